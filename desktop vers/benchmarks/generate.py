@@ -0,0 +1,147 @@
+"""Synthetic policy CSV pairs for benchmarks.
+
+Run from the ``desktop vers`` directory::
+
+    python benchmarks/generate.py OUT_DIR --rows 100000 --columns 20
+
+The generated files share a ``POLICY_NO`` key column followed by text,
+numeric and date columns. ``mismatch_rate`` of the common rows get one changed
+cell in file B, ``missing_rate`` of the keys exist in only one of the files
+(half of them on each side) and ``duplicate_rate`` of the rows of file A are
+written twice.
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import os
+import random
+from dataclasses import dataclass
+from typing import List, Tuple
+
+_WORDS = (
+    "Active",
+    "Closed",
+    "Pending",
+    "Lapsed",
+    "Москва",
+    "Казань",
+    "Auto",
+    "Property",
+    "Life",
+    "Travel",
+)
+
+
+@dataclass(frozen=True)
+class DatasetSpec:
+    """Shape of a generated file pair."""
+
+    rows: int
+    columns: int
+    mismatch_rate: float = 0.01
+    missing_rate: float = 0.001
+    duplicate_rate: float = 0.0
+    seed: int = 0
+    shuffled: bool = True
+
+    @property
+    def name(self) -> str:
+        return (
+            f"r{self.rows}_c{self.columns}_m{self.mismatch_rate:g}_"
+            f"x{self.missing_rate:g}_d{self.duplicate_rate:g}_s{self.seed}"
+            f"{'' if self.shuffled else '_sorted'}"
+        )
+
+
+def _cell(rng: random.Random, column: int) -> str:
+    kind = column % 3
+    if kind == 0:
+        return rng.choice(_WORDS)
+    if kind == 1:
+        return f"{rng.randrange(1_000_000) / 100:.2f}"
+    return f"20{rng.randrange(10, 25)}-{rng.randrange(1, 13):02d}-{rng.randrange(1, 29):02d}"
+
+
+def generate_pair(spec: DatasetSpec, path_a: str, path_b: str) -> Tuple[int, int]:
+    """Write a file pair described by ``spec``; return the row counts of A and B."""
+
+    rng = random.Random(spec.seed)
+    header = ["POLICY_NO"] + [f"FIELD_{column}" for column in range(1, spec.columns)]
+    order = list(range(spec.rows))
+    if spec.shuffled:
+        rng.shuffle(order)
+
+    rows_a = rows_b = 0
+    with open(path_a, "w", encoding="utf-8", newline="") as file_a, open(
+        path_b, "w", encoding="utf-8", newline=""
+    ) as file_b:
+        writer_a = csv.writer(file_a)
+        writer_b = csv.writer(file_b)
+        writer_a.writerow(header)
+        writer_b.writerow(header)
+        for index in order:
+            row: List[str] = [f"P{index:09d}"]
+            row.extend(_cell(rng, column) for column in range(1, spec.columns))
+            draw = rng.random()
+            if draw < spec.missing_rate / 2:
+                writer_a.writerow(row)
+                rows_a += 1
+                continue
+            if draw < spec.missing_rate:
+                writer_b.writerow(row)
+                rows_b += 1
+                continue
+            writer_a.writerow(row)
+            rows_a += 1
+            if rng.random() < spec.duplicate_rate:
+                writer_a.writerow(row)
+                rows_a += 1
+            if spec.columns > 1 and rng.random() < spec.mismatch_rate:
+                column = rng.randrange(1, spec.columns)
+                row[column] = f"{row[column]}*"
+            writer_b.writerow(row)
+            rows_b += 1
+    return rows_a, rows_b
+
+
+def ensure_pair(spec: DatasetSpec, directory: str) -> Tuple[str, str]:
+    """Return the paths of the pair for ``spec`` in ``directory``, generating it once."""
+
+    os.makedirs(directory, exist_ok=True)
+    path_a = os.path.join(directory, f"{spec.name}_a.csv")
+    path_b = os.path.join(directory, f"{spec.name}_b.csv")
+    if not (os.path.exists(path_a) and os.path.exists(path_b)):
+        generate_pair(spec, f"{path_a}.tmp", f"{path_b}.tmp")
+        os.replace(f"{path_a}.tmp", path_a)
+        os.replace(f"{path_b}.tmp", path_b)
+    return path_a, path_b
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Generate a synthetic CSV pair.")
+    parser.add_argument("directory")
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--columns", type=int, default=5)
+    parser.add_argument("--mismatch-rate", type=float, default=0.01)
+    parser.add_argument("--missing-rate", type=float, default=0.001)
+    parser.add_argument("--duplicate-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--sorted", action="store_true", help="write rows in key order")
+    args = parser.parse_args()
+
+    spec = DatasetSpec(
+        rows=args.rows,
+        columns=args.columns,
+        mismatch_rate=args.mismatch_rate,
+        missing_rate=args.missing_rate,
+        duplicate_rate=args.duplicate_rate,
+        seed=args.seed,
+        shuffled=not args.sorted,
+    )
+    for path in ensure_pair(spec, args.directory):
+        print(path)
+
+
+if __name__ == "__main__":
+    main()
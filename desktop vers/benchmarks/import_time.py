@@ -0,0 +1,90 @@
+"""Measure how long ``import csv_checker`` takes in a fresh interpreter.
+
+Run from the ``desktop vers`` directory::
+
+    python benchmarks/import_time.py [--runs 15] [--max-ms 10]
+
+Every run starts a new interpreter with ``-X importtime`` (after a warm-up run
+that writes the bytecode cache). The script prints the best and median import
+time of the package including its standard library dependencies, and the time
+spent in the package's own modules. It fails (exit code 1) when the best own
+time exceeds ``--max-ms`` or when the import loaded Tkinter, NumPy or the
+process pool.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+PACKAGE = "csv_checker"
+FORBIDDEN_MODULES = ("tkinter", "numpy", "concurrent.futures", "multiprocessing")
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _measure_once(module: str) -> Tuple[float, float, List[str]]:
+    """Import ``module`` in a new interpreter; return timings in ms and loaded modules."""
+
+    code = f"import sys, {module}; print('\\n'.join(sys.modules))"
+    env = dict(os.environ)
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=PROJECT_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    cumulative: Dict[str, int] = {}
+    own_time = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        if not self_us.strip().isdigit():
+            continue
+        name = name.strip()
+        cumulative[name] = int(cumulative_us)
+        if name == module or name.startswith(f"{module}."):
+            own_time += int(self_us)
+    return cumulative[module] / 1000, own_time / 1000, result.stdout.split()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=15)
+    parser.add_argument("--max-ms", type=float, default=10.0)
+    parser.add_argument("--module", default=PACKAGE)
+    args = parser.parse_args()
+
+    _measure_once(args.module)
+    totals: List[float] = []
+    own: List[float] = []
+    loaded: List[str] = []
+    for _ in range(args.runs):
+        total_ms, own_ms, loaded = _measure_once(args.module)
+        totals.append(total_ms)
+        own.append(own_ms)
+
+    print(
+        f"import {args.module}: best {min(totals):.1f} ms, median "
+        f"{statistics.median(totals):.1f} ms; own modules: best {min(own):.1f} ms, "
+        f"median {statistics.median(own):.1f} ms ({args.runs} runs)"
+    )
+    failed = False
+    forbidden = [name for name in FORBIDDEN_MODULES if name in loaded]
+    if forbidden:
+        print(f"FAIL: the import loaded {', '.join(forbidden)}")
+        failed = True
+    if min(own) > args.max_ms:
+        print(f"FAIL: own modules import time exceeds {args.max_ms:.1f} ms")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
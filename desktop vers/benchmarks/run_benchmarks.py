@@ -0,0 +1,285 @@
+"""Throughput benchmarks of the comparison pipeline with regression tracking.
+
+Run from the ``desktop vers`` directory::
+
+    python benchmarks/run_benchmarks.py --scale small --scale medium
+
+For every dataset of the selected scales (see ``SCALES``) a synthetic file
+pair is generated once into ``--data-dir`` and each stage is timed in a fresh
+interpreter, so its peak RSS is not inflated by earlier stages. The peak RSS
+covers the stage process as a whole, i.e. including the inputs it prepares.
+Throughput is reported in input rows per second: rows of file A for
+``read_csv_sorted`` and ``detect_duplicate_keys``, rows of both files for
+``compare_csv_files`` and found differences for the report stages
+(``write_differences`` writes a gzip-compressed detailed CSV). For
+``compare_csv_files`` the result also records ``input_passes``: the input
+bytes read before diffing divided by the input size (1.0 is a single pass).
+
+Results are appended to ``--history`` (JSON). The run fails with exit code 1
+when a stage is slower, or uses more memory, than the previous recorded run
+of the same dataset, stage and options on this machine by more than
+``--threshold`` (25% by default); stages faster than ``--min-seconds`` are not
+checked for time regressions.
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - not available on Windows
+    resource = None
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, PROJECT_DIR)
+
+from benchmarks.generate import DatasetSpec, ensure_pair  # noqa: E402
+
+SCALES: Dict[str, List[DatasetSpec]] = {
+    "small": [DatasetSpec(rows=10_000, columns=5)],
+    "medium": [
+        DatasetSpec(rows=100_000, columns=20),
+        DatasetSpec(rows=100_000, columns=20, mismatch_rate=0.2, missing_rate=0.05),
+    ],
+    "wide": [DatasetSpec(rows=20_000, columns=500)],
+    "large": [DatasetSpec(rows=1_000_000, columns=20)],
+    "huge": [DatasetSpec(rows=10_000_000, columns=5)],
+}
+
+STAGES = (
+    "read_csv_sorted",
+    "detect_duplicate_keys",
+    "compare_csv_files",
+    "summarize_differences_by_field",
+    "write_field_report",
+    "write_differences",
+)
+
+DEFAULT_HISTORY = os.path.join(BENCHMARKS_DIR, "results", "history.json")
+DEFAULT_DATA_DIR = os.path.join(BENCHMARKS_DIR, "data")
+
+
+def _peak_rss_bytes() -> Optional[int]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _count_rows(path: str) -> int:
+    with open(path, encoding="utf-8", newline="") as csv_file:
+        return sum(1 for _ in csv.reader(csv_file)) - 1
+
+
+def run_stage(
+    stage: str, path_a: str, path_b: str, options: Dict[str, object]
+) -> Dict[str, object]:
+    """Prepare the inputs of ``stage``, time it and return the measurement."""
+
+    import csv_checker
+
+    key_field = "POLICY_NO"
+    extra: Dict[str, object] = {}
+    if stage in ("read_csv_sorted", "detect_duplicate_keys"):
+        if stage == "detect_duplicate_keys":
+            rows = csv_checker.read_csv_sorted(path_a, key_field)
+        start = time.perf_counter()
+        if stage == "read_csv_sorted":
+            rows = csv_checker.read_csv_sorted(path_a, key_field)
+        else:
+            csv_checker.detect_duplicate_keys(rows, key_field)
+        elapsed = time.perf_counter() - start
+        items = len(rows)
+    elif stage == "compare_csv_files":
+        states: List[csv_checker.ComparisonProgress] = []
+        start = time.perf_counter()
+        try:
+            csv_checker.compare_csv_files(
+                path_a, path_b, key_field, progress=states.append, **options
+            )
+        except csv_checker.DuplicateKeysError:
+            pass
+        elapsed = time.perf_counter() - start
+        items = _count_rows(path_a) + _count_rows(path_b)
+        if states and states[-1].bytes_total:
+            extra["input_passes"] = states[-1].bytes_scanned / states[-1].bytes_total
+    else:
+        try:
+            differences = csv_checker.compare_csv_files(path_a, path_b, key_field, **options)
+        except csv_checker.DuplicateKeysError:
+            return {"skipped": "duplicate keys"}
+        if not differences:
+            return {"skipped": "no differences"}
+        report_path = f"{path_a}.report.csv"
+        start = time.perf_counter()
+        if stage == "summarize_differences_by_field":
+            csv_checker.summarize_differences_by_field(differences)
+        elif stage == "write_field_report":
+            csv_checker.write_field_report(differences, report_path)
+        else:
+            report_path = f"{path_a}.differences.csv.gz"
+            csv_checker.write_differences(differences, report_path)
+        elapsed = time.perf_counter() - start
+        items = len(differences)
+        if os.path.exists(report_path):
+            os.remove(report_path)
+    return {
+        "seconds": elapsed,
+        "items": items,
+        "rows_per_sec": items / elapsed if elapsed > 0 else None,
+        "peak_rss": _peak_rss_bytes(),
+        **extra,
+    }
+
+
+def _run_stage_isolated(
+    stage: str, path_a: str, path_b: str, options: Dict[str, object]
+) -> Dict[str, object]:
+    result = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", stage, path_a, path_b,
+         json.dumps(options)],
+        cwd=PROJECT_DIR,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        return {"error": result.stderr.strip().splitlines()[-1:]}
+    return json.loads(result.stdout)
+
+
+def _load_history(path: str) -> List[Dict[str, object]]:
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as history_file:
+        return json.load(history_file)
+
+
+def _previous_results(
+    history: List[Dict[str, object]], machine: str
+) -> Dict[Tuple[str, str, str], Dict[str, object]]:
+    """Map ``(dataset, stage, options)`` to its latest result on ``machine``."""
+
+    latest: Dict[Tuple[str, str, str], Dict[str, object]] = {}
+    for run in history:
+        if run.get("machine") != machine:
+            continue
+        for result in run["results"]:
+            latest[result["dataset"], result["stage"], result["options"]] = result
+    return latest
+
+
+def find_regressions(
+    results: List[Dict[str, object]],
+    previous: Dict[Tuple[str, str, str], Dict[str, object]],
+    threshold: float,
+    min_seconds: float = 0.05,
+) -> List[str]:
+    """Describe results that got slower or bigger than ``previous`` by ``threshold``.
+
+    Timings below ``min_seconds`` are too noisy to compare and are ignored.
+    """
+
+    regressions = []
+    for result in results:
+        before = previous.get((result["dataset"], result["stage"], result["options"]))
+        if before is None or "seconds" not in before or "seconds" not in result:
+            continue
+        label = f"{result['dataset']} / {result['stage']}"
+        if result["seconds"] >= min_seconds and result["seconds"] > before["seconds"] * (
+            1 + threshold
+        ):
+            regressions.append(
+                f"{label}: {before['seconds']:.3f} s -> {result['seconds']:.3f} s"
+            )
+        if (
+            result.get("peak_rss")
+            and before.get("peak_rss")
+            and result["peak_rss"] > before["peak_rss"] * (1 + threshold)
+        ):
+            regressions.append(
+                f"{label}: peak RSS {before['peak_rss'] / 2**20:.0f} MiB -> "
+                f"{result['peak_rss'] / 2**20:.0f} MiB"
+            )
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", action="append", choices=sorted(SCALES))
+    parser.add_argument("--stage", action="append", choices=STAGES)
+    parser.add_argument("--repeat", type=int, default=1, help="keep the best of N runs")
+    parser.add_argument("--backend", default="python")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--data-dir", default=DEFAULT_DATA_DIR)
+    parser.add_argument("--history", default=DEFAULT_HISTORY)
+    parser.add_argument("--threshold", type=float, default=0.25)
+    parser.add_argument("--min-seconds", type=float, default=0.05)
+    parser.add_argument("--no-record", action="store_true", help="do not update the history")
+    parser.add_argument("--child", nargs=4, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        stage, path_a, path_b, options = args.child
+        print(json.dumps(run_stage(stage, path_a, path_b, json.loads(options))))
+        return 0
+
+    options = {"backend": args.backend, "workers": args.workers}
+    options_label = json.dumps(options, sort_keys=True)
+    results: List[Dict[str, object]] = []
+    for scale in args.scale or ["small"]:
+        for spec in SCALES[scale]:
+            path_a, path_b = ensure_pair(spec, args.data_dir)
+            for stage in args.stage or STAGES:
+                runs = [
+                    _run_stage_isolated(stage, path_a, path_b, options)
+                    for _ in range(max(args.repeat, 1))
+                ]
+                timed = [run for run in runs if "seconds" in run]
+                best = min(timed, key=lambda run: run["seconds"]) if timed else runs[0]
+                result = {"dataset": spec.name, "stage": stage, "options": options_label}
+                result.update(best)
+                if "seconds" in best:
+                    rss = best["peak_rss"]
+                    print(
+                        f"{spec.name:<40} {stage:<32} {best['seconds']:9.3f} s "
+                        f"{best['rows_per_sec'] or 0:>12,.0f} rows/s "
+                        f"{(rss or 0) / 2**20:8.0f} MiB"
+                        + (
+                            f" {best['input_passes']:6.3f} passes"
+                            if "input_passes" in best
+                            else ""
+                        )
+                    )
+                else:
+                    print(f"{spec.name:<40} {stage:<32} {best}")
+                results.append(result)
+
+    machine = f"{platform.node()} {platform.machine()} Python {platform.python_version()}"
+    history = _load_history(args.history)
+    regressions = find_regressions(
+        results, _previous_results(history, machine), args.threshold, args.min_seconds
+    )
+    if not args.no_record:
+        history.append(
+            {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "machine": machine, "results": results}
+        )
+        os.makedirs(os.path.dirname(os.path.abspath(args.history)), exist_ok=True)
+        with open(args.history, "w", encoding="utf-8") as history_file:
+            json.dump(history, history_file, indent=1)
+
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
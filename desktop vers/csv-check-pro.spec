@@ -1,34 +1,49 @@
 # -*- mode: python ; coding: utf-8 -*-
-
+#
+# One-folder build: the executable starts without unpacking an archive to a
+# temporary directory first, which is what made the one-file build slow to
+# cold-start. Modules the tool never uses are excluded to keep the bundle small;
+# NumPy stays optional and is bundled only if installed in the build env.
 
 a = Analysis(
-    ['csv_checker.py'],
-    pathex=[],
+    ['csv_checker/__main__.py'],
+    pathex=['.'],
     binaries=[],
     datas=[],
     hiddenimports=[],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=[],
+    excludes=[
+        'pydoc',
+        'doctest',
+        'pdb',
+        'xmlrpc',
+        'lib2to3',
+        'tkinter.test',
+        'test',
+        'pytest',
+        'IPython',
+        'matplotlib',
+        'pandas',
+        'scipy',
+        'PIL',
+    ],
     noarchive=False,
-    optimize=0,
+    optimize=1,
 )
 pyz = PYZ(a.pure)
 
 exe = EXE(
     pyz,
     a.scripts,
-    a.binaries,
-    a.datas,
     [],
+    exclude_binaries=True,
     name='csv-check-pro',
     debug=False,
     bootloader_ignore_signals=False,
     strip=False,
-    upx=True,
-    upx_exclude=[],
-    runtime_tmpdir=None,
+    upx=False,
     console=False,
     disable_windowed_traceback=False,
     argv_emulation=False,
@@ -36,3 +51,13 @@ exe = EXE(
     codesign_identity=None,
     entitlements_file=None,
 )
+
+coll = COLLECT(
+    exe,
+    a.binaries,
+    a.datas,
+    strip=False,
+    upx=False,
+    upx_exclude=[],
+    name='csv-check-pro',
+)
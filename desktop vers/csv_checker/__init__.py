@@ -0,0 +1,169 @@
+"""Graphical CSV comparison tool.
+
+This package provides functionality to compare two CSV files by a key field
+and highlight any differences. The comparison core has no GUI dependencies;
+the Tkinter based GUI (:mod:`csv_checker.gui`) is loaded only by
+:func:`run_app`, and :mod:`csv_checker.cli` implements the headless
+``python -m csv_checker compare`` command. Importing the package loads only
+the entry points and the result model; the readers, column rules, previews,
+reports, NumPy, the process pool, the incremental index support, the
+detailed report writers, the quick check, the key-only pre-pass, batch
+comparison, the SQLite result stores and the asyncio API
+(:mod:`csv_checker.aio`) are imported only when they are used.
+"""
+from __future__ import annotations
+
+import importlib
+
+from .engine import (
+    BACKENDS,
+    DEFAULT_MEMORY_LIMIT,
+    DUPLICATE_POLICIES,
+    compare_csv_files,
+    iter_differences,
+)
+from .model import (
+    KEY_DISPLAY_SEPARATOR,
+    MISSING_IN_A,
+    MISSING_IN_B,
+    TRUNCATION_MARK,
+    VALUE_MISMATCH,
+    ComparisonCancelled,
+    ComparisonProgress,
+    CsvComparisonError,
+    Difference,
+    DifferenceSet,
+    DuplicateKeysError,
+    FieldSummary,
+    ProgressCallback,
+)
+
+__all__ = [
+    "BACKENDS",
+    "CSV_DELIMITERS",
+    "DATE_FORMATS",
+    "DEFAULT_MEMORY_LIMIT",
+    "DUPLICATE_POLICIES",
+    "FALLBACK_ENCODING",
+    "FIELD_REPORT_EXAMPLES_HEADER",
+    "FIELD_REPORT_HEADERS",
+    "INDEX_SUFFIX",
+    "KEY_DISPLAY_SEPARATOR",
+    "MISSING_IN_A",
+    "MISSING_IN_B",
+    "PREVIEW_FULL",
+    "PREVIEW_OFF",
+    "QUERY_FIELDS",
+    "REPORT_COMPRESSIONS",
+    "REPORT_FORMATS",
+    "RULE_KINDS",
+    "STAGES",
+    "STORE_SUFFIXES",
+    "TRUNCATION_MARK",
+    "VALUE_MISMATCH",
+    "ZIP_MEMBER_SEPARATOR",
+    "BatchResult",
+    "ColumnRule",
+    "ComparisonCancelled",
+    "ComparisonPair",
+    "ComparisonProgress",
+    "ComparisonStats",
+    "CsvComparatorApp",
+    "CsvComparisonError",
+    "Difference",
+    "DifferenceSet",
+    "DifferenceWriter",
+    "DuplicateKeysError",
+    "FieldSummary",
+    "InputSource",
+    "MismatchEstimate",
+    "PairResult",
+    "PreviewPolicy",
+    "ProgressCallback",
+    "QuickCheckResult",
+    "ResultStore",
+    "StageStats",
+    "compare_batch",
+    "compare_csv_files",
+    "compare_csv_files_async",
+    "detect_duplicate_keys",
+    "iter_differences",
+    "iter_differences_async",
+    "iter_missing_rows",
+    "pairs_against",
+    "pairs_from_directories",
+    "pairs_from_manifest",
+    "parse_column_rule",
+    "parse_preview_policy",
+    "quick_check",
+    "read_csv_sorted",
+    "run_app",
+    "summarize_differences_by_field",
+    "update_row_index",
+    "write_batch_summary",
+    "write_differences",
+    "write_field_report",
+]
+
+
+def run_app() -> None:
+    """Launch the GUI application (Tkinter is imported only here)."""
+    from .gui import run_app as run_gui
+
+    run_gui()
+
+
+_LAZY_ATTRIBUTES = {
+    "CSV_DELIMITERS": ".inputs",
+    "FALLBACK_ENCODING": ".inputs",
+    "ZIP_MEMBER_SEPARATOR": ".inputs",
+    "InputSource": ".inputs",
+    "PREVIEW_FULL": ".previews",
+    "PREVIEW_OFF": ".previews",
+    "PreviewPolicy": ".previews",
+    "parse_preview_policy": ".previews",
+    "FIELD_REPORT_EXAMPLES_HEADER": ".reports",
+    "FIELD_REPORT_HEADERS": ".reports",
+    "summarize_differences_by_field": ".reports",
+    "write_field_report": ".reports",
+    "DATE_FORMATS": ".rules",
+    "RULE_KINDS": ".rules",
+    "ColumnRule": ".rules",
+    "parse_column_rule": ".rules",
+    "detect_duplicate_keys": ".sources",
+    "read_csv_sorted": ".sources",
+    "STAGES": ".stats",
+    "ComparisonStats": ".stats",
+    "StageStats": ".stats",
+    "CsvComparatorApp": ".gui",
+    "INDEX_SUFFIX": ".incremental",
+    "update_row_index": ".incremental",
+    "DifferenceWriter": ".writers",
+    "REPORT_COMPRESSIONS": ".writers",
+    "REPORT_FORMATS": ".writers",
+    "write_differences": ".writers",
+    "iter_missing_rows": ".keys",
+    "BatchResult": ".batch",
+    "ComparisonPair": ".batch",
+    "PairResult": ".batch",
+    "compare_batch": ".batch",
+    "pairs_against": ".batch",
+    "pairs_from_directories": ".batch",
+    "pairs_from_manifest": ".batch",
+    "write_batch_summary": ".batch",
+    "MismatchEstimate": ".quick",
+    "QuickCheckResult": ".quick",
+    "quick_check": ".quick",
+    "QUERY_FIELDS": ".store",
+    "STORE_SUFFIXES": ".store",
+    "ResultStore": ".store",
+    "compare_csv_files_async": ".aio",
+    "iter_differences_async": ".aio",
+}
+
+
+def __getattr__(name: str):
+    module_name = _LAZY_ATTRIBUTES.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(importlib.import_module(module_name, __name__), name)
@@ -0,0 +1,7 @@
+"""Run ``python -m csv_checker``: the GUI without arguments, the CLI otherwise."""
+import sys
+
+from csv_checker.cli import main
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,211 @@
+"""Asyncio API: comparisons awaited from an event loop.
+
+The comparison engines are blocking, so :func:`compare_csv_files_async` and
+:func:`iter_differences_async` run them on a worker thread of an executor
+(the loop's default one unless given) while the event loop keeps serving
+other tasks. Cancelling the awaiting task sets the comparison's cancel event;
+the engine stops at its next check and releases its files before the
+cancellation is propagated. :func:`iter_differences_async` hands differences
+over in batches through a bounded queue: once the consumer falls
+``queue_size`` batches behind, the engine waits, so memory use is set by the
+consumer rather than by the size of the result.
+
+Besides paths, file objects and iterables of ``bytes`` chunks, inputs may be
+async iterables of ``bytes`` chunks (for example a request body or a
+streamed download): the worker thread pulls them from the event loop one
+chunk at a time, so the input is never buffered whole. Imported only when
+used.
+"""
+from __future__ import annotations
+
+import asyncio
+import concurrent.futures
+import functools
+import itertools
+import threading
+from contextlib import closing
+from typing import Any, AsyncIterable, AsyncIterator, Iterator, List, Optional, TypeVar, Union
+
+from .engine import compare_csv_files, iter_differences
+from .inputs import InputSource
+from .model import ComparisonCancelled, Difference, DifferenceSet
+from .sources import KeyFields
+
+DEFAULT_BATCH_SIZE = 1000
+"""Number of differences per batch of :func:`iter_differences_async`."""
+
+AsyncInputSource = Union[InputSource, AsyncIterable[bytes]]
+"""An input of the asyncio API: an :data:`InputSource` or async ``bytes`` chunks."""
+
+_POLL_INTERVAL = 0.1
+_T = TypeVar("_T")
+
+
+def _wait_on_loop(future: "concurrent.futures.Future[_T]", cancel_event: threading.Event) -> _T:
+    """Wait on the worker thread for a coroutine scheduled on the event loop.
+
+    The wait gives up with :class:`ComparisonCancelled` once ``cancel_event``
+    is set, so a cancelled comparison never stays blocked on the loop.
+    """
+
+    while not cancel_event.is_set():
+        try:
+            return future.result(_POLL_INTERVAL)
+        except concurrent.futures.TimeoutError:
+            continue
+    future.cancel()
+    raise ComparisonCancelled("Сравнение отменено пользователем.")
+
+
+async def _next_chunk(chunks: AsyncIterator[bytes]) -> Optional[bytes]:
+    try:
+        return await chunks.__anext__()
+    except StopAsyncIteration:
+        return None
+
+
+def _pull_chunks(
+    chunks: AsyncIterable[bytes],
+    loop: asyncio.AbstractEventLoop,
+    cancel_event: threading.Event,
+) -> Iterator[bytes]:
+    """Iterate on the worker thread over async chunks produced on the loop."""
+
+    iterator = chunks.__aiter__()
+    while True:
+        chunk = _wait_on_loop(
+            asyncio.run_coroutine_threadsafe(_next_chunk(iterator), loop), cancel_event
+        )
+        if chunk is None:
+            return
+        yield chunk
+
+
+def _blocking_input(
+    source: AsyncInputSource,
+    loop: asyncio.AbstractEventLoop,
+    cancel_event: threading.Event,
+) -> InputSource:
+    if hasattr(source, "__aiter__"):
+        return _pull_chunks(source, loop, cancel_event)  # type: ignore[arg-type]
+    return source  # type: ignore[return-value]
+
+
+async def _await_worker(
+    worker: "asyncio.Future[_T]", cancel_event: threading.Event
+) -> _T:
+    """Await a worker thread; on cancellation stop it before re-raising."""
+
+    try:
+        return await asyncio.shield(worker)
+    except asyncio.CancelledError:
+        await _stop_worker(worker, cancel_event)
+        raise
+
+
+async def _stop_worker(worker: "asyncio.Future[Any]", cancel_event: threading.Event) -> None:
+    """Ask a worker thread to stop and wait until it has released its files."""
+
+    cancel_event.set()
+    await asyncio.wait([worker])
+    if not worker.cancelled():
+        # The worker's ComparisonCancelled (or a late error) is not reported.
+        worker.exception()
+
+
+async def compare_csv_files_async(
+    file_path_a: AsyncInputSource,
+    file_path_b: AsyncInputSource,
+    key_field: KeyFields = "POLICY_NO",
+    *,
+    executor: Optional[concurrent.futures.Executor] = None,
+    **options: Any,
+) -> DifferenceSet:
+    """Compare two CSV files on a worker thread and return the differences.
+
+    Keyword ``options`` are those of :func:`compare_csv_files`; a
+    ``progress`` callback is called on the worker thread. ``executor`` must
+    run its jobs on threads of this process (the loop's default executor is
+    used if it is ``None``); use ``workers`` to spread the comparison itself
+    over processes. Cancelling the awaiting task stops the comparison.
+    """
+
+    loop = asyncio.get_running_loop()
+    cancel_event = options.pop("cancel_event", None) or threading.Event()
+    worker = loop.run_in_executor(
+        executor,
+        functools.partial(
+            compare_csv_files,
+            _blocking_input(file_path_a, loop, cancel_event),
+            _blocking_input(file_path_b, loop, cancel_event),
+            key_field,
+            cancel_event=cancel_event,
+            **options,
+        ),
+    )
+    return await _await_worker(worker, cancel_event)
+
+
+async def iter_differences_async(
+    file_path_a: AsyncInputSource,
+    file_path_b: AsyncInputSource,
+    key_field: KeyFields = "POLICY_NO",
+    *,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    queue_size: int = 4,
+    executor: Optional[concurrent.futures.Executor] = None,
+    **options: Any,
+) -> AsyncIterator[List[Difference]]:
+    """Yield the differences of two CSV files in key order, in batches.
+
+    The comparison runs on a worker thread (see
+    :func:`compare_csv_files_async` for ``executor`` and the keyword
+    ``options`` of :func:`iter_differences`) and puts lists of up to
+    ``batch_size`` differences into a queue of ``queue_size`` batches; while
+    the queue is full the comparison waits for the consumer. Cancelling the
+    consuming task, or closing the iterator early (``aclose``), stops the
+    comparison.
+    """
+
+    loop = asyncio.get_running_loop()
+    cancel_event = options.pop("cancel_event", None) or threading.Event()
+    batches: "asyncio.Queue[List[Difference]]" = asyncio.Queue(max(queue_size, 1))
+    batch_size = max(batch_size, 1)
+    differences = iter_differences(
+        _blocking_input(file_path_a, loop, cancel_event),
+        _blocking_input(file_path_b, loop, cancel_event),
+        key_field,
+        cancel_event=cancel_event,
+        **options,
+    )
+
+    def produce() -> None:
+        with closing(differences):
+            while True:
+                batch = list(itertools.islice(differences, batch_size))
+                if not batch:
+                    return
+                _wait_on_loop(
+                    asyncio.run_coroutine_threadsafe(batches.put(batch), loop), cancel_event
+                )
+
+    worker = loop.run_in_executor(executor, produce)
+    getter: Optional["asyncio.Future[List[Difference]]"] = None
+    try:
+        while True:
+            getter = asyncio.ensure_future(batches.get())
+            await asyncio.wait([getter, worker], return_when=asyncio.FIRST_COMPLETED)
+            if getter.done():
+                yield getter.result()
+                continue
+            getter.cancel()
+            # Every batch is queued before the worker returns.
+            while not batches.empty():
+                yield batches.get_nowait()
+            worker.result()
+            return
+    finally:
+        if getter is not None:
+            getter.cancel()
+        if not worker.done():
+            await _stop_worker(worker, cancel_event)
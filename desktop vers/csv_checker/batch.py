@@ -0,0 +1,767 @@
+"""Batch comparison of many file pairs, parsing every input only once.
+
+A batch is a list of :class:`ComparisonPair` read from a manifest, matched
+by name in two directories or built from one reference file and several
+others. Every distinct input is parsed and sorted by key once; its sorted
+rows stay in an LRU cache holding at most ``cache_limit`` bytes, and inputs
+that do not fit (or are pushed out of it) are kept as sorted run files in
+the work directory, so a reference file compared with a dozen others is
+read once instead of a dozen times. With several workers the inputs are
+sorted and the pairs compared in a process pool; every worker process
+keeps its own share of the cache.
+"""
+from __future__ import annotations
+
+import csv
+import dataclasses
+import itertools
+import os
+import tempfile
+import threading
+from collections import Counter, OrderedDict
+from contextlib import ExitStack, closing
+from dataclasses import dataclass
+from typing import (
+    TYPE_CHECKING,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+from .engine import (
+    DEFAULT_MEMORY_LIMIT,
+    DUPLICATE_POLICIES,
+    _CompareOptions,
+    _resolve_rules,
+)
+from .inputs import _input_size, _is_path
+from .merge import _join_sorted_rows, _read_run, _row_size, _sorted_rows, _write_run
+from .model import (
+    MISSING_IN_A,
+    MISSING_IN_B,
+    VALUE_MISMATCH,
+    ComparisonCancelled,
+    CsvComparisonError,
+    DifferenceSet,
+    DuplicateKeysError,
+    FieldSummary,
+    ProgressCallback,
+    _Progress,
+)
+from .previews import PreviewPolicy, _preview_policy
+from .rules import ColumnRule
+from .sources import (
+    KeyFields,
+    SortedRow,
+    _column_selection,
+    _ColumnSelection,
+    _CsvSource,
+    _key_fields,
+)
+from .writers import REPORT_FORMATS, write_differences
+
+if TYPE_CHECKING:
+    from concurrent.futures import Executor
+
+DEFAULT_CACHE_LIMIT = DEFAULT_MEMORY_LIMIT
+"""Default budget in bytes for the sorted inputs cached by :func:`compare_batch`."""
+
+BATCH_SUMMARY_HEADERS = (
+    "Сравнение",
+    "Файл 1",
+    "Файл 2",
+    "Всего расхождений",
+    "Несовпадений значений",
+    "Отсутствует в файле 1",
+    "Отсутствует в файле 2",
+    "Ошибка",
+)
+
+_CSV_SUFFIXES = (".csv", ".csv.gz", ".csv.zst", ".csv.zstd", ".zip")
+
+
+@dataclass(frozen=True)
+class ComparisonPair:
+    """Two inputs of a batch; ``name`` labels the pair in summaries and file names."""
+
+    name: str
+    file_a: str
+    file_b: str
+
+
+@dataclass
+class PairResult:
+    """Outcome of comparing one pair of a batch.
+
+    ``differences`` holds the differences unless they were written to
+    ``output_path``; ``error`` describes why the pair could not be compared
+    (a missing file or column, duplicate keys with ``"fail"``, ...).
+    """
+
+    pair: ComparisonPair
+    summary: FieldSummary
+    differences: Optional[DifferenceSet] = None
+    output_path: Optional[str] = None
+    error: Optional[str] = None
+
+
+@dataclass
+class BatchResult:
+    """Outcome of :func:`compare_batch`.
+
+    ``pairs`` lists the results in the order of the pairs, ``summary``
+    combines their per-field summaries and ``parsed_inputs`` counts the
+    inputs that were parsed (each at most once).
+    """
+
+    pairs: List[PairResult]
+    summary: FieldSummary
+    parsed_inputs: int = 0
+
+    @property
+    def has_differences(self) -> bool:
+        return any(result.summary.total for result in self.pairs)
+
+    @property
+    def failed(self) -> List[PairResult]:
+        """Results of the pairs that could not be compared."""
+
+        return [result for result in self.pairs if result.error is not None]
+
+
+def _pair_name(path: str) -> str:
+    """Name a pair after a file: its base name without the CSV suffixes."""
+
+    name = os.path.basename(path)
+    lowered = name.lower()
+    for suffix in _CSV_SUFFIXES:
+        if lowered.endswith(suffix) and len(name) > len(suffix):
+            return name[: -len(suffix)]
+    return name
+
+
+def _named_pairs(items: Iterable[Tuple[str, str, str]]) -> List[ComparisonPair]:
+    """Build pairs from ``(name, file_a, file_b)``, numbering repeated names."""
+
+    pairs = []
+    seen: Counter = Counter()
+    for name, file_a, file_b in items:
+        seen[name] += 1
+        if seen[name] > 1:
+            name = f"{name}_{seen[name]}"
+        pairs.append(ComparisonPair(name, file_a, file_b))
+    return pairs
+
+
+def pairs_against(reference: str, others: Iterable[str]) -> List[ComparisonPair]:
+    """Pair a reference file (as file A) with each of ``others``."""
+
+    reference = os.fspath(reference)
+    return _named_pairs(
+        (_pair_name(os.fspath(other)), reference, os.fspath(other)) for other in others
+    )
+
+
+def pairs_from_directories(directory_a: str, directory_b: str) -> List[ComparisonPair]:
+    """Pair the CSV files of two directories that have the same name.
+
+    ``.csv`` files, compressed ones and ``.zip`` archives are considered. A
+    file found in one directory only is still paired, with the missing path
+    in the other one, so that :func:`compare_batch` reports it as an error.
+    """
+
+    names = set()
+    for directory in (directory_a, directory_b):
+        if not os.path.isdir(directory):
+            raise CsvComparisonError(f"Каталог не найден: {directory}")
+        names.update(
+            entry.name
+            for entry in os.scandir(directory)
+            if entry.is_file() and entry.name.lower().endswith(_CSV_SUFFIXES)
+        )
+    return _named_pairs(
+        (_pair_name(name), os.path.join(directory_a, name), os.path.join(directory_b, name))
+        for name in sorted(names)
+    )
+
+
+def pairs_from_manifest(manifest_path: str) -> List[ComparisonPair]:
+    """Read the pairs of a batch from a CSV manifest.
+
+    The manifest has ``file_a`` and ``file_b`` columns and an optional
+    ``name`` column (the name of ``file_b`` when empty); relative paths are
+    resolved against the directory of the manifest.
+    """
+
+    base = os.path.dirname(os.path.abspath(manifest_path))
+    try:
+        with open(manifest_path, encoding="utf-8-sig", newline="") as manifest:
+            records = list(csv.reader(manifest))
+    except FileNotFoundError as error:
+        raise CsvComparisonError(f"Файл не найден: {manifest_path}") from error
+    header = [cell.strip().casefold() for cell in records[0]] if records else []
+    if "file_a" not in header or "file_b" not in header:
+        raise CsvComparisonError(
+            f"В манифесте {manifest_path} должны быть столбцы file_a и file_b."
+        )
+    index_a, index_b = header.index("file_a"), header.index("file_b")
+    index_name = header.index("name") if "name" in header else None
+
+    def cell(record: List[str], index: Optional[int]) -> str:
+        return record[index].strip() if index is not None and index < len(record) else ""
+
+    items = []
+    for record in records[1:]:
+        file_a, file_b = cell(record, index_a), cell(record, index_b)
+        if not (file_a or file_b):
+            continue
+        if not (file_a and file_b):
+            raise CsvComparisonError(
+                f"В манифесте {manifest_path} у пары {file_a or file_b} не указан второй файл."
+            )
+        file_a, file_b = os.path.join(base, file_a), os.path.join(base, file_b)
+        items.append((cell(record, index_name) or _pair_name(file_b), file_a, file_b))
+    return _named_pairs(items)
+
+
+@dataclass
+class _SortedInput:
+    """An input sorted by key: its rows in memory or in a run file on disk.
+
+    ``size`` estimates the memory the rows take (see :func:`_row_size`).
+    """
+
+    file_path: str
+    positions: Dict[str, int]
+    size: int
+    row_count: int
+    bytes_read: int
+    rows: Optional[List[SortedRow]] = None
+    run_path: Optional[str] = None
+
+    def iter_rows(self) -> Iterator[SortedRow]:
+        if self.rows is not None:
+            yield from self.rows
+            return
+        with open(self.run_path, "r", encoding="utf-8", newline="") as run_file:
+            yield from _read_run(run_file)
+
+
+def _sort_input(
+    file_path: str,
+    key_fields: Sequence[str],
+    selection: Optional[_ColumnSelection],
+    memory_limit: int,
+    keep_limit: int,
+    work_dir: str,
+    progress: Optional[_Progress] = None,
+) -> _SortedInput:
+    """Parse and sort an input, keeping its rows in memory if they fit ``keep_limit``.
+
+    Larger inputs are sorted within ``memory_limit`` bytes and written to a
+    single run file in ``work_dir``.
+    """
+
+    totals = [0, 0]
+
+    def measured(rows: Iterable[SortedRow]) -> Iterator[SortedRow]:
+        for row in rows:
+            totals[0] += _row_size(row[1])
+            totals[1] += 1
+            yield row
+
+    with ExitStack() as stack:
+        source = stack.enter_context(_CsvSource(file_path, key_fields))
+        sort_dir = stack.enter_context(tempfile.TemporaryDirectory(dir=work_dir))
+        if selection is not None:
+            source.project(
+                {
+                    column: index
+                    for column, index in source.positions.items()
+                    if column in key_fields or selection.keeps(column)
+                }
+            )
+        rows: Iterable[SortedRow] = source
+        if progress is not None:
+            progress.add_bytes_reader(source.bytes_read)
+            rows = progress.reading(rows)
+        sorted_rows = stack.enter_context(
+            closing(_sorted_rows(measured(rows), memory_limit, sort_dir))
+        )
+        # The sort reads the whole input before it yields the first row.
+        rows = itertools.chain(list(itertools.islice(sorted_rows, 1)), sorted_rows)
+        entry = _SortedInput(
+            source.file_path, source.positions, totals[0], totals[1], source.bytes_read()
+        )
+        if entry.size <= keep_limit:
+            entry.rows = list(rows)
+        else:
+            entry.run_path = _write_run(rows, work_dir)
+    return entry
+
+
+class _SortedInputCache:
+    """LRU cache of sorted inputs holding at most ``limit`` bytes of rows in memory.
+
+    Rows pushed out of memory are written to run files in ``work_dir`` (unless
+    they were loaded from one), so no input has to be parsed again.
+    """
+
+    def __init__(self, limit: int, work_dir: str) -> None:
+        self.limit = limit
+        self.work_dir = work_dir
+        self._entries: "OrderedDict[str, _SortedInput]" = OrderedDict()
+        self._size = 0
+
+    def get(self, key: str) -> Optional[_SortedInput]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key: str, entry: _SortedInput) -> None:
+        self._entries[key] = entry
+        if entry.rows is not None:
+            self._size += entry.size
+            for cached in list(self._entries.values()):
+                if self._size <= self.limit:
+                    break
+                if cached.rows is not None:
+                    if cached.run_path is None:
+                        cached.run_path = _write_run(cached.rows, self.work_dir)
+                    cached.rows = None
+                    self._size -= cached.size
+
+    def discard(self, key: str) -> None:
+        """Forget an input that is no longer needed and delete its run file."""
+
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        if entry.rows is not None:
+            self._size -= entry.size
+            entry.rows = None
+        if entry.run_path is not None:
+            os.remove(entry.run_path)
+
+
+def _output_path(output_dir: str, name: str, output_format: str) -> str:
+    return os.path.join(output_dir, f"{name.replace(os.sep, '_')}.{output_format}")
+
+
+@dataclass(frozen=True)
+class _PairSettings:
+    """Options of :func:`compare_batch` shared by the comparisons of all pairs."""
+
+    key_fields: Tuple[str, ...]
+    duplicates: str
+    example_keys: int
+    output_dir: Optional[str]
+    output_format: str
+    preview: PreviewPolicy
+
+
+def _compare_sorted(
+    pair: ComparisonPair,
+    input_a: _SortedInput,
+    input_b: _SortedInput,
+    rules: Mapping[str, ColumnRule],
+    settings: _PairSettings,
+    progress: Optional[_Progress] = None,
+) -> PairResult:
+    """Merge-join two sorted inputs into the result of ``pair``."""
+
+    key_fields = settings.key_fields
+    summary = FieldSummary(settings.example_keys)
+    with ExitStack() as stack:
+        rows_a = stack.enter_context(closing(input_a.iter_rows()))
+        rows_b = stack.enter_context(closing(input_b.iter_rows()))
+        if progress is not None:
+            rows_a, rows_b = progress.comparing(rows_a), progress.comparing(rows_b)
+        raws = _join_sorted_rows(
+            rows_a,
+            rows_b,
+            input_a.positions,
+            input_b.positions,
+            key_fields,
+            input_a.file_path,
+            input_b.file_path,
+            settings.duplicates,
+            rules,
+            progress,
+            settings.preview,
+        )
+        raws = summary.observe(raws)
+        if progress is not None:
+            raws = progress.differences(raws)
+        try:
+            if settings.output_dir is None:
+                differences = DifferenceSet(composite_keys=len(key_fields) > 1)
+                differences.extend_raw(raws)
+                differences.summary = summary
+                return PairResult(pair, summary, differences=differences)
+            output_path = _output_path(settings.output_dir, pair.name, settings.output_format)
+            write_differences(
+                raws, output_path, output_format=settings.output_format, key_field=key_fields
+            )
+            return PairResult(pair, summary, output_path=output_path)
+        except DuplicateKeysError as error:
+            return PairResult(pair, FieldSummary(settings.example_keys), error=str(error))
+
+
+_worker_cache: Optional[_SortedInputCache] = None
+
+
+def _init_worker(cache_limit: int, work_dir: str) -> None:
+    global _worker_cache
+    _worker_cache = _SortedInputCache(cache_limit, work_dir)
+
+
+def _cached_input(cache: _SortedInputCache, entry: _SortedInput) -> _SortedInput:
+    """Return ``entry`` with its run file loaded into ``cache`` when it fits."""
+
+    if entry.rows is not None or entry.size > cache.limit:
+        return entry
+    cached = cache.get(entry.run_path)
+    if cached is None:
+        with closing(entry.iter_rows()) as rows:
+            cached = dataclasses.replace(entry, rows=list(rows))
+        cache.put(entry.run_path, cached)
+    return cached
+
+
+def _compare_in_worker(
+    pair: ComparisonPair,
+    input_a: _SortedInput,
+    input_b: _SortedInput,
+    rules: Mapping[str, ColumnRule],
+    settings: _PairSettings,
+) -> PairResult:
+    return _compare_sorted(
+        pair,
+        _cached_input(_worker_cache, input_a),
+        _cached_input(_worker_cache, input_b),
+        rules,
+        settings,
+    )
+
+
+def compare_batch(
+    pairs: Sequence[ComparisonPair],
+    key_field: KeyFields = "POLICY_NO",
+    *,
+    duplicates: str = "fail",
+    memory_limit: int = DEFAULT_MEMORY_LIMIT,
+    cache_limit: int = DEFAULT_CACHE_LIMIT,
+    temp_dir: Optional[str] = None,
+    workers: int = 1,
+    rules: Optional[Mapping[str, Union[ColumnRule, str]]] = None,
+    infer_types: bool = False,
+    columns: Optional[Sequence[str]] = None,
+    exclude_columns: Optional[Sequence[str]] = None,
+    preview: Union[PreviewPolicy, str, None] = None,
+    output_dir: Optional[str] = None,
+    output_format: str = "csv",
+    example_keys: int = 0,
+    progress: Optional[ProgressCallback] = None,
+    cancel_event: Optional[threading.Event] = None,
+) -> BatchResult:
+    """Compare many pairs of CSV files, parsing and sorting every input once.
+
+    Pairs come from :func:`pairs_from_manifest`, :func:`pairs_from_directories`
+    or :func:`pairs_against`. Each distinct input file is sorted by key once
+    (within ``memory_limit`` bytes, spilling to ``temp_dir``) and its sorted
+    rows are cached for the pairs that use it: up to ``cache_limit`` bytes
+    are kept in memory, the least recently used inputs move to sorted run
+    files on disk, and an input is dropped after its last pair.
+
+    With ``workers`` greater than one the inputs are sorted and the pairs
+    compared in a process pool; the memory budget and the cache are split
+    between the workers, and each worker caches the inputs of the pairs it
+    compares.
+
+    ``duplicates``, ``rules``, ``infer_types`` (sampled per pair), ``columns``,
+    ``exclude_columns`` and ``preview`` work as in :func:`compare_csv_files`,
+    except that requested columns missing from a file are skipped for that
+    file. A pair that cannot be compared, for example because a file or a key
+    column is missing or because of duplicate keys with ``"fail"``, gets an
+    :attr:`PairResult.error` and the batch goes on.
+
+    The differences of each pair are kept in its :class:`PairResult` or, with
+    ``output_dir``, written there to ``<name>.<output_format>`` (``csv``,
+    ``jsonl`` or ``parquet``). The per-field summaries (with ``example_keys``
+    example keys) are combined into :attr:`BatchResult.summary`; see
+    :func:`write_batch_summary` for a report with one row per pair.
+    ``progress`` and ``cancel_event`` work as in :func:`iter_differences`
+    across the whole batch.
+    """
+
+    if duplicates not in DUPLICATE_POLICIES:
+        raise CsvComparisonError(
+            f"Неизвестная политика дубликатов '{duplicates}'. "
+            f"Доступны: {', '.join(DUPLICATE_POLICIES)}."
+        )
+    if memory_limit <= 0:
+        raise CsvComparisonError("Лимит памяти должен быть положительным числом.")
+    if cache_limit < 0:
+        raise CsvComparisonError("Размер кэша не может быть отрицательным.")
+    if workers < 1:
+        raise CsvComparisonError("Число процессов должно быть не меньше одного.")
+    if output_format not in REPORT_FORMATS:
+        raise CsvComparisonError(
+            f"Неизвестный формат отчёта '{output_format}'. "
+            f"Доступны: {', '.join(REPORT_FORMATS)}."
+        )
+    if not all(_is_path(pair.file_a) and _is_path(pair.file_b) for pair in pairs):
+        raise CsvComparisonError("Пакетное сравнение работает только с файлами, а не с потоками.")
+    settings = _PairSettings(
+        _key_fields(key_field),
+        duplicates,
+        example_keys,
+        output_dir,
+        output_format,
+        _preview_policy(preview),
+    )
+    selection = _column_selection(columns, exclude_columns)
+    inputs: Dict[str, str] = {}
+    for pair in pairs:
+        for path in (pair.file_a, pair.file_b):
+            inputs.setdefault(_input_key(path), os.fspath(path))
+    run = _Progress(
+        progress, cancel_event, sum(_input_size(path) for path in inputs.values())
+    )
+    options = _CompareOptions(
+        key_field=settings.key_fields, rules=rules, infer_types=infer_types
+    )
+    if pairs:
+        # Parse the explicit rules once, so that a typo fails the whole batch.
+        explicit = _resolve_rules(
+            pairs[0].file_a,
+            pairs[0].file_b,
+            dataclasses.replace(options, infer_types=False),
+            run,
+        )
+        options = dataclasses.replace(options, rules=explicit)
+    if output_dir is not None:
+        os.makedirs(output_dir, exist_ok=True)
+
+    run.tick()
+    with tempfile.TemporaryDirectory(prefix="csv_checker_", dir=temp_dir) as work_dir:
+        batch = _BatchRun(inputs, options, selection, settings, memory_limit, work_dir, run)
+        if workers > 1:
+            results = batch.run_in_pool(pairs, cache_limit, workers)
+        else:
+            results = batch.run(pairs, cache_limit)
+    run.finish()
+    summary = FieldSummary(example_keys)
+    for result in results:
+        summary.merge(result.summary)
+    return BatchResult(results, summary, batch.parsed)
+
+
+def _input_key(path: str) -> str:
+    """Identify an input independently of how its path is spelled."""
+
+    return os.path.normcase(os.path.abspath(path))
+
+
+class _BatchRun:
+    """Sort the inputs of a batch and compare its pairs, here or in a pool."""
+
+    def __init__(
+        self,
+        inputs: Mapping[str, str],
+        options: _CompareOptions,
+        selection: Optional[_ColumnSelection],
+        settings: _PairSettings,
+        memory_limit: int,
+        work_dir: str,
+        progress: _Progress,
+    ) -> None:
+        self.inputs = inputs
+        self.options = options
+        self.selection = selection
+        self.settings = settings
+        self.memory_limit = memory_limit
+        self.work_dir = work_dir
+        self.progress = progress
+        self.failed: Dict[str, str] = {}
+        self.parsed = 0
+
+    def _failure(self, pair: ComparisonPair, error: str) -> PairResult:
+        return PairResult(pair, FieldSummary(self.settings.example_keys), error=error)
+
+    def _rules(self, pair: ComparisonPair) -> Mapping[str, ColumnRule]:
+        return _resolve_rules(pair.file_a, pair.file_b, self.options, self.progress)
+
+    def run(self, pairs: Sequence[ComparisonPair], cache_limit: int) -> List[PairResult]:
+        """Compare the pairs one by one in this process."""
+
+        cache = _SortedInputCache(cache_limit, self.work_dir)
+        uses = Counter(
+            _input_key(path) for pair in pairs for path in (pair.file_a, pair.file_b)
+        )
+        results = []
+        for pair in pairs:
+            keys = (_input_key(pair.file_a), _input_key(pair.file_b))
+            try:
+                input_a, input_b = (self._load(cache, key) for key in keys)
+                results.append(
+                    _compare_sorted(
+                        pair, input_a, input_b, self._rules(pair), self.settings, self.progress
+                    )
+                )
+            except ComparisonCancelled:
+                raise
+            except CsvComparisonError as error:
+                results.append(self._failure(pair, str(error)))
+            finally:
+                for key in keys:
+                    uses[key] -= 1
+                    if not uses[key]:
+                        cache.discard(key)
+        return results
+
+    def _load(self, cache: _SortedInputCache, key: str) -> _SortedInput:
+        if key in self.failed:
+            raise CsvComparisonError(self.failed[key])
+        entry = cache.get(key)
+        if entry is None:
+            self.parsed += 1
+            try:
+                entry = _sort_input(
+                    self.inputs[key],
+                    self.settings.key_fields,
+                    self.selection,
+                    self.memory_limit,
+                    cache.limit,
+                    self.work_dir,
+                    self.progress,
+                )
+            except ComparisonCancelled:
+                raise
+            except CsvComparisonError as error:
+                self.failed[key] = str(error)
+                raise
+            cache.put(key, entry)
+        return entry
+
+    def run_in_pool(
+        self, pairs: Sequence[ComparisonPair], cache_limit: int, workers: int
+    ) -> List[PairResult]:
+        """Sort the inputs, then compare the pairs, on ``workers`` processes."""
+
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(cache_limit // workers, self.work_dir),
+        ) as executor:
+            try:
+                return self._run_jobs(executor, pairs, workers)
+            except ComparisonCancelled:
+                executor.shutdown(wait=False, cancel_futures=True)
+                raise
+
+    def _run_jobs(
+        self, executor: "Executor", pairs: Sequence[ComparisonPair], workers: int
+    ) -> List[PairResult]:
+        from .parallel import _wait_for_jobs
+
+        progress = self.progress
+        sort_jobs = {
+            executor.submit(
+                _sort_input,
+                path,
+                self.settings.key_fields,
+                self.selection,
+                max(self.memory_limit // workers, 1),
+                0,
+                self.work_dir,
+            ): key
+            for key, path in self.inputs.items()
+        }
+        self.parsed = len(sort_jobs)
+        sorted_inputs: Dict[str, _SortedInput] = {}
+
+        def sort_done(job) -> None:
+            key = sort_jobs[job]
+            try:
+                entry = job.result()
+            except CsvComparisonError as error:
+                self.failed[key] = str(error)
+                return
+            sorted_inputs[key] = entry
+            progress.bytes_done += entry.bytes_read
+            progress.rows_read += entry.row_count
+
+        _wait_for_jobs(list(sort_jobs), progress, sort_done)
+
+        results: List[Optional[PairResult]] = []
+        compare_jobs = {}
+        for pair in pairs:
+            key_a, key_b = _input_key(pair.file_a), _input_key(pair.file_b)
+            error = self.failed.get(key_a) or self.failed.get(key_b)
+            if error is None:
+                try:
+                    rules = self._rules(pair)
+                except ComparisonCancelled:
+                    raise
+                except CsvComparisonError as rules_error:
+                    error = str(rules_error)
+            if error is not None:
+                results.append(self._failure(pair, error))
+                continue
+            job = executor.submit(
+                _compare_in_worker,
+                pair,
+                sorted_inputs[key_a],
+                sorted_inputs[key_b],
+                rules,
+                self.settings,
+            )
+            compare_jobs[job] = (len(results), key_a, key_b)
+            results.append(None)
+
+        def compare_done(job) -> None:
+            index, key_a, key_b = compare_jobs[job]
+            results[index] = result = job.result()
+            progress.rows_compared += (
+                sorted_inputs[key_a].row_count + sorted_inputs[key_b].row_count
+            )
+            progress.differences_found += result.summary.total
+
+        _wait_for_jobs(list(compare_jobs), progress, compare_done)
+        return results
+
+
+def write_batch_summary(result: BatchResult, output_path: str) -> None:
+    """Write one row per pair of a batch with its difference counts to CSV."""
+
+    if not output_path:
+        raise CsvComparisonError("Не указан путь для сохранения отчёта.")
+    with open(output_path, "w", encoding="utf-8", newline="") as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(BATCH_SUMMARY_HEADERS)
+        for pair_result in result.pairs:
+            counts = pair_result.summary.type_counts()
+            pair = pair_result.pair
+            writer.writerow(
+                [
+                    pair.name,
+                    pair.file_a,
+                    pair.file_b,
+                    sum(counts.values()),
+                    counts.get(VALUE_MISMATCH, 0),
+                    counts.get(MISSING_IN_A, 0),
+                    counts.get(MISSING_IN_B, 0),
+                    pair_result.error or "",
+                ]
+            )
@@ -0,0 +1,614 @@
+"""Headless command line interface of the CSV comparison tool.
+
+``python -m csv_checker compare A.csv B.csv --key POLICY_NO`` streams the
+differences to stdout (or ``--output``) as CSV or JSON lines while they are
+found; ``--output`` files may also be compressed or written as Parquet.
+Inputs may be gzip/zstd compressed or zipped, and ``-`` reads one of them
+from stdin. ``python -m csv_checker quick A.csv B.csv`` only tells whether
+the files are identical and estimates the share of differences from a
+sample of keys. ``compare --columns``/``--exclude-columns`` compare a subset
+of the columns and ``compare --keys-only`` reports only the missing rows,
+reading nothing but the keys; ``--preview`` limits how missing rows and
+long values are described. ``compare --stats`` prints the time, rows,
+bytes and memory of every comparison stage, and ``--profile``/
+``--trace-memory`` save cProfile and tracemalloc dumps of the run.
+``python -m csv_checker batch`` compares the pairs of a manifest, of two
+directories or of a reference file and several others, reading every file
+once. ``compare -o run.sqlite`` saves the differences to a result store and
+``python -m csv_checker show run.sqlite`` filters, sorts and pages through
+it without comparing the files again. Exit codes follow ``diff``: 0 — no
+differences, 1 — differences found, 2 — invalid arguments or a comparison
+error, 130 — interrupted.
+
+This module never imports Tkinter; running ``python -m csv_checker`` without
+arguments starts the GUI instead.
+"""
+from __future__ import annotations
+
+import argparse
+import itertools
+import os
+import sys
+from typing import List, Optional
+
+from .batch import (
+    DEFAULT_CACHE_LIMIT,
+    compare_batch,
+    pairs_against,
+    pairs_from_directories,
+    pairs_from_manifest,
+    write_batch_summary,
+)
+from .engine import (
+    BACKENDS,
+    DEFAULT_MEMORY_LIMIT,
+    DUPLICATE_POLICIES,
+    _CompareOptions,
+    _iter_raw_differences,
+)
+from .inputs import InputSource
+from .keys import iter_missing_rows
+from .model import MISSING_IN_A, MISSING_IN_B, VALUE_MISMATCH, CsvComparisonError
+from .previews import PREVIEW_FULL, parse_preview_policy
+from .quick import DEFAULT_SAMPLE_SIZE, MISSING_ROWS_COLUMN, MismatchEstimate, quick_check
+from .reports import write_field_report
+from .rules import parse_column_rule
+from .sources import _split_key_fields
+from .stats import ComparisonStats
+from .store import QUERY_FIELDS, ResultStore
+from .writers import REPORT_COMPRESSIONS, REPORT_FORMATS, DifferenceWriter
+
+EXIT_NO_DIFFERENCES = 0
+EXIT_DIFFERENCES = 1
+EXIT_ERROR = 2
+EXIT_INTERRUPTED = 130
+STDIN_ARGUMENT = "-"
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Create the argument parser of the ``csv_checker`` command."""
+
+    parser = argparse.ArgumentParser(
+        prog="python -m csv_checker",
+        description="Сравнение CSV файлов по ключевому столбцу.",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    compare = commands.add_parser(
+        "compare",
+        help="сравнить два файла и вывести различия",
+        description="Сравнить два CSV файла и вывести различия по мере их обнаружения.",
+    )
+    compare.add_argument(
+        "file_a", help="первый CSV файл (.csv, .csv.gz, .csv.zst, .zip или - для stdin)"
+    )
+    compare.add_argument("file_b", help="второй CSV файл")
+    compare.add_argument(
+        "--key",
+        default="POLICY_NO",
+        help="ключевой столбец или несколько через запятую (POLICY_NO)",
+    )
+    compare.add_argument(
+        "--duplicates",
+        choices=DUPLICATE_POLICIES,
+        default="fail",
+        help="обработка повторяющихся ключей (fail)",
+    )
+    compare.add_argument(
+        "--format",
+        choices=REPORT_FORMATS,
+        help="формат различий (по расширению файла -o, иначе csv)",
+    )
+    compare.add_argument(
+        "--compression",
+        choices=REPORT_COMPRESSIONS,
+        help="сжатие файла различий (по расширению файла -o: .gz, .zst)",
+    )
+    compare.add_argument(
+        "--rule",
+        action="append",
+        default=[],
+        metavar="СТОЛБЕЦ=ТИП[:ПАРАМЕТРЫ]",
+        help="правило сравнения столбца: number:abs=0.01,rel=0, date:%%d.%%m.%%Y, "
+        "text:strip,nocase или ignore (можно повторять)",
+    )
+    compare.add_argument(
+        "--infer-types",
+        action="store_true",
+        help="распознавать числовые столбцы и даты по первым строкам файлов",
+    )
+    compare.add_argument(
+        "--columns",
+        metavar="СТОЛБЦЫ",
+        help="сравнивать только эти столбцы (через запятую); остальные не сохраняются",
+    )
+    compare.add_argument(
+        "--exclude-columns",
+        metavar="СТОЛБЦЫ",
+        help="не сравнивать эти столбцы (через запятую)",
+    )
+    compare.add_argument(
+        "--preview",
+        default=PREVIEW_FULL,
+        metavar="ПРАВИЛО",
+        help="описание отсутствующих строк и длина значений: full, off или "
+        "columns=K,chars=N,values=N (full)",
+    )
+    compare.add_argument(
+        "--keys-only",
+        action="store_true",
+        help="найти только отсутствующие строки, читая лишь ключевые столбцы",
+    )
+    compare.add_argument(
+        "-o",
+        "--output",
+        help="файл для различий вместо стандартного вывода (.sqlite — база результатов)",
+    )
+    compare.add_argument(
+        "--max-differences",
+        type=int,
+        metavar="N",
+        help="остановить сравнение после первых N различий",
+    )
+    compare.add_argument("--report", help="сохранить сводный отчёт по полям в CSV")
+    compare.add_argument(
+        "--example-keys",
+        type=int,
+        default=0,
+        metavar="N",
+        help="добавить в сводный отчёт до N примеров ключей для каждого поля",
+    )
+    compare.add_argument(
+        "--memory-limit",
+        type=int,
+        default=DEFAULT_MEMORY_LIMIT,
+        help="бюджет памяти для строк в байтах",
+    )
+    compare.add_argument("--temp-dir", help="каталог для временных файлов сортировки")
+    compare.add_argument("--workers", type=int, default=1, help="число процессов (1)")
+    compare.add_argument("--backend", choices=BACKENDS, default="auto")
+    compare.add_argument(
+        "--incremental",
+        action="store_true",
+        help="использовать индексы хешей строк рядом с файлами",
+    )
+    compare.add_argument("--index-dir", help="каталог для индексов инкрементального режима")
+    compare.add_argument(
+        "--stats",
+        action="store_true",
+        help="вывести в stderr время, ЦП, строки, байты и память по этапам",
+    )
+    compare.add_argument(
+        "--profile",
+        metavar="ФАЙЛ",
+        help="сохранить профиль cProfile сравнения (читается модулем pstats)",
+    )
+    compare.add_argument(
+        "--trace-memory",
+        metavar="ФАЙЛ",
+        help="отслеживать выделения памяти tracemalloc и сохранить снимок",
+    )
+    compare.add_argument(
+        "-q", "--quiet", action="store_true", help="не выводить итоги в stderr"
+    )
+
+    quick = commands.add_parser(
+        "quick",
+        help="быстро проверить, совпадают ли файлы",
+        description="Проверить, совпадают ли файлы побайтно, а если нет — оценить долю "
+        "различий по выборке ключей.",
+    )
+    quick.add_argument("file_a", help="первый CSV файл (.csv, .csv.gz, .csv.zst или .zip)")
+    quick.add_argument("file_b", help="второй CSV файл")
+    quick.add_argument(
+        "--key",
+        default="POLICY_NO",
+        help="ключевой столбец или несколько через запятую (POLICY_NO)",
+    )
+    quick.add_argument(
+        "--duplicates",
+        choices=DUPLICATE_POLICIES,
+        default="fail",
+        help="обработка повторяющихся ключей в выборке (fail)",
+    )
+    quick.add_argument(
+        "--rule",
+        action="append",
+        default=[],
+        metavar="СТОЛБЕЦ=ТИП[:ПАРАМЕТРЫ]",
+        help="правило сравнения столбца, как у compare",
+    )
+    quick.add_argument(
+        "--infer-types",
+        action="store_true",
+        help="распознавать числовые столбцы и даты по первым строкам файлов",
+    )
+    quick.add_argument(
+        "--sample-size",
+        type=int,
+        default=DEFAULT_SAMPLE_SIZE,
+        metavar="N",
+        help=f"число строк выборки из каждого файла ({DEFAULT_SAMPLE_SIZE})",
+    )
+    quick.add_argument(
+        "--confidence",
+        type=float,
+        default=0.95,
+        help="доверительная вероятность интервалов (0.95)",
+    )
+
+    batch = commands.add_parser(
+        "batch",
+        help="сравнить много пар файлов",
+        description="Сравнить пары файлов из манифеста, одноимённые файлы двух каталогов "
+        "или эталонный файл с несколькими другими; каждый файл читается и сортируется "
+        "один раз.",
+    )
+    pairs = batch.add_mutually_exclusive_group(required=True)
+    pairs.add_argument(
+        "--manifest",
+        metavar="ФАЙЛ",
+        help="CSV со столбцами file_a, file_b и необязательным name",
+    )
+    pairs.add_argument(
+        "--dirs",
+        nargs=2,
+        metavar=("КАТАЛОГ_A", "КАТАЛОГ_B"),
+        help="сравнить одноимённые CSV файлы двух каталогов",
+    )
+    pairs.add_argument(
+        "--reference",
+        metavar="ФАЙЛ",
+        help="эталонный файл, который сравнивается с каждым из files",
+    )
+    batch.add_argument("files", nargs="*", help="файлы для сравнения с --reference")
+    batch.add_argument(
+        "--key",
+        default="POLICY_NO",
+        help="ключевой столбец или несколько через запятую (POLICY_NO)",
+    )
+    batch.add_argument(
+        "--duplicates",
+        choices=DUPLICATE_POLICIES,
+        default="fail",
+        help="обработка повторяющихся ключей (fail)",
+    )
+    batch.add_argument(
+        "--rule",
+        action="append",
+        default=[],
+        metavar="СТОЛБЕЦ=ТИП[:ПАРАМЕТРЫ]",
+        help="правило сравнения столбца, как у compare",
+    )
+    batch.add_argument(
+        "--infer-types",
+        action="store_true",
+        help="распознавать числовые столбцы и даты по первым строкам файлов каждой пары",
+    )
+    batch.add_argument(
+        "--columns", metavar="СТОЛБЦЫ", help="сравнивать только эти столбцы (через запятую)"
+    )
+    batch.add_argument(
+        "--exclude-columns", metavar="СТОЛБЦЫ", help="не сравнивать эти столбцы"
+    )
+    batch.add_argument(
+        "--preview",
+        default=PREVIEW_FULL,
+        metavar="ПРАВИЛО",
+        help="описание отсутствующих строк и длина значений, как у compare",
+    )
+    batch.add_argument(
+        "-o",
+        "--output-dir",
+        metavar="КАТАЛОГ",
+        help="записать различия каждой пары в файл <имя пары>.<формат> этого каталога",
+    )
+    batch.add_argument(
+        "--format", choices=REPORT_FORMATS, default="csv", help="формат файлов различий (csv)"
+    )
+    batch.add_argument(
+        "--summary", metavar="ФАЙЛ", help="сохранить сводку по парам в CSV"
+    )
+    batch.add_argument(
+        "--report", metavar="ФАЙЛ", help="сохранить сводный отчёт по полям всех пар в CSV"
+    )
+    batch.add_argument(
+        "--example-keys",
+        type=int,
+        default=0,
+        metavar="N",
+        help="добавить в сводный отчёт до N примеров ключей для каждого поля",
+    )
+    batch.add_argument(
+        "--memory-limit",
+        type=int,
+        default=DEFAULT_MEMORY_LIMIT,
+        help="бюджет памяти для сортировки в байтах",
+    )
+    batch.add_argument(
+        "--cache-limit",
+        type=int,
+        default=DEFAULT_CACHE_LIMIT,
+        help="бюджет памяти для отсортированных файлов в байтах",
+    )
+    batch.add_argument("--temp-dir", help="каталог для временных файлов сортировки")
+    batch.add_argument("--workers", type=int, default=1, help="число процессов (1)")
+    batch.add_argument(
+        "-q", "--quiet", action="store_true", help="не выводить итоги по парам в stderr"
+    )
+
+    show = commands.add_parser(
+        "show",
+        help="показать различия из сохранённой базы результатов",
+        description="Отобрать, отсортировать и вывести различия из базы результатов, "
+        "сохранённой командой compare -o ФАЙЛ.sqlite, не сравнивая файлы заново.",
+    )
+    show.add_argument("store", help="база результатов (.sqlite, .sqlite3 или .db)")
+    show.add_argument("--column", metavar="СТОЛБЕЦ", help="только различия этого столбца")
+    show.add_argument(
+        "--type",
+        choices=(VALUE_MISMATCH, MISSING_IN_A, MISSING_IN_B),
+        help="только различия этого типа",
+    )
+    show.add_argument("--key-prefix", metavar="ПРЕФИКС", help="только ключи с этим началом")
+    show.add_argument(
+        "--sort", choices=QUERY_FIELDS, default="key", help="поле сортировки (key)"
+    )
+    show.add_argument("--desc", action="store_true", help="сортировать по убыванию")
+    show.add_argument("--offset", type=int, default=0, metavar="N", help="пропустить N различий")
+    show.add_argument("--limit", type=int, metavar="N", help="вывести не более N различий")
+    show.add_argument(
+        "-o", "--output", help="файл для различий вместо стандартного вывода"
+    )
+    show.add_argument(
+        "--format",
+        choices=REPORT_FORMATS,
+        help="формат различий (по расширению файла -o, иначе csv)",
+    )
+    show.add_argument(
+        "--compression",
+        choices=REPORT_COMPRESSIONS,
+        help="сжатие файла различий (по расширению файла -o: .gz, .zst)",
+    )
+    show.add_argument(
+        "-q", "--quiet", action="store_true", help="не выводить итоги в stderr"
+    )
+    return parser
+
+
+def _input_argument(value: str) -> InputSource:
+    return sys.stdin.buffer if value == STDIN_ARGUMENT else value
+
+
+def run_compare(args: argparse.Namespace) -> int:
+    """Execute the ``compare`` command and return its exit code."""
+
+    if args.file_a == args.file_b == STDIN_ARGUMENT:
+        raise CsvComparisonError("Стандартный ввод можно указать только для одного файла.")
+    key_fields = _split_key_fields(args.key)
+    if args.keys_only and (args.columns or args.exclude_columns or args.rule):
+        raise CsvComparisonError(
+            "С --keys-only значения не сравниваются: уберите --columns, "
+            "--exclude-columns и --rule."
+        )
+    options = _CompareOptions(
+        key_field=key_fields,
+        duplicates=args.duplicates,
+        rules=dict(map(parse_column_rule, args.rule)),
+        infer_types=args.infer_types,
+        max_differences=args.max_differences,
+        memory_limit=args.memory_limit,
+        temp_dir=args.temp_dir,
+        workers=args.workers,
+        backend=args.backend,
+        incremental=args.incremental,
+        index_dir=args.index_dir,
+        columns=_split_key_fields(args.columns) if args.columns is not None else None,
+        exclude_columns=_split_key_fields(args.exclude_columns or ""),
+        preview=parse_preview_policy(args.preview),
+    )
+    stats = None
+    if args.stats or args.profile or args.trace_memory:
+        stats = ComparisonStats(
+            profile_path=args.profile, memory_snapshot_path=args.trace_memory
+        )
+    file_a, file_b = _input_argument(args.file_a), _input_argument(args.file_b)
+    if args.keys_only:
+        raws = iter_missing_rows(
+            file_a,
+            file_b,
+            key_fields,
+            duplicates=args.duplicates,
+            memory_limit=args.memory_limit,
+            temp_dir=args.temp_dir,
+            max_differences=args.max_differences,
+            stats=stats,
+        )
+    else:
+        raws = iter(_iter_raw_differences(file_a, file_b, options, stats=stats))
+    # Start the engine before creating the output so input errors leave no output.
+    raws = itertools.chain(list(itertools.islice(raws, 1)), raws)
+    with DifferenceWriter(
+        args.output or sys.stdout,
+        args.format,
+        args.compression,
+        key_field=key_fields,
+        summary_path=args.report,
+        example_keys=args.example_keys,
+        sources=(args.file_a, args.file_b),
+    ) as writer:
+        writer.write_all(raws)
+    found = writer.written
+
+    if args.report and not found and not args.quiet:
+        print("Отчёт не сохранён: различия отсутствуют.", file=sys.stderr)
+    if not args.quiet:
+        print(f"Найдено различий: {found}.", file=sys.stderr)
+    if args.stats:
+        print(stats.format_table(), file=sys.stderr)
+    return EXIT_DIFFERENCES if found else EXIT_NO_DIFFERENCES
+
+
+def _percent(share: float) -> str:
+    return f"{share * 100:.2f} %"
+
+
+def _format_estimate(label: str, estimate: MismatchEstimate, exact: bool) -> str:
+    line = f"{label}: {_percent(estimate.rate)} ({estimate.mismatches} из {estimate.sampled})"
+    if not exact:
+        line += f", интервал {_percent(estimate.low)} – {_percent(estimate.high)}"
+    return line
+
+
+def run_quick(args: argparse.Namespace) -> int:
+    """Execute the ``quick`` command and return its exit code."""
+
+    result = quick_check(
+        args.file_a,
+        args.file_b,
+        _split_key_fields(args.key),
+        sample_size=args.sample_size,
+        confidence=args.confidence,
+        duplicates=args.duplicates,
+        rules=dict(map(parse_column_rule, args.rule)),
+        infer_types=args.infer_types,
+    )
+    if result.identical:
+        print("Файлы идентичны.")
+        return EXIT_NO_DIFFERENCES
+
+    if result.exact:
+        print(f"Файлы различаются побайтно; сравнены все ключи ({result.sample_keys}).")
+    else:
+        print(
+            f"Файлы различаются побайтно; в выборке {result.sample_keys} ключей, "
+            f"доверительная вероятность интервалов {_percent(result.confidence)}."
+        )
+    print(_format_estimate("Строки с различиями", result.rows, result.exact))
+    columns = sorted(
+        (item for item in result.columns.items() if item[1].mismatches),
+        key=lambda item: (-item[1].rate, item[0]),
+    )
+    for column, estimate in columns:
+        label = "Отсутствующие строки" if column == MISSING_ROWS_COLUMN else column
+        print(_format_estimate(f"  {label}", estimate, result.exact))
+    return EXIT_DIFFERENCES if result.has_differences else EXIT_NO_DIFFERENCES
+
+
+def run_batch(args: argparse.Namespace) -> int:
+    """Execute the ``batch`` command and return its exit code."""
+
+    if args.files and args.reference is None:
+        raise CsvComparisonError("Файлы для сравнения указываются вместе с --reference.")
+    if args.manifest is not None:
+        pairs = pairs_from_manifest(args.manifest)
+    elif args.dirs is not None:
+        pairs = pairs_from_directories(*args.dirs)
+    else:
+        if not args.files:
+            raise CsvComparisonError("Укажите файлы для сравнения с эталоном.")
+        pairs = pairs_against(args.reference, args.files)
+    if not pairs:
+        raise CsvComparisonError("Нет пар файлов для сравнения.")
+    result = compare_batch(
+        pairs,
+        _split_key_fields(args.key),
+        duplicates=args.duplicates,
+        memory_limit=args.memory_limit,
+        cache_limit=args.cache_limit,
+        temp_dir=args.temp_dir,
+        workers=args.workers,
+        rules=dict(map(parse_column_rule, args.rule)),
+        infer_types=args.infer_types,
+        columns=_split_key_fields(args.columns) if args.columns is not None else None,
+        exclude_columns=_split_key_fields(args.exclude_columns or ""),
+        preview=parse_preview_policy(args.preview),
+        output_dir=args.output_dir,
+        output_format=args.format,
+        example_keys=args.example_keys,
+    )
+    if args.summary:
+        write_batch_summary(result, args.summary)
+    if args.report:
+        if result.summary.total:
+            write_field_report(result.summary, args.report)
+        elif not args.quiet:
+            print("Отчёт не сохранён: различия отсутствуют.", file=sys.stderr)
+    if not args.quiet:
+        for pair_result in result.pairs:
+            if pair_result.error is not None:
+                line = f"ошибка: {pair_result.error}"
+            else:
+                line = f"различий: {pair_result.summary.total}"
+            print(f"{pair_result.pair.name}: {line}", file=sys.stderr)
+        print(
+            f"Сравнено пар: {len(result.pairs)}, с различиями: "
+            f"{sum(1 for pair_result in result.pairs if pair_result.summary.total)}, "
+            f"с ошибками: {len(result.failed)}; прочитано файлов: {result.parsed_inputs}.",
+            file=sys.stderr,
+        )
+    if result.failed:
+        return EXIT_ERROR
+    return EXIT_DIFFERENCES if result.has_differences else EXIT_NO_DIFFERENCES
+
+
+def run_show(args: argparse.Namespace) -> int:
+    """Execute the ``show`` command and return its exit code."""
+
+    with ResultStore(args.store) as store:
+        filters = dict(
+            column=args.column, difference_type=args.type, key_prefix=args.key_prefix
+        )
+        selected = store.select(
+            **filters,
+            order_by=args.sort,
+            descending=args.desc,
+            offset=args.offset,
+            limit=args.limit,
+        )
+        with DifferenceWriter(
+            args.output or sys.stdout,
+            args.format,
+            args.compression,
+            key_field=store.key_fields,
+            sources=(store.file_a, store.file_b),
+        ) as writer:
+            writer.write_all(selected)
+        matched = store.count_matching(**filters)
+    if not args.quiet:
+        print(
+            f"Выведено различий: {writer.written} из {matched} отобранных "
+            f"({len(store)} в базе).",
+            file=sys.stderr,
+        )
+    return EXIT_DIFFERENCES if writer.written else EXIT_NO_DIFFERENCES
+
+
+_COMMANDS = {"compare": run_compare, "quick": run_quick, "batch": run_batch, "show": run_show}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Entry point of ``python -m csv_checker``; returns the exit code."""
+
+    if argv is None:
+        argv = sys.argv[1:]
+    if not argv:
+        from . import run_app
+
+        run_app()
+        return EXIT_NO_DIFFERENCES
+
+    args = build_parser().parse_args(argv)
+    try:
+        return _COMMANDS[args.command](args)
+    except CsvComparisonError as error:
+        print(f"Ошибка: {error}", file=sys.stderr)
+        return EXIT_ERROR
+    except BrokenPipeError:
+        # The reader of stdout went away (e.g. ``| head``); silence the final flush.
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return EXIT_ERROR
+    except OSError as error:
+        print(f"Ошибка ввода-вывода: {error}", file=sys.stderr)
+        return EXIT_ERROR
+    except KeyboardInterrupt:
+        return EXIT_INTERRUPTED
@@ -0,0 +1,246 @@
+"""NumPy columnar comparison backend.
+
+Each input is loaded into a rows x columns object array, so every cell is
+stored once as a Python string plus one pointer whatever the length of the
+other cells. Keys are replaced by their integer ranks in the sorted union of
+both files; sorting, duplicate handling and the alignment of the two files
+then work on integer arrays, and the aligned rows are compared column by
+column with array operations.
+
+Imported only when the NumPy backend is selected, so NumPy is never loaded by
+``import csv_checker`` itself.
+"""
+from __future__ import annotations
+
+from typing import Iterator, List, Mapping, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - NumPy is an optional dependency
+    np = None
+
+from .merge import _ComparisonLayout
+from .model import VALUE_MISMATCH, DuplicateKeysError, RawDifference, _Progress, _truncate
+from .previews import PreviewPolicy
+from .rules import ColumnRule
+from .sources import _CsvSource, _key_getter
+from .stats import READ
+
+
+_COLUMNAR_CHUNK_ROWS = 100_000
+
+
+def _load_table(source: "_CsvSource", progress: _Progress) -> Tuple[List[str], "np.ndarray"]:
+    """Read every record of a source into its keys and a rows x columns object array."""
+
+    progress.add_bytes_reader(source.bytes_read)
+    key_of = _key_getter(source.key_indexes)
+    keys: List[str] = []
+    tables: List["np.ndarray"] = [np.empty((0, source.width), dtype=object)]
+    with progress.stage(READ):
+        for batch in source.batches(_COLUMNAR_CHUNK_ROWS):
+            keys.extend(map(key_of, batch))
+            tables.append(np.array(batch, dtype=object))
+            progress.rows_read += len(batch)
+            progress.tick()
+    progress.count(READ, rows=len(keys))
+    return keys, np.concatenate(tables)
+
+
+def _rank_keys(
+    keys_a: List[str], keys_b: List[str]
+) -> Tuple["np.ndarray", "np.ndarray", "np.ndarray"]:
+    """Return the sorted distinct keys of both files and the rank of every key."""
+
+    unique_keys = sorted(set(keys_a).union(keys_b))
+    ranks = {key: rank for rank, key in enumerate(unique_keys)}
+    codes_a = np.fromiter(map(ranks.__getitem__, keys_a), dtype=np.intp, count=len(keys_a))
+    codes_b = np.fromiter(map(ranks.__getitem__, keys_b), dtype=np.intp, count=len(keys_b))
+    return np.array(unique_keys, dtype=object), codes_a, codes_b
+
+
+def _sorted_duplicates(sorted_codes: "np.ndarray") -> "np.ndarray":
+    """Return the distinct codes that occur more than once in a sorted array."""
+
+    return np.unique(sorted_codes[1:][sorted_codes[1:] == sorted_codes[:-1]])
+
+
+def _group_starts(sorted_codes: "np.ndarray") -> "np.ndarray":
+    """Return a mask of the first occurrence of every code in a sorted array."""
+
+    starts = np.ones(len(sorted_codes), dtype=bool)
+    starts[1:] = sorted_codes[1:] != sorted_codes[:-1]
+    return starts
+
+
+def _select_occurrences(
+    sorted_codes: "np.ndarray", order: "np.ndarray", policy: str
+) -> Tuple["np.ndarray", "np.ndarray"]:
+    """Keep the first or the last occurrence of every code of a stable sort."""
+
+    starts = _group_starts(sorted_codes)
+    if policy == "first":
+        keep = starts
+    else:
+        keep = np.ones_like(starts)
+        keep[:-1] = starts[1:]
+    return sorted_codes[keep], order[keep]
+
+
+def _occurrence_codes(sorted_codes: "np.ndarray", width: int) -> "np.ndarray":
+    """Combine every code of a stable sort with its occurrence number.
+
+    Aligning such codes pairs the n-th occurrences of a key in both files;
+    ``width`` exceeds every occurrence number, so the array stays sorted and
+    ``code // width`` recovers the key.
+    """
+
+    positions = np.arange(len(sorted_codes))
+    group_start = np.maximum.accumulate(np.where(_group_starts(sorted_codes), positions, 0))
+    return sorted_codes * width + (positions - group_start)
+
+
+def _align_rows(
+    sorted_codes: "np.ndarray", order: "np.ndarray", all_codes: "np.ndarray"
+) -> "np.ndarray":
+    """Map every code of ``all_codes`` to its row number, or ``-1`` if absent."""
+
+    if not len(sorted_codes):
+        return np.full(len(all_codes), -1, dtype=np.intp)
+    positions = np.searchsorted(sorted_codes, all_codes)
+    clipped = np.minimum(positions, len(sorted_codes) - 1)
+    found = (positions < len(sorted_codes)) & (sorted_codes[clipped] == all_codes)
+    return np.where(found, order[clipped], -1)
+
+
+def _iter_columnar_differences(
+    source_a: "_CsvSource",
+    source_b: "_CsvSource",
+    key_fields: Sequence[str],
+    duplicates: str,
+    rules: Mapping[str, ColumnRule],
+    preview: PreviewPolicy,
+    progress: _Progress,
+) -> Iterator[RawDifference]:
+    """Compare two sources with NumPy key alignment and column masks.
+
+    Keys are replaced by their ranks, which are sorted and aligned, and every
+    compared column of the matched rows is checked with one array
+    comparison, so rules and differences only see the cells whose strings
+    differ. Duplicate policies are applied to the stably sorted ranks: the
+    ``"multiset"`` policy aligns ranks combined with their occurrence number.
+    """
+
+    keys_a, table_a = _load_table(source_a, progress)
+    keys_b, table_b = _load_table(source_b, progress)
+    unique_keys, codes_a, codes_b = _rank_keys(keys_a, keys_b)
+    del keys_a, keys_b
+
+    order_a = np.argsort(codes_a, kind="stable")
+    order_b = np.argsort(codes_b, kind="stable")
+    sorted_a = codes_a[order_a]
+    sorted_b = codes_b[order_b]
+    duplicates_a = _sorted_duplicates(sorted_a)
+    duplicates_b = _sorted_duplicates(sorted_b)
+    width = 1
+    if len(duplicates_a) or len(duplicates_b):
+        if duplicates == "fail":
+            raise DuplicateKeysError(
+                source_a.file_path,
+                unique_keys[duplicates_a].tolist(),
+                source_b.file_path,
+                unique_keys[duplicates_b].tolist(),
+            )
+        if duplicates == "multiset":
+            width = max(len(sorted_a), len(sorted_b))
+            sorted_a = _occurrence_codes(sorted_a, width)
+            sorted_b = _occurrence_codes(sorted_b, width)
+        else:
+            sorted_a, order_a = _select_occurrences(sorted_a, order_a, duplicates)
+            sorted_b, order_b = _select_occurrences(sorted_b, order_b, duplicates)
+
+    all_codes = np.union1d(sorted_a, sorted_b)
+    positions_a = _align_rows(sorted_a, order_a, all_codes)
+    positions_b = _align_rows(sorted_b, order_b, all_codes)
+    if width > 1:
+        all_codes = all_codes // width
+
+    layout = _ComparisonLayout(
+        source_a.positions,
+        source_b.positions,
+        key_fields,
+        source_a.file_path,
+        source_b.file_path,
+        rules,
+        preview,
+    )
+    compared = layout.compared
+
+    matched = np.nonzero((positions_a >= 0) & (positions_b >= 0))[0]
+    rows_a = positions_a[matched]
+    rows_b = positions_b[matched]
+    entry_keys: List["np.ndarray"] = []
+    entry_columns: List["np.ndarray"] = []
+    values_a: List[str] = []
+    values_b: List[str] = []
+    empty = np.full(len(matched), "", dtype=object)
+    for order, ((column, index_a, index_b), equivalent) in enumerate(
+        zip(compared, layout.equivalences)
+    ):
+        cells_a = table_a[rows_a, index_a] if index_a is not None else empty
+        cells_b = table_b[rows_b, index_b] if index_b is not None else empty
+        mask = cells_a != cells_b
+        if equivalent is not None and mask.any():
+            # Rules only need to look at the cells whose strings differ.
+            rows = np.nonzero(mask)[0]
+            mask[rows] = [
+                not equivalent(value_a, value_b)
+                for value_a, value_b in zip(cells_a[rows].tolist(), cells_b[rows].tolist())
+            ]
+        count = int(np.count_nonzero(mask))
+        if not count:
+            continue
+        entry_keys.append(matched[mask])
+        entry_columns.append(np.full(count, order))
+        values_a.extend(cells_a[mask].tolist())
+        values_b.extend(cells_b[mask].tolist())
+
+    only_a = np.nonzero(positions_b < 0)[0]
+    only_b = np.nonzero(positions_a < 0)[0]
+    missing_in_b = [
+        layout.missing_in_b(key, values)
+        for key, values in zip(
+            unique_keys[all_codes[only_a]].tolist(), table_a[positions_a[only_a]].tolist()
+        )
+    ]
+    missing_in_a = [
+        layout.missing_in_a(key, values)
+        for key, values in zip(
+            unique_keys[all_codes[only_b]].tolist(), table_b[positions_b[only_b]].tolist()
+        )
+    ]
+    entry_keys.extend((only_a, only_b))
+    entry_columns.append(np.full(len(only_a) + len(only_b), -1))
+
+    key_positions = np.concatenate(entry_keys)
+    column_orders = np.concatenate(entry_columns)
+    keys = unique_keys[all_codes[key_positions]].tolist()
+    missing = missing_in_b + missing_in_a
+    mismatch_count = len(values_a)
+    if layout.value_chars:
+        limit = layout.value_chars
+        values_a = [_truncate(value, limit) for value in values_a]
+        values_b = [_truncate(value, limit) for value in values_b]
+    progress.rows_compared = progress.rows_read
+    progress.tick()
+    for entry in np.lexsort((column_orders, key_positions)).tolist():
+        if entry < mismatch_count:
+            yield (
+                keys[entry],
+                compared[int(column_orders[entry])][0],
+                values_a[entry],
+                values_b[entry],
+                VALUE_MISMATCH,
+            )
+        else:
+            yield missing[entry - mismatch_count]
@@ -0,0 +1,503 @@
+"""Engine selection and the public comparison entry points.
+
+The streaming engine (``"python"``) sorts each file by key with an external
+merge sort and merge-joins them (:mod:`csv_checker.merge`); ``"numpy"``
+(:mod:`csv_checker.columnar`) loads both files into memory and ``"mmap"``
+(:mod:`csv_checker.mapped`) keeps only a key index of the mapped files.
+More than one worker compares key-hash partitions in a process pool
+(:mod:`csv_checker.parallel`) and ``incremental`` reuses per-row hash indexes
+(:mod:`csv_checker.incremental`). ``"auto"`` runs a single worker on files on
+disk with ``"numpy"`` when NumPy is installed and the loaded files are
+expected to fit into the memory limit, else with ``"mmap"`` when the
+estimated key indexes fit into it, and with ``"python"`` otherwise;
+compressed files and streams always go to the streaming engines.
+
+Duplicate keys are found while the sorted rows or key indexes are read:
+``"fail"`` raises :class:`DuplicateKeysError` once the files are scanned,
+``"first"`` and ``"last"`` keep one row per key and ``"multiset"`` pairs the
+occurrences of a key in file order. ``max_differences`` closes the engine
+early, so with ``"fail"`` duplicates beyond that point go unnoticed.
+"""
+from __future__ import annotations
+
+import itertools
+import os
+import tempfile
+import threading
+from contextlib import ExitStack, closing
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Dict, Iterator, Mapping, Optional, Sequence, Union
+
+from .model import (
+    CsvComparisonError,
+    Difference,
+    DifferenceSet,
+    FieldSummary,
+    ProgressCallback,
+    RawDifference,
+    _Progress,
+    _to_difference,
+)
+
+if TYPE_CHECKING:
+    from .inputs import InputSource
+    from .previews import PreviewPolicy
+    from .rules import ColumnRule
+    from .sources import KeyFields
+    from .stats import ComparisonStats
+
+
+DEFAULT_MEMORY_LIMIT = 256 * 1024 * 1024
+"""Default budget in bytes for rows buffered in memory by the comparison engine."""
+
+BACKENDS = ("auto", "python", "numpy", "mmap")
+
+# Loaded cells are Python strings of about 50 bytes plus their text, plus a
+# pointer in the row table; short CSV cells take about 16 times their size.
+_COLUMNAR_MEMORY_FACTOR = 16
+
+DUPLICATE_POLICIES = ("fail", "first", "last", "multiset")
+
+
+def _select_backend(
+    backend: str,
+    file_path_a: InputSource,
+    file_path_b: InputSource,
+    memory_limit: int,
+    workers: int,
+    progress: Optional[_Progress] = None,
+) -> str:
+    """Resolve ``backend`` to the engine that should run the comparison.
+
+    Sampling the inputs for the ``"auto"`` choice is counted in ``progress``
+    (as the ``index`` stage of its stats).
+    Compressed files and streams are compared by the streaming engines only.
+    """
+
+    from .inputs import _input_size, _plain_path
+
+    if backend not in BACKENDS:
+        raise CsvComparisonError(
+            f"Неизвестный режим сравнения '{backend}'. Доступны: {', '.join(BACKENDS)}."
+        )
+    if backend in ("numpy", "mmap") and workers > 1:
+        raise CsvComparisonError(f"Режим {backend} не поддерживает несколько процессов.")
+    if backend == "numpy" and not _numpy_available():
+        raise CsvComparisonError("Для режима numpy требуется установить пакет NumPy.")
+    plain = _plain_path(file_path_a) is not None and _plain_path(file_path_b) is not None
+    if not plain and (backend == "mmap" or workers > 1):
+        raise CsvComparisonError(
+            "Режим mmap и параллельный режим работают только с несжатыми файлами на диске."
+        )
+    if backend != "auto":
+        return backend
+    if workers > 1 or not plain:
+        return "python"
+    input_size = _input_size(file_path_a) + _input_size(file_path_b)
+    if input_size * _COLUMNAR_MEMORY_FACTOR <= memory_limit and _numpy_available():
+        return "numpy"
+
+    from .mapped import _SAMPLE_SIZE, _estimated_index_size
+    from .stats import INDEX
+
+    index_size = _estimated_index_size(file_path_a) + _estimated_index_size(file_path_b)
+    if progress is not None:
+        sampled = sum(
+            min(os.path.getsize(path), _SAMPLE_SIZE)
+            for path in (file_path_a, file_path_b)
+            if os.path.isfile(path)
+        )
+        progress.bytes_done += sampled
+        progress.count(INDEX, bytes_read=sampled)
+    return "mmap" if index_size <= memory_limit else "python"
+
+
+def _numpy_available() -> bool:
+    """Import the NumPy backend on first use and report whether it can run."""
+
+    from . import columnar
+
+    return columnar.np is not None
+
+
+@dataclass(frozen=True)
+class _CompareOptions:
+    """Keyword options of :func:`iter_differences` passed to the engines."""
+
+    key_field: KeyFields = "POLICY_NO"
+    duplicates: str = "fail"
+    memory_limit: int = DEFAULT_MEMORY_LIMIT
+    temp_dir: Optional[str] = None
+    workers: int = 1
+    backend: str = "auto"
+    incremental: bool = False
+    index_dir: Optional[str] = None
+    rules: Optional[Mapping[str, Union[ColumnRule, str]]] = None
+    infer_types: bool = False
+    max_differences: Optional[int] = None
+    columns: Optional[Sequence[str]] = None
+    exclude_columns: Optional[Sequence[str]] = None
+    preview: Union[PreviewPolicy, str, None] = None
+
+
+def _resolve_rules(
+    file_path_a: InputSource,
+    file_path_b: InputSource,
+    options: _CompareOptions,
+    progress: _Progress,
+) -> Dict[str, ColumnRule]:
+    """Combine explicit column rules with the types inferred from samples.
+
+    A rule may be given as a :class:`ColumnRule` or as its text form (e.g.
+    ``"number:abs=0.01"``, see :func:`parse_column_rule`); explicit rules win
+    over inferred ones.
+    """
+
+    from .rules import _infer_rules, parse_column_rule
+    from .stats import INFER_TYPES
+
+    rules: Dict[str, ColumnRule] = {}
+    for column, rule in (options.rules or {}).items():
+        if isinstance(rule, str):
+            column, rule = parse_column_rule(f"{column}={rule}")
+        rules[column] = rule
+    if not options.infer_types:
+        return rules
+    with progress.stage(INFER_TYPES):
+        inferred, sampled = _infer_rules(file_path_a, file_path_b)
+    progress.bytes_done += sampled
+    progress.count(INFER_TYPES, bytes_read=sampled)
+    explicit = {column.casefold() for column in rules}
+    inferred = {
+        column: rule for column, rule in inferred.items() if column.casefold() not in explicit
+    }
+    return {**inferred, **rules}
+
+
+def _run_engine(
+    file_path_a: InputSource,
+    file_path_b: InputSource,
+    options: _CompareOptions,
+    progress: _Progress,
+) -> Iterator[RawDifference]:
+    """Select and run a comparison engine; see :func:`iter_differences`."""
+
+    from .inputs import _plain_path
+    from .merge import _join_sorted_rows, _sorted_rows
+    from .previews import _preview_policy
+    from .sources import _column_selection, _CsvSource, _key_fields
+
+    key_fields = _key_fields(options.key_field)
+    selection = _column_selection(options.columns, options.exclude_columns)
+    rules = _resolve_rules(file_path_a, file_path_b, options, progress)
+    preview = _preview_policy(options.preview)
+    duplicates = options.duplicates
+    if duplicates not in DUPLICATE_POLICIES:
+        raise CsvComparisonError(
+            f"Неизвестная политика дубликатов '{duplicates}'. "
+            f"Доступны: {', '.join(DUPLICATE_POLICIES)}."
+        )
+    if options.memory_limit <= 0:
+        raise CsvComparisonError("Лимит памяти должен быть положительным числом.")
+    if options.workers < 1:
+        raise CsvComparisonError("Число процессов должно быть не меньше одного.")
+    if options.incremental:
+        if options.workers > 1 or options.backend in ("numpy", "mmap"):
+            raise CsvComparisonError(
+                "Инкрементальное сравнение не поддерживает параллельный режим "
+                "и режимы numpy и mmap."
+            )
+        if _plain_path(file_path_a) is None or _plain_path(file_path_b) is None:
+            raise CsvComparisonError(
+                "Инкрементальное сравнение работает только с несжатыми файлами на диске."
+            )
+        from .incremental import _iter_incremental_differences
+
+        yield from progress.summarized(
+            _iter_incremental_differences(
+                file_path_a,
+                file_path_b,
+                key_fields,
+                duplicates,
+                options.index_dir,
+                rules,
+                preview,
+                progress,
+                selection,
+            )
+        )
+        return
+
+    backend = _select_backend(
+        options.backend,
+        file_path_a,
+        file_path_b,
+        options.memory_limit,
+        options.workers,
+        progress,
+    )
+    if backend == "mmap":
+        from .mapped import _iter_mapped_differences
+
+        yield from progress.summarized(
+            _iter_mapped_differences(
+                file_path_a,
+                file_path_b,
+                key_fields,
+                duplicates,
+                rules,
+                preview,
+                progress,
+                selection,
+            )
+        )
+        return
+
+    with ExitStack() as stack:
+        source_a = stack.enter_context(_CsvSource(file_path_a, key_fields))
+        source_b = stack.enter_context(_CsvSource(file_path_b, key_fields))
+        work_dir = stack.enter_context(
+            tempfile.TemporaryDirectory(prefix="csv_checker_", dir=options.temp_dir)
+        )
+        if selection is not None:
+            # Project the rows while they are parsed, before they are buffered.
+            positions_a, positions_b = selection.select(
+                source_a.positions, source_b.positions, key_fields
+            )
+            source_a.project(positions_a)
+            source_b.project(positions_b)
+
+        if backend == "numpy":
+            from .columnar import _iter_columnar_differences
+
+            yield from progress.summarized(
+                _iter_columnar_differences(
+                    source_a, source_b, key_fields, duplicates, rules, preview, progress
+                )
+            )
+            return
+        if options.workers > 1:
+            from .parallel import _iter_parallel_differences
+
+            yield from progress.summarized(
+                _iter_parallel_differences(
+                    source_a,
+                    source_b,
+                    key_fields,
+                    duplicates,
+                    rules,
+                    preview,
+                    options.workers,
+                    options.memory_limit,
+                    work_dir,
+                    progress,
+                )
+            )
+            return
+
+        progress.add_bytes_reader(source_a.bytes_read)
+        progress.add_bytes_reader(source_b.bytes_read)
+        half_limit = max(options.memory_limit // 2, 1)
+        sorted_a = stack.enter_context(
+            closing(_sorted_rows(progress.reading(source_a), half_limit, work_dir))
+        )
+        sorted_b = stack.enter_context(
+            closing(_sorted_rows(progress.reading(source_b), half_limit, work_dir))
+        )
+        yield from progress.summarized(
+            _join_sorted_rows(
+                progress.comparing(sorted_a),
+                progress.comparing(sorted_b),
+                source_a.positions,
+                source_b.positions,
+                key_fields,
+                source_a.file_path,
+                source_b.file_path,
+                duplicates,
+                rules,
+                progress,
+                preview,
+            )
+        )
+
+
+def _iter_raw_differences(
+    file_path_a: InputSource,
+    file_path_b: InputSource,
+    options: _CompareOptions,
+    progress_callback: Optional[ProgressCallback] = None,
+    cancel_event: Optional[threading.Event] = None,
+    summary: Optional[FieldSummary] = None,
+    stats: Optional[ComparisonStats] = None,
+) -> Iterator[RawDifference]:
+    """Run a comparison with progress reporting and cancellation support.
+
+    ``summary`` is updated with every produced difference and ``stats`` are
+    measured from the first requested difference until the run ends, fails
+    or is closed. With ``max_differences`` the engine is closed, releasing
+    its files, once that many differences have been produced.
+    """
+
+    from .inputs import _input_size, _is_path
+
+    limit = options.max_differences
+    if limit is not None and limit < 0:
+        raise CsvComparisonError("Число различий не может быть отрицательным.")
+    if _is_path(file_path_a):
+        file_path_a = os.fspath(file_path_a)
+    if _is_path(file_path_b):
+        file_path_b = os.fspath(file_path_b)
+    bytes_total = _input_size(file_path_a) + _input_size(file_path_b)
+    progress = _Progress(progress_callback, cancel_event, bytes_total, summary, stats)
+    progress.start_stats()
+    try:
+        progress.tick()
+        engine = _run_engine(file_path_a, file_path_b, options, progress)
+        with closing(engine):
+            yield from itertools.islice(progress.differences(engine), limit)
+        progress.finish()
+    finally:
+        progress.finish_stats()
+
+
+def iter_differences(
+    file_path_a: InputSource,
+    file_path_b: InputSource,
+    key_field: KeyFields = "POLICY_NO",
+    *,
+    duplicates: str = "fail",
+    memory_limit: int = DEFAULT_MEMORY_LIMIT,
+    temp_dir: Optional[str] = None,
+    workers: int = 1,
+    backend: str = "auto",
+    incremental: bool = False,
+    index_dir: Optional[str] = None,
+    rules: Optional[Mapping[str, Union[ColumnRule, str]]] = None,
+    infer_types: bool = False,
+    columns: Optional[Sequence[str]] = None,
+    exclude_columns: Optional[Sequence[str]] = None,
+    preview: Union[PreviewPolicy, str, None] = None,
+    max_differences: Optional[int] = None,
+    summary: Optional[FieldSummary] = None,
+    stats: Optional[ComparisonStats] = None,
+    progress: Optional[ProgressCallback] = None,
+    cancel_event: Optional[threading.Event] = None,
+) -> Iterator[Difference]:
+    """Lazily compare two CSV files and yield differences ordered by key.
+
+    ``key_field`` is a column name or a sequence of names forming a composite
+    key. Inputs are paths (also of compressed or zipped files), binary
+    streams or iterables of ``bytes`` chunks (see :mod:`csv_checker.inputs`).
+
+    ``duplicates`` is one of :data:`DUPLICATE_POLICIES`; ``memory_limit``
+    bounds the rows buffered for sorting (the rest is spilled to
+    ``temp_dir``); ``workers``, ``backend`` and ``incremental`` (with sidecar
+    indexes in ``index_dir`` or next to the files) choose the engine, see
+    :mod:`csv_checker.engine`. ``rules`` and ``infer_types`` relax how
+    columns compare (see :class:`ColumnRule`), ``columns`` and
+    ``exclude_columns`` select the compared columns and ``preview`` sets how
+    missing rows and long values are reported (see :class:`PreviewPolicy`).
+
+    ``max_differences`` stops the comparison after that many differences.
+    ``summary`` and ``stats`` are filled in during the run, ``progress`` is
+    called from the comparing thread with :class:`ComparisonProgress`
+    snapshots, and setting ``cancel_event`` stops the engine with
+    :class:`ComparisonCancelled`.
+    """
+
+    options = _CompareOptions(
+        key_field=key_field,
+        duplicates=duplicates,
+        memory_limit=memory_limit,
+        temp_dir=temp_dir,
+        workers=workers,
+        backend=backend,
+        incremental=incremental,
+        index_dir=index_dir,
+        rules=rules,
+        infer_types=infer_types,
+        max_differences=max_differences,
+        columns=columns,
+        exclude_columns=exclude_columns,
+        preview=preview,
+    )
+    from .sources import _key_fields
+    from .stats import PREVIEW
+
+    composite = len(_key_fields(key_field)) > 1
+    differences = (
+        _to_difference(raw, composite)
+        for raw in _iter_raw_differences(
+            file_path_a, file_path_b, options, progress, cancel_event, summary, stats
+        )
+    )
+    yield from stats.timed(PREVIEW, differences) if stats is not None else differences
+
+
+def compare_csv_files(
+    file_path_a: InputSource,
+    file_path_b: InputSource,
+    key_field: KeyFields = "POLICY_NO",
+    *,
+    duplicates: str = "fail",
+    memory_limit: int = DEFAULT_MEMORY_LIMIT,
+    temp_dir: Optional[str] = None,
+    workers: int = 1,
+    backend: str = "auto",
+    incremental: bool = False,
+    index_dir: Optional[str] = None,
+    rules: Optional[Mapping[str, Union[ColumnRule, str]]] = None,
+    infer_types: bool = False,
+    columns: Optional[Sequence[str]] = None,
+    exclude_columns: Optional[Sequence[str]] = None,
+    preview: Union[PreviewPolicy, str, None] = None,
+    max_differences: Optional[int] = None,
+    summary: Optional[FieldSummary] = None,
+    stats: Optional[ComparisonStats] = None,
+    progress: Optional[ProgressCallback] = None,
+    cancel_event: Optional[threading.Event] = None,
+) -> DifferenceSet:
+    """Compare two CSV files and return the differences ordered by key.
+
+    The result is a compact :class:`DifferenceSet` whose
+    :attr:`~DifferenceSet.summary` is gathered during the comparison (with the
+    ``example_keys`` setting of ``summary``, into which it is also merged);
+    see :func:`iter_differences` for the meaning of the keyword arguments.
+    The result itself is not counted against the memory budget; storing the
+    differences into it is the ``output`` stage of ``stats``.
+    """
+    options = _CompareOptions(
+        key_field=key_field,
+        duplicates=duplicates,
+        memory_limit=memory_limit,
+        temp_dir=temp_dir,
+        workers=workers,
+        backend=backend,
+        incremental=incremental,
+        index_dir=index_dir,
+        rules=rules,
+        infer_types=infer_types,
+        max_differences=max_differences,
+        columns=columns,
+        exclude_columns=exclude_columns,
+        preview=preview,
+    )
+    from .sources import _key_fields
+
+    run_summary = FieldSummary(summary.example_keys if summary is not None else 0)
+    differences = DifferenceSet(composite_keys=len(_key_fields(key_field)) > 1)
+    differences.extend_raw(
+        _iter_raw_differences(
+            file_path_a,
+            file_path_b,
+            options,
+            progress,
+            cancel_event,
+            run_summary,
+            stats,
+        )
+    )
+    differences.summary = run_summary
+    if summary is not None:
+        summary.merge(run_summary)
+    return differences
@@ -0,0 +1,789 @@
+"""Tkinter GUI of the CSV comparison tool.
+
+Imported lazily by :func:`csv_checker.run_app` so that the comparison core and
+the command line interface never load Tkinter. Every comparison is streamed
+into a result store in a temporary directory, so the table filters, sorts and
+pages through the differences in SQLite instead of holding them in memory; a
+saved store can be reopened without comparing the files again.
+"""
+from __future__ import annotations
+
+import os
+import queue
+import shutil
+import tempfile
+import threading
+from collections import Counter
+from typing import List, Optional, Sequence, Tuple
+
+import tkinter as tk
+from tkinter import filedialog, messagebox, ttk
+
+from .engine import DUPLICATE_POLICIES, iter_differences
+from .model import (
+    MISSING_IN_A,
+    MISSING_IN_B,
+    VALUE_MISMATCH,
+    ComparisonCancelled,
+    ComparisonProgress,
+    CsvComparisonError,
+    Difference,
+    DifferenceSet,
+    _truncate,
+)
+from .previews import PREVIEW_FULL, PREVIEW_OFF, PreviewPolicy, parse_preview_policy
+from .reports import write_field_report
+from .results_view import _TREE_FIELDS, _ResultsWindow
+from .sources import _split_key_fields
+from .stats import ComparisonStats
+from .store import STORE_SUFFIXES, ResultStore
+from .writers import DifferenceWriter, write_differences
+
+_TREE_HEADING_HEIGHT = 25
+# Longer cells are cut in the table only; saved differences keep them whole.
+_TREE_VALUE_CHARS = 500
+_PREVIEW_CHOICES = (PREVIEW_FULL, "columns=20", "chars=500,values=200", PREVIEW_OFF)
+_ALL_VALUES = "Все"
+_DIFFERENCE_LABELS = {
+    VALUE_MISMATCH: "Несовпадение значений",
+    MISSING_IN_A: "Нет строки в файле 1",
+    MISSING_IN_B: "Нет строки в файле 2",
+}
+_STORE_FILETYPES = ("База результатов", " ".join(f"*{suffix}" for suffix in STORE_SUFFIXES))
+
+
+class CsvComparatorApp(tk.Tk):
+    """Tkinter based GUI application for comparing CSV files."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.title("Сравнение CSV")
+        self.geometry("1000x600")
+        self.minsize(700, 500)
+
+        self.file_path_a = tk.StringVar()
+        self.file_path_b = tk.StringVar()
+        self.key_field = tk.StringVar(value="POLICY_NO")
+        self.duplicate_policy = tk.StringVar(value="fail")
+        self.infer_types = tk.BooleanVar(value=False)
+        self.show_stats = tk.BooleanVar(value=False)
+        self.preview = tk.StringVar(value=PREVIEW_FULL)
+        self.last_stats: Optional[ComparisonStats] = None
+        self.differences: Sequence[Difference] = DifferenceSet()
+        self.last_file_name_a = ""
+        self.last_file_name_b = ""
+        self.search_key = tk.StringVar()
+        self.filter_column = tk.StringVar(value=_ALL_VALUES)
+        self.filter_type = tk.StringVar(value=_ALL_VALUES)
+        self.filter_key_prefix = tk.StringVar()
+        self._store_dir = tempfile.mkdtemp(prefix="csv-checker-")
+        self._store_runs = 0
+        self._window = _ResultsWindow(self.differences)
+        self._selected_index: Optional[int] = None
+        self._worker: Optional[threading.Thread] = None
+        self._worker_messages: "queue.Queue[Tuple[str, object]]" = queue.Queue()
+        self._cancel_event = threading.Event()
+        self._worker_files = ("", "")
+        self._worker_key_fields: List[str] = []
+        self._worker_stats: Optional[ComparisonStats] = None
+        self.last_key_fields: List[str] = ["POLICY_NO"]
+
+        self._build_ui()
+
+    def _build_ui(self) -> None:
+        """Construct the widgets for the application."""
+        main_frame = ttk.Frame(self, padding=10)
+        main_frame.pack(fill=tk.BOTH, expand=True)
+
+        file_frame = ttk.Frame(main_frame)
+        file_frame.pack(fill=tk.X, pady=(0, 10))
+
+        self._add_file_selector(file_frame, "Файл 1", self.file_path_a, 0)
+        self._add_file_selector(file_frame, "Файл 2", self.file_path_b, 1)
+
+        key_frame = ttk.Frame(main_frame)
+        key_frame.pack(fill=tk.X, pady=(0, 10))
+
+        ttk.Label(key_frame, text="Ключевые столбцы (через запятую):").pack(side=tk.LEFT)
+        ttk.Entry(key_frame, textvariable=self.key_field, width=30).pack(
+            side=tk.LEFT, padx=(5, 0)
+        )
+        ttk.Label(key_frame, text="Дубликаты:").pack(side=tk.LEFT, padx=(10, 0))
+        ttk.Combobox(
+            key_frame,
+            textvariable=self.duplicate_policy,
+            values=DUPLICATE_POLICIES,
+            state="readonly",
+            width=9,
+        ).pack(side=tk.LEFT, padx=(5, 0))
+        ttk.Checkbutton(
+            key_frame, text="Числа и даты по значению", variable=self.infer_types
+        ).pack(side=tk.LEFT, padx=(10, 0))
+        ttk.Checkbutton(
+            key_frame, text="Время этапов", variable=self.show_stats
+        ).pack(side=tk.LEFT, padx=(10, 0))
+        ttk.Label(key_frame, text="Пропуски:").pack(side=tk.LEFT, padx=(10, 0))
+        ttk.Combobox(
+            key_frame, textvariable=self.preview, values=_PREVIEW_CHOICES, width=18
+        ).pack(side=tk.LEFT, padx=(5, 0))
+
+        self.report_button = ttk.Button(
+            key_frame,
+            text="Сохранить отчёт",
+            command=self.export_report,
+            state=tk.DISABLED,
+        )
+        self.report_button.pack(side=tk.RIGHT)
+
+        self.export_button = ttk.Button(
+            key_frame,
+            text="Сохранить различия",
+            command=self.export_differences,
+            state=tk.DISABLED,
+        )
+        self.export_button.pack(side=tk.RIGHT, padx=(0, 5))
+
+        ttk.Button(
+            key_frame,
+            text="Открыть результаты…",
+            command=self.open_results,
+        ).pack(side=tk.RIGHT, padx=(0, 5))
+
+        self.cancel_button = ttk.Button(
+            key_frame,
+            text="Отмена",
+            command=self.cancel_comparison,
+            state=tk.DISABLED,
+        )
+        self.cancel_button.pack(side=tk.RIGHT)
+
+        self.compare_button = ttk.Button(
+            key_frame,
+            text="Сравнить",
+            command=self.compare_and_display,
+        )
+        self.compare_button.pack(side=tk.RIGHT, padx=(10, 10))
+
+        search_frame = ttk.Frame(main_frame)
+        search_frame.pack(fill=tk.X, pady=(0, 10))
+
+        ttk.Label(search_frame, text="Перейти к ключу:").pack(side=tk.LEFT)
+        search_entry = ttk.Entry(search_frame, textvariable=self.search_key, width=30)
+        search_entry.pack(side=tk.LEFT, padx=(5, 0))
+        search_entry.bind("<Return>", lambda _event: self._jump_to_key())
+        ttk.Button(
+            search_frame,
+            text="Найти",
+            command=self._jump_to_key,
+        ).pack(side=tk.LEFT, padx=(5, 0))
+
+        ttk.Label(search_frame, text="Поле:").pack(side=tk.LEFT, padx=(15, 0))
+        self.filter_column_box = ttk.Combobox(
+            search_frame,
+            textvariable=self.filter_column,
+            values=(_ALL_VALUES,),
+            state="readonly",
+            width=18,
+        )
+        self.filter_column_box.pack(side=tk.LEFT, padx=(5, 0))
+        ttk.Label(search_frame, text="Тип:").pack(side=tk.LEFT, padx=(10, 0))
+        ttk.Combobox(
+            search_frame,
+            textvariable=self.filter_type,
+            values=(_ALL_VALUES, *_DIFFERENCE_LABELS.values()),
+            state="readonly",
+            width=22,
+        ).pack(side=tk.LEFT, padx=(5, 0))
+        ttk.Label(search_frame, text="Начало ключа:").pack(side=tk.LEFT, padx=(10, 0))
+        prefix_entry = ttk.Entry(search_frame, textvariable=self.filter_key_prefix, width=15)
+        prefix_entry.pack(side=tk.LEFT, padx=(5, 0))
+        prefix_entry.bind("<Return>", lambda _event: self._apply_filters())
+        ttk.Button(
+            search_frame,
+            text="Отобрать",
+            command=self._apply_filters,
+        ).pack(side=tk.LEFT, padx=(5, 0))
+
+        columns = ("POLICY_NO", "column", "difference", "value_a", "value_b")
+        self.tree = ttk.Treeview(
+            main_frame,
+            columns=columns,
+            show="headings",
+        )
+        self.headings = {
+            "POLICY_NO": "POLICY_NO",
+            "column": "Поле",
+            "difference": "Тип различия",
+            "value_a": "Значение файла 1",
+            "value_b": "Значение файла 2",
+        }
+        for column in columns:
+            self.tree.heading(
+                column,
+                text=self.headings[column],
+                command=lambda field=column: self._sort_by(field),
+            )
+            self.tree.column(column, anchor=tk.W, stretch=True)
+
+        self.tree.tag_configure(
+            VALUE_MISMATCH,
+            background="#fdecea",
+            foreground="#c0392b",
+        )
+        self.tree.tag_configure(
+            MISSING_IN_A,
+            background="#e8f6f3",
+            foreground="#0b5345",
+        )
+        self.tree.tag_configure(
+            MISSING_IN_B,
+            background="#ebf5fb",
+            foreground="#1a5276",
+        )
+
+        self.scrollbar = ttk.Scrollbar(
+            main_frame, orient=tk.VERTICAL, command=self._on_scrollbar
+        )
+        self.tree.bind("<Configure>", self._on_tree_resize)
+        self.tree.bind("<MouseWheel>", self._on_mouse_wheel)
+        self.tree.bind("<Button-4>", lambda _event: self._scroll_view(-3))
+        self.tree.bind("<Button-5>", lambda _event: self._scroll_view(3))
+        self.tree.bind("<Up>", lambda _event: self._move_selection(-1))
+        self.tree.bind("<Down>", lambda _event: self._move_selection(1))
+        self.tree.bind("<Prior>", lambda _event: self._move_selection(-self._window.size))
+        self.tree.bind("<Next>", lambda _event: self._move_selection(self._window.size))
+        self.tree.bind("<<TreeviewSelect>>", self._on_tree_select)
+
+        self.tree.pack(fill=tk.BOTH, expand=True, side=tk.LEFT)
+        self.scrollbar.pack(fill=tk.Y, side=tk.RIGHT)
+
+        self.status_label = ttk.Label(main_frame, text="")
+        self.status_label.pack(fill=tk.X, pady=(10, 0))
+
+        self.progress_bar = ttk.Progressbar(
+            main_frame, orient=tk.HORIZONTAL, mode="determinate", maximum=100
+        )
+        self.progress_bar.pack(fill=tk.X, pady=(5, 0))
+
+    def _add_file_selector(
+        self,
+        parent: ttk.Frame,
+        label_text: str,
+        variable: tk.StringVar,
+        row: int,
+    ) -> None:
+        """Add labeled entry with a button to choose a file."""
+        row_frame = ttk.Frame(parent)
+        row_frame.grid(row=row, column=0, sticky=tk.W + tk.E, pady=5)
+        row_frame.columnconfigure(1, weight=1)
+
+        ttk.Label(row_frame, text=label_text, width=12).grid(row=0, column=0, sticky=tk.W)
+        entry = ttk.Entry(row_frame, textvariable=variable)
+        entry.grid(row=0, column=1, sticky=tk.W + tk.E, padx=(5, 5))
+        ttk.Button(
+            row_frame,
+            text="Выбрать...",
+            command=lambda: self._select_file(variable),
+        ).grid(row=0, column=2, sticky=tk.E)
+
+    def _select_file(self, variable: tk.StringVar) -> None:
+        """Open a file dialog and update the variable with the chosen path."""
+        file_path = filedialog.askopenfilename(
+            title="Выбор CSV файла",
+            filetypes=(
+                ("CSV файлы", "*.csv"),
+                ("Сжатые CSV файлы", "*.csv.gz *.csv.zst *.zip"),
+                ("Все файлы", "*.*"),
+            ),
+        )
+        if file_path:
+            variable.set(file_path)
+
+    def compare_and_display(self) -> None:
+        """Run comparison and display results in the treeview."""
+        file_a = self.file_path_a.get().strip()
+        file_b = self.file_path_b.get().strip()
+        key_fields = _split_key_fields(self.key_field.get())
+
+        if not file_a or not file_b:
+            messagebox.showwarning("Внимание", "Укажите пути к обоим файлам.")
+            return
+        if not key_fields:
+            messagebox.showwarning("Внимание", "Укажите ключевой столбец.")
+            return
+
+        if self._worker is not None:
+            return
+        try:
+            preview = parse_preview_policy(self.preview.get())
+        except CsvComparisonError as error:
+            messagebox.showwarning("Внимание", str(error))
+            return
+
+        self._cancel_event = threading.Event()
+        self._worker_messages = queue.Queue()
+        self._worker_files = (file_a, file_b)
+        self._store_runs += 1
+        store_path = os.path.join(self._store_dir, f"run-{self._store_runs}.sqlite")
+        self._worker_key_fields = key_fields
+        self._worker_stats = ComparisonStats() if self.show_stats.get() else None
+        self._worker = threading.Thread(
+            target=self._run_comparison,
+            args=(
+                file_a,
+                file_b,
+                key_fields,
+                self.duplicate_policy.get(),
+                self.infer_types.get(),
+                preview,
+                self._worker_stats,
+                store_path,
+                self._cancel_event,
+                self._worker_messages,
+            ),
+            daemon=True,
+        )
+        self.compare_button.config(state=tk.DISABLED)
+        self.cancel_button.config(state=tk.NORMAL)
+        self.report_button.config(state=tk.DISABLED)
+        self.export_button.config(state=tk.DISABLED)
+        self.progress_bar.config(value=0)
+        self.status_label.config(text="Сравнение...")
+        self._worker.start()
+        self.after(100, self._poll_worker)
+
+    @staticmethod
+    def _run_comparison(
+        file_a: str,
+        file_b: str,
+        key_fields: List[str],
+        duplicates: str,
+        infer_types: bool,
+        preview: PreviewPolicy,
+        stats: Optional[ComparisonStats],
+        store_path: str,
+        cancel_event: threading.Event,
+        messages: "queue.Queue[Tuple[str, object]]",
+    ) -> None:
+        """Compare files on the worker thread into the result store at
+        ``store_path`` and post the outcome to the GUI."""
+        try:
+            differences = iter_differences(
+                file_a,
+                file_b,
+                key_fields,
+                duplicates=duplicates,
+                infer_types=infer_types,
+                preview=preview,
+                stats=stats,
+                progress=lambda state: messages.put(("progress", state)),
+                cancel_event=cancel_event,
+            )
+            with DifferenceWriter(
+                store_path, "sqlite", key_field=key_fields, sources=(file_a, file_b)
+            ) as writer:
+                writer.write_all(differences)
+        except BaseException as error:  # noqa: BLE001 - передаётся в GUI
+            messages.put(("error", error))
+        else:
+            messages.put(("done", store_path))
+
+    def cancel_comparison(self) -> None:
+        """Ask the running comparison to stop."""
+        self._cancel_event.set()
+        self.cancel_button.config(state=tk.DISABLED)
+        self.status_label.config(text="Отмена сравнения...")
+
+    def _poll_worker(self) -> None:
+        """Apply messages posted by the comparison thread."""
+        outcome: Optional[Tuple[str, object]] = None
+        while True:
+            try:
+                kind, payload = self._worker_messages.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "progress":
+                self._show_progress(payload)  # type: ignore[arg-type]
+            else:
+                outcome = (kind, payload)
+
+        if outcome is None:
+            self.after(100, self._poll_worker)
+            return
+
+        file_a, file_b = self._worker_files
+        self._worker = None
+        self.compare_button.config(state=tk.NORMAL)
+        self.cancel_button.config(state=tk.DISABLED)
+        self.progress_bar.config(value=0)
+        kind, payload = outcome
+        if kind == "done":
+            self.progress_bar.config(value=100)
+            self.last_stats = self._worker_stats
+            try:
+                # SQLite connections belong to the thread that opened them.
+                self._show_store(ResultStore(payload))  # type: ignore[arg-type]
+            except CsvComparisonError as error:
+                messagebox.showerror("Ошибка", str(error))
+                return
+            if self.last_stats is not None:
+                status = self.status_label.cget("text")
+                self.status_label.config(text=f"{status} {self.last_stats.summary_line()}.")
+            return
+
+        self._close_store()
+        self.differences = DifferenceSet()
+        self.report_button.config(state=tk.DISABLED)
+        self.export_button.config(state=tk.DISABLED)
+        if isinstance(payload, ComparisonCancelled):
+            self.status_label.config(text=str(payload))
+        elif isinstance(payload, CsvComparisonError):
+            self.status_label.config(text="")
+            messagebox.showerror("Ошибка", str(payload))
+        else:  # pragma: no cover - защитный блок
+            self.status_label.config(text="")
+            messagebox.showerror("Ошибка", f"Непредвиденная ошибка: {payload}")
+
+    def _show_store(self, store: ResultStore) -> None:
+        """Replace the shown results with those of ``store``."""
+        self._close_store()
+        self.differences = store
+        self.last_file_name_a = os.path.basename(store.file_a)
+        self.last_file_name_b = os.path.basename(store.file_b)
+        self.last_key_fields = list(store.key_fields)
+        self.filter_column.set(_ALL_VALUES)
+        self.filter_type.set(_ALL_VALUES)
+        self.filter_key_prefix.set("")
+        self.filter_column_box.config(values=(_ALL_VALUES, *store.columns()))
+        self._populate_tree(self.differences, self.last_file_name_a, self.last_file_name_b)
+
+    def _close_store(self) -> None:
+        """Close the shown result store, deleting it if it is a temporary one."""
+        if isinstance(self.differences, ResultStore):
+            self.differences.close()
+            if os.path.dirname(self.differences.path) == self._store_dir:
+                os.remove(self.differences.path)
+
+    def open_results(self) -> None:
+        """Show the differences of a result store saved earlier."""
+        if self._worker is not None:
+            return
+        file_path = filedialog.askopenfilename(
+            title="Открыть результаты",
+            filetypes=(_STORE_FILETYPES, ("Все файлы", "*.*")),
+        )
+        if not file_path:
+            return
+        try:
+            store = ResultStore(file_path)
+        except CsvComparisonError as error:
+            messagebox.showerror("Ошибка", str(error))
+            return
+        self.last_stats = None
+        self._show_store(store)
+
+    def destroy(self) -> None:
+        self._cancel_event.set()
+        self._close_store()
+        shutil.rmtree(self._store_dir, ignore_errors=True)
+        super().destroy()
+
+    def _show_progress(self, state: ComparisonProgress) -> None:
+        """Reflect a progress snapshot in the progress bar and status line."""
+        read_share = state.bytes_read / state.bytes_total if state.bytes_total else 0.0
+        compare_share = state.rows_compared / state.rows_read if state.rows_read else 0.0
+        self.progress_bar.config(value=50 * read_share + 50 * compare_share)
+        self.status_label.config(
+            text=(
+                f"Прочитано {state.bytes_read / 1048576:.1f} из "
+                f"{state.bytes_total / 1048576:.1f} МБ; "
+                f"сравнено строк: {state.rows_compared}; "
+                f"найдено различий: {state.differences_found}."
+            )
+        )
+
+    def _populate_tree(
+        self,
+        differences: Sequence[Difference],
+        file_name_a: str,
+        file_name_b: str,
+    ) -> None:
+        """Show comparison results in the virtualized treeview."""
+        self._window = _ResultsWindow(differences, self._window.size)
+        self._selected_index = None
+        self._update_sort_headings()
+
+        if not differences:
+            self._render_view()
+            self.report_button.config(state=tk.DISABLED)
+            self.export_button.config(state=tk.DISABLED)
+            self.status_label.config(
+                text=(
+                    "Различий не обнаружено. "
+                    f"Файл 1: {file_name_a}. Файл 2: {file_name_b}."
+                )
+            )
+            self.tree.heading("value_a", text=self.headings["value_a"])
+            self.tree.heading("value_b", text=self.headings["value_b"])
+            return
+
+        self.tree.heading("value_a", text=f"Значение {file_name_a}")
+        self.tree.heading("value_b", text=f"Значение {file_name_b}")
+        self.report_button.config(state=tk.NORMAL)
+        self.export_button.config(state=tk.NORMAL)
+        self._render_view()
+
+        self._update_status(differences, file_name_a, file_name_b)
+
+    def _apply_filters(self) -> None:
+        """Show only the rows matching the field, type and key prefix filters."""
+        labels = {label: kind for kind, label in _DIFFERENCE_LABELS.items()}
+        column = self.filter_column.get()
+        self._window.filter(
+            column=None if column == _ALL_VALUES else column,
+            difference_type=labels.get(self.filter_type.get()),
+            key_prefix=self.filter_key_prefix.get().strip(),
+        )
+        self._selected_index = None
+        self._render_view()
+        if any(self._window.filters.values()):
+            self.status_label.config(
+                text=f"Отобрано различий: {self._window.total} из {len(self.differences)}."
+            )
+        else:
+            self._update_status(
+                self.differences, self.last_file_name_a, self.last_file_name_b
+            )
+
+    def _render_view(self) -> None:
+        """Replace treeview items with the rows of the visible window only."""
+
+        self.tree.delete(*self.tree.get_children())
+        for position in self._window.visible_positions():
+            index = self._window.index_at(position)
+            diff = self._window.differences[index]
+            column_label = (
+                "Строка отсутствует" if diff.column == "__missing__" else diff.column
+            )
+            self.tree.insert(
+                "",
+                tk.END,
+                iid=str(index),
+                values=(
+                    diff.POLICY_NO,
+                    column_label,
+                    self._format_difference_label(diff),
+                    _truncate(diff.value_a, _TREE_VALUE_CHARS),
+                    _truncate(diff.value_b, _TREE_VALUE_CHARS),
+                ),
+                tags=(diff.difference_type,),
+            )
+        if self._selected_index is not None and self.tree.exists(str(self._selected_index)):
+            self.tree.selection_set(str(self._selected_index))
+            self.tree.focus(str(self._selected_index))
+        self.scrollbar.set(*self._window.fractions())
+
+    def _scroll_view(self, rows: int) -> None:
+        previous_offset = self._window.offset
+        self._window.scroll_by(rows)
+        if self._window.offset != previous_offset:
+            self._render_view()
+
+    def _on_scrollbar(self, action: str, amount: str, unit: str = "") -> None:
+        """Translate scrollbar commands into window movements."""
+
+        if action == "moveto":
+            self._window.scroll_to_fraction(float(amount))
+            self._render_view()
+        elif action == "scroll":
+            step = self._window.size if unit == "pages" else 1
+            self._scroll_view(int(amount) * step)
+
+    def _on_mouse_wheel(self, event: tk.Event) -> str:
+        self._scroll_view(-3 if event.delta > 0 else 3)
+        return "break"
+
+    def _on_tree_resize(self, event: tk.Event) -> None:
+        """Fit the number of rendered rows to the widget height."""
+
+        row_height = int(ttk.Style().lookup("Treeview", "rowheight") or 20)
+        rows = max((event.height - _TREE_HEADING_HEIGHT) // row_height, 1)
+        if rows != self._window.size:
+            self._window.resize(rows)
+            self._render_view()
+
+    def _on_tree_select(self, _event: tk.Event) -> None:
+        selection = self.tree.selection()
+        if selection:
+            self._selected_index = int(selection[0])
+
+    def _move_selection(self, step: int) -> str:
+        """Move the selection, scrolling the window when it reaches an edge."""
+
+        if not self._window.total:
+            return "break"
+        positions = self._window.visible_positions()
+        position = positions.start
+        if self._selected_index is not None:
+            for visible in positions:
+                if self._window.index_at(visible) == self._selected_index:
+                    position = visible + step
+                    break
+        position = max(0, min(position, self._window.total - 1))
+        if position not in positions:
+            self._window.scroll_to(
+                position if position < positions.start else position - self._window.size + 1
+            )
+        self._selected_index = self._window.index_at(position)
+        self._render_view()
+        return "break"
+
+    def _sort_by(self, field: str) -> None:
+        self._window.sort_by(field)
+        self._selected_index = None
+        self._update_sort_headings()
+        self._render_view()
+
+    def _update_sort_headings(self) -> None:
+        """Mark the sorted column with an arrow in its heading."""
+
+        for column in _TREE_FIELDS:
+            text = self.tree.heading(column, "text").rstrip(" ▲▼")
+            if column == self._window.sort_field:
+                text = f"{text} {'▼' if self._window.descending else '▲'}"
+            self.tree.heading(column, text=text)
+
+    def _jump_to_key(self) -> None:
+        """Scroll to the first row matching the key typed in the search box."""
+
+        key = self.search_key.get().strip()
+        if not key:
+            return
+        position = self._window.find_key(key)
+        if position is None:
+            messagebox.showinfo("Поиск", f"Ключ {key} не найден среди различий.")
+            return
+        self._window.scroll_to(position)
+        self._selected_index = self._window.index_at(position)
+        self._render_view()
+
+    def _format_difference_label(self, diff: Difference) -> str:
+        """Return a human readable label for a difference."""
+
+        return _DIFFERENCE_LABELS.get(diff.difference_type, "Различие")
+
+    def _update_status(
+        self,
+        differences: Sequence[Difference],
+        file_name_a: str,
+        file_name_b: str,
+    ) -> None:
+        """Update summary label with aggregated difference counts."""
+
+        if isinstance(differences, (DifferenceSet, ResultStore)):
+            type_counts = differences.summary.type_counts()
+        else:
+            type_counts = Counter(diff.difference_type for diff in differences)
+        details: List[str] = []
+        if type_counts.get(VALUE_MISMATCH):
+            details.append(
+                f"несовпадений значений — {type_counts[VALUE_MISMATCH]}"
+            )
+        if type_counts.get(MISSING_IN_A):
+            details.append(f"нет строк в файле 1 — {type_counts[MISSING_IN_A]}")
+        if type_counts.get(MISSING_IN_B):
+            details.append(f"нет строк в файле 2 — {type_counts[MISSING_IN_B]}")
+
+        details_text = "; ".join(details)
+        base_text = (
+            f"Всего различий: {len(differences)}. "
+            f"Файл 1: {file_name_a}. Файл 2: {file_name_b}."
+        )
+        if details_text:
+            base_text = f"{base_text} Детализация: {details_text}."
+        self.status_label.config(text=base_text)
+
+    def export_report(self) -> None:
+        """Save aggregated report to CSV."""
+
+        if not self.differences:
+            messagebox.showinfo(
+                "Отчёт",
+                "Сначала выполните сравнение, чтобы сохранить отчёт.",
+            )
+            return
+
+        file_path = filedialog.asksaveasfilename(
+            title="Сохранить отчёт",
+            defaultextension=".csv",
+            filetypes=(("CSV файлы", "*.csv"), ("Все файлы", "*.*")),
+        )
+        if not file_path:
+            return
+
+        try:
+            write_field_report(getattr(self.differences, "summary", self.differences), file_path)
+        except CsvComparisonError as error:
+            messagebox.showerror("Ошибка", str(error))
+            return
+        except OSError as error:
+            messagebox.showerror(
+                "Ошибка",
+                f"Не удалось сохранить отчёт: {error}",
+            )
+            return
+
+        messagebox.showinfo("Готово", f"Отчёт сохранён: {file_path}")
+
+    def export_differences(self) -> None:
+        """Save every difference to a detailed CSV, JSON lines or Parquet file or
+        to a result store."""
+
+        if not self.differences:
+            messagebox.showinfo(
+                "Различия",
+                "Сначала выполните сравнение, чтобы сохранить различия.",
+            )
+            return
+
+        file_path = filedialog.asksaveasfilename(
+            title="Сохранить различия",
+            defaultextension=".csv",
+            filetypes=(
+                ("CSV файлы", "*.csv"),
+                ("CSV, сжатые gzip", "*.csv.gz"),
+                ("JSON lines", "*.jsonl"),
+                ("JSON lines, сжатые gzip", "*.jsonl.gz"),
+                ("Parquet", "*.parquet"),
+                _STORE_FILETYPES,
+                ("Все файлы", "*.*"),
+            ),
+        )
+        if not file_path:
+            return
+
+        sources = None
+        if isinstance(self.differences, ResultStore):
+            sources = (self.differences.file_a, self.differences.file_b)
+        try:
+            written = write_differences(
+                self.differences, file_path, key_field=self.last_key_fields, sources=sources
+            )
+        except CsvComparisonError as error:
+            messagebox.showerror("Ошибка", str(error))
+            return
+        except OSError as error:
+            messagebox.showerror(
+                "Ошибка",
+                f"Не удалось сохранить различия: {error}",
+            )
+            return
+
+        messagebox.showinfo("Готово", f"Сохранено различий: {written}. Файл: {file_path}")
+
+
+def run_app() -> None:
+    """Launch the GUI application."""
+    app = CsvComparatorApp()
+    app.mainloop()
+
@@ -0,0 +1,424 @@
+"""Incremental comparison backed by sidecar per-row hash indexes.
+
+Each file gets an index (next to it, or in ``index_dir``) holding a hash and
+the byte range of every row. Indexes are reused while the file path, size and
+modification time are unchanged, and only rows whose hashes differ are
+parsed and compared.
+"""
+from __future__ import annotations
+
+import csv
+import hashlib
+import json
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from typing import (
+    BinaryIO,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from .inputs import _CsvFormat, _detect_format
+from .merge import _apply_duplicate_policy, _ComparisonLayout
+from .model import (
+    _PROGRESS_STEP,
+    CsvComparisonError,
+    DuplicateKeysError,
+    RawDifference,
+    _Progress,
+)
+from .previews import PreviewPolicy
+from .rules import ColumnRule
+from .sources import (
+    KeyFields,
+    _ColumnSelection,
+    _key_fields,
+    _key_getter,
+    _key_positions,
+    _RecordParser,
+)
+from .stats import INDEX
+
+
+INDEX_SUFFIX = ".csvidx"
+"""File name suffix of the sidecar row indexes used by incremental comparison."""
+
+_INDEX_FORMAT_VERSION = 4
+_INDEX_MAGIC = b"CSVCHECK-INDEX\n"
+_HEADER_SIZE = struct.Struct("<Q")
+_FORMAT_SAMPLE_SIZE = 64 * 1024
+
+
+class _TrackedLines:
+    """Iterate over decoded lines of a binary file while tracking byte offsets.
+
+    The format of the file is detected from its first bytes.
+    """
+
+    def __init__(self, raw_file: BinaryIO) -> None:
+        self._file = raw_file
+        head = raw_file.read(_FORMAT_SAMPLE_SIZE)
+        self.csv_format = _detect_format(head, len(head) < _FORMAT_SAMPLE_SIZE)
+        self._encoding = self.csv_format.encoding
+        raw_file.seek(self.csv_format.bom)
+        self.position = raw_file.tell()
+
+    def __iter__(self) -> "_TrackedLines":
+        return self
+
+    def __next__(self) -> str:
+        line = self._file.readline()
+        if not line:
+            raise StopIteration
+        self.position += len(line)
+        return line.decode(self._encoding)
+
+
+def _row_digest(values: List[str], canonical: Sequence[Tuple[str, int]]) -> int:
+    """Hash the non-empty cells of a row independently of the column order."""
+
+    payload = "\x00".join(
+        f"{column}\x00{values[index]}" for column, index in canonical if values[index]
+    )
+    return int.from_bytes(
+        hashlib.blake2b(payload.encode("utf-8"), digest_size=8).digest(), "little"
+    )
+
+
+class _RowIndex:
+    """Per-key row hashes and byte ranges of a CSV file.
+
+    Keys are stored sorted, repeated keys in file order; ``duplicates`` lists
+    keys that occur more than once.
+    """
+
+    def __init__(
+        self,
+        file_path: str,
+        key_fields: Sequence[str],
+        progress: Optional[_Progress] = None,
+    ) -> None:
+        if not os.path.exists(file_path):
+            raise CsvComparisonError(f"Файл не найден: {file_path}")
+
+        with open(file_path, "rb") as raw_file:
+            lines = _TrackedLines(raw_file)
+            csv_format: _CsvFormat = lines.csv_format
+            reader = csv.reader(lines, delimiter=csv_format.delimiter)
+            header = next(reader, None)
+            if header is None:
+                raise CsvComparisonError("CSV файл не содержит заголовков.")
+            positions, key_indexes = _key_positions(header, key_fields, file_path)
+            canonical = sorted(
+                (column, index)
+                for column, index in positions.items()
+                if column not in key_fields
+            )
+            key_of = _key_getter(key_indexes)
+
+            width = len(header)
+            padding = [""] * width
+            keys: List[str] = []
+            hashes = array("Q")
+            offsets = array("Q")
+            lengths = array("Q")
+            records: Iterable[List[str]] = reader
+            if progress is not None:
+                progress.add_bytes_reader(lambda: lines.position)
+                records = progress.reading(reader)
+            start = lines.position
+            for values in records:
+                end = lines.position
+                if values:
+                    if len(values) != width:
+                        values = (values + padding)[:width]
+                    keys.append(key_of(values))
+                    hashes.append(_row_digest(values, canonical))
+                    offsets.append(start)
+                    lengths.append(end - start)
+                start = end
+
+        order = sorted(range(len(keys)), key=keys.__getitem__)
+        self.key_fields = tuple(key_fields)
+        self.positions: Dict[str, int] = positions
+        self.width = width
+        self.csv_format = csv_format
+        self.keys: List[str] = []
+        self.duplicates: List[str] = []
+        self.hashes = array("Q")
+        self.offsets = array("Q")
+        self.lengths = array("Q")
+        for key, row in _apply_duplicate_policy(
+            ((keys[row], row) for row in order), "multiset", self.duplicates
+        ):
+            self.keys.append(key)
+            self.hashes.append(hashes[row])
+            self.offsets.append(offsets[row])
+            self.lengths.append(lengths[row])
+
+    def selected_rows(self, policy: str) -> Sequence[int]:
+        """Return the indexed rows compared under the duplicate ``policy``."""
+
+        if not self.duplicates or policy == "multiset":
+            return range(len(self.keys))
+        return [
+            row
+            for _, row in _apply_duplicate_policy(
+                zip(self.keys, range(len(self.keys))), policy, []
+            )
+        ]
+
+
+def _index_path(file_path: str, index_dir: Optional[str]) -> str:
+    """Return the location of the sidecar index of a CSV file."""
+
+    if index_dir is None:
+        return f"{file_path}{INDEX_SUFFIX}"
+    digest = hashlib.sha1(os.path.abspath(file_path).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(index_dir, f"{os.path.basename(file_path)}.{digest}{INDEX_SUFFIX}")
+
+
+def _write_index(index_path: str, signature: Dict[str, object], index: _RowIndex) -> None:
+    """Save an index: a JSON header followed by the raw buffers of its arrays.
+
+    The format holds only data, so reading a planted sidecar never runs code.
+    """
+
+    key_data = bytearray()
+    key_ends = array("Q")
+    for key in index.keys:
+        key_data += key.encode("utf-8")
+        key_ends.append(len(key_data))
+    header = json.dumps(
+        {
+            **signature,
+            "byteorder": sys.byteorder,
+            "rows": len(index.keys),
+            "key_bytes": len(key_data),
+            "positions": index.positions,
+            "width": index.width,
+            "encoding": index.csv_format.encoding,
+            "delimiter": index.csv_format.delimiter,
+            "bom": index.csv_format.bom,
+            "duplicates": index.duplicates,
+        },
+        ensure_ascii=False,
+    ).encode("utf-8")
+    handle, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(index_path)))
+    try:
+        with open(handle, "wb") as index_file:
+            index_file.write(_INDEX_MAGIC)
+            index_file.write(_HEADER_SIZE.pack(len(header)))
+            index_file.write(header)
+            for values in (index.hashes, index.offsets, index.lengths, key_ends):
+                values.tofile(index_file)
+            index_file.write(key_data)
+        os.replace(temp_path, index_path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+def _read_index(index_path: str, signature: Dict[str, object]) -> Optional[_RowIndex]:
+    """Read an index saved by :func:`_write_index` if it matches ``signature``.
+
+    Returns ``None`` for a missing, stale, foreign or damaged sidecar.
+    """
+
+    with open(index_path, "rb") as index_file:
+        if index_file.read(len(_INDEX_MAGIC)) != _INDEX_MAGIC:
+            return None
+        (header_size,) = _HEADER_SIZE.unpack(index_file.read(_HEADER_SIZE.size))
+        if header_size > os.fstat(index_file.fileno()).st_size:
+            return None
+        header = json.loads(index_file.read(header_size).decode("utf-8"))
+        if not isinstance(header, dict) or header.get("byteorder") != sys.byteorder:
+            return None
+        if any(header.get(name) != value for name, value in signature.items()):
+            return None
+        rows, key_bytes = header["rows"], header["key_bytes"]
+        expected_size = (
+            len(_INDEX_MAGIC) + _HEADER_SIZE.size + header_size + 32 * rows + key_bytes
+        )
+        if os.fstat(index_file.fileno()).st_size != expected_size:
+            return None
+        buffers = []
+        for _ in range(4):
+            values = array("Q")
+            values.fromfile(index_file, rows)
+            buffers.append(values)
+        hashes, offsets, lengths, key_ends = buffers
+        key_data = index_file.read(key_bytes)
+
+    keys: List[str] = []
+    start = 0
+    for end in key_ends:
+        if not start <= end <= key_bytes:
+            return None
+        keys.append(key_data[start:end].decode("utf-8"))
+        start = end
+    index = _RowIndex.__new__(_RowIndex)
+    index.key_fields = tuple(header["key_fields"])
+    index.positions = {
+        str(column): int(position) for column, position in header["positions"].items()
+    }
+    index.width = int(header["width"])
+    index.csv_format = _CsvFormat(
+        encoding=str(header["encoding"]),
+        delimiter=str(header["delimiter"]),
+        bom=int(header["bom"]),
+    )
+    index.keys = keys
+    index.duplicates = [str(key) for key in header["duplicates"]]
+    index.hashes, index.offsets, index.lengths = hashes, offsets, lengths
+    return index
+
+
+def _load_row_index(
+    file_path: str,
+    key_fields: Sequence[str],
+    index_dir: Optional[str],
+    progress: Optional[_Progress] = None,
+) -> _RowIndex:
+    """Load the sidecar index of a file, rebuilding it when it is stale.
+
+    The sidecar is keyed by the absolute path, size and modification time of
+    the CSV file and by the key columns, which are checked against its
+    header before its arrays are read; any other file at the sidecar path is
+    replaced. Failing to write it does not abort the comparison.
+    """
+
+    if not os.path.exists(file_path):
+        raise CsvComparisonError(f"Файл не найден: {file_path}")
+
+    stat = os.stat(file_path)
+    signature: Dict[str, object] = {
+        "version": _INDEX_FORMAT_VERSION,
+        "path": os.path.abspath(file_path),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "key_fields": list(key_fields),
+    }
+    index_path = _index_path(file_path, index_dir)
+    try:
+        index = _read_index(index_path, signature)
+    except (OSError, EOFError, ValueError, TypeError, KeyError, AttributeError, struct.error):
+        index = None
+    if index is not None:
+        if progress is not None:
+            progress.bytes_skipped += stat.st_size
+            progress.rows_read += len(index.keys)
+            progress.tick()
+        return index
+
+    index = _RowIndex(file_path, key_fields, progress)
+    try:
+        _write_index(index_path, signature, index)
+    except (OSError, UnicodeError):
+        pass
+    return index
+
+
+def update_row_index(
+    file_path: str,
+    key_field: KeyFields = "POLICY_NO",
+    index_dir: Optional[str] = None,
+) -> str:
+    """Build (or refresh) the sidecar index of a CSV file and return its path.
+
+    Useful to prepare the index of a fresh extract ahead of incremental runs.
+    """
+
+    _load_row_index(file_path, _key_fields(key_field), index_dir)
+    return _index_path(file_path, index_dir)
+
+
+def _iter_incremental_differences(
+    file_path_a: str,
+    file_path_b: str,
+    key_fields: Sequence[str],
+    duplicates: str,
+    index_dir: Optional[str],
+    rules: Mapping[str, ColumnRule],
+    preview: PreviewPolicy,
+    progress: _Progress,
+    selection: Optional[_ColumnSelection] = None,
+) -> Iterator[RawDifference]:
+    """Compare two files through their per-key row hash indexes.
+
+    Rows whose hashes match are skipped without being parsed; only changed
+    and missing rows are read back from their byte ranges and compared (in
+    the ``selection`` columns). Indexes hash whole rows, so they are reused
+    whatever the selection. Missing rows are not read back when ``preview``
+    keeps no cells.
+    """
+
+    with progress.stage(INDEX):
+        index_a = _load_row_index(file_path_a, key_fields, index_dir, progress)
+        index_b = _load_row_index(file_path_b, key_fields, index_dir, progress)
+    if duplicates == "fail" and (index_a.duplicates or index_b.duplicates):
+        raise DuplicateKeysError(
+            file_path_a, index_a.duplicates, file_path_b, index_b.duplicates
+        )
+
+    positions_a, positions_b = index_a.positions, index_b.positions
+    if selection is not None:
+        positions_a, positions_b = selection.select(positions_a, positions_b, key_fields)
+    layout = _ComparisonLayout(
+        positions_a, positions_b, key_fields, file_path_a, file_path_b, rules, preview
+    )
+    keep_previews = layout.keep_previews
+    keys_a, keys_b = index_a.keys, index_b.keys
+    rows_a = index_a.selected_rows(duplicates)
+    rows_b = index_b.selected_rows(duplicates)
+    count_a, count_b = len(rows_a), len(rows_b)
+    parser_a = _RecordParser(index_a.csv_format, index_a.width)
+    parser_b = _RecordParser(index_b.csv_format, index_b.width)
+    with open(file_path_a, "rb") as file_a, open(file_path_b, "rb") as file_b:
+
+        def read_record(raw_file: BinaryIO, index: _RowIndex, row: int) -> bytes:
+            raw_file.seek(index.offsets[row])
+            return raw_file.read(index.lengths[row])
+
+        position_a = position_b = 0
+        next_tick = _PROGRESS_STEP
+        while position_a < count_a or position_b < count_b:
+            if position_a + position_b >= next_tick:
+                progress.rows_compared = position_a + position_b
+                progress.tick()
+                next_tick += _PROGRESS_STEP
+            row_a = rows_a[position_a] if position_a < count_a else -1
+            row_b = rows_b[position_b] if position_b < count_b else -1
+            if row_b < 0 or (row_a >= 0 and keys_a[row_a] < keys_b[row_b]):
+                yield layout.missing_in_b(
+                    keys_a[row_a],
+                    parser_a.values(read_record(file_a, index_a, row_a)) if keep_previews else [],
+                )
+                position_a += 1
+            elif row_a < 0 or keys_b[row_b] < keys_a[row_a]:
+                yield layout.missing_in_a(
+                    keys_b[row_b],
+                    parser_b.values(read_record(file_b, index_b, row_b)) if keep_previews else [],
+                )
+                position_b += 1
+            else:
+                if index_a.hashes[row_a] != index_b.hashes[row_b]:
+                    yield from layout.record_mismatches(
+                        keys_a[row_a],
+                        read_record(file_a, index_a, row_a),
+                        read_record(file_b, index_b, row_b),
+                        parser_a,
+                        parser_b,
+                    )
+                position_a += 1
+                position_b += 1
+        progress.rows_compared = count_a + count_b
@@ -0,0 +1,449 @@
+"""Opening comparison inputs: plain, compressed and zipped files and streams.
+
+An input is a path, a binary file-like object or an iterable of ``bytes``
+chunks (for example the output of a pipe). gzip and zstd data is recognized
+by its magic bytes and decompressed while it is read, and a ``.zip`` archive
+is read from its only CSV member or from ``archive.zip::member.csv``; nothing
+is unpacked to disk. Decompression runs on a reader thread that fills a small
+queue of large chunks, so it overlaps with CSV parsing (``zlib`` and
+``zstandard`` release the GIL while they work). The decompressors are
+imported on first use; zstd needs the optional ``zstandard`` package.
+
+The encoding and the delimiter of an input are detected from its leading
+bytes (see :func:`_detect_format`). Every detected encoding is ASCII
+compatible, so quotes, delimiters and line breaks can be found in the raw
+bytes and the byte-level engines decode only the cells they report.
+"""
+from __future__ import annotations
+
+import codecs
+import csv
+import io
+import itertools
+import os
+import queue
+import threading
+from dataclasses import dataclass
+from typing import IO, BinaryIO, Callable, Iterable, List, Optional, Tuple, Union
+
+from .model import CsvComparisonError
+
+InputSource = Union[str, "os.PathLike[str]", BinaryIO, Iterable[bytes]]
+"""A CSV input: a file path, a binary file-like object or byte chunks."""
+
+INPUT_BUFFER_SIZE = 1024 * 1024
+"""Size of the read buffer and of the chunks handed over by the reader thread."""
+
+ZIP_MEMBER_SEPARATOR = "::"
+"""Separates an archive path from a member name, e.g. ``data.zip::a.csv``."""
+
+_GZIP_MAGIC = b"\x1f\x8b"
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+_ZIP_MAGIC = b"PK\x03\x04"
+_READ_AHEAD_CHUNKS = 4
+_STREAM_NAME = "<поток>"
+
+CSV_DELIMITERS = ",;\t|"
+"""Delimiters recognized when the format of an input is detected."""
+
+FALLBACK_ENCODING = "cp1251"
+"""Encoding assumed for inputs whose leading bytes are not valid UTF-8."""
+
+_FORMAT_SAMPLE_SIZE = 64 * 1024
+_FORMAT_SAMPLE_ROWS = 20
+
+
+@dataclass(frozen=True)
+class _CsvFormat:
+    """Encoding and delimiter of a CSV input.
+
+    ``bom`` is the length of a leading UTF-8 byte order mark, which is not
+    part of the first record; ``encoding`` decodes the cells.
+    """
+
+    encoding: str = "utf-8"
+    delimiter: str = ","
+    bom: int = 0
+
+    @property
+    def text_encoding(self) -> str:
+        """The codec that decodes the whole input, skipping the BOM."""
+
+        return "utf-8-sig" if self.bom else self.encoding
+
+    def decode(self, data: bytes) -> str:
+        return data.decode(self.encoding)
+
+
+def _sniff_delimiter(text: str) -> str:
+    """Return the delimiter splitting the leading rows of ``text`` most evenly.
+
+    A candidate must split the header into at least two columns; the share
+    of rows as wide as the header decides, then the number of columns, then
+    the order of :data:`CSV_DELIMITERS`. The comma is the default.
+    """
+
+    best, best_score = ",", (0.0, 1)
+    for delimiter in CSV_DELIMITERS:
+        widths: List[int] = []
+        reader = csv.reader(io.StringIO(text, newline=""), delimiter=delimiter)
+        try:
+            for values in itertools.islice(reader, _FORMAT_SAMPLE_ROWS):
+                if values:
+                    widths.append(len(values))
+        except csv.Error:
+            pass
+        if not widths or widths[0] < 2:
+            continue
+        score = (widths.count(widths[0]) / len(widths), widths[0])
+        if score > best_score:
+            best, best_score = delimiter, score
+    return best
+
+
+def _detect_format(head: bytes, complete: bool) -> _CsvFormat:
+    """Detect the format of an input from its leading bytes ``head``.
+
+    ``complete`` tells whether ``head`` is the whole input. UTF-8 is used
+    when ``head`` decodes as UTF-8 (with or without a BOM), otherwise
+    :data:`FALLBACK_ENCODING`.
+    """
+
+    bom = len(codecs.BOM_UTF8) if head.startswith(codecs.BOM_UTF8) else 0
+    if not bom and head.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        raise CsvComparisonError(
+            "Файлы в кодировке UTF-16 не поддерживаются; сохраните файл в UTF-8."
+        )
+    sample = head[bom:]
+    if not complete:
+        # Parse whole lines only.
+        sample = sample[: sample.rfind(b"\n") + 1] or sample
+    try:
+        text = codecs.getincrementaldecoder("utf-8")().decode(sample, final=complete)
+        encoding = "utf-8"
+    except UnicodeDecodeError:
+        encoding = FALLBACK_ENCODING
+        text = sample.decode(encoding, errors="replace")
+    return _CsvFormat(encoding, _sniff_delimiter(text), bom)
+
+
+def _is_path(source: object) -> bool:
+    return isinstance(source, (str, os.PathLike))
+
+
+def _input_name(source: InputSource) -> str:
+    """Return the name of an input used in messages and row previews."""
+
+    if _is_path(source):
+        return os.fspath(source)
+    name = getattr(source, "name", None)
+    return name if isinstance(name, str) else _STREAM_NAME
+
+
+def _split_member(path: str) -> Tuple[str, Optional[str]]:
+    archive, separator, member = path.partition(ZIP_MEMBER_SEPARATOR)
+    if separator and archive.lower().endswith(".zip"):
+        return archive, member
+    return path, None
+
+
+def _compression_of(head: bytes) -> Optional[str]:
+    if head.startswith(_GZIP_MAGIC):
+        return "gzip"
+    if head.startswith(_ZSTD_MAGIC):
+        return "zstd"
+    if head.startswith(_ZIP_MAGIC):
+        return "zip"
+    return None
+
+
+def _plain_path(source: InputSource) -> Optional[str]:
+    """Return the path of an uncompressed file on disk, or ``None``.
+
+    Only such inputs support the ``mmap``, incremental and parallel engines,
+    which need random access to the bytes of a file.
+    """
+
+    if not _is_path(source):
+        return None
+    path = os.fspath(source)
+    if _split_member(path)[1] is not None:
+        return None
+    try:
+        with open(path, "rb") as raw_file:
+            head = raw_file.read(len(_ZSTD_MAGIC))
+    except OSError:
+        # Let the engine report the missing file.
+        return path
+    return path if _compression_of(head) is None else None
+
+
+def _input_size(source: InputSource) -> int:
+    """Return the stored size of an input in bytes (0 when unknown)."""
+
+    if not _is_path(source):
+        return 0
+    path, member = _split_member(os.fspath(source))
+    if member is not None:
+        import zipfile
+
+        try:
+            with zipfile.ZipFile(path) as archive:
+                return archive.getinfo(member).compress_size
+        except (OSError, KeyError, zipfile.BadZipFile):
+            return 0
+    return os.path.getsize(path) if os.path.isfile(path) else 0
+
+
+class _ChunkReader(io.RawIOBase):
+    """Raw stream over an iterator of byte chunks, counting consumed bytes."""
+
+    def __init__(self, chunks: Iterable[bytes]) -> None:
+        self._chunks = iter(chunks)
+        self._pending = memoryview(b"")
+        self.consumed = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._pending:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+            if not isinstance(chunk, (bytes, bytearray, memoryview)):
+                raise CsvComparisonError("Поток входных данных должен выдавать байты.")
+            self._pending = memoryview(chunk)
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        self.consumed += size
+        return size
+
+
+class _ThreadedReader(io.RawIOBase):
+    """Raw stream reading ahead from ``source`` on a background thread."""
+
+    def __init__(self, source: IO[bytes]) -> None:
+        self._source = source
+        self._chunks: "queue.Queue[Union[bytes, BaseException]]" = queue.Queue(
+            _READ_AHEAD_CHUNKS
+        )
+        self._pending = memoryview(b"")
+        self._done = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="csv-checker-input-reader", daemon=True
+        )
+        self._thread.start()
+
+    def _run(self) -> None:
+        try:
+            while not self._stop.is_set():
+                chunk = self._source.read(INPUT_BUFFER_SIZE)
+                self._chunks.put(chunk)
+                if not chunk:
+                    return
+        except BaseException as error:  # noqa: BLE001 - raised on the reading thread
+            self._chunks.put(error)
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._pending:
+            if self._done:
+                return 0
+            chunk = self._chunks.get()
+            if isinstance(chunk, BaseException):
+                self._done = True
+                raise chunk
+            if not chunk:
+                self._done = True
+                return 0
+            self._pending = memoryview(chunk)
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
+
+    def close(self) -> None:
+        if not self.closed:
+            self._stop.set()
+            while self._thread.is_alive():
+                # Unblock a reader thread waiting for room in the queue.
+                try:
+                    self._chunks.get(timeout=0.05)
+                except queue.Empty:
+                    pass
+        super().close()
+
+
+class _OpenedInput:
+    """A binary stream over an input with a measure of the stored bytes read.
+
+    ``stream`` is buffered and yields decompressed bytes; ``position()``
+    reports how many bytes of the stored (possibly compressed) input have
+    been consumed, which is what progress reporting compares with
+    :func:`_input_size`.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        stream: BinaryIO,
+        position: Callable[[], int],
+        resources: Iterable[IO] = (),
+    ) -> None:
+        # ``resources`` are closed after ``stream``, innermost first.
+        self.name = name
+        self.stream = stream
+        self._position = position
+        self._resources = list(resources)
+        self._final_position: Optional[int] = None
+
+    def read_head(self, size: int) -> bytes:
+        """Return up to ``size`` leading bytes without consuming them."""
+
+        head = self.stream.peek(size)[:size]
+        if len(head) < size:
+            # The buffer holds less: read ahead and put the bytes back in front.
+            rest = self.stream
+            head = rest.read(size)
+            chunks = itertools.chain([head], iter(lambda: rest.read(INPUT_BUFFER_SIZE), b""))
+            self.stream = io.BufferedReader(_ChunkReader(chunks), INPUT_BUFFER_SIZE)
+            self._resources.insert(0, rest)
+        return head
+
+    def detect_format(self) -> _CsvFormat:
+        """Detect the format from the leading bytes; nothing is consumed."""
+
+        head = self.read_head(_FORMAT_SAMPLE_SIZE)
+        return _detect_format(head, len(head) < _FORMAT_SAMPLE_SIZE)
+
+    def position(self) -> int:
+        if self._final_position is not None:
+            return self._final_position
+        return self._position()
+
+    def close(self) -> None:
+        if self._final_position is None and not self.stream.closed:
+            self._final_position = self._position()
+        self.stream.close()
+        for resource in self._resources:
+            resource.close()
+
+
+def _decompressed(compression: str, raw: BinaryIO, name: str) -> IO[bytes]:
+    if compression == "gzip":
+        import gzip
+
+        return gzip.GzipFile(fileobj=raw, mode="rb")
+    try:
+        import zstandard
+    except ImportError as error:
+        raise CsvComparisonError(
+            f"Для чтения {name} (сжатие zstd) установите пакет zstandard."
+        ) from error
+    return zstandard.ZstdDecompressor().stream_reader(
+        raw, read_size=INPUT_BUFFER_SIZE, closefd=False
+    )
+
+
+def _open_zip_member(path: str, member: Optional[str]) -> _OpenedInput:
+    import zipfile
+
+    try:
+        archive = zipfile.ZipFile(path)
+    except zipfile.BadZipFile as error:
+        raise CsvComparisonError(f"Файл {path} не является архивом zip.") from error
+    try:
+        if member is None:
+            members = [
+                info.filename
+                for info in archive.infolist()
+                if not info.is_dir() and info.filename.lower().endswith(".csv")
+            ]
+            if len(members) != 1:
+                raise CsvComparisonError(
+                    f"В архиве {path} должен быть ровно один CSV файл; укажите его как "
+                    f"{path}{ZIP_MEMBER_SEPARATOR}имя.csv."
+                )
+            member = members[0]
+        try:
+            info = archive.getinfo(member)
+        except KeyError as error:
+            raise CsvComparisonError(f"В архиве {path} нет файла {member}.") from error
+        member_file = archive.open(info)
+    except BaseException:
+        archive.close()
+        raise
+    reader = _ThreadedReader(member_file)
+    stream = io.BufferedReader(reader, INPUT_BUFFER_SIZE)
+    ratio = info.compress_size / info.file_size if info.file_size else 0.0
+    return _OpenedInput(
+        f"{path}{ZIP_MEMBER_SEPARATOR}{member}",
+        stream,
+        lambda: int(member_file.tell() * ratio),
+        (member_file, archive),
+    )
+
+
+def _open_input(source: InputSource) -> _OpenedInput:
+    """Open an input for reading decompressed bytes.
+
+    Raises :class:`CsvComparisonError` for missing files and unsupported data.
+    """
+
+    name = _input_name(source)
+    if _is_path(source):
+        path, member = _split_member(name)
+        if not os.path.exists(path):
+            raise CsvComparisonError(f"Файл не найден: {path}")
+        if member is not None:
+            return _open_zip_member(path, member)
+        raw: BinaryIO = open(path, "rb", buffering=INPUT_BUFFER_SIZE)
+        position = raw.tell
+    else:
+        if isinstance(source, io.TextIOBase):
+            source = getattr(source, "buffer", None)
+            if source is None:
+                raise CsvComparisonError("Передайте поток в двоичном режиме.")
+        read = getattr(source, "read", None)
+        chunks = iter(lambda: read(INPUT_BUFFER_SIZE), b"") if read is not None else source
+        chunk_reader = _ChunkReader(chunks)
+        raw = io.BufferedReader(chunk_reader, INPUT_BUFFER_SIZE)
+        position = lambda: chunk_reader.consumed  # noqa: E731
+
+    try:
+        compression = _compression_of(raw.peek(len(_ZSTD_MAGIC)))
+        if compression == "zip":
+            if not _is_path(source):
+                raise CsvComparisonError("Архив zip можно читать только из файла.")
+            raw.close()
+            return _open_zip_member(path, None)
+        if compression is None:
+            return _OpenedInput(name, raw, position)
+        decompressed = _decompressed(compression, raw, name)
+        stream = io.BufferedReader(_ThreadedReader(decompressed), INPUT_BUFFER_SIZE)
+    except BaseException:
+        raw.close()
+        raise
+    return _OpenedInput(name, stream, position, [decompressed, raw])
+
+
+def _open_text(source: InputSource) -> Tuple[_OpenedInput, IO[str], _CsvFormat]:
+    """Open an input as text for ``csv`` and return its detected format.
+
+    The text is decoded with the detected encoding (a leading BOM is
+    skipped); the ``csv`` reader needs the detected delimiter.
+    """
+
+    opened = _open_input(source)
+    try:
+        csv_format = opened.detect_format()
+    except BaseException:
+        opened.close()
+        raise
+    text = io.TextIOWrapper(opened.stream, encoding=csv_format.text_encoding, newline="")
+    return opened, text, csv_format
@@ -0,0 +1,199 @@
+"""Key-only pre-pass: rows present in one file only, found from the keys alone.
+
+Records are scanned as raw bytes and only their key cells are decoded (see
+:func:`~csv_checker.sources._record_key_getter`), so no other cell is parsed
+or stored. The keys are sorted with the external merge sort of the streaming
+engine and merge-joined, which makes the pass I/O bound even for very wide
+files.
+"""
+from __future__ import annotations
+
+import itertools
+import os
+import tempfile
+import threading
+from contextlib import ExitStack, closing
+from typing import Iterator, List, Optional, Sequence
+
+from .engine import DEFAULT_MEMORY_LIMIT, DUPLICATE_POLICIES
+from .inputs import InputSource, _input_size, _is_path, _open_input
+from .merge import _apply_duplicate_policy, _sorted_rows
+from .model import (
+    MISSING_IN_A,
+    MISSING_IN_B,
+    CsvComparisonError,
+    Difference,
+    DuplicateKeysError,
+    ProgressCallback,
+    RawDifference,
+    _Progress,
+    _to_difference,
+)
+from .sources import (
+    KeyFields,
+    SortedRow,
+    _iter_records,
+    _key_fields,
+    _key_positions,
+    _record_header,
+    _record_key_getter,
+)
+from .stats import ComparisonStats
+
+
+class _KeyColumn:
+    """The keys of the records of a CSV input as ``(key, [])`` rows."""
+
+    def __init__(self, source: InputSource, key_fields: Sequence[str]) -> None:
+        self._input = _open_input(source)
+        self.file_path = self._input.name
+        try:
+            csv_format = self._input.detect_format()
+            self._records = _iter_records(self._input.stream.readline, csv_format)
+            header = _record_header(self._records, csv_format)
+            _, key_indexes = _key_positions(header, key_fields, self.file_path)
+        except BaseException:
+            self.close()
+            raise
+        self._key_of = _record_key_getter(key_indexes, csv_format)
+
+    def __enter__(self) -> "_KeyColumn":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._input.close()
+
+    def bytes_read(self) -> int:
+        return self._input.position()
+
+    def __iter__(self) -> Iterator[SortedRow]:
+        key_of = self._key_of
+        for _, data in self._records:
+            key = key_of(data)
+            if key is not None:
+                yield key, []
+
+
+def _iter_missing_keys(
+    file_path_a: InputSource,
+    file_path_b: InputSource,
+    key_fields: Sequence[str],
+    duplicates: str,
+    memory_limit: int,
+    temp_dir: Optional[str],
+    progress: _Progress,
+) -> Iterator[RawDifference]:
+    with ExitStack() as stack:
+        keys_a = stack.enter_context(_KeyColumn(file_path_a, key_fields))
+        keys_b = stack.enter_context(_KeyColumn(file_path_b, key_fields))
+        work_dir = stack.enter_context(
+            tempfile.TemporaryDirectory(prefix="csv_checker_", dir=temp_dir)
+        )
+        progress.add_bytes_reader(keys_a.bytes_read)
+        progress.add_bytes_reader(keys_b.bytes_read)
+        half_limit = max(memory_limit // 2, 1)
+        sorted_a = stack.enter_context(
+            closing(_sorted_rows(progress.reading(keys_a), half_limit, work_dir))
+        )
+        sorted_b = stack.enter_context(
+            closing(_sorted_rows(progress.reading(keys_b), half_limit, work_dir))
+        )
+        duplicates_a: List[str] = []
+        duplicates_b: List[str] = []
+        rows_a = _apply_duplicate_policy(progress.comparing(sorted_a), duplicates, duplicates_a)
+        rows_b = _apply_duplicate_policy(progress.comparing(sorted_b), duplicates, duplicates_b)
+        name_a = os.path.basename(keys_a.file_path)
+        name_b = os.path.basename(keys_b.file_path)
+        in_a, not_in_a = f"Есть запись в {name_a}", f"Нет записи в {name_a}"
+        in_b, not_in_b = f"Есть запись в {name_b}", f"Нет записи в {name_b}"
+        fail = duplicates == "fail"
+
+        key_a = next(rows_a, (None,))[0]
+        key_b = next(rows_b, (None,))[0]
+        while (key_a is not None or key_b is not None) and not (
+            fail and (duplicates_a or duplicates_b)
+        ):
+            if key_b is None or (key_a is not None and key_a < key_b):
+                yield (key_a, "__missing__", in_a, not_in_b, MISSING_IN_B)
+                key_a = next(rows_a, (None,))[0]
+            elif key_a is None or key_b < key_a:
+                yield (key_b, "__missing__", not_in_a, in_b, MISSING_IN_A)
+                key_b = next(rows_b, (None,))[0]
+            else:
+                key_a = next(rows_a, (None,))[0]
+                key_b = next(rows_b, (None,))[0]
+
+        if fail and (duplicates_a or duplicates_b):
+            for _ in rows_a:
+                pass
+            for _ in rows_b:
+                pass
+            raise DuplicateKeysError(
+                keys_a.file_path, duplicates_a, keys_b.file_path, duplicates_b
+            )
+
+
+def iter_missing_rows(
+    file_path_a: InputSource,
+    file_path_b: InputSource,
+    key_field: KeyFields = "POLICY_NO",
+    *,
+    duplicates: str = "fail",
+    memory_limit: int = DEFAULT_MEMORY_LIMIT,
+    temp_dir: Optional[str] = None,
+    max_differences: Optional[int] = None,
+    stats: Optional[ComparisonStats] = None,
+    progress: Optional[ProgressCallback] = None,
+    cancel_event: Optional[threading.Event] = None,
+) -> Iterator[Difference]:
+    """Yield the rows present in one file only, reading just the key columns.
+
+    This is a cheap pre-pass before (or instead of) :func:`iter_differences`:
+    only the key cells of every record are decoded, and the keys are sorted
+    within ``memory_limit`` bytes (spilling to ``temp_dir``). The
+    differences are the ``missing_in_a``/``missing_in_b`` ones of a full
+    comparison, ordered by key, except that their values name the files
+    instead of previewing the row. ``duplicates`` is handled as in
+    :func:`iter_differences` (``"multiset"`` reports unpaired occurrences).
+    Inputs may be plain, compressed or zipped files and streams;
+    ``max_differences``, ``stats``, ``progress`` and ``cancel_event`` work as
+    in :func:`iter_differences`.
+    """
+
+    if duplicates not in DUPLICATE_POLICIES:
+        raise CsvComparisonError(
+            f"Неизвестная политика дубликатов '{duplicates}'. "
+            f"Доступны: {', '.join(DUPLICATE_POLICIES)}."
+        )
+    if memory_limit <= 0:
+        raise CsvComparisonError("Лимит памяти должен быть положительным числом.")
+    if max_differences is not None and max_differences < 0:
+        raise CsvComparisonError("Число различий не может быть отрицательным.")
+    if _is_path(file_path_a):
+        file_path_a = os.fspath(file_path_a)
+    if _is_path(file_path_b):
+        file_path_b = os.fspath(file_path_b)
+    key_fields = _key_fields(key_field)
+    run = _Progress(
+        progress,
+        cancel_event,
+        _input_size(file_path_a) + _input_size(file_path_b),
+        stats=stats,
+    )
+    run.start_stats()
+    try:
+        run.tick()
+        missing = _iter_missing_keys(
+            file_path_a, file_path_b, key_fields, duplicates, memory_limit, temp_dir, run
+        )
+        with closing(missing):
+            raws = itertools.islice(run.differences(missing), max_differences)
+            composite = len(key_fields) > 1
+            for raw in raws:
+                yield _to_difference(raw, composite)
+        run.finish()
+    finally:
+        run.finish_stats()
@@ -0,0 +1,239 @@
+"""Memory-mapped comparison over per-file ``(key, offset, length)`` indexes.
+
+Each file is mapped into memory and scanned once to record the key and byte
+range of every record; rows are parsed into cells only when they have to be
+reported. When both files share the same header bytes and encoding, rows
+whose raw bytes are equal are known to be equal without being parsed, so the
+working set is the key index plus the rows that actually differ. Of those,
+records without quotes are split into raw cells and only the cells whose
+bytes differ are decoded.
+"""
+from __future__ import annotations
+
+import mmap
+import os
+from array import array
+from typing import Dict, Iterator, List, Mapping, Optional, Sequence
+
+from .merge import _apply_duplicate_policy, _ComparisonLayout
+from .model import (
+    _PROGRESS_STEP,
+    CsvComparisonError,
+    DuplicateKeysError,
+    RawDifference,
+    _Progress,
+)
+from .inputs import _detect_format
+from .previews import PreviewPolicy
+from .rules import ColumnRule
+from .sources import (
+    _LINE_ENDINGS,
+    _ColumnSelection,
+    _iter_records,
+    _key_positions,
+    _parse_record,
+    _record_key_getter,
+    _RecordParser,
+)
+from .stats import INDEX, READ
+
+_INDEX_ROW_OVERHEAD = 160
+_SAMPLE_SIZE = 64 * 1024
+
+
+def _estimated_index_size(file_path: str) -> int:
+    """Estimate the memory taken by the key index of a file from its first rows."""
+
+    try:
+        size = os.path.getsize(file_path)
+        with open(file_path, "rb") as raw_file:
+            sample = raw_file.read(_SAMPLE_SIZE)
+    except OSError:
+        return 0
+    rows = size * max(sample.count(b"\n"), 1) // max(len(sample), 1)
+    return rows * _INDEX_ROW_OVERHEAD
+
+
+class _MappedCsv:
+    """A memory-mapped CSV file with its records indexed by key.
+
+    ``keys`` are sorted; ``offsets`` and ``lengths`` give the byte range of
+    the record of each key and ``duplicates`` lists keys that occur more than
+    once. Which occurrences are indexed depends on the ``duplicates`` policy
+    (see :func:`_apply_duplicate_policy`).
+    """
+
+    def __init__(
+        self,
+        file_path: str,
+        key_fields: Sequence[str],
+        duplicates: str,
+        progress: _Progress,
+    ) -> None:
+        if not os.path.exists(file_path):
+            raise CsvComparisonError(f"Файл не найден: {file_path}")
+
+        self.file_path = file_path
+        self._file = open(file_path, "rb")
+        try:
+            if os.fstat(self._file.fileno()).st_size == 0:
+                raise CsvComparisonError("CSV файл не содержит заголовков.")
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except BaseException:
+            self._file.close()
+            raise
+        try:
+            self._scan(key_fields, duplicates, progress)
+        except BaseException:
+            self.close()
+            raise
+
+    def __enter__(self) -> "_MappedCsv":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if not self._map.closed:
+            self._bytes_read = self._map.tell()
+        self._map.close()
+        self._file.close()
+
+    def bytes_read(self) -> int:
+        """Return how many bytes of the file the key scan has consumed."""
+
+        if self._map.closed:
+            return self._bytes_read
+        return self._map.tell()
+
+    def _scan(self, key_fields: Sequence[str], policy: str, progress: _Progress) -> None:
+        mapped = self._map
+        head = mapped[:_SAMPLE_SIZE]
+        csv_format = _detect_format(head, len(head) < _SAMPLE_SIZE)
+        mapped.seek(csv_format.bom)
+        records = _iter_records(mapped.readline, csv_format, mapped.tell())
+        first = next(records, None)
+        if first is None:
+            raise CsvComparisonError("CSV файл не содержит заголовков.")
+        self.header_bytes = first[1]
+        header = _parse_record(csv_format.decode(first[1]), csv_format.delimiter)
+        self.positions: Dict[str, int]
+        self.positions, key_indexes = _key_positions(header, key_fields, self.file_path)
+        self.width = len(header)
+        self.parser = _RecordParser(csv_format, self.width)
+        key_of = _record_key_getter(key_indexes, csv_format)
+
+        keys: List[str] = []
+        offsets = array("Q")
+        lengths = array("Q")
+        progress.add_bytes_reader(self.bytes_read)
+        with progress.stage(READ):
+            for offset, data in records:
+                key = key_of(data)
+                if key is None:
+                    continue
+                keys.append(key)
+                offsets.append(offset)
+                lengths.append(len(data))
+                if len(keys) % _PROGRESS_STEP == 0:
+                    progress.rows_read += _PROGRESS_STEP
+                    progress.tick()
+            progress.rows_read += len(keys) % _PROGRESS_STEP
+        progress.count(READ, rows=len(keys))
+
+        with progress.stage(INDEX):
+            order = sorted(range(len(keys)), key=keys.__getitem__)
+            self.keys: List[str] = []
+            self.duplicates: List[str] = []
+            self.offsets = array("Q")
+            self.lengths = array("Q")
+            selected = _apply_duplicate_policy(
+                ((keys[row], row) for row in order), policy, self.duplicates
+            )
+            for key, row in selected:
+                self.keys.append(key)
+                self.offsets.append(offsets[row])
+                self.lengths.append(lengths[row])
+        progress.count(INDEX, rows=len(self.keys))
+
+    def raw(self, row: int) -> bytes:
+        """Return the raw bytes of the record of the ``row``-th key."""
+
+        offset = self.offsets[row]
+        return self._map[offset : offset + self.lengths[row]]
+
+    def values(self, row: int) -> List[str]:
+        """Parse the record of the ``row``-th key into ``width`` cells."""
+
+        return self.parser.values(self.raw(row))
+
+
+def _iter_mapped_differences(
+    file_path_a: str,
+    file_path_b: str,
+    key_fields: Sequence[str],
+    duplicates: str,
+    rules: Mapping[str, ColumnRule],
+    preview: PreviewPolicy,
+    progress: _Progress,
+    selection: Optional[_ColumnSelection] = None,
+) -> Iterator[RawDifference]:
+    """Compare two files through memory-mapped key indexes.
+
+    Rows are parsed whole but only the ``selection`` columns are compared.
+    Missing rows are not parsed at all when ``preview`` keeps no cells.
+    """
+
+    with _MappedCsv(file_path_a, key_fields, duplicates, progress) as csv_a, _MappedCsv(
+        file_path_b, key_fields, duplicates, progress
+    ) as csv_b:
+        if duplicates == "fail" and (csv_a.duplicates or csv_b.duplicates):
+            raise DuplicateKeysError(
+                file_path_a, csv_a.duplicates, file_path_b, csv_b.duplicates
+            )
+
+        positions_a, positions_b = csv_a.positions, csv_b.positions
+        if selection is not None:
+            positions_a, positions_b = selection.select(positions_a, positions_b, key_fields)
+        layout = _ComparisonLayout(
+            positions_a, positions_b, key_fields, file_path_a, file_path_b, rules, preview
+        )
+        keep_previews = layout.keep_previews
+        same_layout = (
+            csv_a.parser.csv_format.encoding == csv_b.parser.csv_format.encoding
+            and csv_a.header_bytes.rstrip(_LINE_ENDINGS)
+            == csv_b.header_bytes.rstrip(_LINE_ENDINGS)
+        )
+        keys_a, keys_b = csv_a.keys, csv_b.keys
+        count_a, count_b = len(keys_a), len(keys_b)
+        row_a = row_b = 0
+        next_tick = _PROGRESS_STEP
+        while row_a < count_a or row_b < count_b:
+            if row_a + row_b >= next_tick:
+                progress.rows_compared = row_a + row_b
+                progress.tick()
+                next_tick += _PROGRESS_STEP
+            if row_b >= count_b or (row_a < count_a and keys_a[row_a] < keys_b[row_b]):
+                yield layout.missing_in_b(
+                    keys_a[row_a], csv_a.values(row_a) if keep_previews else []
+                )
+                row_a += 1
+            elif row_a >= count_a or keys_b[row_b] < keys_a[row_a]:
+                yield layout.missing_in_a(
+                    keys_b[row_b], csv_b.values(row_b) if keep_previews else []
+                )
+                row_b += 1
+            else:
+                raw_a = csv_a.raw(row_a)
+                raw_b = csv_b.raw(row_b)
+                if not (
+                    same_layout
+                    and raw_a.rstrip(_LINE_ENDINGS) == raw_b.rstrip(_LINE_ENDINGS)
+                ):
+                    yield from layout.record_mismatches(
+                        keys_a[row_a], raw_a, raw_b, csv_a.parser, csv_b.parser
+                    )
+                row_a += 1
+                row_b += 1
+        progress.rows_compared = count_a + count_b
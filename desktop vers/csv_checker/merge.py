@@ -0,0 +1,369 @@
+"""External merge sort of row streams and the sorted merge join.
+
+At most the memory limit of rows is buffered; the rest is spilled to sorted
+runs in a temporary directory and merged back in the single merge-join pass.
+"""
+from __future__ import annotations
+
+import csv
+import heapq
+import os
+import tempfile
+from contextlib import ExitStack
+from operator import itemgetter
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+    Union,
+)
+
+from .model import (
+    MISSING_IN_A,
+    MISSING_IN_B,
+    VALUE_MISMATCH,
+    DuplicateKeysError,
+    RawDifference,
+    _Progress,
+    _RowPreview,
+    _truncate,
+)
+from .previews import PreviewPolicy
+from .rules import ColumnRule, Equivalence, _column_rule, _compile_rule
+from .sources import SortedRow, _RecordParser
+from .stats import DUPLICATES
+
+
+_MAX_MERGE_FANIN = 64
+_ROW_OVERHEAD = 120
+_FIELD_OVERHEAD = 57
+
+
+def _row_size(values: Sequence[str]) -> int:
+    """Estimate the memory in bytes taken by a buffered row with ``values``."""
+
+    return _ROW_OVERHEAD + _FIELD_OVERHEAD * len(values) + sum(map(len, values))
+
+
+def _write_run(rows: Iterable[SortedRow], temp_dir: str) -> str:
+    """Persist already sorted rows to a temporary run file and return its path."""
+
+    handle, run_path = tempfile.mkstemp(suffix=".csv", dir=temp_dir)
+    with open(handle, "w", encoding="utf-8", newline="") as run_file:
+        writer = csv.writer(run_file)
+        for key, values in rows:
+            writer.writerow([key, *values])
+    return run_path
+
+
+def _read_run(run_file: Iterable[str]) -> Iterator[SortedRow]:
+    """Yield rows stored by :func:`_write_run`."""
+
+    for record in csv.reader(run_file):
+        yield record[0], record[1:]
+
+
+def _merge_runs(run_paths: Sequence[str], temp_dir: str) -> str:
+    """Merge several run files into a single new run file."""
+
+    with ExitStack() as stack:
+        readers = [
+            _read_run(stack.enter_context(open(path, "r", encoding="utf-8", newline="")))
+            for path in run_paths
+        ]
+        merged_path = _write_run(heapq.merge(*readers, key=itemgetter(0)), temp_dir)
+    for path in run_paths:
+        os.remove(path)
+    return merged_path
+
+
+def _sorted_rows(
+    rows: Iterable[SortedRow],
+    memory_limit: int,
+    temp_dir: str,
+) -> Iterator[SortedRow]:
+    """Yield rows ordered by key using an external merge sort.
+
+    Rows are buffered until their estimated size reaches ``memory_limit`` bytes,
+    then the buffer is sorted and spilled to a run file in ``temp_dir``. The
+    runs are finally merged lazily. Rows with equal keys keep their file order.
+    """
+
+    run_paths: List[str] = []
+    buffer: List[SortedRow] = []
+    buffered_size = 0
+    for row in rows:
+        buffer.append(row)
+        buffered_size += _row_size(row[1])
+        if buffered_size >= memory_limit:
+            buffer.sort(key=itemgetter(0))
+            run_paths.append(_write_run(buffer, temp_dir))
+            buffer = []
+            buffered_size = 0
+    buffer.sort(key=itemgetter(0))
+
+    if not run_paths:
+        yield from buffer
+        return
+
+    while len(run_paths) > _MAX_MERGE_FANIN:
+        merged_path = _merge_runs(run_paths[:_MAX_MERGE_FANIN], temp_dir)
+        run_paths = [merged_path, *run_paths[_MAX_MERGE_FANIN:]]
+
+    with ExitStack() as stack:
+        readers = [
+            _read_run(stack.enter_context(open(path, "r", encoding="utf-8", newline="")))
+            for path in run_paths
+        ]
+        readers.append(iter(buffer))
+        yield from heapq.merge(*readers, key=itemgetter(0))
+
+
+_Keyed = TypeVar("_Keyed", bound=Tuple[str, Any])
+
+
+def _apply_duplicate_policy(
+    rows: Iterable[_Keyed], policy: str, duplicates: List[str]
+) -> Iterator[_Keyed]:
+    """Select the rows of a key-ordered stream that take part in the comparison.
+
+    Repeated keys are recorded in ``duplicates`` as they pass by. ``"fail"``
+    and ``"first"`` keep the first row of every key, ``"last"`` the last one
+    and ``"multiset"`` every row, so that a merge join pairs the occurrences
+    of a key in their file order. Rows with equal keys must keep their file
+    order in ``rows``.
+    """
+
+    previous: Optional[_Keyed] = None
+    for row in rows:
+        key = row[0]
+        if previous is not None and key == previous[0]:
+            if not duplicates or duplicates[-1] != key:
+                duplicates.append(key)
+            if policy == "multiset":
+                yield row
+            elif policy == "last":
+                previous = row
+            continue
+        if policy != "last":
+            yield row
+        elif previous is not None:
+            yield previous
+        previous = row
+    if policy == "last" and previous is not None:
+        yield previous
+
+
+class _ComparisonLayout:
+    """Columns compared for a pair of files and the builders of missing rows.
+
+    ``preview`` limits the cells kept for missing rows and the length of
+    reported values (see :class:`PreviewPolicy`).
+    """
+
+    def __init__(
+        self,
+        positions_a: Dict[str, int],
+        positions_b: Dict[str, int],
+        key_fields: Sequence[str],
+        file_path_a: str,
+        file_path_b: str,
+        rules: Optional[Mapping[str, ColumnRule]] = None,
+        preview: Optional[PreviewPolicy] = None,
+    ) -> None:
+        all_columns = sorted(set(positions_a) | set(positions_b))
+        column_rules = {
+            column: _column_rule(rules, column) if rules else None for column in all_columns
+        }
+        self.compared: List[Tuple[str, Optional[int], Optional[int]]] = [
+            (column, positions_a.get(column), positions_b.get(column))
+            for column in all_columns
+            if column not in key_fields
+            and getattr(column_rules[column], "kind", None) != "ignore"
+        ]
+        self.equivalences: List[Optional[Equivalence]] = [
+            _compile_rule(column_rules[column]) if column_rules[column] else None
+            for column, _, _ in self.compared
+        ]
+        self._checks = [
+            (*entry, equivalent) for entry, equivalent in zip(self.compared, self.equivalences)
+        ]
+        self.preview = preview or PreviewPolicy()
+        self.value_chars = self.preview.value_chars
+        self.keep_previews = self.preview.enabled
+        self._preview_chars = self.preview.max_chars
+        self._preview_columns_a, self._preview_cells_a = self._preview_layout(positions_a)
+        self._preview_columns_b, self._preview_cells_b = self._preview_layout(positions_b)
+        self._missing_label_a = f"Нет записи в {os.path.basename(file_path_a)}"
+        self._missing_label_b = f"Нет записи в {os.path.basename(file_path_b)}"
+
+    def _preview_layout(
+        self, positions: Dict[str, int]
+    ) -> Tuple[Tuple[str, ...], Callable[[List[str]], Tuple[str, ...]]]:
+        """Return preview column names and a getter of their cells in a row."""
+
+        columns = tuple(column for column, *_ in self.compared if column in positions)
+        columns = columns[: self.preview.columns]
+        indexes = [positions[column] for column in columns]
+        if len(indexes) > 1:
+            return columns, itemgetter(*indexes)
+        if indexes:
+            index = indexes[0]
+            return columns, lambda values: (values[index],)
+        return columns, lambda values: ()
+
+    def mismatches(
+        self, key: str, values_a: List[str], values_b: List[str]
+    ) -> List[RawDifference]:
+        """Return the cells that differ between two rows sharing ``key``."""
+
+        differences = []
+        for column, index_a, index_b, equivalent in self._checks:
+            value_a = values_a[index_a] if index_a is not None else ""
+            value_b = values_b[index_b] if index_b is not None else ""
+            if value_a != value_b and (equivalent is None or not equivalent(value_a, value_b)):
+                differences.append((key, column, value_a, value_b, VALUE_MISMATCH))
+        return self.clipped(differences) if self.value_chars and differences else differences
+
+    def clipped(self, differences: List[RawDifference]) -> List[RawDifference]:
+        """Cut the values of mismatches longer than the ``value_chars`` limit."""
+
+        limit = self.value_chars
+        return [
+            (key, column, _truncate(value_a, limit), _truncate(value_b, limit), kind)
+            for key, column, value_a, value_b, kind in differences
+        ]
+
+    def record_mismatches(
+        self,
+        key: str,
+        record_a: bytes,
+        record_b: bytes,
+        parser_a: _RecordParser,
+        parser_b: _RecordParser,
+    ) -> List[RawDifference]:
+        """Return the cells that differ between two raw records sharing ``key``.
+
+        Records without quotes are split into raw cells and quoted records are
+        parsed whole. When both files have the same encoding, cells with equal
+        bytes are skipped and only the others are decoded; cells of files in
+        different encodings are always decoded, as equal bytes may stand for
+        different text.
+        """
+
+        cells_a = parser_a.cells(record_a)
+        cells_b = parser_b.cells(record_b) if cells_a is not None else None
+        if cells_a is None or cells_b is None:
+            return self.mismatches(key, parser_a.values(record_a), parser_b.values(record_b))
+        same_encoding = parser_a.csv_format.encoding == parser_b.csv_format.encoding
+        decode_a, decode_b = parser_a.decode, parser_b.decode
+        differences = []
+        for column, index_a, index_b, equivalent in self._checks:
+            raw_a = cells_a[index_a] if index_a is not None else b""
+            raw_b = cells_b[index_b] if index_b is not None else b""
+            if same_encoding and raw_a == raw_b:
+                continue
+            value_a, value_b = decode_a(raw_a), decode_b(raw_b)
+            if value_a != value_b and (equivalent is None or not equivalent(value_a, value_b)):
+                differences.append((key, column, value_a, value_b, VALUE_MISMATCH))
+        return self.clipped(differences) if self.value_chars and differences else differences
+
+    def _row_preview(
+        self, prefix: str, columns: Tuple[str, ...], cells: Tuple[str, ...]
+    ) -> Union[str, _RowPreview]:
+        """Describe the cells of a missing row as the preview policy asks."""
+
+        if not self.keep_previews:
+            return f"{prefix}не сохранены"
+        if self.value_chars:
+            limit = self.value_chars
+            cells = tuple(_truncate(cell, limit) for cell in cells)
+        preview = _RowPreview(prefix, columns, cells)
+        if self._preview_chars is not None:
+            return preview.format(self._preview_chars)
+        return preview
+
+    def missing_in_b(self, key: str, values_a: List[str]) -> RawDifference:
+        """Describe a row of the first file that has no counterpart."""
+
+        preview = self._row_preview(
+            "Данные файла 1: ", self._preview_columns_a, self._preview_cells_a(values_a)
+        )
+        return (key, "__missing__", preview, self._missing_label_b, MISSING_IN_B)
+
+    def missing_in_a(self, key: str, values_b: List[str]) -> RawDifference:
+        """Describe a row of the second file that has no counterpart."""
+
+        preview = self._row_preview(
+            "Данные файла 2: ", self._preview_columns_b, self._preview_cells_b(values_b)
+        )
+        return (key, "__missing__", self._missing_label_a, preview, MISSING_IN_A)
+
+
+def _join_sorted_rows(
+    sorted_a: Iterable[SortedRow],
+    sorted_b: Iterable[SortedRow],
+    positions_a: Dict[str, int],
+    positions_b: Dict[str, int],
+    key_fields: Sequence[str],
+    file_path_a: str,
+    file_path_b: str,
+    duplicates: str = "fail",
+    rules: Optional[Mapping[str, ColumnRule]] = None,
+    progress: Optional[_Progress] = None,
+    preview: Optional[PreviewPolicy] = None,
+) -> Iterator[RawDifference]:
+    """Merge-join two key-ordered row streams and yield their differences.
+
+    Duplicate keys are detected on the fly and handled by the ``duplicates``
+    policy (see :func:`_apply_duplicate_policy`). With ``"fail"``, once one is
+    found no further differences are yielded and :class:`DuplicateKeysError`
+    is raised after both streams have been drained. ``rules`` map column
+    names to their :class:`ColumnRule`; ``progress`` times the duplicate
+    handling for its stats; ``preview`` shapes the reported values.
+    """
+
+    layout = _ComparisonLayout(
+        positions_a, positions_b, key_fields, file_path_a, file_path_b, rules, preview
+    )
+    duplicates_a: List[str] = []
+    duplicates_b: List[str] = []
+    rows_a = _apply_duplicate_policy(sorted_a, duplicates, duplicates_a)
+    rows_b = _apply_duplicate_policy(sorted_b, duplicates, duplicates_b)
+    if progress is not None:
+        rows_a = iter(progress.timed(DUPLICATES, rows_a))
+        rows_b = iter(progress.timed(DUPLICATES, rows_b))
+    fail = duplicates == "fail"
+
+    row_a = next(rows_a, None)
+    row_b = next(rows_b, None)
+    while (row_a is not None or row_b is not None) and not (
+        fail and (duplicates_a or duplicates_b)
+    ):
+        if row_b is None or (row_a is not None and row_a[0] < row_b[0]):
+            yield layout.missing_in_b(*row_a)
+            row_a = next(rows_a, None)
+            continue
+        if row_a is None or row_b[0] < row_a[0]:
+            yield layout.missing_in_a(*row_b)
+            row_b = next(rows_b, None)
+            continue
+
+        yield from layout.mismatches(row_a[0], row_a[1], row_b[1])
+        row_a = next(rows_a, None)
+        row_b = next(rows_b, None)
+
+    if fail and (duplicates_a or duplicates_b):
+        for _ in rows_a:
+            pass
+        for _ in rows_b:
+            pass
+        raise DuplicateKeysError(file_path_a, duplicates_a, file_path_b, duplicates_b)
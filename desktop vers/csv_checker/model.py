@@ -0,0 +1,648 @@
+"""Difference records, their compact container, errors and progress tracking."""
+from __future__ import annotations
+
+import bisect
+import os
+import threading
+import time
+from array import array
+from collections import Counter
+from collections.abc import Sequence as SequenceABC
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from typing import (
+    Callable,
+    ContextManager,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+    Union,
+)
+
+from .stats import DIFF, READ, SORT, ComparisonStats, StageStats
+
+
+@dataclass(frozen=True)
+class Difference:
+    """Represents a difference between two CSV files."""
+
+    POLICY_NO: str
+    column: str
+    value_a: str
+    value_b: str
+    difference_type: str
+    key_cells: Tuple[str, ...] = field(default=(), compare=False, repr=False)
+    """Cells of a composite key (``POLICY_NO`` joins them for display)."""
+
+    @property
+    def policy_no(self) -> str:
+        """Backward compatible alias for the policy number field."""
+
+        return self.POLICY_NO
+
+
+KEY_SEPARATOR = "\x1f"
+"""Joins the cells of a composite key inside the comparison engines."""
+
+KEY_DISPLAY_SEPARATOR = " | "
+"""Joins the cells of a composite key in reported differences."""
+
+
+def _display_key(key: str) -> str:
+    """Return the reported form of an engine-level key."""
+
+    return key.replace(KEY_SEPARATOR, KEY_DISPLAY_SEPARATOR)
+
+
+VALUE_MISMATCH = "value_mismatch"
+MISSING_IN_A = "missing_in_a"
+MISSING_IN_B = "missing_in_b"
+
+
+TRUNCATION_MARK = "…"
+"""Ends cell values and row previews cut by a :class:`PreviewPolicy`."""
+
+
+def _truncate(value: str, limit: int) -> str:
+    """Cut ``value`` to ``limit`` characters, marking the cut."""
+
+    return value if len(value) <= limit else f"{value[:limit]}{TRUNCATION_MARK}"
+
+
+class _RowPreview:
+    """Description of a row missing in the other file, formatted on demand."""
+
+    __slots__ = ("prefix", "columns", "values")
+
+    def __init__(
+        self, prefix: str, columns: Tuple[str, ...], values: Tuple[str, ...]
+    ) -> None:
+        self.prefix = prefix
+        self.columns = columns
+        self.values = values
+
+    def format(self, max_chars: Optional[int] = None) -> str:
+        """Return the description, cut to ``max_chars`` characters if given.
+
+        A cut description stops formatting at the first column past the limit.
+        """
+
+        parts = []
+        length = 0
+        for column, value in zip(self.columns, self.values):
+            if not value:
+                continue
+            parts.append(f"{column}={value}")
+            length += len(parts[-1]) + 2
+            if max_chars is not None and length > max_chars:
+                break
+        text = ", ".join(parts) if parts else "данные отсутствуют"
+        return f"{self.prefix}{text if max_chars is None else _truncate(text, max_chars)}"
+
+    def __str__(self) -> str:
+        return self.format()
+
+
+RawDifference = Tuple[str, str, Union[str, _RowPreview], Union[str, _RowPreview], str]
+"""Engine-level difference: ``Difference`` fields with lazily built previews."""
+
+
+def _to_difference(raw: RawDifference, composite: bool = False) -> Difference:
+    """Materialize an engine-level difference.
+
+    With ``composite`` keys the engine-level key is split into the cells of
+    the difference and joined with :data:`KEY_DISPLAY_SEPARATOR` for display.
+    """
+
+    key, column, value_a, value_b, difference_type = raw
+    if composite:
+        return Difference(
+            _display_key(key),
+            column,
+            str(value_a),
+            str(value_b),
+            difference_type,
+            tuple(key.split(KEY_SEPARATOR)),
+        )
+    return Difference(key, column, str(value_a), str(value_b), difference_type)
+
+
+def _engine_key(difference: Difference) -> str:
+    """Return the engine-level key of a difference."""
+
+    if difference.key_cells:
+        return KEY_SEPARATOR.join(difference.key_cells)
+    return difference.POLICY_NO
+
+
+class FieldSummary:
+    """Running per-field and per-type difference counts.
+
+    Counts are updated while differences stream by (see :meth:`observe`), so
+    reports and status lines never need another pass over the differences.
+    With ``example_keys`` the smallest that many keys of every field are kept
+    as examples. Summaries of separate comparisons, such as the pairs of a
+    batch comparison, are combined with :meth:`merge`.
+    """
+
+    def __init__(self, example_keys: int = 0) -> None:
+        self.example_keys = max(example_keys, 0)
+        self.counts: Counter = Counter()
+        """Number of differences per ``(column, difference_type)``."""
+        self.examples: Dict[str, List[str]] = {}
+        """Sorted example keys per column."""
+
+    def add(self, key: str, column: str, difference_type: str) -> None:
+        """Count one difference."""
+
+        self.counts[column, difference_type] += 1
+        if self.example_keys:
+            self._add_examples(column, (key,))
+
+    def observe(self, raws: Iterable[RawDifference]) -> Iterator[RawDifference]:
+        """Pass engine-level differences through while counting them."""
+
+        counts = self.counts
+        if not self.example_keys:
+            for raw in raws:
+                counts[raw[1], raw[4]] += 1
+                yield raw
+            return
+        for raw in raws:
+            counts[raw[1], raw[4]] += 1
+            self._add_examples(raw[1], (raw[0],))
+            yield raw
+
+    def merge(self, other: "FieldSummary") -> "FieldSummary":
+        """Add the counts and examples of ``other`` to this summary."""
+
+        self.counts.update(other.counts)
+        if self.example_keys:
+            for column, keys in other.examples.items():
+                self._add_examples(column, keys)
+        return self
+
+    def _add_examples(self, column: str, keys: Iterable[str]) -> None:
+        examples = self.examples.setdefault(column, [])
+        limit = self.example_keys
+        for key in keys:
+            if len(examples) >= limit:
+                if key >= examples[-1]:
+                    continue
+                examples.pop()
+            position = bisect.bisect_left(examples, key)
+            if position == len(examples) or examples[position] != key:
+                examples.insert(position, key)
+
+    @property
+    def total(self) -> int:
+        """Number of counted differences."""
+
+        return sum(self.counts.values())
+
+    def type_counts(self) -> Counter:
+        """Count differences per ``difference_type``."""
+
+        totals: Counter = Counter()
+        for (_, difference_type), count in self.counts.items():
+            totals[difference_type] += count
+        return totals
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, FieldSummary):
+            return NotImplemented
+        return +self.counts == +other.counts and self.examples == other.examples
+
+    __hash__ = None  # type: ignore[assignment]
+
+    def __repr__(self) -> str:
+        return f"<FieldSummary: {self.total} differences in {len(self.counts)} groups>"
+
+
+class DifferenceSet(SequenceABC):
+    """Compact append-only sequence of :class:`Difference` objects.
+
+    Keys, columns, types and cell values are interned in a shared string pool
+    and referenced from typed arrays. Rows missing in one of the files keep
+    references to their cells only; their descriptions are formatted when an
+    item is accessed. Indexing and iteration return :class:`Difference`.
+    :attr:`summary` holds the per-field counts of the stored differences.
+
+    Items are stored with engine-level keys; with :attr:`composite_keys`
+    (set by the comparisons of composite keys and by appending a
+    :class:`Difference` that has ``key_cells``) they are split into the key
+    cells of the returned differences.
+    """
+
+    _PREVIEW_A = 1
+    _PREVIEW_B = 2
+
+    def __init__(
+        self, differences: Iterable[Difference] = (), composite_keys: bool = False
+    ) -> None:
+        self.composite_keys = composite_keys
+        self._strings: List[str] = []
+        self._string_ids: Dict[str, int] = {}
+        self._keys = array("I")
+        self._columns = array("I")
+        self._types = array("I")
+        self._values_a = array("I")
+        self._values_b = array("I")
+        self._flags = array("B")
+        self._layouts: List[Tuple[str, Tuple[str, ...]]] = []
+        self._layout_ids: Dict[Tuple[str, Tuple[str, ...]], int] = {}
+        self._preview_layouts = array("I")
+        self._preview_starts = array("Q", [0])
+        self._preview_cells = array("I")
+        self._summary: Optional[FieldSummary] = None
+        for difference in differences:
+            self.append(difference)
+
+    def _intern(self, value: str) -> int:
+        string_id = self._string_ids.get(value)
+        if string_id is None:
+            string_id = len(self._strings)
+            self._string_ids[value] = string_id
+            self._strings.append(value)
+        return string_id
+
+    def _store_preview(self, preview: _RowPreview) -> int:
+        layout = (preview.prefix, preview.columns)
+        layout_id = self._layout_ids.get(layout)
+        if layout_id is None:
+            layout_id = len(self._layouts)
+            self._layout_ids[layout] = layout_id
+            self._layouts.append(layout)
+        self._preview_layouts.append(layout_id)
+        self._preview_cells.extend(map(self._intern, preview.values))
+        self._preview_starts.append(len(self._preview_cells))
+        return len(self._preview_layouts) - 1
+
+    def _load_preview(self, preview_id: int) -> _RowPreview:
+        prefix, columns = self._layouts[self._preview_layouts[preview_id]]
+        cells = self._preview_cells[
+            self._preview_starts[preview_id] : self._preview_starts[preview_id + 1]
+        ]
+        return _RowPreview(prefix, columns, tuple(self._strings[cell] for cell in cells))
+
+    def append(self, difference: Difference) -> None:
+        """Store a difference."""
+
+        if difference.key_cells:
+            self.composite_keys = True
+        self.append_raw(
+            (
+                _engine_key(difference),
+                difference.column,
+                difference.value_a,
+                difference.value_b,
+                difference.difference_type,
+            )
+        )
+
+    def append_raw(self, raw: RawDifference) -> None:
+        """Store an engine-level difference without formatting its previews."""
+
+        key, column, value_a, value_b, difference_type = raw
+        flags = 0
+        if isinstance(value_a, _RowPreview):
+            flags |= self._PREVIEW_A
+            value_a_id = self._store_preview(value_a)
+        else:
+            value_a_id = self._intern(value_a)
+        if isinstance(value_b, _RowPreview):
+            flags |= self._PREVIEW_B
+            value_b_id = self._store_preview(value_b)
+        else:
+            value_b_id = self._intern(value_b)
+        self._keys.append(self._intern(key))
+        self._columns.append(self._intern(column))
+        self._types.append(self._intern(difference_type))
+        self._values_a.append(value_a_id)
+        self._values_b.append(value_b_id)
+        self._flags.append(flags)
+
+    def extend_raw(self, raws: Iterable[RawDifference]) -> None:
+        """Store several engine-level differences."""
+
+        for raw in raws:
+            self.append_raw(raw)
+
+    def raw(self, index: int) -> RawDifference:
+        """Return the stored item with unformatted row previews."""
+
+        flags = self._flags[index]
+        strings = self._strings
+        value_a_id = self._values_a[index]
+        value_b_id = self._values_b[index]
+        return (
+            strings[self._keys[index]],
+            strings[self._columns[index]],
+            self._load_preview(value_a_id) if flags & self._PREVIEW_A else strings[value_a_id],
+            self._load_preview(value_b_id) if flags & self._PREVIEW_B else strings[value_b_id],
+            strings[self._types[index]],
+        )
+
+    def key_at(self, index: int) -> str:
+        """Return the displayed key of an item without materializing it."""
+
+        key = self._strings[self._keys[index]]
+        return _display_key(key) if self.composite_keys else key
+
+    def iter_raw(self) -> Iterator[RawDifference]:
+        """Iterate over stored items with unformatted row previews."""
+
+        return map(self.raw, range(len(self)))
+
+    @property
+    def summary(self) -> FieldSummary:
+        """Per-field counts of the stored items.
+
+        Comparisons attach the summary they gathered while producing the
+        items; otherwise (or after further appends) it is counted once from
+        the compact arrays without materializing any item.
+        """
+
+        if self._summary is None or self._summary.total != len(self):
+            strings = self._strings
+            summary = FieldSummary()
+            summary.counts.update(
+                {
+                    (strings[column], strings[difference_type]): count
+                    for (column, difference_type), count in Counter(
+                        zip(self._columns, self._types)
+                    ).items()
+                }
+            )
+            self._summary = summary
+        return self._summary
+
+    @summary.setter
+    def summary(self, summary: FieldSummary) -> None:
+        self._summary = summary
+
+    def field_type_counts(self) -> Counter:
+        """Count items per ``(column, difference_type)`` without materializing them."""
+
+        return Counter(self.summary.counts)
+
+    def type_counts(self) -> Counter:
+        """Count items per ``difference_type`` without materializing them."""
+
+        return self.summary.type_counts()
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __getitem__(self, index):  # type: ignore[override]
+        if isinstance(index, slice):
+            return [self[position] for position in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("DifferenceSet index out of range")
+        return _to_difference(self.raw(index), self.composite_keys)
+
+    def __iter__(self) -> Iterator[Difference]:
+        composite = self.composite_keys
+        return (_to_difference(raw, composite) for raw in self.iter_raw())
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, (DifferenceSet, list, tuple)):
+            return NotImplemented
+        return len(self) == len(other) and all(
+            mine == theirs for mine, theirs in zip(self, other)
+        )
+
+    __hash__ = None  # type: ignore[assignment]
+
+    def __repr__(self) -> str:
+        return f"<DifferenceSet: {len(self)} differences>"
+
+
+class CsvComparisonError(Exception):
+    """Custom exception for CSV comparison errors."""
+
+
+class ComparisonCancelled(CsvComparisonError):
+    """Raised when a comparison is stopped through its cancel event."""
+
+
+@dataclass(frozen=True)
+class ComparisonProgress:
+    """Snapshot of a running comparison passed to progress callbacks.
+
+    ``bytes_read`` tracks the progress through the inputs, while
+    ``bytes_scanned`` counts the input bytes actually read before the
+    differences are computed: it equals ``bytes_total`` when every byte is
+    read exactly once, is larger when some input is read again and smaller
+    when a cached incremental index replaces reading.
+    """
+
+    bytes_read: int
+    bytes_total: int
+    rows_read: int
+    rows_compared: int
+    differences_found: int
+    bytes_scanned: int = 0
+
+
+ProgressCallback = Callable[[ComparisonProgress], None]
+
+_PROGRESS_STEP = 4096
+_PROGRESS_INTERVAL = 0.1
+_T = TypeVar("_T")
+
+
+class _Progress:
+    """Throttled progress reporting and cooperative cancellation checks.
+
+    Engines wrap their row streams with :meth:`reading`, :meth:`comparing`
+    and :meth:`differences`, or call :meth:`tick` from their own loops; every
+    tick raises :class:`ComparisonCancelled` once the cancel event is set.
+    The same wrappers (and :meth:`timed`, :meth:`stage` and :meth:`count` for
+    other stages) feed the optional :class:`ComparisonStats`.
+    """
+
+    def __init__(
+        self,
+        callback: Optional[ProgressCallback],
+        cancel_event: Optional[threading.Event],
+        bytes_total: int,
+        summary: Optional[FieldSummary] = None,
+        stats: Optional[ComparisonStats] = None,
+    ) -> None:
+        self._callback = callback
+        self._cancel_event = cancel_event
+        self.enabled = callback is not None or cancel_event is not None
+        self.bytes_total = bytes_total
+        self.bytes_done = 0
+        self.bytes_skipped = 0
+        self.rows_read = 0
+        self.rows_compared = 0
+        self.differences_found = 0
+        self.summary = summary
+        self.stats = stats
+        self._bytes_readers: List[Callable[[], int]] = []
+        self._last_report = 0.0
+        self._stage_bytes = 0
+
+    def add_bytes_reader(self, reader: Callable[[], int]) -> None:
+        """Register a callable returning how many input bytes a reader consumed.
+
+        The callable must keep returning its final count once the reader is
+        closed.
+        """
+
+        self._bytes_readers.append(reader)
+
+    @property
+    def bytes_scanned(self) -> int:
+        """Input bytes read so far, counting every repeated read."""
+
+        return self.bytes_done + sum(reader() for reader in self._bytes_readers)
+
+    @property
+    def bytes_read(self) -> int:
+        return min(self.bytes_scanned + self.bytes_skipped, self.bytes_total)
+
+    def tick(self) -> None:
+        if self._cancel_event is not None and self._cancel_event.is_set():
+            raise ComparisonCancelled("Сравнение отменено пользователем.")
+        if self._callback is not None:
+            now = time.monotonic()
+            if now - self._last_report >= _PROGRESS_INTERVAL:
+                self._last_report = now
+                self.report()
+
+    def finish(self) -> None:
+        """Mark the input as fully read and send the final report."""
+
+        self.bytes_done = self.bytes_scanned
+        self._bytes_readers.clear()
+        self.bytes_skipped = max(self.bytes_total - self.bytes_done, 0)
+        self.report()
+
+    def report(self) -> None:
+        if self._callback is not None:
+            self._callback(
+                ComparisonProgress(
+                    bytes_read=self.bytes_read,
+                    bytes_total=self.bytes_total,
+                    rows_read=self.rows_read,
+                    rows_compared=self.rows_compared,
+                    differences_found=self.differences_found,
+                    bytes_scanned=self.bytes_scanned,
+                )
+            )
+
+    def _counted(self, items: Iterable[_T], counter: str) -> Iterator[_T]:
+        pending = 0
+        for item in items:
+            yield item
+            pending += 1
+            if pending == _PROGRESS_STEP:
+                setattr(self, counter, getattr(self, counter) + pending)
+                pending = 0
+                self.tick()
+        setattr(self, counter, getattr(self, counter) + pending)
+
+    def reading(self, rows: Iterable[_T]) -> Iterable[_T]:
+        """Count rows taken from an input file."""
+
+        rows = self.timed(READ, rows)
+        return self._counted(rows, "rows_read") if self.enabled else rows
+
+    def comparing(self, rows: Iterable[_T]) -> Iterable[_T]:
+        """Count rows consumed by the comparison stage (sorted rows)."""
+
+        rows = self.timed(SORT, rows)
+        return self._counted(rows, "rows_compared") if self.enabled else rows
+
+    def differences(self, raws: Iterable[_T]) -> Iterable[_T]:
+        """Count produced differences."""
+
+        raws = self.timed(DIFF, raws)
+        return self._counted(raws, "differences_found") if self.enabled else raws
+
+    def timed(self, stage: str, items: Iterable[_T]) -> Iterable[_T]:
+        """Attribute the time spent producing ``items`` to a stats stage."""
+
+        return self.stats.timed(stage, items) if self.stats is not None else items
+
+    def stage(self, name: str) -> "ContextManager[Optional[StageStats]]":
+        """Attribute the time spent in a ``with`` block to a stats stage."""
+
+        return self.stats.running(name) if self.stats is not None else nullcontext()
+
+    def count(self, stage: str, rows: int = 0, bytes_read: int = 0) -> None:
+        """Add rows and input bytes handled outside :meth:`timed` to a stage.
+
+        Bytes not counted here are attributed to the ``read`` stage.
+        """
+
+        if self.stats is not None:
+            record = self.stats.stage(stage)
+            record.rows += rows
+            record.bytes_read += bytes_read
+            self._stage_bytes += bytes_read
+
+    def start_stats(self) -> None:
+        if self.stats is not None:
+            self.stats.start()
+
+    def finish_stats(self) -> None:
+        """Stop the stats of a run, finished or not."""
+
+        if self.stats is not None:
+            self.stats.finish({READ: max(self.bytes_scanned - self._stage_bytes, 0)})
+
+    def summarized(self, raws: Iterable[RawDifference]) -> Iterable[RawDifference]:
+        """Count produced differences per field into :attr:`summary`.
+
+        Differences are counted as they are consumed, so a limit applied
+        after this point (``max_differences``) also limits the counts.
+        """
+
+        return self.summary.observe(raws) if self.summary is not None else raws
+
+
+class DuplicateKeysError(CsvComparisonError):
+    """Raised when key values are not unique in one of the compared files."""
+
+    def __init__(
+        self,
+        file_path_a: str,
+        duplicates_a: Sequence[str],
+        file_path_b: str,
+        duplicates_b: Sequence[str],
+    ) -> None:
+        super().__init__(file_path_a, list(duplicates_a), file_path_b, list(duplicates_b))
+        self.file_path_a = file_path_a
+        self.duplicates_a = list(duplicates_a)
+        self.file_path_b = file_path_b
+        self.duplicates_b = list(duplicates_b)
+
+    _SHOWN_DUPLICATES = 20
+
+    def __str__(self) -> str:
+        duplicates_info = []
+        for file_path, duplicates in (
+            (self.file_path_a, self.duplicates_a),
+            (self.file_path_b, self.duplicates_b),
+        ):
+            if not duplicates:
+                continue
+            shown = ", ".join(map(_display_key, duplicates[: self._SHOWN_DUPLICATES]))
+            hidden = len(duplicates) - self._SHOWN_DUPLICATES
+            if hidden > 0:
+                shown = f"{shown} и ещё {hidden}"
+            duplicates_info.append(
+                f"Файл {os.path.basename(file_path)} содержит дубликаты ключей: {shown}"
+            )
+        return "\n".join(duplicates_info)
@@ -0,0 +1,442 @@
+"""Multi-process comparison over key-hash partitions of both files.
+
+The memory limit is shared between the workers, and differences are yielded
+only after every shard is done. Imported only when more than one worker is
+requested.
+"""
+from __future__ import annotations
+
+import csv
+import heapq
+import io
+import itertools
+import os
+import zlib
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from contextlib import ExitStack, closing
+from operator import itemgetter
+from typing import (
+    BinaryIO,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from .inputs import _CsvFormat
+from .merge import _join_sorted_rows, _read_run, _sorted_rows
+from .model import (
+    _PROGRESS_INTERVAL,
+    ComparisonCancelled,
+    DifferenceSet,
+    DuplicateKeysError,
+    RawDifference,
+    _Progress,
+)
+from .previews import PreviewPolicy
+from .rules import ColumnRule
+from .sources import _CsvSource, _iter_rows
+from .stats import READ
+
+
+_PARTITION_SCAN_BLOCK = 1024 * 1024
+_BOUNDARY_PROBE_BLOCK = 8 * 1024
+
+
+class _ByteRange(io.RawIOBase):
+    """Read-only view over ``length`` bytes of a binary file from its position.
+
+    ``quotes`` counts the quote characters read so far.
+    """
+
+    def __init__(self, raw_file: BinaryIO, length: int) -> None:
+        super().__init__()
+        self._file = raw_file
+        self._remaining = length
+        self.quotes = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: bytearray) -> int:
+        size = min(len(buffer), self._remaining)
+        if size <= 0:
+            return 0
+        data = self._file.read(size)
+        self.quotes += data.count(b'"')
+        buffer[: len(data)] = data
+        self._remaining -= len(data)
+        return len(data)
+
+
+def _line_boundaries(file_path: str, parts: int) -> Tuple[List[int], int, int]:
+    """Guess the boundaries of ``parts`` byte ranges of the data rows of a CSV file.
+
+    Every boundary is the first line break after an even split of the file,
+    found by reading only a small block there. A line break inside a quoted
+    field is not a record boundary, so the guess has to be validated with
+    the quote counts of the ranges (see :func:`_partition_range`). Returns
+    ``parts + 1`` ascending offsets, the number of quote characters before
+    the first one (the header) and the number of bytes probed.
+    """
+
+    size = os.path.getsize(file_path)
+    boundaries: List[int] = []
+    header_quotes = 0
+    probed = 0
+    with open(file_path, "rb") as raw_file:
+        for part in range(parts):
+            position = max(size * part // parts, boundaries[-1] if boundaries else 0)
+            raw_file.seek(position)
+            boundary = size
+            while True:
+                block = raw_file.read(_BOUNDARY_PROBE_BLOCK)
+                probed += len(block)
+                newline = block.find(b"\n")
+                if part == 0:
+                    header_quotes += block.count(b'"', 0, newline if newline != -1 else None)
+                if newline != -1:
+                    boundary = position + newline + 1
+                    break
+                if not block:
+                    break
+                position += len(block)
+            boundaries.append(boundary)
+    boundaries.append(size)
+    return boundaries, header_quotes, probed
+
+
+def _boundaries_valid(header_quotes: int, range_quotes: Sequence[int]) -> bool:
+    """Check that no guessed boundary falls inside a quoted field.
+
+    A boundary is outside of quotes when an even number of quote characters
+    precedes it (escaped quotes come in pairs). A negative count marks a
+    range that could not be parsed.
+    """
+
+    if header_quotes % 2 or min(range_quotes, default=0) < 0:
+        return False
+    quotes = header_quotes
+    for count in range_quotes[:-1]:
+        quotes += count
+        if quotes % 2:
+            return False
+    return True
+
+
+def _record_boundaries(file_path: str, parts: int) -> List[int]:
+    """Split the data rows of a CSV file into ``parts`` byte ranges.
+
+    Returns ``parts + 1`` ascending offsets: the first one points right after
+    the header, the last one is the file size. Offsets always fall after a line
+    break that is outside of a quoted field, which is tracked by the parity of
+    quote characters seen so far (escaped quotes come in pairs).
+    """
+
+    size = os.path.getsize(file_path)
+    boundaries: List[int] = []
+    targets = iter([0] + [size * part // parts for part in range(1, parts)])
+    target: Optional[int] = next(targets)
+    in_quotes = False
+    block_start = 0
+    with open(file_path, "rb") as raw_file:
+        while target is not None:
+            block = raw_file.read(_PARTITION_SCAN_BLOCK)
+            if not block:
+                break
+            position = 0
+            while target is not None:
+                search_from = max(target - block_start, position)
+                if search_from >= len(block):
+                    break
+                in_quotes ^= block.count(b'"', position, search_from) % 2 == 1
+                position = search_from
+                newline = block.find(b"\n", position)
+                if newline == -1:
+                    break
+                in_quotes ^= block.count(b'"', position, newline) % 2 == 1
+                position = newline + 1
+                if not in_quotes:
+                    boundaries.append(block_start + position)
+                    target = next(targets, None)
+            in_quotes ^= block.count(b'"', position) % 2 == 1
+            block_start += len(block)
+
+    boundaries.extend([size] * (parts + 1 - len(boundaries)))
+    return boundaries
+
+
+def _partition_range(
+    file_path: str,
+    csv_format: _CsvFormat,
+    start: int,
+    end: int,
+    width: int,
+    key_indexes: Sequence[int],
+    kept: Optional[Sequence[int]],
+    shards: int,
+    output_prefix: str,
+) -> Tuple[List[str], List[int], int]:
+    """Hash-partition the rows stored in ``[start, end)`` of a CSV file.
+
+    The range is decoded and parsed with the ``csv_format`` of the file.
+
+    Records of ``width`` cells are reduced to the ``kept`` cells (all when
+    ``None``), which ``key_indexes`` refer to, before they are written.
+
+    The shard of a row is the CRC-32 of its (composite) key. Rows are
+    written to one run-formatted file per shard; the returned lists of
+    written paths and row counts are indexed by shard number. The last item
+    is the number of quote characters in the range, or ``-1`` when the range
+    does not start at a record boundary and could not be parsed.
+    """
+
+    shard_paths = [f"{output_prefix}_{shard}.csv" for shard in range(shards)]
+    row_counts = [0] * shards
+    with ExitStack() as stack:
+        raw_file = stack.enter_context(open(file_path, "rb"))
+        raw_file.seek(start)
+        byte_range = _ByteRange(raw_file, end - start)
+        text_stream = stack.enter_context(
+            io.TextIOWrapper(
+                io.BufferedReader(byte_range), encoding=csv_format.encoding, newline=""
+            )
+        )
+        writers = [
+            csv.writer(stack.enter_context(open(path, "w", encoding="utf-8", newline="")))
+            for path in shard_paths
+        ]
+        try:
+            for key, values in _iter_rows(
+                csv.reader(text_stream, delimiter=csv_format.delimiter),
+                width,
+                key_indexes,
+                kept,
+            ):
+                shard = zlib.crc32(key.encode("utf-8")) % shards
+                writers[shard].writerow([key, *values])
+                row_counts[shard] += 1
+        except (csv.Error, UnicodeDecodeError):
+            return shard_paths, row_counts, -1
+    return shard_paths, row_counts, byte_range.quotes
+
+
+def _compare_partition(
+    part_paths_a: Sequence[str],
+    part_paths_b: Sequence[str],
+    positions_a: Dict[str, int],
+    positions_b: Dict[str, int],
+    key_fields: Sequence[str],
+    duplicates: str,
+    rules: Mapping[str, ColumnRule],
+    preview: PreviewPolicy,
+    file_path_a: str,
+    file_path_b: str,
+    memory_limit: int,
+    work_dir: str,
+) -> Tuple[DifferenceSet, List[str], List[str]]:
+    """Compare one shard pair; return its differences and duplicate keys.
+
+    Shard files are chained in file order, so the stable sort keeps repeated
+    keys in their file order as the duplicate policies expect.
+    """
+
+    with ExitStack() as stack:
+        rows_a = itertools.chain.from_iterable(
+            _read_run(stack.enter_context(open(path, "r", encoding="utf-8", newline="")))
+            for path in part_paths_a
+        )
+        rows_b = itertools.chain.from_iterable(
+            _read_run(stack.enter_context(open(path, "r", encoding="utf-8", newline="")))
+            for path in part_paths_b
+        )
+        half_limit = max(memory_limit // 2, 1)
+        sorted_a = stack.enter_context(closing(_sorted_rows(rows_a, half_limit, work_dir)))
+        sorted_b = stack.enter_context(closing(_sorted_rows(rows_b, half_limit, work_dir)))
+        joined = _join_sorted_rows(
+            sorted_a,
+            sorted_b,
+            positions_a,
+            positions_b,
+            key_fields,
+            file_path_a,
+            file_path_b,
+            duplicates,
+            rules,
+            preview=preview,
+        )
+        try:
+            differences = DifferenceSet()
+            differences.extend_raw(joined)
+        except DuplicateKeysError as error:
+            return DifferenceSet(), error.duplicates_a, error.duplicates_b
+    return differences, [], []
+
+
+def _iter_parallel_differences(
+    source_a: "_CsvSource",
+    source_b: "_CsvSource",
+    key_fields: Sequence[str],
+    duplicates: str,
+    rules: Mapping[str, ColumnRule],
+    preview: PreviewPolicy,
+    workers: int,
+    memory_limit: int,
+    work_dir: str,
+    progress: _Progress,
+) -> Iterator[RawDifference]:
+    """Compare two files on ``workers`` processes over key-hash partitions.
+
+    Both files are cut into ``workers`` byte ranges that are hash-partitioned
+    by key in parallel; every shard pair is then sorted and merge-joined by its
+    own process and the per-shard results, which cover disjoint key sets, are
+    merged back into global key order.
+    """
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        try:
+            results = _run_parallel_jobs(
+                executor,
+                source_a,
+                source_b,
+                key_fields,
+                duplicates,
+                rules,
+                preview,
+                workers,
+                memory_limit,
+                work_dir,
+                progress,
+            )
+        except ComparisonCancelled:
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+
+    duplicates_a = sorted(itertools.chain.from_iterable(result[1] for result in results))
+    duplicates_b = sorted(itertools.chain.from_iterable(result[2] for result in results))
+    if duplicates_a or duplicates_b:
+        raise DuplicateKeysError(
+            source_a.file_path, duplicates_a, source_b.file_path, duplicates_b
+        )
+    yield from heapq.merge(
+        *(result[0].iter_raw() for result in results), key=itemgetter(0)
+    )
+
+
+def _wait_for_jobs(
+    jobs: Sequence[Future],
+    progress: _Progress,
+    on_done: Callable[[Future], None],
+) -> None:
+    """Wait for pool jobs while reporting progress and checking for cancel."""
+
+    pending = set(jobs)
+    while pending:
+        done, pending = wait(pending, timeout=_PROGRESS_INTERVAL, return_when=FIRST_COMPLETED)
+        for job in done:
+            on_done(job)
+        progress.tick()
+
+
+def _run_parallel_jobs(
+    executor: ProcessPoolExecutor,
+    source_a: "_CsvSource",
+    source_b: "_CsvSource",
+    key_fields: Sequence[str],
+    duplicates: str,
+    rules: Mapping[str, ColumnRule],
+    preview: PreviewPolicy,
+    workers: int,
+    memory_limit: int,
+    work_dir: str,
+    progress: _Progress,
+) -> List[Tuple[DifferenceSet, List[str], List[str]]]:
+    """Run the partition and compare stages of :func:`_iter_parallel_differences`."""
+
+    range_sizes: Dict[Future, int] = {}
+
+    def partition(
+        label: str, source: "_CsvSource", boundaries: Sequence[int]
+    ) -> List[Future]:
+        jobs = []
+        for part, (start, end) in enumerate(zip(boundaries, boundaries[1:])):
+            job = executor.submit(
+                _partition_range,
+                source.file_path,
+                source.csv_format,
+                start,
+                end,
+                source.record_width,
+                source.key_indexes,
+                source.kept,
+                workers,
+                os.path.join(work_dir, f"{label}{part}"),
+            )
+            range_sizes[job] = end - start
+            jobs.append(job)
+        return jobs
+
+    def partition_done(job: Future) -> None:
+        progress.bytes_done += range_sizes[job]
+        progress.rows_read += sum(job.result()[1])
+
+    # Partition from guessed line boundaries so that each input byte is read
+    # once; a file whose guess split a quoted field is partitioned again from
+    # boundaries found by a full quote-aware scan.
+    sources = {"a": source_a, "b": source_b}
+    partition_jobs: Dict[str, List[Future]] = {}
+    header_quotes: Dict[str, int] = {}
+    with progress.stage(READ):
+        for label, source in sources.items():
+            progress.add_bytes_reader(source.bytes_read)
+            boundaries, header_quotes[label], probed = _line_boundaries(
+                source.file_path, workers
+            )
+            progress.bytes_done += probed
+            partition_jobs[label] = partition(label, source, boundaries)
+        _wait_for_jobs(partition_jobs["a"] + partition_jobs["b"], progress, partition_done)
+
+        for label, source in sources.items():
+            jobs = partition_jobs[label]
+            if _boundaries_valid(header_quotes[label], [job.result()[2] for job in jobs]):
+                continue
+            progress.rows_read -= sum(sum(job.result()[1]) for job in jobs)
+            boundaries = _record_boundaries(source.file_path, workers)
+            progress.bytes_done += os.path.getsize(source.file_path)
+            partition_jobs[label] = partition(label, source, boundaries)
+            _wait_for_jobs(partition_jobs[label], progress, partition_done)
+    progress.count(READ, rows=progress.rows_read)
+
+    shards_a = [job.result()[:2] for job in partition_jobs["a"]]
+    shards_b = [job.result()[:2] for job in partition_jobs["b"]]
+
+    shard_memory_limit = max(memory_limit // workers, 2)
+    compare_jobs = [
+        executor.submit(
+            _compare_partition,
+            [paths[shard] for paths, _ in shards_a],
+            [paths[shard] for paths, _ in shards_b],
+            source_a.positions,
+            source_b.positions,
+            key_fields,
+            duplicates,
+            rules,
+            preview,
+            source_a.file_path,
+            source_b.file_path,
+            shard_memory_limit,
+            work_dir,
+        )
+        for shard in range(workers)
+    ]
+
+    def compare_done(job: Future) -> None:
+        shard = compare_jobs.index(job)
+        progress.rows_compared += sum(counts[shard] for _, counts in shards_a + shards_b)
+
+    _wait_for_jobs(compare_jobs, progress, compare_done)
+    return [job.result() for job in compare_jobs]
@@ -0,0 +1,94 @@
+"""How rows missing in the other file and long cell values are reported.
+
+A missing row is described by a preview of its compared cells. By default the
+preview covers every compared column and keeps the cells until it is
+formatted, which for extracts with hundreds of columns and many missing rows
+is the main memory cost of a comparison. A :class:`PreviewPolicy` trades that
+detail for memory and speed: previews limited to their first columns or to a
+number of characters, no previews at all, and cell values cut to a maximum
+length. The policy is applied by the engines, so :class:`Difference` values,
+result stores, the GUI table and detailed reports all show the same text.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Optional, Union
+
+from .model import CsvComparisonError
+
+PREVIEW_FULL = "full"
+"""Text form of the default policy: full previews, values not truncated."""
+
+PREVIEW_OFF = "off"
+"""Text form of the policy that keeps no cells of missing rows."""
+
+
+@dataclass(frozen=True)
+class PreviewPolicy:
+    """How much of a missing row, and of a long cell value, is kept.
+
+    ``columns`` limits previews of missing rows to their first that many
+    columns (``0`` keeps no cells: the row is then found in its file by
+    key); ``max_chars`` formats every preview right away and cuts it to that
+    many characters, so only the short text is stored; ``value_chars`` cuts
+    longer cell values of mismatches and previews. Cut text ends with
+    :data:`~csv_checker.model.TRUNCATION_MARK`. ``None`` means no limit.
+    """
+
+    columns: Optional[int] = None
+    max_chars: Optional[int] = None
+    value_chars: Optional[int] = None
+
+    def __post_init__(self) -> None:
+        if self.columns is not None and self.columns < 0:
+            raise CsvComparisonError("Число столбцов описания не может быть отрицательным.")
+        for limit in (self.max_chars, self.value_chars):
+            if limit is not None and limit < 1:
+                raise CsvComparisonError("Предел длины должен быть положительным числом.")
+
+    @property
+    def enabled(self) -> bool:
+        """Whether missing rows keep any of their cells."""
+
+        return self.columns != 0
+
+
+def parse_preview_policy(text: str) -> PreviewPolicy:
+    """Parse the text form of a :class:`PreviewPolicy`.
+
+    ``full`` is the default policy and ``off`` keeps no cells of missing
+    rows; otherwise comma separated limits ``columns=K``, ``chars=N`` and
+    ``values=N`` are combined, e.g. ``columns=20,values=200`` or
+    ``off,values=1000``.
+    """
+
+    limits = {"columns": None, "chars": None, "values": None}
+    for option in (part.strip() for part in text.split(",")):
+        if option == PREVIEW_FULL or not option:
+            continue
+        if option == PREVIEW_OFF:
+            limits["columns"] = 0
+            continue
+        name, separator, value = option.partition("=")
+        if not separator or name.strip() not in limits:
+            raise CsvComparisonError(
+                f"Неизвестный параметр '{option}' в описании строк '{text}'. "
+                f"Доступны: {PREVIEW_FULL}, {PREVIEW_OFF}, columns=K, chars=N, values=N."
+            )
+        try:
+            limits[name.strip()] = int(value)
+        except ValueError as error:
+            raise CsvComparisonError(
+                f"Неверное число '{option}' в описании строк '{text}'."
+            ) from error
+    return PreviewPolicy(limits["columns"], limits["chars"], limits["values"])
+
+
+def _preview_policy(preview: Union[PreviewPolicy, str, None]) -> PreviewPolicy:
+    """Accept a policy, its text form or ``None`` (the default policy)."""
+
+    if preview is None:
+        return PreviewPolicy()
+    if isinstance(preview, str):
+        return parse_preview_policy(preview)
+    return preview
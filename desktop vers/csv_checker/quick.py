@@ -0,0 +1,300 @@
+"""Quick checks: are two inputs identical, and if not, roughly how different?
+
+:func:`quick_check` first compares the inputs byte by byte, stopping at the
+first differing chunk, so identical files are confirmed in I/O-bound time.
+Otherwise it compares a sample of keys. Every key is hashed and each file
+keeps the ``sample_size`` rows with the largest hashes; the keys above both
+files' thresholds form a coordinated sample: a key sampled in one file is
+sampled in the other one too, so missing rows and cell mismatches are
+estimated without sorting or joining the whole files.
+"""
+from __future__ import annotations
+
+import hashlib
+import heapq
+import math
+import os
+import threading
+from collections import Counter
+from contextlib import ExitStack, closing
+from dataclasses import dataclass, field
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple, Union
+
+from .engine import DUPLICATE_POLICIES, _CompareOptions, _resolve_rules
+from .inputs import (
+    INPUT_BUFFER_SIZE,
+    InputSource,
+    _input_size,
+    _is_path,
+    _open_input,
+    _plain_path,
+)
+from .merge import _join_sorted_rows
+from .model import VALUE_MISMATCH, CsvComparisonError, ProgressCallback, _Progress
+from .rules import ColumnRule, _column_rule
+from .sources import (
+    KeyFields,
+    SortedRow,
+    _iter_records,
+    _key_fields,
+    _key_positions,
+    _record_header,
+    _record_key_getter,
+    _RecordParser,
+)
+
+DEFAULT_SAMPLE_SIZE = 10_000
+"""Rows kept from each file by :func:`quick_check` by default."""
+
+MISSING_ROWS_COLUMN = "__missing__"
+"""Column of :attr:`QuickCheckResult.columns` estimating missing rows."""
+
+
+@dataclass(frozen=True)
+class MismatchEstimate:
+    """Share of sampled rows that differ, with a confidence interval.
+
+    ``mismatches`` of ``sampled`` rows differ; ``low`` and ``high`` bound the
+    share over all rows (a Wilson score interval). When the sample covers
+    every row the share is exact and both bounds equal ``rate``.
+    """
+
+    mismatches: int
+    sampled: int
+    rate: float
+    low: float
+    high: float
+
+    @classmethod
+    def of(cls, mismatches: int, sampled: int, z: float, exact: bool) -> "MismatchEstimate":
+        if not sampled:
+            return cls(0, 0, 0.0, 0.0, 0.0 if exact else 1.0)
+        rate = mismatches / sampled
+        if exact:
+            return cls(mismatches, sampled, rate, rate, rate)
+        z2 = z * z
+        scale = 1 + z2 / sampled
+        center = (rate + z2 / (2 * sampled)) / scale
+        half = z * math.sqrt(rate * (1 - rate) / sampled + z2 / (4 * sampled * sampled)) / scale
+        return cls(mismatches, sampled, rate, max(center - half, 0.0), min(center + half, 1.0))
+
+
+@dataclass(frozen=True)
+class QuickCheckResult:
+    """Outcome of :func:`quick_check`.
+
+    ``identical`` is true when the inputs have the same bytes; nothing was
+    sampled then. Otherwise ``rows`` estimates the share of keys whose rows
+    differ in any way (among ``sample_keys`` keys sampled from both files)
+    and ``columns`` the share per column: value mismatches among keys present
+    in both files and, under :data:`MISSING_ROWS_COLUMN`, rows present in one
+    file only. ``exact`` means every row was compared.
+    """
+
+    identical: bool
+    exact: bool
+    confidence: float
+    sample_keys: int = 0
+    rows: MismatchEstimate = MismatchEstimate(0, 0, 0.0, 0.0, 0.0)
+    columns: Dict[str, MismatchEstimate] = field(default_factory=dict)
+
+    @property
+    def has_differences(self) -> bool:
+        """Whether a difference was seen (in the bytes or in the sample)."""
+
+        return not self.identical and self.rows.mismatches > 0
+
+
+def _same_bytes(
+    file_path_a: InputSource, file_path_b: InputSource, progress: _Progress
+) -> bool:
+    """Compare two inputs chunk by chunk, stopping at the first difference."""
+
+    plain_a, plain_b = _plain_path(file_path_a), _plain_path(file_path_b)
+    if plain_a is not None and plain_b is not None:
+        if not (os.path.isfile(plain_a) and os.path.isfile(plain_b)):
+            return False
+        if os.path.samefile(plain_a, plain_b):
+            return True
+        if os.path.getsize(plain_a) != os.path.getsize(plain_b):
+            return False
+    with ExitStack() as stack:
+        input_a = stack.enter_context(closing(_open_input(file_path_a)))
+        input_b = stack.enter_context(closing(_open_input(file_path_b)))
+        progress.add_bytes_reader(input_a.position)
+        progress.add_bytes_reader(input_b.position)
+        read_a, read_b = input_a.stream.read, input_b.stream.read
+        while True:
+            chunk_a = read_a(INPUT_BUFFER_SIZE)
+            if chunk_a != read_b(INPUT_BUFFER_SIZE):
+                return False
+            if not chunk_a:
+                return True
+            progress.tick()
+
+
+class _KeySample:
+    """The rows of an input with the ``sample_size`` largest key hashes.
+
+    Records are scanned as raw bytes and only the key is decoded, so a row
+    is parsed into cells only when it ends up in the compared sample.
+    """
+
+    def __init__(
+        self,
+        file_path: str,
+        key_fields: Sequence[str],
+        sample_size: int,
+        progress: _Progress,
+    ) -> None:
+        opened = _open_input(file_path)
+        with closing(opened):
+            self.file_path = opened.name
+            progress.add_bytes_reader(opened.position)
+            csv_format = opened.detect_format()
+            records = _iter_records(opened.stream.readline, csv_format)
+            header = _record_header(records, csv_format)
+            self.positions: Dict[str, int]
+            self.positions, key_indexes = _key_positions(header, key_fields, self.file_path)
+            self.width = len(header)
+            self._parser = _RecordParser(csv_format, self.width)
+            self.dropped = False
+            key_of = _record_key_getter(key_indexes, csv_format)
+
+            # A min-heap of (key hash, row number, key, raw record); hashes
+            # are compared as digest bytes.
+            heap: List[Tuple[bytes, int, str, bytes]] = []
+            push, replace, blake2b = heapq.heappush, heapq.heapreplace, hashlib.blake2b
+            for number, (_, data) in enumerate(progress.reading(records)):
+                key = key_of(data)
+                if key is None:
+                    continue
+                digest = blake2b(key.encode("utf-8"), digest_size=8).digest()
+                if len(heap) < sample_size:
+                    push(heap, (digest, number, key, data))
+                elif digest > heap[0][0]:
+                    replace(heap, (digest, number, key, data))
+                    self.dropped = True
+                else:
+                    self.dropped = True
+        self._heap = heap
+
+    @property
+    def threshold(self) -> bytes:
+        """The smallest sampled key hash, or ``b""`` when no row was dropped."""
+
+        return self._heap[0][0] if self.dropped else b""
+
+    def rows(self, threshold: bytes) -> List[SortedRow]:
+        """Parse the rows hashed at least ``threshold`` in key and file order."""
+
+        records = sorted(
+            (key, number, data)
+            for digest, number, key, data in self._heap
+            if digest >= threshold
+        )
+        return [(key, self._parser.values(data)) for key, _, data in records]
+
+
+def quick_check(
+    file_path_a: InputSource,
+    file_path_b: InputSource,
+    key_field: KeyFields = "POLICY_NO",
+    *,
+    sample_size: int = DEFAULT_SAMPLE_SIZE,
+    confidence: float = 0.95,
+    duplicates: str = "fail",
+    rules: Optional[Mapping[str, Union[ColumnRule, str]]] = None,
+    infer_types: bool = False,
+    progress: Optional[ProgressCallback] = None,
+    cancel_event: Optional[threading.Event] = None,
+) -> QuickCheckResult:
+    """Tell whether two CSV files are identical or estimate how they differ.
+
+    Identical inputs are recognized by comparing their bytes, which stops at
+    the first differing chunk. Different inputs are compared on a sample of
+    about ``sample_size`` keys chosen by a hash of the key, so the same keys
+    are sampled from both files and repeated checks give the same answer;
+    every row is scanned once, but only sampled rows are parsed and compared.
+    Estimates come with ``confidence`` level Wilson intervals and are exact
+    when neither file has more than ``sample_size`` rows. ``duplicates``,
+    ``rules`` and ``infer_types`` apply to the sampled rows as in
+    :func:`compare_csv_files`; files equal in content but not in bytes (for
+    example with other line endings) are reported as not identical with no
+    sampled differences.
+
+    Inputs may be plain, compressed or zipped files (see
+    :func:`iter_differences`); streams cannot be read twice and are rejected.
+    """
+
+    if not (_is_path(file_path_a) and _is_path(file_path_b)):
+        raise CsvComparisonError("Быстрая проверка доступна только для файлов, а не для потоков.")
+    if sample_size < 1:
+        raise CsvComparisonError("Размер выборки должен быть положительным числом.")
+    if not 0 < confidence < 1:
+        raise CsvComparisonError("Доверительная вероятность должна быть между 0 и 1.")
+    if duplicates not in DUPLICATE_POLICIES:
+        raise CsvComparisonError(
+            f"Неизвестная политика дубликатов '{duplicates}'. "
+            f"Доступны: {', '.join(DUPLICATE_POLICIES)}."
+        )
+    file_path_a, file_path_b = os.fspath(file_path_a), os.fspath(file_path_b)
+    key_fields = _key_fields(key_field)
+    run = _Progress(
+        progress, cancel_event, _input_size(file_path_a) + _input_size(file_path_b)
+    )
+    run.tick()
+    if _same_bytes(file_path_a, file_path_b, run):
+        run.finish()
+        return QuickCheckResult(identical=True, exact=True, confidence=confidence)
+
+    options = _CompareOptions(key_field=key_fields, rules=rules, infer_types=infer_types)
+    column_rules = _resolve_rules(file_path_a, file_path_b, options, run)
+    sample_a = _KeySample(file_path_a, key_fields, sample_size, run)
+    sample_b = _KeySample(file_path_b, key_fields, sample_size, run)
+    threshold = max(sample_a.threshold, sample_b.threshold)
+    rows_a = sample_a.rows(threshold)
+    rows_b = sample_b.rows(threshold)
+    differences = _join_sorted_rows(
+        run.comparing(rows_a),
+        run.comparing(rows_b),
+        sample_a.positions,
+        sample_b.positions,
+        key_fields,
+        sample_a.file_path,
+        sample_b.file_path,
+        duplicates,
+        column_rules,
+    )
+    counts: Counter = Counter()
+    differing = set()
+    for key, column, _, _, difference_type in run.differences(differences):
+        counts[column if difference_type == VALUE_MISMATCH else MISSING_ROWS_COLUMN] += 1
+        differing.add(key)
+    run.finish()
+
+    from statistics import NormalDist
+
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    exact = not (sample_a.dropped or sample_b.dropped)
+    keys_a = {key for key, _ in rows_a}
+    keys_b = {key for key, _ in rows_b}
+    paired = len(keys_a & keys_b)
+    sample_keys = len(keys_a | keys_b)
+    columns = {
+        column: MismatchEstimate.of(counts[column], paired, z, exact)
+        for column in sorted(set(sample_a.positions) | set(sample_b.positions))
+        if column not in key_fields
+        and getattr(_column_rule(column_rules, column), "kind", None) != "ignore"
+    }
+    columns[MISSING_ROWS_COLUMN] = MismatchEstimate.of(
+        counts[MISSING_ROWS_COLUMN], sample_keys, z, exact
+    )
+    return QuickCheckResult(
+        identical=False,
+        exact=exact,
+        confidence=confidence,
+        sample_keys=sample_keys,
+        rows=MismatchEstimate.of(len(differing), sample_keys, z, exact),
+        columns=columns,
+    )
@@ -0,0 +1,112 @@
+"""Per-field summaries of comparison results and their CSV export."""
+from __future__ import annotations
+
+import csv
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Tuple, Union
+
+from .model import (
+    MISSING_IN_A,
+    MISSING_IN_B,
+    VALUE_MISMATCH,
+    CsvComparisonError,
+    Difference,
+    DifferenceSet,
+    FieldSummary,
+    _display_key,
+)
+
+
+FIELD_REPORT_HEADERS = (
+    "Поле",
+    "Всего расхождений",
+    "Несовпадений значений",
+    "Отсутствует в файле 1",
+    "Отсутствует в файле 2",
+)
+FIELD_REPORT_EXAMPLES_HEADER = "Примеры ключей"
+"""Extra report column filled when the summary keeps example keys."""
+
+_MISSING_ROW_FIELD = "Строка отсутствует"
+
+
+def summarize_differences_by_field(
+    differences: Union[Sequence[Difference], FieldSummary],
+) -> List[Dict[str, str]]:
+    """Group differences by column and return rows for report generation.
+
+    A :class:`FieldSummary` (or the summary a :class:`DifferenceSet` carries)
+    is used as is, without another pass over the differences; its example
+    keys, if any, fill the :data:`FIELD_REPORT_EXAMPLES_HEADER` column.
+    """
+
+    if isinstance(differences, DifferenceSet):
+        differences = differences.summary
+    if isinstance(differences, FieldSummary):
+        return _summarize_field_counts(differences.counts, differences.examples)
+    return _summarize_field_counts(
+        Counter((diff.column, diff.difference_type) for diff in differences)
+    )
+
+
+def _summarize_field_counts(
+    counts: Mapping[Tuple[str, str], int],
+    examples: Optional[Mapping[str, Iterable[str]]] = None,
+) -> List[Dict[str, str]]:
+    """Build report rows from difference counts keyed by ``(column, type)``."""
+
+    summary: Dict[str, Counter] = defaultdict(Counter)
+    for (column, difference_type), count in counts.items():
+        if count:
+            summary[_field_name(column)][difference_type] += count
+    field_examples: Dict[str, List[str]] = defaultdict(list)
+    for column, keys in (examples or {}).items():
+        field_examples[_field_name(column)].extend(map(_display_key, keys))
+
+    report_rows: List[Dict[str, str]] = []
+    for field_name in sorted(summary.keys()):
+        counts = summary[field_name]
+        total = sum(counts.values())
+        report_rows.append(
+            {
+                FIELD_REPORT_HEADERS[0]: field_name,
+                FIELD_REPORT_HEADERS[1]: str(total),
+                FIELD_REPORT_HEADERS[2]: str(counts.get(VALUE_MISMATCH, 0)),
+                FIELD_REPORT_HEADERS[3]: str(counts.get(MISSING_IN_A, 0)),
+                FIELD_REPORT_HEADERS[4]: str(counts.get(MISSING_IN_B, 0)),
+            }
+        )
+        if examples:
+            report_rows[-1][FIELD_REPORT_EXAMPLES_HEADER] = "; ".join(
+                field_examples.get(field_name, ())
+            )
+    return report_rows
+
+
+def _field_name(column: str) -> str:
+    return column if column != "__missing__" else _MISSING_ROW_FIELD
+
+
+def write_field_report(
+    differences: Union[Sequence[Difference], FieldSummary],
+    output_path: str,
+) -> None:
+    """Persist aggregated difference information to CSV.
+
+    ``differences`` may also be a :class:`FieldSummary` gathered while
+    streaming, see :func:`summarize_differences_by_field`.
+    """
+
+    _write_report_rows(summarize_differences_by_field(differences), output_path)
+
+
+def _write_report_rows(report_rows: List[Dict[str, str]], output_path: str) -> None:
+    if not output_path:
+        raise CsvComparisonError("Не указан путь для сохранения отчёта.")
+    if not report_rows:
+        raise CsvComparisonError("Отчёт нельзя сохранить: различия отсутствуют.")
+
+    with open(output_path, "w", encoding="utf-8", newline="") as csv_file:
+        writer = csv.DictWriter(csv_file, fieldnames=list(report_rows[0]))
+        writer.writeheader()
+        writer.writerows(report_rows)
@@ -0,0 +1,182 @@
+"""Tk-independent model of the virtualized results table shown by the GUI."""
+from __future__ import annotations
+
+from array import array
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .model import Difference, RawDifference
+
+
+_TREE_FIELDS = {
+    "POLICY_NO": 0,
+    "column": 1,
+    "value_a": 2,
+    "value_b": 3,
+    "difference": 4,
+}
+# Tree columns as fields of ResultStore.query.
+_QUERY_FIELDS = {
+    "POLICY_NO": "key",
+    "column": "column",
+    "value_a": "value_a",
+    "value_b": "value_b",
+    "difference": "difference_type",
+}
+
+
+class _ResultsWindow:
+    """Slice of comparison results shown by the GUI, independent of Tk.
+
+    Only ``size`` rows starting at ``offset`` are displayed; an optional
+    ``order`` permutation maps view positions to indexes of ``differences``.
+    It is built by :meth:`sort_by` and :meth:`filter`, in SQLite when the
+    results are a :class:`~csv_checker.store.ResultStore`.
+    """
+
+    def __init__(self, differences: Sequence[Difference], size: int = 30) -> None:
+        self.differences = differences
+        self.size = max(size, 1)
+        self.offset = 0
+        self.order: Optional[array] = None
+        self.sort_field = "POLICY_NO"
+        self.descending = False
+        self.filters: Dict[str, Optional[str]] = {
+            "column": None,
+            "difference_type": None,
+            "key_prefix": None,
+        }
+
+    @property
+    def total(self) -> int:
+        return len(self.order) if self.order is not None else len(self.differences)
+
+    def index_at(self, position: int) -> int:
+        """Return the index in ``differences`` shown at a view position."""
+
+        return self.order[position] if self.order is not None else position
+
+    def visible_positions(self) -> range:
+        return range(self.offset, min(self.offset + self.size, self.total))
+
+    def resize(self, size: int) -> None:
+        self.size = max(size, 1)
+        self.scroll_to(self.offset)
+
+    def scroll_to(self, position: int) -> None:
+        self.offset = max(0, min(position, self.total - self.size))
+
+    def scroll_by(self, rows: int) -> None:
+        self.scroll_to(self.offset + rows)
+
+    def scroll_to_fraction(self, fraction: float) -> None:
+        self.scroll_to(int(fraction * self.total))
+
+    def fractions(self) -> Tuple[float, float]:
+        """Return the visible part of the results as scrollbar fractions."""
+
+        if not self.total:
+            return 0.0, 1.0
+        return self.offset / self.total, min(self.offset + self.size, self.total) / self.total
+
+    def _raw(self, index: int) -> RawDifference:
+        raw = getattr(self.differences, "raw", None)
+        if raw is not None:
+            return raw(index)
+        diff = self.differences[index]
+        return (diff.POLICY_NO, diff.column, diff.value_a, diff.value_b, diff.difference_type)
+
+    def _key(self, index: int) -> str:
+        key_at = getattr(self.differences, "key_at", None)
+        if key_at is not None:
+            return key_at(index)
+        return self.differences[index].POLICY_NO
+
+    def sort_by(self, field: str) -> None:
+        """Order the view by a tree column; repeated calls flip the direction."""
+
+        self.descending = self.sort_field == field and not self.descending
+        self.sort_field = field
+        self._refresh()
+
+    def filter(
+        self,
+        column: Optional[str] = None,
+        difference_type: Optional[str] = None,
+        key_prefix: Optional[str] = None,
+    ) -> None:
+        """Show only the rows of ``column``, of ``difference_type`` and with
+        keys starting with ``key_prefix``; ``None`` or ``""`` drops a filter."""
+
+        self.filters = {
+            "column": column or None,
+            "difference_type": difference_type or None,
+            "key_prefix": key_prefix or None,
+        }
+        self._refresh()
+
+    def _refresh(self) -> None:
+        """Rebuild ``order`` for the current filters and sort field."""
+
+        filtered = any(self.filters.values())
+        query = getattr(self.differences, "query", None)
+        if query is not None and (filtered or self.sort_field != "POLICY_NO"):
+            self.order = query(
+                **self.filters,
+                order_by=_QUERY_FIELDS[self.sort_field],
+                descending=self.descending,
+            )
+        elif filtered:
+            indexes = [
+                index for index in range(len(self.differences)) if self._matches(index)
+            ]
+            if self.sort_field != "POLICY_NO":
+                indexes = self._sorted(indexes)
+            elif self.descending:
+                indexes.reverse()
+            self.order = array("I", indexes)
+        elif self.sort_field != "POLICY_NO":
+            self.order = array("I", self._sorted(range(len(self.differences))))
+        elif self.descending:
+            self.order = array("I", range(len(self.differences) - 1, -1, -1))
+        else:
+            self.order = None
+        self.scroll_to(0)
+
+    def _matches(self, index: int) -> bool:
+        _, column, _, _, difference_type = self._raw(index)
+        key = self._key(index)
+        filters = self.filters
+        return (
+            (filters["column"] is None or column == filters["column"])
+            and (
+                filters["difference_type"] is None
+                or difference_type == filters["difference_type"]
+            )
+            and (filters["key_prefix"] is None or key.startswith(filters["key_prefix"]))
+        )
+
+    def _sorted(self, indexes: Iterable[int]) -> List[int]:
+        field_position = _TREE_FIELDS[self.sort_field]
+        return sorted(
+            indexes,
+            key=lambda index: str(self._raw(index)[field_position]),
+            reverse=self.descending,
+        )
+
+    def find_key(self, key: str) -> Optional[int]:
+        """Return the view position of the first row whose key starts with
+        ``key`` (or, in key order, the first key not less than it)."""
+
+        if self.sort_field == "POLICY_NO" and not self.descending:
+            low, high = 0, self.total
+            while low < high:
+                middle = (low + high) // 2
+                if self._key(self.index_at(middle)) < key:
+                    low = middle + 1
+                else:
+                    high = middle
+            return low if low < self.total else None
+        for position in range(self.total):
+            if self._key(self.order[position]).startswith(key):
+                return position
+        return None
@@ -0,0 +1,281 @@
+"""Per-column comparison rules and their compiled equivalence checks.
+
+Engines compare cells as strings first; a column rule is consulted only for
+cells whose strings differ, so equal cells never pay for parsing. Rules are
+compiled once per comparison into plain functions, and inferred column types
+come from a sample of the inputs rather than from every row.
+"""
+from __future__ import annotations
+
+import csv
+import decimal
+import itertools
+import os
+import re
+from contextlib import closing
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+from .inputs import InputSource, _is_path, _open_text, _split_member
+from .model import CsvComparisonError
+
+RULE_KINDS = ("text", "number", "date", "ignore")
+
+DATE_FORMATS = (
+    "%Y-%m-%d",
+    "%d.%m.%Y",
+    "%d/%m/%Y",
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%dT%H:%M:%S",
+    "%d.%m.%Y %H:%M:%S",
+)
+"""Date formats tried when ``date`` rules are inferred or given no formats."""
+
+_INFERENCE_SAMPLE_ROWS = 1000
+_NUMBER_PATTERN = re.compile(r"[+-]?(?:\d+(?:[.,]\d*)?|[.,]\d+)(?:[eE][+-]?\d+)?")
+_THOUSANDS_PATTERN = re.compile(r"[+-]?\d{1,3}(?:,\d{3})+")
+_LEADING_ZERO_PATTERN = re.compile(r"[+-]?0\d")
+_INTEGER_PATTERN = re.compile(r"[+-]?\d+")
+_IDENTIFIER_DIGITS = 15
+_TOLERANCE_CONTEXT = decimal.Context(prec=100, Emax=decimal.MAX_EMAX, Emin=decimal.MIN_EMIN)
+
+Equivalence = Callable[[str, str], bool]
+
+
+@dataclass(frozen=True)
+class ColumnRule:
+    """How the cells of a column are compared.
+
+    ``kind`` is ``"text"`` (optionally ignoring surrounding whitespace with
+    ``strip`` and letter case with ``ignore_case``), ``"number"`` (exact
+    decimals, equal within ``abs_tol`` or ``rel_tol``, so long identifiers
+    never round together; a decimal comma is accepted where it cannot
+    separate thousands), ``"date"`` (equal when both cells parse to the same
+    moment with one of ``date_formats``) or ``"ignore"`` (the column is not
+    compared).
+    """
+
+    kind: str = "text"
+    abs_tol: float = 0.0
+    rel_tol: float = 0.0
+    date_formats: Tuple[str, ...] = ()
+    strip: bool = False
+    ignore_case: bool = False
+
+    def __post_init__(self) -> None:
+        if self.kind not in RULE_KINDS:
+            raise CsvComparisonError(
+                f"Неизвестный тип правила '{self.kind}'. Доступны: {', '.join(RULE_KINDS)}."
+            )
+        if self.abs_tol < 0 or self.rel_tol < 0:
+            raise CsvComparisonError("Допуск сравнения не может быть отрицательным.")
+
+
+def parse_column_rule(text: str) -> Tuple[str, ColumnRule]:
+    """Parse ``COLUMN=KIND[:OPTIONS]`` into a column name and its rule.
+
+    Options are comma separated: ``number:abs=0.01,rel=1e-6``,
+    ``date:%d.%m.%Y,%Y-%m-%d``, ``text:strip,nocase``; ``ignore`` takes none.
+    """
+
+    column, separator, spec = text.partition("=")
+    column = column.strip()
+    if not separator or not column:
+        raise CsvComparisonError(f"Правило '{text}' должно иметь вид СТОЛБЕЦ=ТИП[:ПАРАМЕТРЫ].")
+    kind, _, options_text = spec.strip().partition(":")
+    options = [option.strip() for option in options_text.split(",") if option.strip()]
+    if kind == "number":
+        tolerances = {"abs": 0.0, "rel": 0.0}
+        for option in options:
+            name, _, value = option.partition("=")
+            if name not in tolerances:
+                raise CsvComparisonError(f"Неизвестный параметр '{option}' в правиле '{text}'.")
+            try:
+                tolerances[name] = float(value)
+            except ValueError as error:
+                raise CsvComparisonError(
+                    f"Неверный допуск '{option}' в правиле '{text}'."
+                ) from error
+        return column, ColumnRule("number", abs_tol=tolerances["abs"], rel_tol=tolerances["rel"])
+    if kind == "date":
+        return column, ColumnRule("date", date_formats=tuple(options))
+    if kind == "text":
+        unknown = set(options) - {"strip", "nocase"}
+        if unknown:
+            raise CsvComparisonError(
+                f"Неизвестный параметр '{sorted(unknown)[0]}' в правиле '{text}'."
+            )
+        return column, ColumnRule("text", strip="strip" in options, ignore_case="nocase" in options)
+    if options:
+        raise CsvComparisonError(f"Правило '{text}' не принимает параметров.")
+    return column, ColumnRule(kind)
+
+
+def _is_number(text: str) -> bool:
+    """Whether a stripped cell is a number.
+
+    A comma is a decimal comma only where it cannot separate thousands, so
+    ``1,5`` is a number and ``1,000`` is not.
+    """
+
+    return bool(_NUMBER_PATTERN.fullmatch(text)) and not _THOUSANDS_PATTERN.fullmatch(text)
+
+
+def _parse_number(text: str) -> Optional[decimal.Decimal]:
+    text = text.strip()
+    if not _is_number(text):
+        return None
+    return decimal.Decimal(text.replace(",", "."))
+
+
+def _parse_date(text: str, formats: Sequence[str]) -> Optional[datetime]:
+    text = text.strip()
+    for date_format in formats:
+        try:
+            return datetime.strptime(text, date_format)
+        except ValueError:
+            continue
+    return None
+
+
+def _compile_rule(rule: ColumnRule) -> Optional[Equivalence]:
+    """Return a check of whether two different strings are equal under ``rule``.
+
+    ``None`` means plain string equality (or an ignored column).
+    """
+
+    if rule.kind == "number":
+        # Tolerances are taken as written (0.01, not the nearest binary float).
+        abs_tol = decimal.Decimal(repr(rule.abs_tol))
+        rel_tol = decimal.Decimal(repr(rule.rel_tol))
+        exact = not abs_tol and not rel_tol
+
+        def numbers_equal(value_a: str, value_b: str) -> bool:
+            number_a = _parse_number(value_a)
+            number_b = _parse_number(value_b)
+            if number_a is None or number_b is None:
+                return False
+            if exact:
+                return number_a == number_b
+            context = _TOLERANCE_CONTEXT
+            difference = context.abs(context.subtract(number_a, number_b))
+            largest = max(context.abs(number_a), context.abs(number_b))
+            return difference <= max(context.multiply(rel_tol, largest), abs_tol)
+
+        return numbers_equal
+    if rule.kind == "date":
+        formats = rule.date_formats or DATE_FORMATS
+
+        def dates_equal(value_a: str, value_b: str) -> bool:
+            date_a = _parse_date(value_a, formats)
+            return date_a is not None and date_a == _parse_date(value_b, formats)
+
+        return dates_equal
+    if rule.kind == "text" and (rule.strip or rule.ignore_case):
+        strip, ignore_case = rule.strip, rule.ignore_case
+
+        def normalize(value: str) -> str:
+            if strip:
+                value = value.strip()
+            return value.casefold() if ignore_case else value
+
+        return lambda value_a, value_b: normalize(value_a) == normalize(value_b)
+    return None
+
+
+def _column_rule(rules: Mapping[str, ColumnRule], column: str) -> Optional[ColumnRule]:
+    """Find the rule of ``column``, matching names case-insensitively."""
+
+    rule = rules.get(column)
+    if rule is not None:
+        return rule
+    folded = column.casefold()
+    for name, rule in rules.items():
+        if name.casefold() == folded:
+            return rule
+    return None
+
+
+def _sample_columns(source: InputSource) -> Tuple[Dict[str, List[str]], int]:
+    """Read the first rows of a CSV input into non-empty values per column.
+
+    Returns the values and the number of stored bytes read. Streams cannot be
+    read twice, so only files (compressed or not) can be sampled.
+    """
+
+    if not _is_path(source):
+        raise CsvComparisonError(
+            "Распознавание типов столбцов доступно только для файлов, а не для потоков."
+        )
+    if not os.path.exists(_split_member(os.fspath(source))[0]):
+        return {}, 0
+    opened, csv_file, csv_format = _open_text(source)
+    with csv_file, closing(opened):
+        reader = csv.reader(csv_file, delimiter=csv_format.delimiter)
+        header = next(reader, [])
+        columns: Dict[str, List[str]] = {column: [] for column in header}
+        for values in itertools.islice(reader, _INFERENCE_SAMPLE_ROWS):
+            for column, value in zip(header, values):
+                if value:
+                    columns[column].append(value)
+        sampled = opened.position()
+    return columns, sampled
+
+
+def _date_format_of(values: Iterable[str]) -> Optional[str]:
+    """Return the first known date format that parses every value."""
+
+    values = list(values)
+    for date_format in DATE_FORMATS:
+        if all(_parse_date(value, (date_format,)) is not None for value in values):
+            return date_format
+    return None
+
+
+def _is_identifier(value: str) -> bool:
+    """Whether a number-like value is too long an integer to be a quantity."""
+
+    digits = value.lstrip("+-")
+    return bool(_INTEGER_PATTERN.fullmatch(value)) and len(digits) > _IDENTIFIER_DIGITS
+
+
+def _infer_column_rule(values_a: List[str], values_b: List[str]) -> Optional[ColumnRule]:
+    """Infer a ``number`` or ``date`` rule from sampled values of both files."""
+
+    if not values_a or not values_b:
+        return None
+    values = [value.strip() for value in values_a + values_b]
+    if all(_is_number(value) for value in values) and not any(
+        _LEADING_ZERO_PATTERN.match(value) or _is_identifier(value) for value in values
+    ):
+        return ColumnRule("number")
+    format_a = _date_format_of(values_a)
+    format_b = _date_format_of(values_b) if format_a is not None else None
+    if format_a is not None and format_b is not None:
+        return ColumnRule("date", date_formats=tuple(dict.fromkeys((format_a, format_b))))
+    return None
+
+
+def _infer_rules(
+    file_path_a: InputSource, file_path_b: InputSource
+) -> Tuple[Dict[str, ColumnRule], int]:
+    """Infer rules for the columns of two files from their first rows.
+
+    Columns are matched by name as key columns are, case-insensitively.
+    Values with leading zeros (codes such as ``007``), integers of more than
+    15 digits (account and card numbers) and numbers such as ``1,000`` keep a
+    column textual.
+    Returns the rules and the number of bytes sampled.
+    """
+
+    columns_a, sampled_a = _sample_columns(file_path_a)
+    columns_b, sampled_b = _sample_columns(file_path_b)
+    folded_b = {column.casefold(): column for column in reversed(list(columns_b))}
+    rules: Dict[str, ColumnRule] = {}
+    for column, values_a in columns_a.items():
+        name_b = column if column in columns_b else folded_b.get(column.casefold())
+        rule = _infer_column_rule(values_a, columns_b[name_b] if name_b is not None else [])
+        if rule is not None:
+            rules[column] = rule
+    return rules, sampled_a + sampled_b
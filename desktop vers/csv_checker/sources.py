@@ -0,0 +1,471 @@
+"""Reading CSV inputs: key column resolution and normalized row streams."""
+from __future__ import annotations
+
+import csv
+import itertools
+from collections import defaultdict
+from contextlib import closing
+from operator import itemgetter
+from typing import (
+    AnyStr,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+from .inputs import InputSource, _CsvFormat, _open_text
+from .model import KEY_SEPARATOR, CsvComparisonError
+
+KeyFields = Union[str, Sequence[str]]
+"""A key column name or the names of the columns of a composite key."""
+
+
+def _key_fields(key_field: KeyFields) -> Tuple[str, ...]:
+    """Normalize ``key_field`` to a non-empty tuple of distinct column names."""
+
+    fields = (key_field,) if isinstance(key_field, str) else tuple(key_field)
+    if not fields or not all(fields):
+        raise CsvComparisonError("Не указан ключевой столбец.")
+    if len(set(fields)) != len(fields):
+        raise CsvComparisonError("Ключевые столбцы не должны повторяться.")
+    return fields
+
+
+def _split_key_fields(text: str) -> List[str]:
+    """Split a comma separated list of key columns typed by the user."""
+
+    return [field.strip() for field in text.split(",") if field.strip()]
+
+
+def _key_getter(
+    key_indexes: Sequence[int], separator: AnyStr = KEY_SEPARATOR
+) -> Callable[[Sequence[AnyStr]], AnyStr]:
+    """Return a function building the key of a record from its cells.
+
+    A composite key is the cells of its columns joined with
+    :data:`KEY_SEPARATOR`, so every engine can order and match it as a string.
+    """
+
+    if len(key_indexes) == 1:
+        return itemgetter(key_indexes[0])
+    cells = itemgetter(*key_indexes)
+    return lambda values: separator.join(cells(values))
+
+
+def read_csv_sorted(file_path: InputSource, key_field: KeyFields) -> List[Dict[str, str]]:
+    """Read a CSV file, ensuring the key field exists, and return sorted rows.
+
+    ``file_path`` may also be a compressed or zipped file, a binary stream or
+    an iterable of byte chunks (see :mod:`csv_checker.inputs`). The encoding
+    and the delimiter are detected from the first bytes.
+    """
+
+    key_fields = _key_fields(key_field)
+    opened, csv_file, csv_format = _open_text(file_path)
+    file_path = opened.name
+    with csv_file, closing(opened):
+        reader = csv.DictReader(csv_file, delimiter=csv_format.delimiter)
+        if reader.fieldnames is None:
+            raise CsvComparisonError("CSV файл не содержит заголовков.")
+
+        renames = [
+            (_resolve_key_field(reader.fieldnames, field, file_path), field)
+            for field in key_fields
+        ]
+        renames = [(actual, field) for actual, field in renames if actual != field]
+
+        rows = []
+        for row in reader:
+            for actual_key_field, field in renames:
+                row[field] = row.pop(actual_key_field, "")
+            rows.append(row)
+
+    try:
+        rows.sort(key=lambda row: tuple(row.get(field, "") for field in key_fields))
+    except TypeError as error:
+        raise CsvComparisonError(
+            "Ошибка сортировки. Проверьте корректность значений в столбце ключа."
+        ) from error
+
+    return rows
+
+
+def _resolve_key_field(
+    fieldnames: Sequence[str], key_field: str, file_path: str
+) -> str:
+    """Return actual column name that matches the provided key (case insensitive)."""
+
+    for field in fieldnames:
+        if field == key_field:
+            return field
+    key_lower = key_field.casefold()
+    for field in fieldnames:
+        if field.casefold() == key_lower:
+            return field
+
+    raise CsvComparisonError(
+        f"В файле {file_path} отсутствует ключевой столбец '{key_field}'."
+    )
+
+
+def _key_positions(
+    header: Sequence[str], key_fields: Sequence[str], file_path: str
+) -> Tuple[Dict[str, int], Tuple[int, ...]]:
+    """Map column names to indexes, renaming the key columns to ``key_fields``.
+
+    Returns the mapping and the indexes of the key columns.
+    """
+
+    actual_key_fields = [
+        _resolve_key_field(header, key_field, file_path) for key_field in key_fields
+    ]
+    positions = {column: index for index, column in enumerate(header)}
+    key_indexes = tuple(map(positions.pop, actual_key_fields))
+    positions.update(zip(key_fields, key_indexes))
+    return positions, key_indexes
+
+
+class _ColumnSelection:
+    """Columns chosen with ``columns`` and ``exclude_columns``.
+
+    Names match case-insensitively; key columns are always kept.
+    """
+
+    def __init__(
+        self, columns: Optional[Sequence[str]], exclude_columns: Optional[Sequence[str]]
+    ) -> None:
+        if isinstance(columns, str):
+            columns = (columns,)
+        if isinstance(exclude_columns, str):
+            exclude_columns = (exclude_columns,)
+        self.columns = (
+            None if columns is None else {column.casefold(): column for column in columns}
+        )
+        self.excluded = {column.casefold() for column in exclude_columns or ()}
+
+    def keeps(self, column: str) -> bool:
+        folded = column.casefold()
+        return folded not in self.excluded and (self.columns is None or folded in self.columns)
+
+    def select(
+        self,
+        positions_a: Dict[str, int],
+        positions_b: Dict[str, int],
+        key_fields: Sequence[str],
+    ) -> Tuple[Dict[str, int], Dict[str, int]]:
+        """Return the positions of the selected columns of both files.
+
+        Raises :class:`CsvComparisonError` when a requested column is in
+        neither file.
+        """
+
+        if self.columns is not None:
+            present = {column.casefold() for column in (*positions_a, *positions_b)}
+            unknown = [name for folded, name in self.columns.items() if folded not in present]
+            if unknown:
+                raise CsvComparisonError(
+                    f"Столбцы не найдены ни в одном из файлов: {', '.join(unknown)}."
+                )
+        selected_a, selected_b = (
+            {
+                column: index
+                for column, index in positions.items()
+                if column in key_fields or self.keeps(column)
+            }
+            for positions in (positions_a, positions_b)
+        )
+        return selected_a, selected_b
+
+
+def _column_selection(
+    columns: Optional[Sequence[str]], exclude_columns: Optional[Sequence[str]]
+) -> Optional[_ColumnSelection]:
+    """Return the selection of ``columns``/``exclude_columns``, or ``None`` for all."""
+
+    if columns is None and not exclude_columns:
+        return None
+    return _ColumnSelection(columns, exclude_columns)
+
+
+def detect_duplicate_keys(
+    rows: Iterable[Dict[str, str]], key_field: KeyFields
+) -> List[str]:
+    """Return a list of duplicate key values.
+
+    Values of a composite key are joined with :data:`KEY_SEPARATOR`.
+    """
+    key_fields = _key_fields(key_field)
+    occurrences: Dict[str, int] = defaultdict(int)
+    duplicates: List[str] = []
+    for row in rows:
+        key_value = KEY_SEPARATOR.join(row.get(field, "") for field in key_fields)
+        occurrences[key_value] += 1
+        if occurrences[key_value] == 2:
+            duplicates.append(key_value)
+    return duplicates
+
+
+SortedRow = Tuple[str, List[str]]
+
+
+class _CsvSource:
+    """Stream rows of a CSV input as ``(key, values)`` pairs in header order.
+
+    The key columns are renamed to the requested ``key_fields`` (as
+    :func:`read_csv_sorted` does), short rows are padded with empty strings and
+    extra trailing cells are dropped. After :meth:`project` rows hold only
+    the cells of the selected columns. The encoding and the delimiter are
+    detected from the first bytes (:attr:`csv_format`).
+    """
+
+    def __init__(self, source: InputSource, key_fields: Sequence[str]) -> None:
+        self._input, self._file, self.csv_format = _open_text(source)
+        self.file_path = file_path = self._input.name
+        try:
+            self._reader = csv.reader(self._file, delimiter=self.csv_format.delimiter)
+            header = next(self._reader, None)
+            if header is None:
+                raise CsvComparisonError("CSV файл не содержит заголовков.")
+            self.positions, self.key_indexes = _key_positions(
+                header, key_fields, file_path
+            )
+        except BaseException:
+            self.close()
+            raise
+        self.record_width = self.width = len(header)
+        self.kept: Optional[Tuple[int, ...]] = None
+
+    def __enter__(self) -> "_CsvSource":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._input.close()
+
+    def bytes_read(self) -> int:
+        """Return how many stored (possibly compressed) bytes have been consumed."""
+
+        return self._input.position()
+
+    def project(self, positions: Dict[str, int]) -> None:
+        """Keep only the cells of ``positions``, a subset of :attr:`positions`.
+
+        Must be called before the rows are read; :attr:`positions`,
+        :attr:`key_indexes` and :attr:`width` then refer to the kept cells.
+        """
+
+        kept = sorted(positions.values())
+        if len(kept) == self.width:
+            return
+        new_indexes = {index: new for new, index in enumerate(kept)}
+        self.positions = {column: new_indexes[index] for column, index in positions.items()}
+        self.key_indexes = tuple(new_indexes[index] for index in self.key_indexes)
+        self.kept = tuple(kept)
+        self.width = len(kept)
+
+    def __iter__(self) -> Iterator[SortedRow]:
+        return _iter_rows(self._reader, self.record_width, self.key_indexes, self.kept)
+
+    def batches(self, size: int) -> Iterator[List[List[str]]]:
+        """Yield lists of up to ``size`` normalized records (without keys)."""
+
+        width = self.record_width
+        while True:
+            batch = list(itertools.islice(self._reader, size))
+            if not batch:
+                return
+            if self.kept is not None or any(map(width.__ne__, map(len, batch))):
+                batch = [
+                    values
+                    for _, values in _iter_rows(batch, width, self.key_indexes, self.kept)
+                ]
+            yield batch
+
+
+def _iter_rows(
+    records: Iterable[List[str]],
+    width: int,
+    key_indexes: Sequence[int],
+    kept: Optional[Sequence[int]] = None,
+) -> Iterator[SortedRow]:
+    """Normalize parsed records to ``width`` cells and pair them with their key.
+
+    With ``kept`` only the cells at those indexes are kept (``key_indexes``
+    then index the kept cells), so the rest are released right after parsing.
+    """
+
+    key_of = _key_getter(key_indexes)
+    padding = [""] * width
+    if kept is None:
+        for values in records:
+            if not values:
+                continue
+            if len(values) != width:
+                values = (values + padding)[:width]
+            yield key_of(values), values
+        return
+
+    if len(kept) == 1:
+        only = kept[0]
+        project: Callable[[List[str]], List[str]] = lambda values: [values[only]]  # noqa: E731
+    else:
+        cells = itemgetter(*kept)
+        project = lambda values: list(cells(values))  # noqa: E731
+    for values in records:
+        if not values:
+            continue
+        if len(values) != width:
+            values = (values + padding)[:width]
+        values = project(values)
+        yield key_of(values), values
+
+
+_LINE_ENDINGS = b"\r\n"
+
+
+def _parse_record(text: str, delimiter: str) -> List[str]:
+    """Parse one decoded record into cells.
+
+    Raises :class:`CsvComparisonError` when :mod:`csv` rejects the record.
+    """
+
+    try:
+        return next(csv.reader([text], delimiter=delimiter), [])
+    except csv.Error as error:
+        raise CsvComparisonError(f"Не удалось разобрать строку CSV файла: {error}.") from error
+
+
+def _ends_in_quotes(line: bytes, opening: bytes, quoted: bool) -> bool:
+    """Return whether a line of a record ends inside a quoted field.
+
+    As in :mod:`csv`, a quote opens a quoted field only at the start of a
+    field (``opening`` is the delimiter followed by a quote) and a doubled
+    quote inside it is escaped; other quotes are ordinary characters.
+    ``quoted`` tells whether the line continues a quoted field.
+    """
+
+    position = 0
+    while True:
+        if not quoted:
+            if position == 0 and line.startswith(b'"'):
+                position = 1
+            else:
+                start = line.find(opening, position)
+                if start < 0:
+                    return False
+                position = start + len(opening)
+        end = line.find(b'"', position)
+        while end >= 0 and line.startswith(b'"', end + 1):
+            end = line.find(b'"', end + 2)
+        if end < 0:
+            return True
+        position = end + 1
+        quoted = False
+
+
+def _iter_records(
+    readline: Callable[[], bytes], csv_format: _CsvFormat, position: int = 0
+) -> Iterator[Tuple[int, bytes]]:
+    """Yield ``(offset, raw bytes)`` of every record read with ``readline``.
+
+    A quoted field spanning several lines extends the record to its closing
+    quote; offsets count from ``position``.
+    """
+
+    opening = (csv_format.delimiter + '"').encode(csv_format.encoding)
+    for line in iter(readline, b""):
+        if b'"' in line and _ends_in_quotes(line, opening, False):
+            parts = [line]
+            while True:
+                more = readline()
+                if not more:
+                    break
+                parts.append(more)
+                if not _ends_in_quotes(more, opening, True):
+                    break
+            line = b"".join(parts)
+        yield position, line
+        position += len(line)
+
+
+def _record_header(
+    records: Iterator[Tuple[int, bytes]], csv_format: _CsvFormat
+) -> List[str]:
+    """Parse the header from the first raw record, skipping a UTF-8 BOM."""
+
+    first = next(records, None)
+    if first is None:
+        raise CsvComparisonError("CSV файл не содержит заголовков.")
+    return _parse_record(csv_format.decode(first[1][csv_format.bom :]), csv_format.delimiter)
+
+
+def _record_key_getter(
+    key_indexes: Sequence[int], csv_format: _CsvFormat
+) -> Callable[[bytes], Optional[str]]:
+    """Return a function reading the key of a raw record (``None`` if blank).
+
+    Records without quotes are split on the delimiter as bytes and only the
+    key is decoded; quoted records are parsed with :mod:`csv`.
+    """
+
+    text_key = _key_getter(key_indexes)
+    encoding, delimiter = csv_format.encoding, csv_format.delimiter
+    raw_key = _key_getter(key_indexes, KEY_SEPARATOR.encode(encoding))
+    raw_delimiter = delimiter.encode(encoding)
+    last_index = max(key_indexes)
+
+    def key_of(data: bytes) -> Optional[str]:
+        if b'"' in data:
+            cells = _parse_record(data.decode(encoding), delimiter)
+            if len(cells) <= last_index:
+                cells += [""] * (last_index + 1 - len(cells))
+            return text_key(cells)
+        stripped = data.rstrip(_LINE_ENDINGS)
+        if not stripped:
+            return None
+        raw_cells = stripped.split(raw_delimiter, last_index + 1)
+        if len(raw_cells) <= last_index:
+            raw_cells += [b""] * (last_index + 1 - len(raw_cells))
+        return raw_key(raw_cells).decode(encoding)
+
+    return key_of
+
+
+class _RecordParser:
+    """Parse raw records of ``width`` cells read from a known byte range."""
+
+    def __init__(self, csv_format: _CsvFormat, width: int) -> None:
+        self.csv_format = csv_format
+        self.width = width
+        self.decode = csv_format.decode
+        self._delimiter = csv_format.delimiter.encode(csv_format.encoding)
+
+    def values(self, data: bytes) -> List[str]:
+        """Parse a record into decoded cells."""
+
+        values = _parse_record(self.decode(data), self.csv_format.delimiter)
+        if len(values) != self.width:
+            values = (values + [""] * self.width)[: self.width]
+        return values
+
+    def cells(self, data: bytes) -> Optional[List[bytes]]:
+        """Split a record without quotes into raw cells (``None`` if quoted).
+
+        Raw cells may be compared as bytes only with cells of an input in the
+        same encoding; otherwise equal bytes can decode to different text.
+        """
+
+        if b'"' in data:
+            return None
+        cells = data.rstrip(_LINE_ENDINGS).split(self._delimiter)
+        if len(cells) != self.width:
+            cells = (cells + [b""] * self.width)[: self.width]
+        return cells
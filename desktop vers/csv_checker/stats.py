@@ -0,0 +1,339 @@
+"""Per-stage timing of comparisons.
+
+Comparison engines are chains of generators, so parsing, sorting, duplicate
+detection, diffing and the consumer of the differences take turns row by
+row. Every switch between stages reads the wall clock (about 0.1 µs) and
+charges the elapsed time to the stage that ran, so wall times are exact.
+Reading the CPU clock is several times slower, so a sampler thread instead
+splits the process CPU time of every interval between the stages in
+proportion to their wall time, and samples memory use on the way.
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, Iterator, List, Mapping, Optional, TypeVar
+
+INFER_TYPES = "infer_types"
+READ = "read"
+SORT = "sort"
+INDEX = "index"
+DUPLICATES = "duplicates"
+DIFF = "diff"
+PREVIEW = "preview"
+OUTPUT = "output"
+
+STAGES = (INFER_TYPES, READ, SORT, INDEX, DUPLICATES, DIFF, PREVIEW, OUTPUT)
+"""Stage names in the order of a comparison.
+
+``infer_types`` samples inputs for column types, ``read`` parses the inputs
+(and decompresses them), ``sort`` sorts rows and merges spilled runs,
+``index`` builds key indexes (``mmap``, incremental and NumPy engines),
+``duplicates`` applies the duplicate policy, ``diff`` joins the rows and
+compares cells (with everything an engine does outside the other stages),
+``preview`` formats the differences handed out by :func:`iter_differences`
+and ``output`` is the time the consumer of the differences takes, for
+example to store or write them.
+"""
+
+STAGE_LABELS = {
+    INFER_TYPES: "типы столбцов",
+    READ: "чтение",
+    SORT: "сортировка",
+    INDEX: "индекс",
+    DUPLICATES: "дубликаты",
+    DIFF: "сравнение",
+    PREVIEW: "форматирование",
+    OUTPUT: "вывод",
+}
+"""Russian names of the stages used in the CLI and the GUI."""
+
+DEFAULT_SAMPLE_INTERVAL = 0.01
+
+_T = TypeVar("_T")
+
+try:
+    _PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+except (AttributeError, ValueError, OSError):  # pragma: no cover - not POSIX
+    _PAGE_SIZE = 4096
+
+
+def _resident_memory() -> Optional[int]:
+    """Return the resident set size of the process where it can be read cheaply."""
+
+    try:
+        with open("/proc/self/statm", "rb") as statm:
+            return int(statm.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+@dataclass
+class StageStats:
+    """Measurements of one comparison stage.
+
+    ``wall_time`` and ``cpu_time`` are in seconds (CPU time is the process
+    time, so it includes reader and writer threads working meanwhile),
+    ``rows`` counts the items the stage produced (rows, or differences for
+    ``diff`` and ``preview``), ``bytes_read`` the input bytes it read and
+    ``peak_memory`` the largest memory use sampled while it ran (``None``
+    when it cannot be measured).
+    """
+
+    wall_time: float = 0.0
+    cpu_time: float = 0.0
+    rows: int = 0
+    bytes_read: int = 0
+    peak_memory: Optional[int] = None
+
+    def _observe_memory(self, memory: Optional[int]) -> None:
+        if memory is not None and (self.peak_memory is None or memory > self.peak_memory):
+            self.peak_memory = memory
+
+
+class ComparisonStats:
+    """Per-stage wall time, CPU time, rows, bytes and peak memory of comparisons.
+
+    Pass an instance as ``stats`` to :func:`compare_csv_files` or
+    :func:`iter_differences`; it accumulates over the runs it is passed to
+    (one at a time) and ``callback`` is called with it at the end of every
+    run. :attr:`stages` maps the names of :data:`STAGES` to
+    :class:`StageStats`. CPU time and memory are sampled every ``interval``
+    seconds; memory is the resident set size where the platform exposes it
+    cheaply (Linux), otherwise ``None``. Work done in the worker processes of
+    the parallel mode is not measured: the main process only waits for it.
+
+    Opt-in dumps for a closer look: ``profile_path`` runs :mod:`cProfile` on
+    the comparing thread and saves its statistics there (read them with
+    :mod:`pstats`), and ``memory_snapshot_path`` traces allocations with
+    :mod:`tracemalloc` (memory figures then count traced Python allocations)
+    and saves the final snapshot (read it with ``tracemalloc.Snapshot.load``).
+    Both slow the comparison down noticeably.
+    """
+
+    def __init__(
+        self,
+        callback: Optional[Callable[["ComparisonStats"], None]] = None,
+        *,
+        interval: float = DEFAULT_SAMPLE_INTERVAL,
+        profile_path: Optional[str] = None,
+        memory_snapshot_path: Optional[str] = None,
+    ) -> None:
+        self.callback = callback
+        self.interval = interval
+        self.profile_path = profile_path
+        self.memory_snapshot_path = memory_snapshot_path
+        self.stages: Dict[str, StageStats] = {}
+        self.wall_time = 0.0
+        self.cpu_time = 0.0
+        self.peak_memory: Optional[int] = None
+        self.runs = 0
+        self._current = StageStats()
+        self._mark = 0.0
+        self._last_walls: Dict[str, float] = {}
+        self._stop = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+        self._profiler = None
+        self._tracing = False
+        self._memory: Callable[[], Optional[int]] = _resident_memory
+        self._started_wall = self._started_cpu = self._last_cpu = 0.0
+
+    def stage(self, name: str) -> StageStats:
+        """Return the measurements of a stage, creating them when missing."""
+
+        record = self.stages.get(name)
+        if record is None:
+            record = self.stages[name] = StageStats()
+        return record
+
+    def timed(self, name: str, items: Iterable[_T]) -> Iterator[_T]:
+        """Charge the time spent producing ``items`` to stage ``name``.
+
+        Time spent in nested timed stages is charged to those stages instead.
+        """
+
+        record = self.stage(name)
+        switch = self._switch
+        iterator = iter(items)
+        while True:
+            outer = switch(record)
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                switch(outer)
+            record.rows += 1
+            yield item
+
+    @contextmanager
+    def running(self, name: str) -> Iterator[StageStats]:
+        """Charge the time spent in a ``with`` block to stage ``name``.
+
+        The block must not yield to the consumer of the differences.
+        """
+
+        record = self.stage(name)
+        outer = self._switch(record)
+        try:
+            yield record
+        finally:
+            self._switch(outer)
+
+    def _switch(self, record: StageStats) -> StageStats:
+        """Charge the time since the last switch and make ``record`` current."""
+
+        now = time.perf_counter()
+        current = self._current
+        current.wall_time += now - self._mark
+        self._mark = now
+        self._current = record
+        return current
+
+    def start(self) -> None:
+        """Start measuring a run (called by the comparison functions)."""
+
+        if self.memory_snapshot_path is not None:
+            import tracemalloc
+
+            self._tracing = not tracemalloc.is_tracing()
+            if self._tracing:
+                tracemalloc.start()
+            self._memory = lambda: tracemalloc.get_traced_memory()[0]
+        else:
+            self._memory = _resident_memory
+        if self.profile_path is not None:
+            import cProfile
+
+            self._profiler = cProfile.Profile()
+        self._current = self.stage(OUTPUT)
+        self._started_wall = self._mark = time.perf_counter()
+        self._started_cpu = self._last_cpu = time.process_time()
+        self._last_walls = {name: record.wall_time for name, record in self.stages.items()}
+        self._stop.clear()
+        self._sampler = threading.Thread(
+            target=self._run_sampler, name="csv-checker-stats", daemon=True
+        )
+        self._sampler.start()
+        if self._profiler is not None:
+            self._profiler.enable()
+
+    def finish(self, bytes_read: Mapping[str, int]) -> None:
+        """Stop measuring a run, record its bytes per stage and save dumps."""
+
+        if self._profiler is not None:
+            self._profiler.disable()
+        self._stop.set()
+        if self._sampler is not None:
+            self._sampler.join()
+            self._sampler = None
+        self._switch(self._current)
+        self._sample()
+        self.wall_time += self._mark - self._started_wall
+        self.cpu_time += self._last_cpu - self._started_cpu
+        self.runs += 1
+        for name, size in bytes_read.items():
+            if size:
+                self.stage(name).bytes_read += size
+        if self._profiler is not None:
+            self._profiler.dump_stats(self.profile_path)
+            self._profiler = None
+        if self.memory_snapshot_path is not None:
+            import tracemalloc
+
+            peak = tracemalloc.get_traced_memory()[1]
+            self.peak_memory = max(self.peak_memory or 0, peak)
+            tracemalloc.take_snapshot().dump(self.memory_snapshot_path)
+            if self._tracing:
+                tracemalloc.stop()
+                self._tracing = False
+        if self.callback is not None:
+            self.callback(self)
+
+    def _run_sampler(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def _sample(self) -> None:
+        """Split the CPU time since the last sample and sample memory use."""
+
+        cpu = time.process_time()
+        walls = {name: record.wall_time for name, record in list(self.stages.items())}
+        elapsed = {
+            name: wall - self._last_walls.get(name, 0.0) for name, wall in walls.items()
+        }
+        total = sum(elapsed.values())
+        if total > 0:
+            share = (cpu - self._last_cpu) / total
+            for name, wall in elapsed.items():
+                if wall > 0:
+                    self.stages[name].cpu_time += wall * share
+            self._last_cpu = cpu
+            self._last_walls = walls
+        memory = self._memory()
+        self._current._observe_memory(memory)
+        if memory is not None and (self.peak_memory is None or memory > self.peak_memory):
+            self.peak_memory = memory
+
+    def ordered_stages(self) -> List[str]:
+        """Names of the measured stages in :data:`STAGES` order."""
+
+        return [name for name in STAGES if name in self.stages] + sorted(
+            set(self.stages) - set(STAGES)
+        )
+
+    def summary_line(self, limit: int = 3) -> str:
+        """Describe the slowest stages in one line, e.g. for a status bar."""
+
+        slowest = sorted(
+            (record.wall_time, name) for name, record in self.stages.items() if record.wall_time
+        )[::-1][:limit]
+        parts = [f"{STAGE_LABELS.get(name, name)} {wall:.2f} с" for wall, name in slowest]
+        return f"Время: {self.wall_time:.2f} с ({', '.join(parts)})" if parts else (
+            f"Время: {self.wall_time:.2f} с"
+        )
+
+    def format_table(self) -> str:
+        """Format all stages as a text table with a total row."""
+
+        rows = [("Этап", "Время, с", "ЦП, с", "Строк", "Прочитано, МБ", "Память, МБ")]
+        for name in self.ordered_stages():
+            record = self.stages[name]
+            rows.append(
+                (
+                    STAGE_LABELS.get(name, name),
+                    f"{record.wall_time:.3f}",
+                    f"{record.cpu_time:.3f}",
+                    str(record.rows),
+                    f"{record.bytes_read / 1e6:.1f}",
+                    _megabytes(record.peak_memory),
+                )
+            )
+        rows.append(
+            (
+                "всего",
+                f"{self.wall_time:.3f}",
+                f"{self.cpu_time:.3f}",
+                "",
+                f"{sum(record.bytes_read for record in self.stages.values()) / 1e6:.1f}",
+                _megabytes(self.peak_memory),
+            )
+        )
+        widths = [max(len(row[column]) for row in rows) for column in range(len(rows[0]))]
+        return "\n".join(
+            "  ".join(
+                cell.ljust(width) if column == 0 else cell.rjust(width)
+                for column, (cell, width) in enumerate(zip(row, widths))
+            ).rstrip()
+            for row in rows
+        )
+
+    def __repr__(self) -> str:
+        return f"<ComparisonStats: {self.runs} runs, {self.wall_time:.3f} s>"
+
+
+def _megabytes(size: Optional[int]) -> str:
+    return "—" if size is None else f"{size / 1e6:.1f}"
@@ -0,0 +1,379 @@
+"""SQLite result stores: saved comparison results queried through indexes.
+
+A store is written by :class:`~csv_checker.writers.DifferenceWriter` in the
+``"sqlite"`` format (``compare -o run.sqlite``): every batch of differences
+is inserted in one transaction on the writer thread, and the indexes on the
+key, the column and the difference type are built once all rows are in,
+which is much faster than updating them row by row. Rows keep the key order
+in which the engines produce them. A composite key is stored both as
+displayed and as its separate cells, so reports written from a store get
+the key columns right even when a cell contains the display separator.
+
+:class:`ResultStore` reopens a store without recomputing the comparison.
+Items are read by position, so the GUI pages through any number of
+differences, and :meth:`ResultStore.query` filters and sorts in SQLite.
+Imported only when a store is written or opened.
+"""
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import tempfile
+from array import array
+from collections.abc import Sequence as SequenceABC
+from contextlib import closing
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from .model import CsvComparisonError, Difference, FieldSummary, RawDifference, _to_difference
+
+STORE_SUFFIXES = (".sqlite", ".sqlite3", ".db")
+"""File name suffixes of result stores (``-o`` then writes a store)."""
+
+QUERY_FIELDS = ("key", "column", "value_a", "value_b", "difference_type")
+"""Fields that :meth:`ResultStore.query` can order by."""
+
+_STORE_VERSION = "2"
+_ORDER_COLUMNS = {
+    "key": "position",
+    "column": "field",
+    "value_a": "value_a",
+    "value_b": "value_b",
+    "difference_type": "difference_type",
+}
+_SELECT = (
+    "SELECT COALESCE(key_cells, key), field, value_a, value_b, difference_type "
+    "FROM differences"
+)
+_SCHEMA = """
+CREATE TABLE meta (name TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE differences (
+    position INTEGER PRIMARY KEY,
+    key TEXT NOT NULL,
+    key_cells TEXT,
+    field TEXT NOT NULL,
+    value_a TEXT NOT NULL,
+    value_b TEXT NOT NULL,
+    difference_type TEXT NOT NULL
+);
+CREATE TABLE summary (
+    field TEXT NOT NULL,
+    difference_type TEXT NOT NULL,
+    count INTEGER NOT NULL
+);
+"""
+_INDEXES = """
+CREATE INDEX differences_key ON differences (key);
+CREATE INDEX differences_field ON differences (field, position);
+CREATE INDEX differences_type ON differences (difference_type, position);
+"""
+
+
+def _check_replaceable(path: str) -> None:
+    """Refuse to overwrite an existing file that is not a result store."""
+
+    if not os.path.exists(path):
+        return
+    try:
+        with closing(sqlite3.connect(path)) as db:
+            db.execute("SELECT value FROM meta WHERE name = 'key_fields'").fetchone()
+    except sqlite3.DatabaseError as error:
+        raise CsvComparisonError(
+            f"Файл {path} не является базой результатов сравнения и не будет перезаписан."
+        ) from error
+
+
+class _StoreBuilder:
+    """Bulk loader of a new result store, used by the report writer thread.
+
+    Rows are loaded into a temporary file next to ``path``, which replaces
+    ``path`` only once the store is complete; an existing file at ``path``
+    must be a result store (see :func:`_check_replaceable`).
+    """
+
+    def __init__(
+        self,
+        path: str,
+        key_fields: Sequence[str],
+        sources: Optional[Tuple[str, str]] = None,
+    ) -> None:
+        _check_replaceable(path)
+        self._path = path
+        handle, self._temp_path = tempfile.mkstemp(
+            prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=os.path.dirname(path) or None
+        )
+        os.close(handle)
+        # The connection is created on the writer thread and closed by the
+        # thread that closes the writer, once the writer thread has stopped.
+        self._db = sqlite3.connect(self._temp_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode = OFF")
+        self._db.execute("PRAGMA synchronous = OFF")
+        self._db.executescript(_SCHEMA)
+        file_a, file_b = sources or ("", "")
+        self._db.executemany(
+            "INSERT INTO meta VALUES (?, ?)",
+            [
+                ("version", _STORE_VERSION),
+                ("key_fields", json.dumps(list(key_fields), ensure_ascii=False)),
+                ("file_a", file_a),
+                ("file_b", file_b),
+                ("complete", "0"),
+            ],
+        )
+        self._db.commit()
+
+    def add(self, rows: Iterable[Tuple[Optional[str], ...]]) -> None:
+        """Insert ``(key, key_cells, column, value_a, value_b, difference_type)``
+        rows; ``key_cells`` is the engine-level form of a composite key."""
+
+        with self._db:
+            self._db.executemany(
+                "INSERT INTO differences "
+                "(key, key_cells, field, value_a, value_b, difference_type) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+
+    def close(self, summary: Optional[FieldSummary]) -> None:
+        """Index the rows, save ``summary`` and move the store to its path.
+
+        Without a summary (the writer failed) the store is discarded and an
+        earlier file at the path is kept.
+        """
+
+        complete = False
+        try:
+            if summary is not None:
+                with self._db:
+                    self._db.executescript(_INDEXES)
+                    self._db.executemany(
+                        "INSERT INTO summary VALUES (?, ?, ?)",
+                        [
+                            (column, difference_type, count)
+                            for (column, difference_type), count in summary.counts.items()
+                        ],
+                    )
+                    self._db.execute("UPDATE meta SET value = '1' WHERE name = 'complete'")
+                complete = True
+        finally:
+            self._db.close()
+            if complete:
+                os.replace(self._temp_path, self._path)
+            else:
+                os.remove(self._temp_path)
+
+
+def _prefix_bounds(prefix: str) -> Tuple[str, Optional[str]]:
+    """Return the key range ``[low, high)`` of the keys starting with ``prefix``."""
+
+    last = ord(prefix[-1])
+    if last >= 0x10FFFF:
+        return prefix, None
+    return prefix, f"{prefix[:-1]}{chr(last + 1)}"
+
+
+class ResultStore(SequenceABC):
+    """A result store reopened for reading; a sequence of :class:`Difference`.
+
+    Items are in the key order of the comparison. :attr:`key_fields`,
+    :attr:`file_a` and :attr:`file_b` describe the run and :attr:`summary`
+    holds its per-field counts. Use it as a context manager or call
+    :meth:`close`.
+    """
+
+    def __init__(self, path: str) -> None:
+        if not os.path.isfile(path):
+            raise CsvComparisonError(f"Файл не найден: {path}")
+        self.path = path
+        self._db = sqlite3.connect(path)
+        try:
+            meta = dict(self._db.execute("SELECT name, value FROM meta"))
+            if meta.get("version") != _STORE_VERSION:
+                raise CsvComparisonError(
+                    f"База результатов {path} создана другой версией программы."
+                )
+            if meta.get("complete") != "1":
+                raise CsvComparisonError(
+                    f"База результатов {path} не дописана: сравнение было прервано."
+                )
+            self.key_fields: Tuple[str, ...] = tuple(json.loads(meta["key_fields"]))
+            self._composite = len(self.key_fields) > 1
+            self.file_a: str = meta["file_a"]
+            self.file_b: str = meta["file_b"]
+            self._length = self._db.execute("SELECT COUNT(*) FROM differences").fetchone()[0]
+            counts = self._db.execute("SELECT field, difference_type, count FROM summary")
+            self.summary = FieldSummary()
+            """Per-field counts of the stored differences."""
+            self.summary.counts.update(
+                {(column, difference_type): count for column, difference_type, count in counts}
+            )
+        except sqlite3.DatabaseError as error:
+            self._db.close()
+            raise CsvComparisonError(
+                f"Файл {path} не является базой результатов сравнения."
+            ) from error
+        except BaseException:
+            self._db.close()
+            raise
+
+    def __enter__(self) -> "ResultStore":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._db.close()
+
+    def columns(self) -> List[str]:
+        """Return the compared columns that have differences, sorted."""
+
+        return sorted({column for column, _ in self.summary.counts})
+
+    def __len__(self) -> int:
+        return self._length
+
+    def raw(self, index: int) -> RawDifference:
+        """Return the item at ``index`` as a tuple of its fields.
+
+        The key is in its engine-level form, as in :class:`DifferenceSet`.
+        """
+
+        row = self._db.execute(f"{_SELECT} WHERE position = ?", (index + 1,)).fetchone()
+        if row is None:
+            raise IndexError("ResultStore index out of range")
+        return row
+
+    def key_at(self, index: int) -> str:
+        """Return the displayed key of the item at ``index``."""
+
+        row = self._db.execute(
+            "SELECT key FROM differences WHERE position = ?", (index + 1,)
+        ).fetchone()
+        if row is None:
+            raise IndexError("ResultStore index out of range")
+        return row[0]
+
+    def __getitem__(self, index):  # type: ignore[override]
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                return [self[position] for position in range(start, stop, step)]
+            rows = self._db.execute(
+                f"{_SELECT} WHERE position > ? AND position <= ? ORDER BY position",
+                (start, stop),
+            )
+            return [_to_difference(row, self._composite) for row in rows]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("ResultStore index out of range")
+        return _to_difference(self.raw(index), self._composite)
+
+    def __iter__(self) -> Iterator[Difference]:
+        return self.select()
+
+    def iter_raw(self) -> Iterator[RawDifference]:
+        """Iterate over the stored items as tuples of their fields."""
+
+        return iter(self._db.execute(f"{_SELECT} ORDER BY position"))
+
+    def _filter(
+        self,
+        column: Optional[str],
+        difference_type: Optional[str],
+        key_prefix: Optional[str],
+        order_by: str,
+        descending: bool,
+    ) -> Tuple[str, List[str]]:
+        """Build the ``WHERE`` and ``ORDER BY`` clauses of a query."""
+
+        if order_by not in _ORDER_COLUMNS:
+            raise CsvComparisonError(
+                f"Неизвестное поле сортировки '{order_by}'. Доступны: {', '.join(QUERY_FIELDS)}."
+            )
+        conditions: List[str] = []
+        parameters: List[str] = []
+        if column:
+            conditions.append("field = ?")
+            parameters.append(column)
+        if difference_type:
+            conditions.append("difference_type = ?")
+            parameters.append(difference_type)
+        if key_prefix:
+            low, high = _prefix_bounds(key_prefix)
+            conditions.append("key >= ?")
+            parameters.append(low)
+            if high is not None:
+                conditions.append("key < ?")
+                parameters.append(high)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        direction = " DESC" if descending else ""
+        order_column = _ORDER_COLUMNS[order_by]
+        if order_column == "position":
+            order = f" ORDER BY position{direction}"
+        else:
+            order = f" ORDER BY {order_column}{direction}, position"
+        return where + order, parameters
+
+    def query(
+        self,
+        *,
+        column: Optional[str] = None,
+        difference_type: Optional[str] = None,
+        key_prefix: Optional[str] = None,
+        order_by: str = "key",
+        descending: bool = False,
+    ) -> array:
+        """Return the indexes of the matching items in the requested order.
+
+        Filters combine with AND; ``order_by`` is one of
+        :data:`QUERY_FIELDS`, ties keep the key order.
+        """
+
+        clauses, parameters = self._filter(
+            column, difference_type, key_prefix, order_by, descending
+        )
+        rows = self._db.execute(f"SELECT position - 1 FROM differences{clauses}", parameters)
+        return array("I", (row[0] for row in rows))
+
+    def select(
+        self,
+        *,
+        column: Optional[str] = None,
+        difference_type: Optional[str] = None,
+        key_prefix: Optional[str] = None,
+        order_by: str = "key",
+        descending: bool = False,
+        offset: int = 0,
+        limit: Optional[int] = None,
+    ) -> Iterator[Difference]:
+        """Iterate over the matching items; see :meth:`query` for the filters.
+
+        ``offset`` and ``limit`` page through the result.
+        """
+
+        clauses, parameters = self._filter(
+            column, difference_type, key_prefix, order_by, descending
+        )
+        page: List[object] = [-1 if limit is None else max(limit, 0), max(offset, 0)]
+        rows = self._db.execute(f"{_SELECT}{clauses} LIMIT ? OFFSET ?", [*parameters, *page])
+        return (_to_difference(row, self._composite) for row in rows)
+
+    def count_matching(
+        self,
+        *,
+        column: Optional[str] = None,
+        difference_type: Optional[str] = None,
+        key_prefix: Optional[str] = None,
+    ) -> int:
+        """Return the number of items matching the filters of :meth:`query`."""
+
+        clauses, parameters = self._filter(column, difference_type, key_prefix, "key", False)
+        where = clauses.partition(" ORDER BY")[0]
+        rows = self._db.execute(f"SELECT COUNT(*) FROM differences{where}", parameters)
+        return rows.fetchone()[0]
+
+    def __repr__(self) -> str:
+        return f"<ResultStore {self.path!r}: {len(self)} differences>"
+
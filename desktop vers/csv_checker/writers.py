@@ -0,0 +1,430 @@
+"""Detailed difference reports written in batches on a background thread.
+
+The caller only collects differences into batches; formatting, compression
+and file I/O happen on a writer thread, so exporting overlaps with the
+comparison producing the differences. At most ``queue_size`` batches wait
+for the writer, which bounds the memory used by a report of any size.
+zstd compression needs the optional ``zstandard`` package and Parquet output
+the optional ``pyarrow`` package; both are imported only when used. The
+``sqlite`` format saves an indexed result store that can be reopened and
+queried (see :mod:`csv_checker.store`).
+"""
+from __future__ import annotations
+
+import csv
+import gzip
+import io
+import itertools
+import json
+import os
+import queue
+import threading
+from typing import IO, Iterable, List, Optional, Sequence, Tuple, Union
+
+from .model import (
+    KEY_DISPLAY_SEPARATOR,
+    KEY_SEPARATOR,
+    CsvComparisonError,
+    Difference,
+    FieldSummary,
+    RawDifference,
+    _engine_key,
+)
+from .reports import _write_report_rows, summarize_differences_by_field
+from .sources import KeyFields, _key_fields
+
+REPORT_FORMATS = ("csv", "jsonl", "parquet", "sqlite")
+REPORT_COMPRESSIONS = ("none", "gzip", "zstd")
+DEFAULT_BATCH_SIZE = 10_000
+
+_DETAIL_FIELDS = ("column", "value_a", "value_b", "difference_type")
+_COMPRESSION_SUFFIXES = {".gz": "gzip", ".zst": "zstd", ".zstd": "zstd"}
+_FORMAT_SUFFIXES = {
+    ".jsonl": "jsonl",
+    ".ndjson": "jsonl",
+    ".parquet": "parquet",
+    ".sqlite": "sqlite",
+    ".sqlite3": "sqlite",
+    ".db": "sqlite",
+}
+_GZIP_LEVEL = 6
+_ZSTD_LEVEL = 3
+_STOP = None
+
+
+def _report_kind(
+    output_path: str, output_format: Optional[str], compression: Optional[str]
+) -> Tuple[str, str]:
+    """Resolve the format and compression, inferring missing ones from the path.
+
+    ``diff.csv.gz`` is gzip-compressed CSV, ``diff.jsonl.zst`` zstd-compressed
+    JSON lines, ``diff.parquet`` Parquet and ``run.sqlite`` (or ``.db``) a
+    result store; other names default to CSV.
+    """
+
+    stem, suffix = os.path.splitext(output_path.lower())
+    if compression is None:
+        compression = _COMPRESSION_SUFFIXES.get(suffix, "none")
+    if suffix in _COMPRESSION_SUFFIXES:
+        suffix = os.path.splitext(stem)[1]
+    if output_format is None:
+        output_format = _FORMAT_SUFFIXES.get(suffix, "csv")
+    if output_format not in REPORT_FORMATS:
+        raise CsvComparisonError(
+            f"Неизвестный формат отчёта '{output_format}'. "
+            f"Доступны: {', '.join(REPORT_FORMATS)}."
+        )
+    if compression not in REPORT_COMPRESSIONS:
+        raise CsvComparisonError(
+            f"Неизвестное сжатие '{compression}'. Доступны: {', '.join(REPORT_COMPRESSIONS)}."
+        )
+    if output_format == "sqlite" and compression != "none":
+        raise CsvComparisonError("База результатов SQLite не сжимается.")
+    return output_format, compression
+
+
+def _open_binary(output_path: str, compression: str) -> IO[bytes]:
+    if compression == "gzip":
+        return gzip.open(output_path, "wb", compresslevel=_GZIP_LEVEL)
+    if compression == "zstd":
+        try:
+            import zstandard
+        except ImportError as error:
+            raise CsvComparisonError(
+                "Для сжатия zstd установите пакет zstandard."
+            ) from error
+        return zstandard.ZstdCompressor(level=_ZSTD_LEVEL).stream_writer(
+            open(output_path, "wb"), closefd=True
+        )
+    return open(output_path, "wb")
+
+
+def _split_key(key: str, count: int) -> List[str]:
+    """Split an engine-level key into ``count`` cells.
+
+    A displayed key is split on :data:`KEY_DISPLAY_SEPARATOR` only for
+    differences built by hand without ``key_cells``.
+    """
+
+    if count == 1:
+        return [key]
+    if KEY_SEPARATOR in key:
+        cells = key.split(KEY_SEPARATOR)
+    else:
+        cells = key.split(KEY_DISPLAY_SEPARATOR, count - 1)
+    return cells + [""] * (count - len(cells))
+
+
+class DifferenceWriter:
+    """Write differences to a CSV, JSON lines or Parquet report in batches.
+
+    Every key column gets its own report column, followed by ``column``,
+    ``value_a``, ``value_b`` and ``difference_type``. ``output`` is a file
+    path or, for uncompressed CSV and JSON lines, an open text stream. A
+    ``sqlite`` result store keeps the key fields and the compared
+    ``sources`` (names of both inputs) for :class:`ResultStore`. The
+    written differences are counted into :attr:`summary` (a
+    :class:`FieldSummary` keeping ``example_keys`` keys per field, complete
+    once the writer is closed); with ``summary_path`` it is also saved as a
+    field report (see :func:`write_field_report`) on :meth:`close`.
+
+    Use it as a context manager: on an error inside the ``with`` block the
+    writer stops and a partially written report file is removed. Errors of the
+    writer thread are raised by the next :meth:`write` or by :meth:`close`.
+    """
+
+    def __init__(
+        self,
+        output: Union[str, IO[str]],
+        output_format: Optional[str] = None,
+        compression: Optional[str] = None,
+        key_field: KeyFields = "POLICY_NO",
+        summary_path: Optional[str] = None,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        queue_size: int = 4,
+        example_keys: int = 0,
+        sources: Optional[Tuple[str, str]] = None,
+    ) -> None:
+        self._path = output if isinstance(output, str) else None
+        if self._path is not None:
+            output_format, compression = _report_kind(self._path, output_format, compression)
+        else:
+            output_format, compression = _report_kind("", output_format, compression)
+            if output_format in ("parquet", "sqlite") or compression != "none":
+                raise CsvComparisonError(
+                    "В поток можно записать только несжатый CSV или JSON lines."
+                )
+        key_fields = _key_fields(key_field)
+        self.output_format = output_format
+        self.compression = compression
+        self.fields = (*key_fields, *_DETAIL_FIELDS)
+        self.key_fields = key_fields
+        self.sources = sources
+        self.summary_path = summary_path
+        self.summary = FieldSummary(example_keys)
+        self.written = 0
+        self._key_count = len(key_fields)
+        self._batch_size = max(batch_size, 1)
+        self._batch: List[Union[Difference, RawDifference]] = []
+        self._queue: "queue.Queue[Optional[list]]" = queue.Queue(
+            max(queue_size, 1)
+        )
+        self._error: Optional[BaseException] = None
+        self._closed = False
+        self._complete = False
+        self._store = None
+        self._parquet = None
+        self._csv_writer = None
+        if output_format == "parquet":
+            try:
+                import pyarrow
+                import pyarrow.parquet
+            except ImportError as error:
+                raise CsvComparisonError(
+                    "Для отчётов Parquet установите пакет pyarrow."
+                ) from error
+            self._arrow = pyarrow
+            self._text: Optional[IO[str]] = None
+        elif output_format == "sqlite":
+            from .store import _check_replaceable
+
+            _check_replaceable(self._path)
+            self._text = None
+        elif self._path is not None:
+            self._text = io.TextIOWrapper(
+                _open_binary(self._path, compression), encoding="utf-8", newline=""
+            )
+        else:
+            self._text = output
+        self._thread = threading.Thread(
+            target=self._run, name="csv-checker-report-writer", daemon=True
+        )
+        self._thread.start()
+
+    def __enter__(self) -> "DifferenceWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self._abort()
+
+    def write(self, difference: Union[Difference, RawDifference]) -> None:
+        """Queue a :class:`Difference` or an engine-level difference tuple."""
+
+        self._batch.append(difference)
+        if len(self._batch) >= self._batch_size:
+            self._flush_batch()
+
+    def write_all(self, differences: Iterable[Union[Difference, RawDifference]]) -> int:
+        """Queue several differences and return how many were queued."""
+
+        if hasattr(differences, "iter_raw"):
+            # A DifferenceSet or a ResultStore yields its items as tuples.
+            differences = differences.iter_raw()
+        differences = iter(differences)
+        queued = 0
+        while True:
+            chunk = list(itertools.islice(differences, self._batch_size - len(self._batch)))
+            if not chunk:
+                return queued
+            queued += len(chunk)
+            self._batch.extend(chunk)
+            if len(self._batch) >= self._batch_size:
+                self._flush_batch()
+
+    def close(self) -> None:
+        """Write the pending batch, wait for the writer and save the summary."""
+
+        if self._closed:
+            return
+        try:
+            self._flush_batch()
+            self._complete = True
+            self._finish()
+        except BaseException:
+            self._remove_output()
+            raise
+        if self.summary_path and self.summary.counts:
+            _write_report_rows(summarize_differences_by_field(self.summary), self.summary_path)
+
+    def _flush_batch(self) -> None:
+        if self._error is not None:
+            raise self._error
+        if self._batch:
+            self.written += len(self._batch)
+            self._queue.put(self._batch)
+            self._batch = []
+
+    def _finish(self) -> None:
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join()
+        try:
+            self._close_streams()
+        except BaseException as error:
+            if self._error is None:
+                self._error = error
+        if self._error is not None:
+            raise self._error
+
+    def _abort(self) -> None:
+        if self._closed:
+            return
+        self._batch = []
+        try:
+            self._finish()
+        except BaseException:
+            pass
+        self._remove_output()
+
+    def _remove_output(self) -> None:
+        # A result store replaces its path only once complete.
+        if self.output_format == "sqlite":
+            return
+        if self._path is not None and os.path.exists(self._path):
+            os.remove(self._path)
+
+    def _close_streams(self) -> None:
+        if self._store is not None:
+            self._store.close(self.summary if self._complete and self._error is None else None)
+        elif self._parquet is not None:
+            self._parquet.close()
+        elif self._path is not None:
+            self._text.close()
+        else:
+            self._text.flush()
+
+    def _run(self) -> None:
+        write_batch = {
+            "csv": self._write_csv,
+            "jsonl": self._write_jsonl,
+            "parquet": self._write_parquet,
+            "sqlite": self._write_sqlite,
+        }[self.output_format]
+        empty = True
+        while True:
+            batch = self._queue.get()
+            if batch is _STOP and not empty:
+                break
+            if self._error is None:
+                try:
+                    # An empty report still gets its header (or Parquet schema).
+                    write_batch(self._rows(batch or []))
+                except BaseException as error:  # noqa: BLE001 - raised on the caller thread
+                    self._error = error
+            if batch is _STOP:
+                break
+            empty = False
+
+    def _rows(
+        self, batch: Sequence[Union[Difference, RawDifference]]
+    ) -> List[Tuple[str, ...]]:
+        """Format a batch into report rows and count it for the summary."""
+
+        counts = self.summary.counts
+        add_examples = self.summary.add if self.summary.example_keys else None
+        key_count = self._key_count
+        rows = []
+        for difference in batch:
+            if isinstance(difference, Difference):
+                key, column, value_a, value_b = (
+                    _engine_key(difference),
+                    difference.column,
+                    difference.value_a,
+                    difference.value_b,
+                )
+                difference_type = difference.difference_type
+                cells = difference.key_cells or _split_key(difference.POLICY_NO, key_count)
+            else:
+                key, column, value_a, value_b, difference_type = difference
+                cells = _split_key(key, key_count)
+            rows.append((*cells, column, str(value_a), str(value_b), difference_type))
+            if add_examples is None:
+                counts[column, difference_type] += 1
+            else:
+                add_examples(key, column, difference_type)
+        return rows
+
+    def _write_csv(self, rows: List[Tuple[str, ...]]) -> None:
+        if self._csv_writer is None:
+            self._csv_writer = csv.writer(self._text)
+            self._csv_writer.writerow(self.fields)
+        self._csv_writer.writerows(rows)
+
+    def _write_jsonl(self, rows: List[Tuple[str, ...]]) -> None:
+        fields = self.fields
+        self._text.write(
+            "".join(
+                json.dumps(dict(zip(fields, row)), ensure_ascii=False) + "\n" for row in rows
+            )
+        )
+
+    def _write_parquet(self, rows: List[Tuple[str, ...]]) -> None:
+        pa = self._arrow
+        columns = list(zip(*rows)) or [()] * len(self.fields)
+        table = pa.Table.from_arrays(
+            [pa.array(column, pa.string()) for column in columns], names=list(self.fields)
+        )
+        if self._parquet is None:
+            self._parquet = pa.parquet.ParquetWriter(
+                self._path,
+                table.schema,
+                compression="snappy" if self.compression == "none" else self.compression,
+            )
+        self._parquet.write_table(table)
+
+    def _write_sqlite(self, rows: List[Tuple[str, ...]]) -> None:
+        if self._store is None:
+            from .store import _StoreBuilder
+
+            self._store = _StoreBuilder(self._path, self.key_fields, self.sources)
+        key_count = self._key_count
+        if key_count == 1:
+            self._store.add((row[0], None, *row[1:]) for row in rows)
+        else:
+            self._store.add(
+                (
+                    KEY_DISPLAY_SEPARATOR.join(row[:key_count]),
+                    KEY_SEPARATOR.join(row[:key_count]),
+                    *row[key_count:],
+                )
+                for row in rows
+            )
+
+
+def write_differences(
+    differences: Iterable[Union[Difference, RawDifference]],
+    output_path: str,
+    *,
+    output_format: Optional[str] = None,
+    compression: Optional[str] = None,
+    key_field: KeyFields = "POLICY_NO",
+    summary_path: Optional[str] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    example_keys: int = 0,
+    sources: Optional[Tuple[str, str]] = None,
+) -> int:
+    """Write every difference to a detailed report and return their number.
+
+    ``differences`` may be a :class:`DifferenceSet` or a stream such as
+    :func:`iter_differences`, which is then consumed while the report is being
+    written. The format (``csv``, ``jsonl`` or ``parquet``) and compression
+    (``none``, ``gzip`` or ``zstd``) are inferred from the file name unless
+    given; ``sqlite`` saves a result store. See :class:`DifferenceWriter` for
+    the report layout, ``summary_path`` and ``sources``.
+    """
+
+    with DifferenceWriter(
+        output_path,
+        output_format,
+        compression,
+        key_field=key_field,
+        summary_path=summary_path,
+        batch_size=batch_size,
+        example_keys=example_keys,
+        sources=sources,
+    ) as writer:
+        writer.write_all(differences)
+    return writer.written
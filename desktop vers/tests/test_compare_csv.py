@@ -1,15 +1,73 @@
+import asyncio
 import csv
+import gzip
+import importlib
+import importlib.util
+import io
+import json
 import os
+import pickle
+import sqlite3
+import subprocess
+import sys
 import tempfile
+import threading
 import unittest
+import zipfile
+from collections import Counter
+from contextlib import closing, redirect_stderr, redirect_stdout
+from unittest import mock
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover - NumPy is optional
+    numpy = None
 
 from csv_checker import (
+    ComparisonCancelled,
+    ComparisonPair,
     Difference,
+    FIELD_REPORT_EXAMPLES_HEADER,
+    ColumnRule,
+    ComparisonStats,
     CsvComparisonError,
+    DifferenceSet,
+    DifferenceWriter,
+    DuplicateKeysError,
+    FieldSummary,
+    INDEX_SUFFIX,
+    ResultStore,
+    compare_batch,
     compare_csv_files,
+    compare_csv_files_async,
+    iter_differences,
+    iter_differences_async,
+    iter_missing_rows,
+    pairs_against,
+    pairs_from_directories,
+    pairs_from_manifest,
+    PreviewPolicy,
+    parse_column_rule,
+    parse_preview_policy,
+    quick_check,
+    read_csv_sorted,
     summarize_differences_by_field,
+    update_row_index,
+    write_batch_summary,
+    write_differences,
     write_field_report,
 )
+from benchmarks.generate import DatasetSpec, generate_pair
+from benchmarks.run_benchmarks import find_regressions
+from csv_checker import engine
+from csv_checker.cli import main as cli_main
+from csv_checker.columnar import _load_table
+from csv_checker.model import _Progress
+from csv_checker.quick import MISSING_ROWS_COLUMN
+from csv_checker.results_view import _ResultsWindow
+from csv_checker.rules import _infer_rules
+from csv_checker.sources import _CsvSource
+from csv_checker.store import _StoreBuilder
 
 
 class CompareCsvFilesTests(unittest.TestCase):
@@ -18,8 +76,9 @@ class CompareCsvFilesTests(unittest.TestCase):
 
     def tearDown(self) -> None:
         for file_path in self.temp_files:
-            if os.path.exists(file_path):
-                os.remove(file_path)
+            for path in (file_path, f"{file_path}{INDEX_SUFFIX}"):
+                if os.path.exists(path):
+                    os.remove(path)
 
     def _create_csv(self, headers, rows):
         temp_file = tempfile.NamedTemporaryFile("w", delete=False, newline="", encoding="utf-8")
@@ -62,6 +121,544 @@ class CompareCsvFilesTests(unittest.TestCase):
         with self.assertRaises(CsvComparisonError):
             compare_csv_files(file_a, file_b)
 
+    def test_spilled_runs_match_in_memory_result(self):
+        headers = ["Policy_no", "Amount", "Status"]
+        rows_a = [[f"{index:03d}", str(index), "Active"] for index in range(50, 0, -1)]
+        rows_b = [[f"{index:03d}", str(index % 7), "Active"] for index in range(60, 5, -1)]
+        file_a = self._create_csv(headers, rows_a)
+        file_b = self._create_csv(headers, rows_b)
+
+        in_memory = compare_csv_files(file_a, file_b)
+        spilled = compare_csv_files(file_a, file_b, memory_limit=512)
+
+        self.assertEqual(spilled, in_memory)
+        keys = [diff.policy_no for diff in spilled]
+        self.assertEqual(keys, sorted(keys))
+        self.assertEqual(
+            {diff.difference_type for diff in spilled},
+            {"value_mismatch", "missing_in_a", "missing_in_b"},
+        )
+
+    def test_iter_differences_is_lazy(self):
+        headers = ["Policy_no", "Amount"]
+        file_a = self._create_csv(headers, [["001", "100"], ["002", "200"]])
+        file_b = self._create_csv(headers, [["001", "101"], ["002", "201"]])
+
+        iterator = iter_differences(file_a, file_b)
+        first = next(iterator)
+        self.assertEqual((first.policy_no, first.column), ("001", "Amount"))
+        self.assertEqual(len(list(iterator)), 1)
+
+    def test_raises_on_duplicate_keys_in_spilled_runs(self):
+        headers = ["Policy_no", "Amount"]
+        rows = [[f"{index:03d}", "1"] for index in range(30)] + [["007", "2"]]
+        file_a = self._create_csv(headers, rows)
+        file_b = self._create_csv(headers, rows[:-1])
+
+        with self.assertRaisesRegex(CsvComparisonError, "007"):
+            compare_csv_files(file_a, file_b, memory_limit=256)
+
+    def test_parallel_mode_matches_sequential_result(self):
+        headers = ["Policy_no", "Amount", "Comment"]
+        rows_a = [[f"{index:03d}", str(index), "line\nbreak"] for index in range(40)]
+        rows_b = [[f"{index:03d}", str(index % 5), "line\nbreak"] for index in range(5, 45)]
+        file_a = self._create_csv(headers, rows_a)
+        file_b = self._create_csv(headers, rows_b)
+
+        sequential = compare_csv_files(file_a, file_b)
+        parallel = compare_csv_files(file_a, file_b, workers=3)
+
+        self.assertEqual(parallel, sequential)
+
+    def test_parallel_mode_repartitions_when_a_split_falls_inside_quotes(self):
+        headers = ["Policy_no", "Amount", "Comment"]
+        long_comment = 'quoted "text"\n' * 5000
+        rows_a = [[f"{index:03d}", str(index), long_comment if index == 3 else ""] for index in range(8)]
+        rows_b = [[f"{index:03d}", str(index % 3), long_comment if index == 3 else ""] for index in range(8)]
+        file_a = self._create_csv(headers, rows_a)
+        file_b = self._create_csv(headers, rows_b)
+
+        sequential = compare_csv_files(file_a, file_b, backend="python")
+        for workers in (2, 3):
+            with self.subTest(workers=workers):
+                self.assertEqual(compare_csv_files(file_a, file_b, workers=workers), sequential)
+
+    def test_parallel_mode_reports_all_duplicates(self):
+        headers = ["Policy_no", "Amount"]
+        rows = [[f"{index:03d}", "1"] for index in range(20)]
+        file_a = self._create_csv(headers, rows + [["003", "2"], ["011", "2"]])
+        file_b = self._create_csv(headers, rows)
+
+        with self.assertRaises(DuplicateKeysError) as context:
+            compare_csv_files(file_a, file_b, workers=2)
+        self.assertEqual(context.exception.duplicates_a, ["003", "011"])
+        self.assertEqual(context.exception.duplicates_b, [])
+
+    @unittest.skipUnless(numpy, "NumPy is not installed")
+    def test_numpy_backend_matches_python_backend(self):
+        headers_a = ["Policy_no", "Amount", "Status", "Comment"]
+        headers_b = ["POLICY_NO", "Status", "Amount", "Region"]
+        rows_a = [[f"{index:03d}", str(index), "Active", "x" * (index % 3)] for index in range(30)]
+        rows_b = [[f"{index:03d}", "Active" if index % 4 else "Closed", str(index), ""] for index in range(10, 40)]
+        rows_b[3][3] = "North"
+        file_a = self._create_csv(headers_a, rows_a)
+        file_b = self._create_csv(headers_b, rows_b)
+
+        python_result = compare_csv_files(file_a, file_b, backend="python")
+        numpy_result = compare_csv_files(file_a, file_b, backend="numpy")
+
+        self.assertEqual(numpy_result, python_result)
+
+    @unittest.skipUnless(numpy, "NumPy is not installed")
+    def test_numpy_backend_stores_keys_and_cells_of_any_length(self):
+        long_key = "9" * 5000
+        headers = ["Policy_no", "Amount"]
+        rows_a = [[f"{index:03d}", str(index)] for index in range(20)] + [[long_key, "1"]] * 2
+        rows_b = [[f"{index:03d}", str(index % 7)] for index in range(5, 25)] + [[long_key, "2"]]
+        file_a = self._create_csv(headers, rows_a)
+        file_b = self._create_csv(headers, rows_b)
+
+        with _CsvSource(file_a, ("Policy_no",)) as source:
+            keys, table = _load_table(source, _Progress(None, None, 0))
+        self.assertEqual((table.dtype, table.shape, keys[-1]), (object, (22, 2), long_key))
+        for duplicates in ("first", "last", "multiset"):
+            with self.subTest(duplicates=duplicates):
+                self.assertEqual(
+                    compare_csv_files(file_a, file_b, backend="numpy", duplicates=duplicates),
+                    compare_csv_files(file_a, file_b, backend="python", duplicates=duplicates),
+                )
+
+    def test_mmap_backend_matches_python_backend(self):
+        headers = ["Policy_no", "Amount", "Comment"]
+        rows_a = [[f"{index:03d}", str(index), "multi\nline" if index % 5 else ""] for index in range(30)]
+        rows_b = [[f"{index:03d}", str(index), "multi\nline" if index % 5 else ""] for index in range(5, 35)]
+        rows_b[4][1] = "changed"
+        rows_b[7][2] = 'quoted "text"'
+        file_a = self._create_csv(headers, rows_a)
+        file_b = self._create_csv(headers, rows_b)
+        file_c = self._create_csv(["Comment", "POLICY_NO", "Amount"], [r[2:] + r[:2] for r in rows_b])
+
+        for other in (file_b, file_c):
+            python_result = compare_csv_files(file_a, other, backend="python")
+            mmap_result = compare_csv_files(file_a, other, backend="mmap")
+            self.assertEqual(mmap_result, python_result)
+            self.assertEqual(len(mmap_result), 12)
+
+    def _create_raw_csv(self, data):
+        with tempfile.NamedTemporaryFile("wb", suffix=".csv", delete=False) as temp_file:
+            temp_file.write(data)
+        self.temp_files.append(temp_file.name)
+        return temp_file.name
+
+    def test_mmap_backend_reads_quotes_inside_unquoted_fields(self):
+        file_a = self._create_raw_csv(
+            b'POLICY_NO,Desc,Amt\n1,5" screen,100\n2,ok,200\n3,"a ""b""\nc",300\n'
+        )
+        file_b = self._create_raw_csv(
+            b'POLICY_NO,Desc,Amt\n1,5" screen,150\n2,ok,200\n3,"a ""b""\nc",300\n'
+        )
+
+        expected = compare_csv_files(file_a, file_b, backend="python")
+        self.assertEqual([(d.policy_no, d.column) for d in expected], [("1", "Amt")])
+        for backend in ("mmap", "auto"):
+            with self.subTest(backend=backend):
+                self.assertEqual(compare_csv_files(file_a, file_b, backend=backend), expected)
+
+        broken = self._create_raw_csv(b'POLICY_NO,Desc,Amt\n1,"a"\rb,100\n')
+        with self.assertRaises(CsvComparisonError):
+            compare_csv_files(broken, file_b, backend="mmap")
+
+    def test_auto_backend_prefers_numpy_when_the_files_fit(self):
+        headers = ["Policy_no", "Amount"]
+        file_a = self._create_csv(headers, [[f"{index:03d}", "1"] for index in range(50)])
+        file_b = self._create_csv(headers, [[f"{index:03d}", "2"] for index in range(50)])
+        size = os.path.getsize(file_a) + os.path.getsize(file_b)
+        loaded = engine._COLUMNAR_MEMORY_FACTOR * size
+        with mock.patch.object(engine, "_numpy_available", return_value=False):
+            without_numpy = engine._select_backend("auto", file_a, file_b, loaded - 1, 1)
+        self.assertNotEqual(without_numpy, "numpy")
+        choices = [
+            (True, loaded, 1, "numpy"),
+            (True, loaded - 1, 1, without_numpy),
+            (False, 10**9, 1, "mmap"),
+            (True, 10**9, 2, "python"),
+        ]
+        for installed, memory_limit, workers, expected in choices:
+            with self.subTest(installed=installed, memory_limit=memory_limit, workers=workers):
+                with mock.patch.object(engine, "_numpy_available", return_value=installed):
+                    self.assertEqual(
+                        engine._select_backend("auto", file_a, file_b, memory_limit, workers),
+                        expected,
+                    )
+
+    def test_rejects_unknown_backend(self):
+        headers = ["Policy_no", "Amount"]
+        file_a = self._create_csv(headers, [["001", "100"]])
+        file_b = self._create_csv(headers, [["001", "100"]])
+
+        with self.assertRaises(CsvComparisonError):
+            compare_csv_files(file_a, file_b, backend="fortran")
+
+    def test_composite_key(self):
+        file_a = self._create_csv(
+            ["Policy_no", "Endorsement_no", "Amount"],
+            [["001", "1", "100"], ["001", "2", "150"], ["002", "1", "200"]],
+        )
+        file_b = self._create_csv(
+            ["ENDORSEMENT_NO", "POLICY_NO", "Amount"],
+            [["1", "001", "100"], ["2", "001", "175"], ["2", "002", "200"]],
+        )
+
+        differences = compare_csv_files(file_a, file_b, ["POLICY_NO", "ENDORSEMENT_NO"])
+
+        self.assertEqual(
+            [(d.policy_no, d.column, d.difference_type) for d in differences],
+            [
+                ("001 | 2", "Amount", "value_mismatch"),
+                ("002 | 1", "__missing__", "missing_in_b"),
+                ("002 | 2", "__missing__", "missing_in_a"),
+            ],
+        )
+
+    def test_duplicate_policies_agree_across_backends(self):
+        headers = ["Policy_no", "Amount"]
+        file_a = self._create_csv(
+            headers, [["001", "100"], ["002", "1"], ["001", "150"], ["001", "175"]]
+        )
+        file_b = self._create_csv(headers, [["001", "150"], ["002", "1"], ["001", "100"]])
+        expected = {
+            "first": [("001", "Amount", "100", "150")],
+            "last": [("001", "Amount", "175", "100")],
+            "multiset": [
+                ("001", "Amount", "100", "150"),
+                ("001", "Amount", "150", "100"),
+                ("001", "__missing__", "Данные файла 1: Amount=175", "Нет записи в "
+                 f"{os.path.basename(file_b)}"),
+            ],
+        }
+        options = [
+            {"backend": "python"},
+            {"backend": "mmap"},
+            {"incremental": True},
+            {"workers": 2, "memory_limit": 1},
+        ]
+        if numpy is not None:
+            options.append({"backend": "numpy"})
+
+        for policy, rows in expected.items():
+            for option in options:
+                with self.subTest(policy=policy, **option):
+                    differences = compare_csv_files(file_a, file_b, duplicates=policy, **option)
+                    self.assertEqual(
+                        [(d.policy_no, d.column, d.value_a, d.value_b) for d in differences],
+                        rows,
+                    )
+        for option in options:
+            with self.subTest(policy="fail", **option):
+                with self.assertRaises(DuplicateKeysError) as error:
+                    compare_csv_files(file_a, file_b, **option)
+                self.assertEqual(error.exception.duplicates_a, ["001"])
+
+    def test_duplicate_policies_with_an_empty_file(self):
+        headers = ["Policy_no", "Amount"]
+        file_a = self._create_csv(headers, [["001", "100"], ["001", "150"], ["002", "1"]])
+        file_b = self._create_csv(headers, [])
+        backends = ["python", "mmap"] + (["numpy"] if numpy is not None else [])
+
+        for policy, count in (("first", 2), ("last", 2), ("multiset", 3)):
+            for backend in backends:
+                with self.subTest(policy=policy, backend=backend):
+                    differences = compare_csv_files(
+                        file_a, file_b, duplicates=policy, backend=backend
+                    )
+                    self.assertEqual(len(differences), count)
+                    self.assertEqual(
+                        differences.type_counts(), {"missing_in_b": count}
+                    )
+
+    def test_duplicate_keys_error_message_is_bounded(self):
+        error = DuplicateKeysError("a.csv", [f"{index:03d}" for index in range(100)], "b.csv", [])
+
+        self.assertIn("и ещё 80", str(error))
+        self.assertNotIn("099", str(error))
+
+    def test_column_rules_agree_across_backends(self):
+        headers = ["Policy_no", "Amount", "Issued", "Status", "Comment"]
+        file_a = self._create_csv(
+            headers,
+            [
+                ["001", "100.0", "2024-01-05", "Active", "a"],
+                ["002", "10,5", "2024-01-06", " Closed ", "b"],
+                ["003", "7", "2024-01-07", "Active", "c"],
+            ],
+        )
+        file_b = self._create_csv(
+            headers,
+            [
+                ["001", "100", "05.01.2024", "ACTIVE", "x"],
+                ["002", "10.504", "06.01.2024", "closed", "y"],
+                ["003", "8", "08.01.2024", "Active", "z"],
+            ],
+        )
+        rules = {
+            "AMOUNT": "number:abs=0.01",
+            "Issued": ColumnRule("date", date_formats=("%Y-%m-%d", "%d.%m.%Y")),
+            "Status": "text:strip,nocase",
+            "Comment": "ignore",
+        }
+        options = [
+            {"backend": "python"},
+            {"backend": "mmap"},
+            {"incremental": True},
+            {"workers": 2, "memory_limit": 1},
+        ]
+        if numpy is not None:
+            options.append({"backend": "numpy"})
+
+        for option in options:
+            with self.subTest(**option):
+                differences = compare_csv_files(file_a, file_b, rules=rules, **option)
+                self.assertEqual(
+                    [(d.policy_no, d.column) for d in differences],
+                    [("003", "Amount"), ("003", "Issued")],
+                )
+
+    def test_infer_types_keeps_codes_textual(self):
+        headers = ["Policy_no", "Amount", "Issued", "Code"]
+        file_a = self._create_csv(
+            headers, [["001", "100.50", "2024-01-05", "007"], ["002", "3", "2024-02-01", "10"]]
+        )
+        file_b = self._create_csv(
+            headers, [["001", "100.5", "05.01.2024", "7"], ["002", "3.0", "01.02.2024", "10"]]
+        )
+
+        self.assertEqual(len(compare_csv_files(file_a, file_b)), 5)
+        differences = compare_csv_files(
+            file_a, file_b, infer_types=True, rules={"issued": "text"}
+        )
+        self.assertEqual(
+            [(d.policy_no, d.column) for d in differences],
+            [("001", "Code"), ("001", "Issued"), ("002", "Issued")],
+        )
+
+    def test_numbers_compare_exactly_and_long_identifiers_stay_textual(self):
+        headers = ["Policy_no", "Account", "Amount"]
+        file_a = self._create_csv(
+            headers,
+            [["001", "40702810938000012345", "0.1"], ["002", "40702810938000012347", "2"]],
+        )
+        file_b = self._create_csv(
+            headers,
+            [["001", "40702810938000012346", "0.10"], ["002", "40702810938000012347", "2.0"]],
+        )
+
+        for rules in ({}, {"Account": "number"}, {"Account": "number:abs=0.5"}):
+            with self.subTest(rules=rules):
+                differences = compare_csv_files(file_a, file_b, infer_types=True, rules=rules)
+                self.assertEqual(
+                    [(d.policy_no, d.column) for d in differences], [("001", "Account")]
+                )
+        differences = compare_csv_files(file_a, file_b, rules={"Account": "number:abs=1"})
+        self.assertEqual(len(differences), 2)
+        self.assertEqual(
+            len(compare_csv_files(file_a, file_b, rules={"Account": "number:rel=1e-19"})), 2
+        )
+
+    def test_number_rules_keep_thousands_separators_apart_from_decimal_commas(self):
+        headers = ["Policy_no", "Amount", "Rate"]
+        file_a = self._create_csv(headers, [["001", "1,000", "1,5"], ["002", "7", "2,50"]])
+        file_b = self._create_csv(headers, [["001", "1", "1.5"], ["002", "7.0", "2.5"]])
+
+        differences = compare_csv_files(file_a, file_b, rules={"Amount": "number", "Rate": "number"})
+        self.assertEqual([(d.policy_no, d.column) for d in differences], [("001", "Amount")])
+        # "1,000" keeps the inferred Amount column textual.
+        differences = compare_csv_files(file_a, file_b, infer_types=True)
+        self.assertEqual(
+            [(d.policy_no, d.column) for d in differences], [("001", "Amount"), ("002", "Amount")]
+        )
+
+        upper = self._create_csv(["POLICY_NO", "AMOUNT", "RATE"], [["001", "1.0", "1.5"]])
+        inferred, _ = _infer_rules(file_a, upper)
+        self.assertEqual(inferred, {"Rate": ColumnRule("number")})
+
+    def test_parse_column_rule(self):
+        self.assertEqual(
+            parse_column_rule(" Amount = number:abs=0.5,rel=1e-6"),
+            ("Amount", ColumnRule("number", abs_tol=0.5, rel_tol=1e-6)),
+        )
+        self.assertEqual(parse_column_rule("Comment=ignore"), ("Comment", ColumnRule("ignore")))
+        for text in ("Amount", "=number", "Amount=float", "Amount=number:abs=x",
+                     "Amount=number:abs=-1", "Status=text:upper", "Comment=ignore:all"):
+            with self.subTest(text=text), self.assertRaises(CsvComparisonError):
+                parse_column_rule(text)
+
+    def test_compare_returns_compact_difference_set(self):
+        headers = ["Policy_no", "Amount", "Status"]
+        file_a = self._create_csv(headers, [["001", "100", "Active"], ["002", "200", ""]])
+        file_b = self._create_csv(headers, [["001", "150", "Active"]])
+
+        differences = compare_csv_files(file_a, file_b)
+
+        self.assertIsInstance(differences, DifferenceSet)
+        self.assertEqual(differences[-1].value_a, "Данные файла 1: Amount=200")
+        self.assertEqual(differences[0], Difference("001", "Amount", "100", "150", "value_mismatch"))
+        self.assertEqual(pickle.loads(pickle.dumps(differences)), differences)
+        self.assertEqual(
+            summarize_differences_by_field(differences),
+            summarize_differences_by_field(list(differences)),
+        )
+
+    def test_difference_set_round_trips_differences(self):
+        differences = [
+            Difference("001", "Amount", "100", "120", "value_mismatch"),
+            Difference("001", "Status", "100", "Closed", "value_mismatch"),
+            Difference("002", "__missing__", "Нет записи в A", "Данные файла 2", "missing_in_a"),
+        ]
+
+        stored = DifferenceSet(differences)
+
+        self.assertEqual(list(stored), differences)
+        self.assertEqual(stored[1:], differences[1:])
+        self.assertEqual(stored.type_counts()["value_mismatch"], 2)
+        with self.assertRaises(IndexError):
+            stored[3]
+
+    def test_incremental_mode_matches_full_comparison(self):
+        headers_a = ["Policy_no", "Amount", "Comment"]
+        headers_b = ["Comment", "POLICY_NO", "Amount"]
+        rows_a = [[f"{index:03d}", str(index), "multi\nline"] for index in range(20)]
+        rows_b = [["multi\nline", f"{index:03d}", str(index)] for index in range(5, 25)]
+        rows_b[2][2] = "changed"
+        file_a = self._create_csv(headers_a, rows_a)
+        file_b = self._create_csv(headers_b, rows_b)
+
+        expected = compare_csv_files(file_a, file_b)
+        first_run = compare_csv_files(file_a, file_b, incremental=True)
+        second_run = compare_csv_files(file_a, file_b, incremental=True)
+
+        self.assertEqual(first_run, expected)
+        self.assertEqual(second_run, expected)
+        self.assertTrue(os.path.exists(f"{file_a}{INDEX_SUFFIX}"))
+
+    def test_incremental_index_is_rebuilt_after_file_changes(self):
+        headers = ["Policy_no", "Amount"]
+        file_a = self._create_csv(headers, [["001", "100"], ["002", "200"]])
+        file_b = self._create_csv(headers, [["001", "100"], ["002", "200"]])
+        update_row_index(file_a)
+        self.assertEqual(len(compare_csv_files(file_a, file_b, incremental=True)), 0)
+
+        with open(file_a, "a", encoding="utf-8", newline="") as csv_file:
+            csv.writer(csv_file).writerow(["002", "250"])
+        with self.assertRaises(DuplicateKeysError):
+            compare_csv_files(file_a, file_b, incremental=True)
+
+    def test_incremental_index_never_runs_planted_code(self):
+        headers = ["Policy_no", "Amount"]
+        file_a = self._create_csv(headers, [["001", "100"], ["002", "200"]])
+        file_b = self._create_csv(headers, [["001", "150"], ["002", "200"]])
+        marker = f"{file_a}.planted"
+        self.temp_files.append(marker)
+        expected = compare_csv_files(file_a, file_b)
+
+        class Planted:
+            def __reduce__(self):
+                return (open, (marker, "w"))
+
+        index_path = f"{file_a}{INDEX_SUFFIX}"
+        with open(index_path, "wb") as index_file:
+            pickle.dump(Planted(), index_file)
+        self.assertEqual(compare_csv_files(file_a, file_b, incremental=True), expected)
+        self.assertFalse(os.path.exists(marker))
+
+        with open(index_path, "rb") as index_file:
+            data = index_file.read()
+        for damaged in (data[:-3], data[:40], data.replace(b'"rows": 2', b'"rows": 9')):
+            with open(index_path, "wb") as index_file:
+                index_file.write(damaged)
+            self.assertEqual(compare_csv_files(file_a, file_b, incremental=True), expected)
+        with open(index_path, "rb") as index_file:
+            self.assertEqual(index_file.read(), data)
+
+    def test_reports_progress(self):
+        headers = ["Policy_no", "Amount"]
+        file_a = self._create_csv(headers, [["001", "100"], ["002", "200"]])
+        file_b = self._create_csv(headers, [["001", "150"], ["003", "300"]])
+
+        for options in ({}, {"incremental": True}):
+            snapshots = []
+            compare_csv_files(file_a, file_b, progress=snapshots.append, **options)
+            final = snapshots[-1]
+            self.assertEqual(final.bytes_read, final.bytes_total)
+            self.assertEqual(final.bytes_total, os.path.getsize(file_a) + os.path.getsize(file_b))
+            self.assertEqual(final.rows_read, 4)
+            self.assertEqual(final.rows_compared, 4)
+            self.assertEqual(final.differences_found, 3)
+
+    def test_reads_each_input_byte_once_before_diffing(self):
+        headers = ["Policy_no", "Amount", "Comment"]
+        rows = [[f"{index:04d}", str(index), "multi\nline" if index % 7 else ""] for index in range(500)]
+        file_a = self._create_csv(headers, rows)
+        file_b = self._create_csv(headers, rows[::-1][:400])
+        options = [{"backend": "python", "memory_limit": 1}, {"backend": "mmap"}]
+        if numpy is not None:
+            options.append({"backend": "numpy"})
+
+        for option in options + [{"incremental": True}]:
+            with self.subTest(**option):
+                snapshots = []
+                compare_csv_files(file_a, file_b, progress=snapshots.append, **option)
+                self.assertEqual(snapshots[-1].bytes_scanned, snapshots[-1].bytes_total)
+
+        snapshots = []
+        compare_csv_files(file_a, file_b, incremental=True, progress=snapshots.append)
+        self.assertEqual(snapshots[-1].bytes_scanned, 0)
+        self.assertEqual(snapshots[-1].bytes_read, snapshots[-1].bytes_total)
+
+    def test_max_differences_stops_the_comparison(self):
+        headers = ["Policy_no", "Amount"]
+        file_a = self._create_csv(headers, [[f"{index:03d}", "1"] for index in range(50)])
+        file_b = self._create_csv(headers, [[f"{index:03d}", "2"] for index in range(10, 60)])
+        full = compare_csv_files(file_a, file_b)
+        options = [
+            {"backend": "python"},
+            {"backend": "mmap"},
+            {"incremental": True},
+            {"workers": 2},
+        ]
+        if numpy is not None:
+            options.append({"backend": "numpy"})
+
+        for option in options:
+            with self.subTest(**option):
+                summary = FieldSummary()
+                limited = compare_csv_files(
+                    file_a, file_b, max_differences=5, summary=summary, **option
+                )
+                self.assertEqual(list(limited), list(full)[:5])
+                self.assertEqual(limited.summary.total, 5)
+                self.assertEqual(summary.total, 5)
+                summary = FieldSummary()
+                streamed = list(
+                    iter_differences(file_a, file_b, max_differences=3, summary=summary, **option)
+                )
+                self.assertEqual(streamed, list(full)[:3])
+                self.assertEqual(summary.total, 3)
+        self.assertEqual(list(iter_differences(file_a, file_b, max_differences=0)), [])
+        with self.assertRaises(CsvComparisonError):
+            compare_csv_files(file_a, file_b, max_differences=-1)
+
+    def test_cancel_event_stops_comparison(self):
+        headers = ["Policy_no", "Amount"]
+        file_a = self._create_csv(headers, [["001", "100"]])
+        file_b = self._create_csv(headers, [["001", "150"]])
+        cancel_event = threading.Event()
+        cancel_event.set()
+
+        with self.assertRaises(ComparisonCancelled):
+            compare_csv_files(file_a, file_b, cancel_event=cancel_event)
+        with self.assertRaises(ComparisonCancelled):
+            list(iter_differences(file_a, file_b, workers=2, cancel_event=cancel_event))
+
     def test_summarize_differences_by_field(self):
         differences = [
             Difference("001", "Amount", "100", "120", "value_mismatch"),
@@ -78,6 +675,302 @@ class CompareCsvFilesTests(unittest.TestCase):
             "1",
         )
 
+    def test_field_summary_is_gathered_by_every_engine(self):
+        headers = ["Policy_no", "Amount", "Status"]
+        file_a = self._create_csv(
+            headers, [[f"{index:03d}", str(index), "Active"] for index in range(40)]
+        )
+        file_b = self._create_csv(
+            headers,
+            [[f"{index:03d}", str(index % 7), "Active" if index % 3 else "Closed"]
+             for index in range(5, 45)],
+        )
+        expected = compare_csv_files(file_a, file_b, backend="python")
+        counts = Counter(
+            (difference.column, difference.difference_type) for difference in expected
+        )
+        options = [
+            {"backend": "python"},
+            {"backend": "mmap"},
+            {"incremental": True},
+            {"workers": 3, "memory_limit": 1},
+        ]
+        if numpy is not None:
+            options.append({"backend": "numpy"})
+
+        for option in options:
+            with self.subTest(**option):
+                streamed = FieldSummary(example_keys=2)
+                self.assertEqual(
+                    len(list(iter_differences(file_a, file_b, summary=streamed, **option))),
+                    len(expected),
+                )
+                self.assertEqual(streamed.counts, counts)
+                self.assertEqual(streamed.examples["Status"], ["006", "009"])
+                self.assertEqual(streamed.examples["__missing__"], ["000", "001"])
+
+                differences = compare_csv_files(file_a, file_b, **option)
+                self.assertEqual(differences.summary.counts, counts)
+                self.assertEqual(differences.type_counts(), expected.type_counts())
+
+    def test_field_summaries_merge(self):
+        first, second, whole = FieldSummary(2), FieldSummary(2), FieldSummary(2)
+        for index, key in enumerate(["005", "001", "004", "002", "003"]):
+            (first if index % 2 else second).add(key, "Amount", "value_mismatch")
+            whole.add(key, "Amount", "value_mismatch")
+        second.add("009", "__missing__", "missing_in_a")
+        whole.add("009", "__missing__", "missing_in_a")
+
+        self.assertEqual(first.merge(second), whole)
+        self.assertEqual(whole.examples["Amount"], ["001", "002"])
+        self.assertEqual(whole.total, 6)
+        self.assertEqual(whole.type_counts(), {"value_mismatch": 5, "missing_in_a": 1})
+
+    def test_column_projection_is_applied_by_every_engine(self):
+        headers = ["Policy_no", "Amount", "Status", "Comment"]
+        file_a = self._create_csv(
+            headers, [[f"{index:03d}", str(index), "Active", "a"] for index in range(40)]
+        )
+        file_b = self._create_csv(
+            headers,
+            [[f"{index:03d}", str(index % 7), "Active" if index % 3 else "Closed", "b"]
+             for index in range(5, 45)],
+        )
+        full = compare_csv_files(file_a, file_b, backend="python")
+        expected = Counter(
+            (difference.POLICY_NO, difference.column, difference.difference_type)
+            for difference in full
+            if difference.column in ("Amount", "__missing__")
+        )
+        options = [
+            {"backend": "python"},
+            {"backend": "mmap"},
+            {"incremental": True},
+            {"workers": 2},
+        ]
+        if numpy is not None:
+            options.append({"backend": "numpy"})
+
+        for selection in ({"columns": ["amount"]}, {"exclude_columns": ["Status", "Comment"]}):
+            for option in options:
+                with self.subTest(**selection, **option):
+                    differences = compare_csv_files(file_a, file_b, **selection, **option)
+                    self.assertEqual(
+                        Counter(
+                            (difference.POLICY_NO, difference.column, difference.difference_type)
+                            for difference in differences
+                        ),
+                        expected,
+                    )
+
+        with self.assertRaises(CsvComparisonError):
+            compare_csv_files(file_a, file_b, columns=["Amount", "Region"])
+
+    def test_encoding_and_delimiter_are_detected_by_every_engine(self):
+        headers = ["Policy_no", "Город", "Comment"]
+        rows_a = [[f"{index:03d}", "Москва", "да"] for index in range(30)]
+        rows_b = [[f"{index:03d}", "Москва", "да"] for index in range(5, 35)]
+        rows_b[0][1] = "Тверь"
+        rows_b[1][2] = "нет; позже"
+        file_a = self._create_csv(headers, rows_a)
+        with tempfile.NamedTemporaryFile(
+            "w", delete=False, newline="", encoding="cp1251", suffix=".csv"
+        ) as temp_file:
+            writer = csv.writer(temp_file, delimiter=";")
+            writer.writerow(headers)
+            writer.writerows(rows_b)
+        file_b = temp_file.name
+        self.temp_files.append(file_b)
+        expected = Counter(
+            [("005", "Город", "Москва", "Тверь"), ("006", "Comment", "да", "нет; позже")]
+            + [(f"{index:03d}", "__missing__") for index in range(5)]
+            + [(f"{index:03d}", "__missing__") for index in range(30, 35)]
+        )
+
+        options = [
+            {"backend": "python"},
+            {"backend": "mmap"},
+            {"incremental": True},
+            {"workers": 2},
+        ]
+        if numpy is not None:
+            options.append({"backend": "numpy"})
+        for option in options:
+            with self.subTest(**option):
+                differences = compare_csv_files(file_a, file_b, **option)
+                self.assertEqual(
+                    Counter(
+                        (difference.POLICY_NO, difference.column)
+                        + (
+                            (difference.value_a, difference.value_b)
+                            if difference.column != "__missing__"
+                            else ()
+                        )
+                        for difference in differences
+                    ),
+                    expected,
+                )
+        with open(file_b, "rb") as raw_file:
+            data_b = raw_file.read()
+        chunks = (data_b[start : start + 7] for start in range(0, len(data_b), 7))
+        self.assertEqual(len(compare_csv_files(file_a, chunks)), sum(expected.values()))
+        self.assertEqual(len(list(iter_missing_rows(file_a, file_b, "Policy_no"))), 10)
+        self.assertTrue(quick_check(file_a, file_b, "Policy_no").has_differences)
+        self.assertEqual(read_csv_sorted(file_b, "policy_no")[0]["Город"], "Тверь")
+
+        with open(file_b, "wb") as raw_file:
+            raw_file.write("Policy_no,Amount\n".encode("utf-16"))
+        with self.assertRaises(CsvComparisonError):
+            compare_csv_files(file_a, file_b)
+
+    def test_cells_with_equal_bytes_in_different_encodings_differ(self):
+        # "Рђ" in cp1251 is the same two bytes as "А" in UTF-8.
+        headers = ["Policy_no", "Город"]
+        file_a = self._create_csv(headers, [["001", "Рђ"], ["002", "Тверь"]])
+        with open(file_a, "rb") as raw_file:
+            data_a = raw_file.read().decode("utf-8").encode("cp1251")
+        with open(file_a, "wb") as raw_file:
+            raw_file.write(data_a)
+        file_b = self._create_csv(headers, [["001", "А"], ["002", "Тверь"]])
+        self.assertIn(b"\xd0\x90", data_a)
+
+        for option in ({"backend": "python"}, {"backend": "mmap"}, {"incremental": True}, {}):
+            with self.subTest(**option):
+                self.assertEqual(
+                    [(d.POLICY_NO, d.value_a, d.value_b)
+                     for d in compare_csv_files(file_a, file_b, **option)],
+                    [("001", "Рђ", "А")],
+                )
+
+    def test_preview_policy_limits_missing_rows_and_values(self):
+        headers = ["Policy_no", "Amount", "Comment", "Status"]
+        long_text = "x" * 50
+        file_a = self._create_csv(
+            headers, [["001", "100", long_text, "Active"], ["002", "5", "a", "Closed"]]
+        )
+        file_b = self._create_csv(
+            headers, [["001", "200", long_text + "y", "Active"], ["003", "7", "b", "New"]]
+        )
+        expected = {
+            "full": [
+                ("Comment", long_text, long_text + "y"),
+                "Данные файла 1: Amount=5, Comment=a, Status=Closed",
+                "Данные файла 2: Amount=7, Comment=b, Status=New",
+            ],
+            "columns=1,values=10": [
+                ("Comment", "x" * 10 + "…", "x" * 10 + "…"),
+                "Данные файла 1: Amount=5",
+                "Данные файла 2: Amount=7",
+            ],
+            "chars=12": [
+                ("Comment", long_text, long_text + "y"),
+                "Данные файла 1: Amount=5, Co…",
+                "Данные файла 2: Amount=7, Co…",
+            ],
+            "off": [
+                ("Comment", long_text, long_text + "y"),
+                "Данные файла 1: не сохранены",
+                "Данные файла 2: не сохранены",
+            ],
+        }
+
+        options = [
+            {"backend": "python"},
+            {"backend": "mmap"},
+            {"incremental": True},
+            {"workers": 2},
+        ]
+        if numpy is not None:
+            options.append({"backend": "numpy"})
+        for preview, (mismatch, missing_b, missing_a) in expected.items():
+            for option in options:
+                with self.subTest(preview=preview, **option):
+                    differences = compare_csv_files(
+                        file_a, file_b, "Policy_no", preview=preview, **option
+                    )
+                    self.assertEqual(
+                        [(d.column, d.value_a, d.value_b) for d in differences],
+                        [
+                            ("Amount", "100", "200"),
+                            mismatch,
+                            ("__missing__", missing_b, "Нет записи в " + os.path.basename(file_b)),
+                            ("__missing__", "Нет записи в " + os.path.basename(file_a), missing_a),
+                        ],
+                    )
+
+        self.assertEqual(parse_preview_policy("full"), PreviewPolicy())
+        self.assertEqual(
+            parse_preview_policy("off, values=5"), PreviewPolicy(columns=0, value_chars=5)
+        )
+        for text in ("columns=-1", "chars=0", "rows=3", "values=many"):
+            with self.subTest(text=text), self.assertRaises(CsvComparisonError):
+                parse_preview_policy(text)
+
+    def test_iter_missing_rows_matches_the_missing_rows_of_a_comparison(self):
+        headers = ["Policy_no", "Amount"]
+        rows_a = [[f"{index:03d}", str(index)] for index in range(30)]
+        rows_b = [[f"{index:03d}", "0"] for index in range(10, 40)]
+        file_a = self._create_csv(headers, rows_a[::-1])
+        file_b = self._create_csv(headers, rows_b)
+        compressed = file_b + ".gz"
+        with open(file_b, "rb") as raw_file, gzip.open(compressed, "wb") as gz_file:
+            gz_file.write(raw_file.read())
+        self.temp_files.append(compressed)
+        expected = [
+            (difference.POLICY_NO, difference.difference_type)
+            for difference in compare_csv_files(file_a, file_b, "Policy_no")
+            if difference.column == "__missing__"
+        ]
+
+        for other in (file_b, compressed):
+            with self.subTest(other=other):
+                missing = list(iter_missing_rows(file_a, other, "Policy_no"))
+                self.assertEqual(
+                    [(difference.POLICY_NO, difference.difference_type) for difference in missing],
+                    expected,
+                )
+                self.assertTrue(missing[0].value_b.startswith("Нет записи в"))
+        self.assertEqual(
+            len(list(iter_missing_rows(file_a, file_b, "Policy_no", max_differences=3))), 3
+        )
+
+        duplicated = self._create_csv(headers, rows_a + [["005", "1"]])
+        with self.assertRaises(DuplicateKeysError) as context:
+            list(iter_missing_rows(duplicated, file_b, "Policy_no"))
+        self.assertEqual(context.exception.duplicates_a, ["005"])
+
+    def test_iter_missing_rows_reads_quotes_inside_unquoted_fields(self):
+        file_a = self._create_raw_csv(b'POLICY_NO,Desc,Amt\n1,5" screen,100\n2,ok,200\n')
+        file_b = self._create_raw_csv(b'POLICY_NO,Desc,Amt\n2,ok,200\n3,7" tab,300\n')
+
+        missing = list(iter_missing_rows(file_a, file_b))
+        self.assertEqual(
+            [(difference.POLICY_NO, difference.difference_type) for difference in missing],
+            [("1", "missing_in_b"), ("3", "missing_in_a")],
+        )
+        broken = self._create_raw_csv(b'POLICY_NO,Desc,Amt\n"1"\r0,a,100\n')
+        with self.assertRaises(CsvComparisonError):
+            list(iter_missing_rows(broken, file_b))
+        with redirect_stderr(io.StringIO()):
+            self.assertEqual(cli_main(["compare", broken, file_b, "--keys-only", "-q"]), 2)
+
+    def test_write_field_report_from_a_summary_with_examples(self):
+        summary = FieldSummary(example_keys=2)
+        for key in ("003", "001", "002"):
+            summary.add(key, "Amount", "value_mismatch")
+        summary.add("001\x1f2", "__missing__", "missing_in_b")
+        temp_file = tempfile.NamedTemporaryFile("w", delete=False, encoding="utf-8")
+        temp_file.close()
+        self.temp_files.append(temp_file.name)
+
+        write_field_report(summary, temp_file.name)
+
+        with open(temp_file.name, encoding="utf-8") as report_file:
+            rows = {row["Поле"]: row for row in csv.DictReader(report_file)}
+        self.assertEqual(rows["Amount"]["Всего расхождений"], "3")
+        self.assertEqual(rows["Amount"][FIELD_REPORT_EXAMPLES_HEADER], "001; 002")
+        self.assertEqual(rows["Строка отсутствует"][FIELD_REPORT_EXAMPLES_HEADER], "001 | 2")
+
     def test_write_field_report(self):
         differences = [
             Difference("001", "Amount", "100", "120", "value_mismatch"),
@@ -101,5 +994,1093 @@ class CompareCsvFilesTests(unittest.TestCase):
         self.assertIn("Строка отсутствует", fields)
 
 
+class DifferenceWriterTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.file_a = self._create_csv(
+            "a.csv", [["001", "1", "100"], ["001", "2", "150"], ["002", "1", "200"]]
+        )
+        self.file_b = self._create_csv(
+            "b.csv", [["001", "1", "100"], ["001", "2", "175"], ["003", "1", "300"]]
+        )
+        self.key = ["Policy_no", "Endorsement_no"]
+        self.expected = [
+            ["001", "2", "Amount", "150", "175", "value_mismatch"],
+            ["002", "1", "__missing__", "missing_in_b"],
+            ["003", "1", "__missing__", "missing_in_a"],
+        ]
+
+    def tearDown(self) -> None:
+        self.temp_dir.cleanup()
+
+    def _create_csv(self, name, rows):
+        path = os.path.join(self.temp_dir.name, name)
+        with open(path, "w", encoding="utf-8", newline="") as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(["Policy_no", "Endorsement_no", "Amount"])
+            writer.writerows(rows)
+        return path
+
+    def _path(self, name):
+        return os.path.join(self.temp_dir.name, name)
+
+    def _assert_rows(self, rows):
+        self.assertEqual(rows[0][:3], ["Policy_no", "Endorsement_no", "column"])
+        self.assertEqual(
+            [row[:6] if row[2] != "__missing__" else row[:3] + row[5:] for row in rows[1:]],
+            self.expected,
+        )
+
+    def test_writes_detailed_reports_from_a_stream(self):
+        for name in ("diff.csv", "diff.jsonl", "diff.csv.gz", "diff.jsonl.gz"):
+            with self.subTest(name=name):
+                path = self._path(name)
+                summary = self._path(f"{name}.summary.csv")
+                written = write_differences(
+                    iter_differences(self.file_a, self.file_b, self.key),
+                    path,
+                    key_field=self.key,
+                    summary_path=summary,
+                    batch_size=2,
+                )
+
+                self.assertEqual(written, 3)
+                opener = gzip.open if name.endswith(".gz") else open
+                with opener(path, "rt", encoding="utf-8", newline="") as report_file:
+                    if ".jsonl" in name:
+                        records = [json.loads(line) for line in report_file]
+                        rows = [list(records[0])] + [list(r.values()) for r in records]
+                    else:
+                        rows = list(csv.reader(report_file))
+                self._assert_rows(rows)
+                expected_summary = self._path("expected.csv")
+                write_field_report(
+                    compare_csv_files(self.file_a, self.file_b, self.key), expected_summary
+                )
+                with open(summary, encoding="utf-8") as actual, open(
+                    expected_summary, encoding="utf-8"
+                ) as expected:
+                    self.assertEqual(actual.read(), expected.read())
+
+    def test_writes_difference_sets_and_empty_reports(self):
+        path = self._path("diff.csv")
+        differences = compare_csv_files(self.file_a, self.file_b, self.key)
+        self.assertEqual(write_differences(differences, path, key_field=self.key), 3)
+        with open(path, encoding="utf-8", newline="") as report_file:
+            self._assert_rows(list(csv.reader(report_file)))
+
+        summary = self._path("summary.csv")
+        self.assertEqual(write_differences([], path, summary_path=summary), 0)
+        with open(path, encoding="utf-8") as report_file:
+            self.assertEqual(
+                report_file.read().strip(), "POLICY_NO,column,value_a,value_b,difference_type"
+            )
+        self.assertFalse(os.path.exists(summary))
+
+    def test_key_cells_containing_the_display_separator(self):
+        file_a = self._create_csv("pipe_a.csv", [["A | B", "C", "1"], ["A", "B | C", "1"]])
+        file_b = self._create_csv("pipe_b.csv", [["A | B", "C", "2"], ["A", "B | C", "3"]])
+        expected = [["A", "B | C", "Amount", "1", "3"], ["A | B", "C", "Amount", "1", "2"]]
+        differences = compare_csv_files(file_a, file_b, self.key)
+        self.assertEqual(
+            [d.key_cells for d in differences], [("A", "B | C"), ("A | B", "C")]
+        )
+
+        store = self._path("pipe.sqlite")
+        sources = {
+            "stream": lambda: iter_differences(file_a, file_b, self.key),
+            "set": lambda: differences,
+            "store": lambda: ResultStore(store),
+        }
+        write_differences(differences, store, key_field=self.key)
+        for name, source in sources.items():
+            with self.subTest(source=name):
+                path = self._path(f"pipe_{name}.csv")
+                items = source()
+                write_differences(items, path, key_field=self.key)
+                if isinstance(items, ResultStore):
+                    items.close()
+                with open(path, encoding="utf-8", newline="") as report_file:
+                    rows = list(csv.reader(report_file))
+                self.assertEqual([row[:5] for row in rows[1:]], expected)
+        with ResultStore(store) as saved:
+            self.assertEqual(list(saved), list(differences))
+            self.assertEqual(saved[0].key_cells, ("A", "B | C"))
+            self.assertEqual(saved.key_at(0), "A | B | C")
+
+    def test_optional_formats_need_their_packages(self):
+        differences = compare_csv_files(self.file_a, self.file_b, self.key)
+        for name, package in (("diff.csv.zst", "zstandard"), ("diff.parquet", "pyarrow")):
+            with self.subTest(name=name):
+                path = self._path(name)
+                if importlib.util.find_spec(package) is None:
+                    with self.assertRaises(CsvComparisonError):
+                        write_differences(differences, path, key_field=self.key)
+                    self.assertFalse(os.path.exists(path))
+                else:
+                    self.assertEqual(
+                        write_differences(differences, path, key_field=self.key), 3
+                    )
+                    self.assertGreater(os.path.getsize(path), 0)
+
+    def test_error_in_the_stream_removes_the_partial_report(self):
+        path = self._path("diff.csv.gz")
+
+        def failing_stream():
+            yield from iter_differences(self.file_a, self.file_b, self.key)
+            raise CsvComparisonError("broken input")
+
+        with self.assertRaises(CsvComparisonError):
+            write_differences(failing_stream(), path, key_field=self.key, batch_size=1)
+        self.assertFalse(os.path.exists(path))
+
+    def test_rejects_compressed_streams(self):
+        with self.assertRaises(CsvComparisonError):
+            DifferenceWriter(sys.stdout, compression="gzip")
+        with self.assertRaises(CsvComparisonError):
+            DifferenceWriter(self._path("diff.csv"), output_format="xlsx")
+
+
+class CompressedInputTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        rows_a = [[f"{index:03d}", str(index)] for index in range(40, 0, -1)]
+        rows_b = [[f"{index:03d}", str(index % 9)] for index in range(45, 5, -1)]
+        self.file_a = self._create_csv("a.csv", rows_a)
+        self.file_b = self._create_csv("b.csv", rows_b)
+        self.expected = self._outline(compare_csv_files(self.file_a, self.file_b))
+
+    def tearDown(self) -> None:
+        self.temp_dir.cleanup()
+
+    def _outline(self, differences):
+        # Missing-row previews name the input, so only their keys are compared.
+        return [
+            (diff.policy_no, diff.column, diff.difference_type)
+            + ((diff.value_a, diff.value_b) if diff.difference_type == "value_mismatch" else ())
+            for diff in differences
+        ]
+
+    def _create_csv(self, name, rows):
+        path = os.path.join(self.temp_dir.name, name)
+        with open(path, "w", encoding="utf-8", newline="") as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(["Policy_no", "Amount"])
+            writer.writerows(rows)
+        return path
+
+    def _read(self, path):
+        with open(path, "rb") as raw_file:
+            return raw_file.read()
+
+    def _gzip(self, path):
+        gz_path = f"{path}.gz"
+        with gzip.open(gz_path, "wb") as gz_file:
+            gz_file.write(self._read(path))
+        return gz_path
+
+    def test_compressed_and_zipped_inputs_match_plain_files(self):
+        archive = os.path.join(self.temp_dir.name, "inputs.zip")
+        with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as zip_file:
+            zip_file.write(self.file_a, "a.csv")
+            zip_file.write(self.file_b, "b.csv")
+        single = os.path.join(self.temp_dir.name, "b.zip")
+        with zipfile.ZipFile(single, "w", zipfile.ZIP_DEFLATED) as zip_file:
+            zip_file.write(self.file_b, "b.csv")
+        # A gzip file without the .gz suffix is recognized by its magic bytes.
+        disguised = os.path.join(self.temp_dir.name, "disguised.csv")
+        os.replace(self._gzip(self.file_b), disguised)
+
+        for file_a, file_b in (
+            (self._gzip(self.file_a), self.file_b),
+            (self.file_a, disguised),
+            (f"{archive}::a.csv", f"{archive}::b.csv"),
+            (self.file_a, single),
+        ):
+            with self.subTest(file_a=file_a, file_b=file_b):
+                self.assertEqual(self._outline(compare_csv_files(file_a, file_b)), self.expected)
+                self.assertEqual(
+                    self._outline(compare_csv_files(file_a, file_b, infer_types=True)),
+                    self.expected,
+                )
+
+    def test_streams_and_chunk_iterators_are_inputs(self):
+        data_b = self._read(self.file_b)
+        with gzip.open(self._gzip(self.file_a), "rb") as gz_file, open(
+            self._gzip(self.file_a), "rb"
+        ) as compressed:
+            self.assertEqual(
+                self._outline(compare_csv_files(compressed, self.file_b)), self.expected
+            )
+            self.assertEqual(
+                self._outline(compare_csv_files(gz_file, io.BytesIO(data_b))), self.expected
+            )
+        chunks = (data_b[start : start + 7] for start in range(0, len(data_b), 7))
+        self.assertEqual(self._outline(compare_csv_files(self.file_a, chunks)), self.expected)
+
+        with self.assertRaises(CsvComparisonError):
+            compare_csv_files(self.file_a, io.BytesIO(data_b), infer_types=True)
+        with self.assertRaises(CsvComparisonError):
+            compare_csv_files(self.file_a, iter(["Policy_no,Amount\n"]))
+
+    def test_random_access_modes_need_plain_files(self):
+        gz_path = self._gzip(self.file_a)
+        for options in ({"backend": "mmap"}, {"workers": 2}, {"incremental": True}):
+            with self.subTest(options=options), self.assertRaises(CsvComparisonError):
+                compare_csv_files(gz_path, self.file_b, **options)
+
+    def test_zip_archives_must_name_one_csv_member(self):
+        archive = os.path.join(self.temp_dir.name, "inputs.zip")
+        with zipfile.ZipFile(archive, "w") as zip_file:
+            zip_file.write(self.file_a, "a.csv")
+            zip_file.write(self.file_b, "b.csv")
+        for file_a in (archive, f"{archive}::c.csv"):
+            with self.subTest(file_a=file_a), self.assertRaises(CsvComparisonError):
+                compare_csv_files(file_a, self.file_b)
+
+    def test_zstd_inputs_need_zstandard(self):
+        zst_path = os.path.join(self.temp_dir.name, "a.csv.zst")
+        with open(zst_path, "wb") as zst_file:
+            # A zstd frame header is enough to detect the format.
+            zst_file.write(b"\x28\xb5\x2f\xfd")
+        if importlib.util.find_spec("zstandard") is None:
+            with self.assertRaises(CsvComparisonError):
+                compare_csv_files(zst_path, self.file_b)
+        else:
+            with open(self.file_a, "rb") as raw_file, open(zst_path, "wb") as zst_file:
+                zst_file.write(importlib.import_module("zstandard").compress(raw_file.read()))
+            self.assertEqual(
+                self._outline(compare_csv_files(zst_path, self.file_b)), self.expected
+            )
+
+
+class QuickCheckTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        self.temp_dir.cleanup()
+
+    def _create_csv(self, name, rows):
+        path = os.path.join(self.temp_dir.name, name)
+        with open(path, "w", encoding="utf-8", newline="") as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(["Policy_no", "Amount", "Status"])
+            writer.writerows(rows)
+        return path
+
+    def _pair(self, count):
+        rows_a = [[f"{index:05d}", str(index), "Active"] for index in range(count)]
+        rows_b = [
+            [key, str(int(amount) + 1) if index % 10 == 0 else amount, status]
+            for index, (key, amount, status) in enumerate(rows_a)
+            if index % 25
+        ]
+        return self._create_csv("a.csv", rows_a), self._create_csv("b.csv", rows_b[::-1])
+
+    def test_identical_files_are_confirmed_from_their_bytes(self):
+        file_a, _ = self._pair(100)
+        copy = os.path.join(self.temp_dir.name, "copy.csv.gz")
+        with open(file_a, "rb") as raw_file, gzip.open(copy, "wb") as gz_file:
+            gz_file.write(raw_file.read())
+
+        for other in (file_a, copy):
+            with self.subTest(other=other):
+                result = quick_check(file_a, other, "Policy_no")
+                self.assertTrue(result.identical)
+                self.assertFalse(result.has_differences)
+
+    def test_small_files_are_compared_exactly(self):
+        file_a, file_b = self._pair(500)
+        result = quick_check(file_a, file_b, "Policy_no")
+        summary = compare_csv_files(file_a, file_b, "Policy_no").summary
+
+        self.assertFalse(result.identical)
+        self.assertTrue(result.exact)
+        self.assertTrue(result.has_differences)
+        self.assertEqual(result.sample_keys, 500)
+        amount = result.columns["Amount"]
+        self.assertEqual(amount.mismatches, summary.counts["Amount", "value_mismatch"])
+        self.assertEqual((amount.low, amount.high), (amount.rate, amount.rate))
+        self.assertEqual(result.columns["Status"].mismatches, 0)
+        self.assertEqual(result.columns[MISSING_ROWS_COLUMN].mismatches, 20)
+        self.assertEqual(result.rows.mismatches, 20 + amount.mismatches)
+
+    def test_sampled_estimates_cover_the_true_rates(self):
+        file_a, file_b = self._pair(4000)
+        result = quick_check(file_a, file_b, "Policy_no", sample_size=1000, confidence=0.99)
+
+        self.assertFalse(result.exact)
+        self.assertLessEqual(result.sample_keys, 1000)
+        self.assertEqual(
+            quick_check(file_a, file_b, "Policy_no", sample_size=1000, confidence=0.99), result
+        )
+        amount = result.columns["Amount"]
+        true_rate = 320 / 3840
+        self.assertLess(amount.low, true_rate)
+        self.assertGreater(amount.high, true_rate)
+        missing = result.columns[MISSING_ROWS_COLUMN]
+        self.assertLess(missing.low, 0.04)
+        self.assertGreater(missing.high, 0.04)
+        self.assertEqual(result.columns["Status"].mismatches, 0)
+
+    def test_rejects_streams_and_invalid_settings(self):
+        file_a, file_b = self._pair(10)
+        with open(file_b, "rb") as stream, self.assertRaises(CsvComparisonError):
+            quick_check(file_a, stream, "Policy_no")
+        for option in ({"sample_size": 0}, {"confidence": 1.0}, {"duplicates": "any"}):
+            with self.subTest(**option), self.assertRaises(CsvComparisonError):
+                quick_check(file_a, file_b, "Policy_no", **option)
+
+    def test_quotes_inside_unquoted_fields(self):
+        paths = []
+        for name, amount in (("a.csv", b"100"), ("b.csv", b"150"), ("broken.csv", b'"1"\r0')):
+            path = os.path.join(self.temp_dir.name, name)
+            with open(path, "wb") as csv_file:
+                csv_file.write(b'Policy_no,Amount,Status\n1,' + amount + b',5" screen\n2,2,ok\n')
+            paths.append(path)
+        file_a, file_b, broken = paths
+
+        result = quick_check(file_a, file_b, "Policy_no")
+        self.assertTrue(result.exact)
+        self.assertEqual(result.columns["Amount"].mismatches, 1)
+        self.assertEqual(result.columns["Status"].mismatches, 0)
+        with self.assertRaises(CsvComparisonError):
+            quick_check(broken, file_b, "Policy_no")
+        with redirect_stderr(io.StringIO()):
+            self.assertEqual(cli_main(["quick", broken, file_b, "--key", "Policy_no"]), 2)
+
+    def test_command_line_quick_check(self):
+        file_a, file_b = self._pair(100)
+        self.assertEqual(cli_main(["quick", file_a, file_a, "--key", "Policy_no"]), 0)
+        self.assertEqual(cli_main(["quick", file_a, file_b, "--key", "Policy_no"]), 1)
+        self.assertEqual(
+            cli_main(["quick", file_a, file_b, "--key", "Policy_no", "--rule",
+                      "Amount=ignore", "--duplicates", "first"]),
+            1,
+        )
+
+
+class BatchComparisonTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.reference = [[f"{index:03d}", str(index), "Active"] for index in range(60)]
+
+    def tearDown(self) -> None:
+        self.temp_dir.cleanup()
+
+    def _create_csv(self, name, rows):
+        path = os.path.join(self.temp_dir.name, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8", newline="") as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(["Policy_no", "Amount", "Status"])
+            writer.writerows(rows)
+        return path
+
+    def _regional(self, name, step):
+        return self._create_csv(
+            name,
+            [[key, amount if index % step else "0", status]
+             for index, (key, amount, status) in enumerate(self.reference)
+             if index % (step + 1)][::-1],
+        )
+
+    def test_reference_is_compared_with_every_file(self):
+        reference = self._create_csv("golden.csv", self.reference)
+        others = [self._regional(f"region{step}.csv", step) for step in (3, 4, 5)]
+        missing = os.path.join(self.temp_dir.name, "region9.csv")
+        pairs = pairs_against(reference, [*others, missing])
+        expected = [compare_csv_files(reference, other, "Policy_no") for other in others]
+
+        options = [{}, {"cache_limit": 0}, {"cache_limit": 4000}, {"workers": 2}]
+        for option in options:
+            with self.subTest(**option):
+                result = compare_batch(pairs, "Policy_no", example_keys=2, **option)
+                self.assertEqual([pair.pair.name for pair in result.pairs][:3],
+                                 ["region3", "region4", "region5"])
+                self.assertEqual(
+                    [pair.differences for pair in result.pairs[:3]], expected
+                )
+                self.assertEqual(result.parsed_inputs, 5)
+                self.assertEqual(len(result.failed), 1)
+                self.assertIn("region9.csv", result.failed[0].error)
+                combined = FieldSummary(2)
+                for differences in expected:
+                    combined.merge(differences.summary)
+                self.assertEqual(result.summary.counts, combined.counts)
+                self.assertTrue(result.has_differences)
+
+    def test_directories_manifest_and_outputs(self):
+        for step in (3, 4):
+            self._create_csv(os.path.join("a", f"region{step}.csv"), self.reference)
+            self._regional(os.path.join("b", f"region{step}.csv"), step)
+        self._create_csv(os.path.join("b", "extra.csv"), self.reference)
+        directory_a = os.path.join(self.temp_dir.name, "a")
+        directory_b = os.path.join(self.temp_dir.name, "b")
+        manifest = os.path.join(self.temp_dir.name, "pairs.csv")
+        with open(manifest, "w", encoding="utf-8", newline="") as manifest_file:
+            manifest_file.write(
+                "name,file_a,file_b\n"
+                "north,a/region3.csv,b/region3.csv\n"
+                ",a/region4.csv,b/region4.csv\n"
+            )
+
+        from_directories = pairs_from_directories(directory_a, directory_b)
+        self.assertEqual(
+            [pair.name for pair in from_directories], ["extra", "region3", "region4"]
+        )
+        from_manifest = pairs_from_manifest(manifest)
+        self.assertEqual(
+            from_manifest[0],
+            ComparisonPair("north", os.path.join(self.temp_dir.name, "a/region3.csv"),
+                           os.path.join(self.temp_dir.name, "b/region3.csv")),
+        )
+        self.assertEqual(from_manifest[1].name, "region4")
+
+        output_dir = os.path.join(self.temp_dir.name, "out")
+        result = compare_batch(
+            from_directories, "Policy_no", output_dir=output_dir, output_format="jsonl",
+            columns=["Amount"],
+        )
+        self.assertEqual(result.failed[0].pair.name, "extra")
+        self.assertEqual(sorted(os.listdir(output_dir)), ["region3.jsonl", "region4.jsonl"])
+        with open(result.pairs[1].output_path, encoding="utf-8") as jsonl_file:
+            self.assertEqual(len(jsonl_file.readlines()), result.pairs[1].summary.total)
+        summary_path = os.path.join(self.temp_dir.name, "summary.csv")
+        write_batch_summary(result, summary_path)
+        with open(summary_path, encoding="utf-8") as summary_file:
+            rows = list(csv.DictReader(summary_file))
+        self.assertEqual([row["Сравнение"] for row in rows], ["extra", "region3", "region4"])
+        self.assertTrue(rows[0]["Ошибка"])
+        self.assertEqual(int(rows[1]["Всего расхождений"]), result.pairs[1].summary.total)
+
+        duplicated = self._create_csv("dup.csv", self.reference + [["007", "1", "Active"]])
+        result = compare_batch(pairs_against(duplicated, [duplicated]), "Policy_no")
+        self.assertIsInstance(result.pairs[0].error, str)
+        with self.assertRaises(CsvComparisonError):
+            compare_batch(from_manifest, "Policy_no", rules={"Amount": "number:tolerance"})
+
+    def test_command_line_batch(self):
+        reference = self._create_csv("golden.csv", self.reference)
+        other = self._regional("region3.csv", 3)
+        summary_path = os.path.join(self.temp_dir.name, "summary.csv")
+        report_path = os.path.join(self.temp_dir.name, "report.csv")
+        with redirect_stderr(io.StringIO()) as stderr:
+            exit_code = cli_main(
+                ["batch", "--reference", reference, other, reference, "--key", "Policy_no",
+                 "--summary", summary_path, "--report", report_path]
+            )
+        self.assertEqual(exit_code, 1)
+        self.assertIn("прочитано файлов: 2", stderr.getvalue())
+        with open(summary_path, encoding="utf-8") as summary_file:
+            self.assertEqual(len(list(csv.reader(summary_file))), 3)
+        self.assertTrue(os.path.exists(report_path))
+        self.assertEqual(
+            cli_main(["batch", "--reference", reference, reference, "--key", "Policy_no",
+                      "-q"]),
+            0,
+        )
+        self.assertEqual(cli_main(["batch", "--reference", reference, "-q"]), 2)
+
+
+class ComparisonStatsTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        rows_a = [[f"{index:04d}", str(index)] for index in range(300)]
+        rows_b = [[key, "0" if index % 7 == 0 else amount] for index, (key, amount)
+                  in enumerate(rows_a) if index % 50]
+        self.file_a = self._create_csv("a.csv", rows_a)
+        self.file_b = self._create_csv("b.csv", rows_b[::-1])
+        self.rows = len(rows_a) + len(rows_b)
+        self.size = os.path.getsize(self.file_a) + os.path.getsize(self.file_b)
+
+    def tearDown(self) -> None:
+        self.temp_dir.cleanup()
+
+    def _create_csv(self, name, rows):
+        path = os.path.join(self.temp_dir.name, name)
+        with open(path, "w", encoding="utf-8", newline="") as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(["Policy_no", "Amount"])
+            writer.writerows(rows)
+        return path
+
+    def test_stages_are_measured_for_every_engine(self):
+        expected_stages = {
+            "python": {"read", "sort", "duplicates", "diff", "output"},
+            "mmap": {"read", "index", "diff", "output"},
+            "incremental": {"read", "index", "diff", "output"},
+        }
+        for backend, stages in expected_stages.items():
+            with self.subTest(backend=backend):
+                finished = []
+                stats = ComparisonStats(finished.append)
+                options = (
+                    {"incremental": True, "index_dir": self.temp_dir.name}
+                    if backend == "incremental"
+                    else {"backend": backend}
+                )
+                differences = compare_csv_files(
+                    self.file_a, self.file_b, "Policy_no", stats=stats, **options
+                )
+
+                self.assertEqual(finished, [stats])
+                self.assertEqual(stats.runs, 1)
+                self.assertLessEqual(stages, set(stats.stages))
+                self.assertEqual(stats.stages["read"].rows, self.rows)
+                self.assertEqual(stats.stages["read"].bytes_read, self.size)
+                self.assertEqual(stats.stages["diff"].rows, len(differences))
+                stage_time = sum(record.wall_time for record in stats.stages.values())
+                self.assertAlmostEqual(stage_time, stats.wall_time, delta=1e-6)
+                self.assertIn("чтение", stats.format_table())
+                self.assertTrue(stats.summary_line().startswith("Время:"))
+
+    def test_stats_accumulate_and_cover_closed_streams(self):
+        stats = ComparisonStats()
+        differences = compare_csv_files(
+            self.file_a, self.file_b, "Policy_no", infer_types=True, stats=stats
+        )
+        self.assertGreater(stats.stages["infer_types"].bytes_read, 0)
+        self.assertEqual(stats.stages["read"].bytes_read, self.size)
+
+        stream = iter_differences(self.file_a, self.file_b, "Policy_no", stats=stats)
+        first = [next(stream) for _ in range(3)]
+        stream.close()
+
+        self.assertEqual(stats.runs, 2)
+        self.assertEqual(first, list(differences)[:3])
+        self.assertEqual(stats.stages["preview"].rows, 3)
+        self.assertEqual(stats.stages["read"].bytes_read, 2 * self.size)
+
+    def test_profile_and_memory_snapshot_are_saved(self):
+        import pstats
+        import tracemalloc
+
+        profile_path = os.path.join(self.temp_dir.name, "run.prof")
+        snapshot_path = os.path.join(self.temp_dir.name, "run.snapshot")
+        stats = ComparisonStats(profile_path=profile_path, memory_snapshot_path=snapshot_path)
+        compare_csv_files(self.file_a, self.file_b, "Policy_no", stats=stats)
+
+        functions = {name for _, _, name in pstats.Stats(profile_path).stats}
+        self.assertIn("_run_engine", functions)
+        self.assertTrue(tracemalloc.Snapshot.load(snapshot_path).traces)
+        self.assertFalse(tracemalloc.is_tracing())
+        self.assertGreater(stats.peak_memory, 0)
+
+    def test_cli_prints_the_stage_table(self):
+        output = os.path.join(self.temp_dir.name, "diff.csv")
+        errors = io.StringIO()
+        with redirect_stderr(errors):
+            exit_code = cli_main(
+                ["compare", self.file_a, self.file_b, "--key", "Policy_no", "-o", output,
+                 "--stats", "-q"]
+            )
+
+        self.assertEqual(exit_code, 1)
+        lines = errors.getvalue().splitlines()
+        self.assertTrue(lines[0].startswith("Этап"))
+        self.assertTrue(lines[-1].startswith("всего"))
+
+
+class ResultsWindowTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.differences = DifferenceSet(
+            Difference(f"{index:03d}", "Amount", str(100 - index), "0", "value_mismatch")
+            for index in range(100)
+        )
+
+    def test_keeps_only_visible_slice(self):
+        window = _ResultsWindow(self.differences, size=10)
+
+        window.scroll_to_fraction(0.5)
+        self.assertEqual(window.visible_positions(), range(50, 60))
+        self.assertEqual(window.fractions(), (0.5, 0.6))
+
+        window.scroll_by(1000)
+        self.assertEqual(window.visible_positions(), range(90, 100))
+        window.scroll_by(-1000)
+        self.assertEqual(window.offset, 0)
+
+    def test_sorts_and_finds_keys(self):
+        window = _ResultsWindow(self.differences, size=10)
+
+        self.assertEqual(window.find_key("042"), 42)
+        window.sort_by("value_a")
+        self.assertEqual(self.differences[window.index_at(0)].value_a, "1")
+        window.sort_by("value_a")
+        self.assertEqual(self.differences[window.index_at(0)].value_a, "99")
+        self.assertEqual(window.index_at(window.find_key("042")), 42)
+
+        window.sort_by("POLICY_NO")
+        window.sort_by("POLICY_NO")
+        self.assertEqual(window.index_at(0), 99)
+
+    def test_filters_rows(self):
+        window = _ResultsWindow(self.differences, size=10)
+
+        window.filter(key_prefix="04")
+        self.assertEqual(window.total, 10)
+        self.assertEqual(window.find_key("045"), 5)
+        window.sort_by("value_a")
+        self.assertEqual([window.index_at(p) for p in (0, 9)], [49, 40])
+        window.filter(column="Amount", difference_type="missing_in_a")
+        self.assertEqual(window.total, 0)
+        window.filter()
+        self.assertEqual(window.total, 100)
+
+
+class ResultStoreTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.file_a = self._create_csv(
+            "a.csv", [[f"{i:03d}", str(i), "x"] for i in range(0, 60)]
+        )
+        self.file_b = self._create_csv(
+            "b.csv",
+            [[f"{i:03d}", str(i if i % 3 else i + 1), "x" if i % 4 else "y"]
+             for i in range(10, 70)],
+        )
+        self.store_path = os.path.join(self.temp_dir.name, "run.sqlite")
+
+    def tearDown(self) -> None:
+        self.temp_dir.cleanup()
+
+    def _create_csv(self, name, rows):
+        path = os.path.join(self.temp_dir.name, name)
+        with open(path, "w", encoding="utf-8", newline="") as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(["Policy_no", "Amount", "Status"])
+            writer.writerows(rows)
+        return path
+
+    def test_saved_results_are_queried_without_comparing_again(self):
+        expected = compare_csv_files(self.file_a, self.file_b)
+        written = write_differences(
+            iter_differences(self.file_a, self.file_b),
+            self.store_path,
+            sources=(self.file_a, self.file_b),
+        )
+
+        with ResultStore(self.store_path) as store:
+            self.assertEqual(written, len(expected))
+            self.assertEqual(list(store), list(expected))
+            self.assertEqual(store[-1], expected[-1])
+            self.assertEqual(store[5:8], list(expected)[5:8])
+            self.assertEqual(store.key_fields, ("POLICY_NO",))
+            self.assertEqual((store.file_a, store.file_b), (self.file_a, self.file_b))
+            self.assertEqual(store.summary.counts, expected.summary.counts)
+            self.assertEqual(store.columns(), ["Amount", "Status", "__missing__"])
+
+            amounts = [d for d in expected if d.column == "Amount"]
+            self.assertEqual(store.count_matching(column="Amount"), len(amounts))
+            self.assertEqual(store.count(expected[0]), 1)
+            self.assertEqual(
+                list(store.select(column="Amount", key_prefix="01")),
+                [d for d in amounts if d.POLICY_NO.startswith("01")],
+            )
+            self.assertEqual(
+                list(store.select(difference_type="missing_in_a", offset=2, limit=3)),
+                [d for d in expected if d.difference_type == "missing_in_a"][2:5],
+            )
+            by_value = store.query(order_by="value_b", descending=True)
+            self.assertEqual(
+                [store[index] for index in by_value],
+                sorted(expected, key=lambda d: d.value_b, reverse=True),
+            )
+            with self.assertRaises(CsvComparisonError):
+                store.query(order_by="POLICY_NO")
+
+            window = _ResultsWindow(store, size=10)
+            memory_window = _ResultsWindow(expected, size=10)
+            for view in (window, memory_window):
+                view.filter(column="Status", key_prefix="0")
+                view.sort_by("value_a")
+            self.assertEqual(list(window.order), list(memory_window.order))
+            self.assertEqual(window.find_key("04"), memory_window.find_key("04"))
+
+    def test_rejects_incomplete_and_foreign_files(self):
+        with self.assertRaises(RuntimeError):
+            with DifferenceWriter(self.store_path) as writer:
+                writer.write(Difference("001", "Amount", "1", "2", "value_mismatch"))
+                raise RuntimeError("interrupted")
+        self.assertFalse(os.path.exists(self.store_path))
+
+        write_differences(iter_differences(self.file_a, self.file_b), self.store_path)
+        with self.assertRaises(RuntimeError):
+            with DifferenceWriter(self.store_path) as writer:
+                writer.write(Difference("001", "Amount", "1", "2", "value_mismatch"))
+                raise RuntimeError("interrupted")
+        with ResultStore(self.store_path) as store:
+            self.assertEqual(list(store), list(compare_csv_files(self.file_a, self.file_b)))
+        self.assertEqual(sorted(os.listdir(self.temp_dir.name)), ["a.csv", "b.csv", "run.sqlite"])
+
+        with open(self.file_a, "rb") as csv_file:
+            original = csv_file.read()
+        with self.assertRaises(CsvComparisonError):
+            write_differences([], self.file_a, output_format="sqlite")
+        with open(self.file_a, "rb") as csv_file:
+            self.assertEqual(csv_file.read(), original)
+        other_db = os.path.join(self.temp_dir.name, "other.db")
+        with closing(sqlite3.connect(other_db)) as db:
+            db.execute("CREATE TABLE accounts (id INTEGER)")
+        with self.assertRaises(CsvComparisonError):
+            write_differences([], other_db)
+        self.assertTrue(os.path.exists(other_db))
+
+        # A store left behind by a killed process is never marked complete.
+        incomplete = _StoreBuilder(self.store_path, ["POLICY_NO"])
+        incomplete._db.close()
+        os.replace(incomplete._temp_path, self.store_path)
+        with self.assertRaises(CsvComparisonError):
+            ResultStore(self.store_path)
+        with self.assertRaises(CsvComparisonError):
+            ResultStore(self.file_a)
+        with self.assertRaises(CsvComparisonError):
+            ResultStore(os.path.join(self.temp_dir.name, "missing.sqlite"))
+        with self.assertRaises(CsvComparisonError):
+            DifferenceWriter(io.StringIO(), "sqlite")
+
+
+
+class AsyncComparisonTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.file_a = self._create_csv(
+            "a.csv", [[f"{i:03d}", str(i), "x"] for i in range(0, 300)]
+        )
+        self.file_b = self._create_csv(
+            "b.csv",
+            [[f"{i:03d}", str(i if i % 3 else i + 1), "x" if i % 4 else "y"]
+             for i in range(10, 310)],
+        )
+
+    def tearDown(self) -> None:
+        self.temp_dir.cleanup()
+
+    def _create_csv(self, name, rows):
+        path = os.path.join(self.temp_dir.name, name)
+        with open(path, "w", encoding="utf-8", newline="") as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(["Policy_no", "Amount", "Status"])
+            writer.writerows(rows)
+        return path
+
+    async def _chunks(self, path, size=97):
+        with open(path, "rb") as csv_file:
+            while True:
+                chunk = csv_file.read(size)
+                if not chunk:
+                    return
+                await asyncio.sleep(0)
+                yield chunk
+
+    def _stream(self, path):
+        with open(path, "rb") as csv_file:
+            return [csv_file.read()]
+
+    def test_results_match_the_blocking_api(self):
+        expected_b = compare_csv_files(self.file_a, self._stream(self.file_b))
+        expected_a = compare_csv_files(self._stream(self.file_a), self.file_b)
+
+        async def compare():
+            differences = await compare_csv_files_async(
+                self.file_a, self._chunks(self.file_b), backend="python"
+            )
+            batches = [
+                batch
+                async for batch in iter_differences_async(
+                    self._chunks(self.file_a), self.file_b, batch_size=7
+                )
+            ]
+            return differences, batches
+
+        differences, batches = asyncio.run(compare())
+        self.assertEqual(list(differences), list(expected_b))
+        self.assertEqual([d for batch in batches for d in batch], list(expected_a))
+        self.assertTrue(all(len(batch) == 7 for batch in batches[:-1]))
+
+    def test_slow_consumer_holds_back_the_comparison(self):
+        summary = FieldSummary()
+
+        async def consume():
+            differences = iter_differences_async(
+                self.file_a,
+                self.file_b,
+                batch_size=1,
+                queue_size=1,
+                backend="python",
+                summary=summary,
+            )
+            first = await differences.__anext__()
+            await asyncio.sleep(0.3)
+            produced = summary.total
+            await differences.aclose()
+            return first, produced
+
+        first, produced = asyncio.run(consume())
+        self.assertEqual(len(first), 1)
+        # One batch consumed, one queued and one waiting on the full queue.
+        self.assertLessEqual(produced, 4)
+        self.assertGreater(len(compare_csv_files(self.file_a, self.file_b)), 100)
+
+    def test_task_cancellation_stops_the_comparison(self):
+        async def endless():
+            yield b"Policy_no,Amount\n"
+            while True:
+                await asyncio.sleep(0.01)
+                yield b"001,1\n"
+
+        async def cancel():
+            task = asyncio.ensure_future(compare_csv_files_async(self.file_a, endless()))
+            await asyncio.sleep(0.2)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await asyncio.wait_for(task, 5)
+
+            async def consume():
+                async for _ in iter_differences_async(endless(), self.file_b):
+                    pass
+
+            task = asyncio.ensure_future(consume())
+            await asyncio.sleep(0.2)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await asyncio.wait_for(task, 5)
+
+        asyncio.run(cancel())
+
+    def test_errors_reach_the_awaiting_task(self):
+        async def compare():
+            await compare_csv_files_async(self.file_a, self.file_b, "MISSING")
+
+        with self.assertRaises(CsvComparisonError):
+            asyncio.run(compare())
+
+
+class CommandLineTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.file_a = self._create_csv("a.csv", [["001", "100"], ["002", "200"]])
+        self.file_b = self._create_csv("b.csv", [["001", "150"], ["003", "300"]])
+
+    def tearDown(self) -> None:
+        self.temp_dir.cleanup()
+
+    def _create_csv(self, name, rows):
+        path = os.path.join(self.temp_dir.name, name)
+        with open(path, "w", encoding="utf-8", newline="") as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(["Policy_no", "Amount"])
+            writer.writerows(rows)
+        return path
+
+    def test_show_queries_a_saved_store(self):
+        store = os.path.join(self.temp_dir.name, "run.sqlite")
+        self.assertEqual(cli_main(["compare", self.file_a, self.file_b, "-o", store, "-q"]), 1)
+        output = io.StringIO()
+        with redirect_stderr(io.StringIO()), redirect_stdout(output):
+            exit_code = cli_main(["show", store, "--sort", "difference_type"])
+        self.assertEqual(exit_code, 1)
+        rows = list(csv.reader(io.StringIO(output.getvalue())))
+        self.assertEqual([row[0] for row in rows], ["POLICY_NO", "003", "002", "001"])
+
+        filtered = os.path.join(self.temp_dir.name, "missing.jsonl")
+        exit_code = cli_main(
+            ["show", store, "--type", "missing_in_a", "-o", filtered, "-q"]
+        )
+        self.assertEqual(exit_code, 1)
+        with open(filtered, encoding="utf-8") as jsonl_file:
+            self.assertEqual([json.loads(line)["POLICY_NO"] for line in jsonl_file], ["003"])
+        self.assertEqual(cli_main(["show", store, "--key-prefix", "9", "-q", "-o", filtered]), 0)
+        self.assertEqual(cli_main(["show", self.file_a, "-q"]), 2)
+
+    def test_malformed_records_are_reported_as_errors(self):
+        broken = os.path.join(self.temp_dir.name, "broken.csv")
+        with open(broken, "wb") as csv_file:
+            csv_file.write(b'Policy_no,Amount\n001,"1"\r00\n')
+        with redirect_stderr(io.StringIO()) as errors:
+            exit_code = cli_main(["compare", broken, self.file_b, "--backend", "mmap", "-q"])
+        self.assertEqual(exit_code, 2)
+        self.assertNotIn("Traceback", errors.getvalue())
+
+    def test_compare_writes_jsonl_and_report(self):
+        output = os.path.join(self.temp_dir.name, "diff.jsonl")
+        report = os.path.join(self.temp_dir.name, "report.csv")
+        exit_code = cli_main(
+            ["compare", self.file_a, self.file_b, "--format", "jsonl", "-o", output,
+             "--report", report, "--quiet"]
+        )
+
+        self.assertEqual(exit_code, 1)
+        with open(output, encoding="utf-8") as jsonl_file:
+            records = [json.loads(line) for line in jsonl_file]
+        self.assertEqual(
+            [(r["POLICY_NO"], r["difference_type"]) for r in records],
+            [("001", "value_mismatch"), ("002", "missing_in_b"), ("003", "missing_in_a")],
+        )
+        with open(report, encoding="utf-8") as report_file:
+            self.assertEqual(len(list(csv.reader(report_file))), 3)
+
+        exit_code = cli_main(
+            ["compare", self.file_a, self.file_b, "--preview", "off", "-o", output, "-q"]
+        )
+        self.assertEqual(exit_code, 1)
+        with open(output, encoding="utf-8") as jsonl_file:
+            self.assertEqual(
+                json.loads(jsonl_file.readlines()[1])["value_a"], "Данные файла 1: не сохранены"
+            )
+        with redirect_stderr(io.StringIO()):
+            exit_code = cli_main(["compare", self.file_a, self.file_b, "--preview", "rows=1"])
+        self.assertEqual(exit_code, 2)
+
+    def test_compare_exit_codes(self):
+        output = os.path.join(self.temp_dir.name, "diff.csv")
+        self.assertEqual(cli_main(["compare", self.file_a, self.file_a, "-o", output, "-q"]), 0)
+        with open(output, encoding="utf-8") as csv_file:
+            self.assertEqual(len(list(csv.reader(csv_file))), 1)
+        missing = os.path.join(self.temp_dir.name, "missing.csv")
+        self.assertEqual(cli_main(["compare", missing, self.file_a, "-o", output, "-q"]), 2)
+
+    def test_compare_with_columns_and_keys_only(self):
+        output = os.path.join(self.temp_dir.name, "diff.jsonl")
+        self.assertEqual(
+            cli_main(["compare", self.file_a, self.file_b, "--keys-only", "--format", "jsonl",
+                      "-o", output, "-q"]),
+            1,
+        )
+        with open(output, encoding="utf-8") as jsonl_file:
+            records = [json.loads(line) for line in jsonl_file]
+        self.assertEqual(
+            [(r["POLICY_NO"], r["difference_type"]) for r in records],
+            [("002", "missing_in_b"), ("003", "missing_in_a")],
+        )
+        self.assertEqual(
+            cli_main(["compare", self.file_a, self.file_b, "--exclude-columns", "Amount",
+                      "--format", "jsonl", "-o", output, "-q"]),
+            1,
+        )
+        with open(output, encoding="utf-8") as jsonl_file:
+            self.assertEqual(len(jsonl_file.readlines()), 2)
+        self.assertEqual(
+            cli_main(["compare", self.file_a, self.file_b, "--keys-only", "--columns",
+                      "Amount", "-o", output, "-q"]),
+            2,
+        )
+
+    def test_compare_splits_composite_keys_into_columns(self):
+        output = os.path.join(self.temp_dir.name, "diff.csv")
+        exit_code = cli_main(
+            ["compare", self.file_a, self.file_b, "--key", "Policy_no, Amount", "-o", output,
+             "-q"]
+        )
+
+        self.assertEqual(exit_code, 1)
+        with open(output, encoding="utf-8") as csv_file:
+            rows = list(csv.reader(csv_file))
+        self.assertEqual(rows[0][:3], ["Policy_no", "Amount", "column"])
+        self.assertEqual([row[:2] for row in rows[1:]], [["001", "100"], ["001", "150"],
+                                                         ["002", "200"], ["003", "300"]])
+
+    def test_compare_applies_column_rules(self):
+        file_c = self._create_csv("c.csv", [["001", "100.00"], ["002", "199.999"]])
+        output = os.path.join(self.temp_dir.name, "diff.csv")
+
+        self.assertEqual(cli_main(["compare", self.file_a, file_c, "-o", output, "-q"]), 1)
+        self.assertEqual(
+            cli_main(["compare", self.file_a, file_c, "--rule", "Amount=number:abs=0.01",
+                      "-o", output, "-q"]),
+            0,
+        )
+        self.assertEqual(
+            cli_main(["compare", self.file_a, file_c, "--rule", "Amount=float", "-o", output,
+                      "-q"]),
+            2,
+        )
+
+    def test_compare_writes_compressed_output(self):
+        output = os.path.join(self.temp_dir.name, "diff.jsonl.gz")
+        report = os.path.join(self.temp_dir.name, "report.csv")
+        exit_code = cli_main(
+            ["compare", self.file_a, self.file_b, "-o", output, "--report", report, "-q"]
+        )
+
+        self.assertEqual(exit_code, 1)
+        with gzip.open(output, "rt", encoding="utf-8") as jsonl_file:
+            self.assertEqual(len([json.loads(line) for line in jsonl_file]), 3)
+        with open(report, encoding="utf-8") as report_file:
+            self.assertEqual(len(list(csv.reader(report_file))), 3)
+
+    def test_compare_reads_compressed_files_and_stdin(self):
+        gz_path = f"{self.file_a}.gz"
+        with open(self.file_a, "rb") as raw_file, gzip.open(gz_path, "wb") as gz_file:
+            gz_file.write(raw_file.read())
+        output = os.path.join(self.temp_dir.name, "diff.csv")
+        self.assertEqual(cli_main(["compare", gz_path, self.file_b, "-o", output, "-q"]), 1)
+        with open(output, encoding="utf-8") as csv_file:
+            expected = [row[:2] + row[-1:] for row in csv.reader(csv_file)]
+
+        package_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        with open(gz_path, "rb") as stdin:
+            result = subprocess.run(
+                [sys.executable, "-m", "csv_checker", "compare", "-", self.file_b, "-q"],
+                cwd=package_dir,
+                stdin=stdin,
+                capture_output=True,
+                check=False,
+            )
+        self.assertEqual(result.returncode, 1)
+        rows = csv.reader(io.StringIO(result.stdout.decode("utf-8"), newline=""))
+        self.assertEqual([row[:2] + row[-1:] for row in rows], expected)
+        self.assertEqual(cli_main(["compare", "-", "-", "-q"]), 2)
+
+    def test_core_and_cli_do_not_import_tkinter_or_numpy(self):
+        package_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        code = (
+            "import sys, csv_checker, csv_checker.cli; "
+            "print(bool({'tkinter', 'numpy'} & set(sys.modules)))"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=package_dir,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        self.assertEqual(result.stdout.strip(), "False")
+
+
+
+class BenchmarkToolsTests(unittest.TestCase):
+    def test_generated_pair_has_requested_differences(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path_a = os.path.join(temp_dir, "a.csv")
+            path_b = os.path.join(temp_dir, "b.csv")
+            spec = DatasetSpec(rows=2000, columns=6, mismatch_rate=0.1, missing_rate=0.1)
+            rows_a, rows_b = generate_pair(spec, path_a, path_b)
+            differences = compare_csv_files(path_a, path_b)
+
+            counts = differences.type_counts()
+            self.assertEqual(rows_a - counts["missing_in_b"], rows_b - counts["missing_in_a"])
+            self.assertTrue(100 < counts["value_mismatch"] < 260)
+            self.assertTrue(100 < counts["missing_in_a"] + counts["missing_in_b"] < 300)
+
+            generate_pair(DatasetSpec(rows=500, columns=3, duplicate_rate=0.1), path_a, path_b)
+            with self.assertRaises(DuplicateKeysError):
+                compare_csv_files(path_a, path_b)
+
+    def test_find_regressions(self):
+        key = ("data", "compare_csv_files", "{}")
+        previous = {key: {"seconds": 1.0, "peak_rss": 100}}
+        result = {"dataset": "data", "stage": "compare_csv_files", "options": "{}"}
+
+        self.assertEqual(
+            find_regressions([dict(result, seconds=1.2, peak_rss=110)], previous, 0.25), []
+        )
+        self.assertEqual(
+            len(find_regressions([dict(result, seconds=1.5, peak_rss=200)], previous, 0.25)), 2
+        )
+
+
 if __name__ == "__main__":  # pragma: no cover
     unittest.main()